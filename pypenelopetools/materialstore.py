@@ -0,0 +1,288 @@
+"""
+Content-addressed store of material files (``.mat``).
+
+Creating a material file with the ``material`` program of PENELOPE takes
+seconds to minutes.
+A :class:`MaterialStore` keeps the created files in a directory, under a key
+computed from the definition of the material (composition, density, mean
+excitation energy and plasmon parameters), so each material is only created
+once.
+Missing material files are created in parallel and the stored files are
+linked in the work directories of simulations under the file name of the
+material (see :data:`FILENAME_MAXLENGTH <pypenelopetools.material.FILENAME_MAXLENGTH>`).
+
+Example:
+    Create the material files of a simulation::
+
+        store = MaterialStore("/data/materials", pdfiles_dirpath="/opt/penelope/pendbase/pdfiles")
+        store.link_all([material1, material2], "/simulation/epma1")
+"""
+
+# Standard library modules.
+import os
+import copy
+import json
+import shutil
+import hashlib
+import tempfile
+
+# Third party modules.
+
+# Local modules.
+from pypenelopetools.material import FILENAME_MAXLENGTH
+from pypenelopetools.penelope.program import MaterialProgram
+from pypenelopetools.penelope.runner import Job, LocalScheduler, JobStatus
+
+# Globals and constants variables.
+EXTENSION = ".mat"
+
+WORK_FILENAME = "material.mat"
+"""Name of the material file created by the ``material`` program in its work directory."""
+
+
+def _format_optional(value):
+    if value is None:
+        return None
+    return "{0:f}".format(value)
+
+
+def get_material_key(material):
+    """
+    Returns the key of a material in the store.
+    Two materials have the same key if the ``material`` program creates the
+    same material file for both, apart from the name of the material.
+    The composition is normalized and values are rounded to the precision
+    written in the input of the ``material`` program
+    (see :meth:`Material.write_input <pypenelopetools.material.Material.write_input>`).
+
+    Args:
+        material (:class:`Material <pypenelopetools.material.Material>`): Material.
+
+    Returns:
+        str: Key (hexadecimal SHA-256 digest).
+    """
+    total = sum(material.composition.values())
+    if not material.composition or total <= 0.0:
+        raise ValueError("No elements are defined in the material")
+
+    composition = [
+        [z, "{0:.4f}".format(wf / total)]
+        for z, wf in sorted(material.composition.items())
+    ]
+
+    fcb = material.oscillator_strength_fcb
+    wcb = material.plasmon_energy_wcb_eV
+    if fcb is None or wcb is None:
+        fcb = wcb = None  # Both are estimated by PENELOPE
+
+    definition = {
+        "composition": composition,
+        "density_g_per_cm3": _format_optional(material.density_g_per_cm3),
+        "mean_excitation_energy_eV": _format_optional(
+            material.mean_excitation_energy_eV
+        ),
+        "oscillator_strength_fcb": _format_optional(fcb),
+        "plasmon_energy_wcb_eV": _format_optional(wcb),
+    }
+
+    content = json.dumps(definition, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(content.encode("utf8")).hexdigest()
+
+
+def _link(src, dst):
+    """
+    Links *src* to *dst* with a hard link, or a symbolic link if both paths
+    are not on the same file system.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+
+    try:
+        os.link(src, dst)
+    except OSError:
+        os.symlink(os.path.abspath(src), dst)
+
+
+class MaterialStore(object):
+    """
+    Store of material files.
+
+    Args:
+        dirpath (str): Path of the directory of the store.
+            It is created if it does not exist.
+        program (:class:`MaterialProgram <pypenelopetools.penelope.program.MaterialProgram>`, optional):
+            ``material`` program used to create missing material files.
+        pdfiles_dirpath (str, optional): Path of the ``pdfiles`` directory of
+            the PENELOPE database. It is linked in the work directory of the
+            ``material`` program, which reads its data from ``./pdfiles``.
+        max_workers (int, optional): Number of material files created at the
+            same time. Defaults to the number of processors.
+
+    Attributes:
+        dirpath (str): Path of the directory of the store.
+        program (:class:`MaterialProgram <pypenelopetools.penelope.program.MaterialProgram>`):
+            ``material`` program.
+        pdfiles_dirpath (str): Path of the ``pdfiles`` directory or ``None``.
+        max_workers (int): Number of material files created at the same time.
+    """
+
+    def __init__(self, dirpath, program=None, pdfiles_dirpath=None, max_workers=None):
+        if program is None:
+            program = MaterialProgram()
+
+        self.dirpath = dirpath
+        self.program = program
+        self.pdfiles_dirpath = pdfiles_dirpath
+        self.max_workers = max_workers
+
+        os.makedirs(dirpath, exist_ok=True)
+
+    def __repr__(self):
+        return "<{0}({1})>".format(self.__class__.__name__, self.dirpath)
+
+    def __contains__(self, material):
+        return os.path.exists(self.get_filepath(material))
+
+    def get_filepath(self, material):
+        """
+        Returns the path of the material file of a material in the store.
+        The file may not exist yet (see :meth:`ensure`).
+
+        Args:
+            material (:class:`Material <pypenelopetools.material.Material>`): Material.
+
+        Returns:
+            str: Path of the material file.
+        """
+        return os.path.join(self.dirpath, get_material_key(material) + EXTENSION)
+
+    def _create_job(self, material, workdir):
+        # The name of the created file is fixed, since the file is renamed
+        # after its key once it is created
+        material = copy.copy(material)
+        material.filename = WORK_FILENAME
+
+        if self.pdfiles_dirpath is not None:
+            os.symlink(
+                os.path.abspath(self.pdfiles_dirpath), os.path.join(workdir, "pdfiles")
+            )
+
+        return Job(self.program, material, workdir, name=material.name)
+
+    def ensure(self, materials):
+        """
+        Creates the material files missing in the store.
+        Materials with the same key are only created once.
+
+        Args:
+            materials (iterable(:class:`Material <pypenelopetools.material.Material>`)):
+                Materials.
+
+        Returns:
+            list(str): Paths of the material files, in the same order as
+            *materials*.
+
+        Raises:
+            JobError: If the ``material`` program fails.
+            FileNotFoundError: If the ``material`` program did not create the
+                material file.
+        """
+        materials = list(materials)
+        filepaths = [self.get_filepath(material) for material in materials]
+
+        missing = {}
+        for material, filepath in zip(materials, filepaths):
+            if not os.path.exists(filepath):
+                missing.setdefault(filepath, material)
+
+        if not missing:
+            return filepaths
+
+        # Work directories in the store, so created files are moved atomically
+        tmpdirpath = tempfile.mkdtemp(".tmp", dir=self.dirpath)
+        try:
+            jobs = {}
+            for index, (filepath, material) in enumerate(missing.items()):
+                workdir = os.path.join(tmpdirpath, "{0:03d}".format(index))
+                os.makedirs(workdir)
+                jobs[filepath] = self._create_job(material, workdir)
+
+            with LocalScheduler(self.max_workers) as scheduler:
+                futures = [scheduler.submit(job) for job in jobs.values()]
+                for future in futures:
+                    future.result()
+
+            for filepath, job in jobs.items():
+                created_filepath = os.path.join(job.workdir, WORK_FILENAME)
+                if job.status is not JobStatus.SUCCEEDED or not os.path.exists(
+                    created_filepath
+                ):
+                    raise FileNotFoundError(
+                        "Material program did not create {0}".format(job.name)
+                    )
+                os.replace(created_filepath, filepath)
+
+        finally:
+            shutil.rmtree(tmpdirpath, ignore_errors=True)
+
+        return filepaths
+
+    def link(self, material, dirpath, filename=None):
+        """
+        Links the material file of a material in a directory.
+        The file is created first if it is missing in the store.
+
+        Args:
+            material (:class:`Material <pypenelopetools.material.Material>`): Material.
+            dirpath (str): Path of the directory, e.g. the work directory of a
+                simulation.
+            filename (str, optional): Name of the linked file.
+                Defaults to :attr:`Material.filename <pypenelopetools.material.Material.filename>`.
+
+        Returns:
+            str: Path of the linked file.
+        """
+        return self.link_all([material], dirpath, [filename])[0]
+
+    def link_all(self, materials, dirpath, filenames=None):
+        """
+        Links the material files of several materials in a directory.
+        Missing files are created first, in parallel.
+
+        Args:
+            materials (iterable(:class:`Material <pypenelopetools.material.Material>`)):
+                Materials.
+            dirpath (str): Path of the directory.
+            filenames (iterable(str), optional): Names of the linked files.
+                Defaults to the file names of the materials.
+
+        Returns:
+            list(str): Paths of the linked files.
+        """
+        materials = list(materials)
+        if filenames is None:
+            filenames = [None] * len(materials)
+        filenames = [
+            material.filename if filename is None else filename
+            for material, filename in zip(materials, filenames)
+        ]
+
+        for filename in filenames:
+            if len(filename) > FILENAME_MAXLENGTH:
+                raise ValueError(
+                    "Filename {0} is too long. Maximum {1} characters".format(
+                        filename, FILENAME_MAXLENGTH
+                    )
+                )
+        if len(set(filenames)) != len(filenames):
+            raise ValueError("Materials must have different file names")
+
+        os.makedirs(dirpath, exist_ok=True)
+
+        linked_filepaths = []
+        for filepath, filename in zip(self.ensure(materials), filenames):
+            linked_filepath = os.path.join(dirpath, filename)
+            _link(filepath, linked_filepath)
+            linked_filepaths.append(linked_filepath)
+
+        return linked_filepaths
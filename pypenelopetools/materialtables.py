@@ -0,0 +1,478 @@
+"""
+Tables of interaction properties stored in PENELOPE material files (``.mat``).
+
+Besides its header (see :func:`read_material_header <pypenelopetools.pendbase.read_material_header>`),
+a material file contains tables of energy-dependent quantities, each one
+introduced by a title line starting with ``***``.
+:class:`MaterialTables` parses all the tables once into numpy arrays and
+caches them in a binary sidecar file (see :mod:`pypenelopetools.penelope.snapshot`),
+which is memory-mapped the next time the material file is read.
+Lines that cannot be parsed are skipped, so tables of unknown sections are
+kept as they are.
+
+The meaning of the columns of the known tables, as written by the program
+``material`` of PENELOPE 2018, is defined in :data:`TABLE_COLUMNS` and is
+used by the interpolation functions (stopping power, CSDA range and photon
+attenuation).
+All interpolation functions accept arrays of energies and interpolate
+linearly in log-log scale; energies outside the table give ``nan``.
+
+Example:
+    CSDA range of electrons in copper::
+
+        tables = MaterialTables.read_file("/opt/penelope/pendbase/Cu.mat")
+        ranges_cm = tables.csda_range_cm(np.geomspace(1e3, 1e6, 1000000))
+"""
+
+# Standard library modules.
+import os
+import re
+
+# Third party modules.
+import numpy as np
+import pyxray
+
+# Local modules.
+from pypenelopetools.pendbase import read_material_header
+from pypenelopetools.penelope.snapshot import write_snapshot, read_snapshot
+
+# Globals and constants variables.
+SIDECAR_EXTENSION = ".tables"
+
+ELECTRON = "electron"
+POSITRON = "positron"
+
+AVOGADRO_CONSTANT = 6.02214076e23
+"""Avogadro constant in 1/mol."""
+
+STOPPING_POWERS = "Stopping powers for electrons and positrons"
+RAYLEIGH = "Rayleigh scattering"
+COMPTON_PAIR_PRODUCTION = "Compton and pair-production cross sections"
+PHOTOELECTRIC = "Photoelectric cross sections"
+
+TABLE_COLUMNS = {
+    STOPPING_POWERS: (
+        "energy_eV",
+        "electron_collision_stopping_power_MeV_cm2_per_g",
+        "electron_radiative_stopping_power_MeV_cm2_per_g",
+        "positron_collision_stopping_power_MeV_cm2_per_g",
+        "positron_radiative_stopping_power_MeV_cm2_per_g",
+    ),
+    RAYLEIGH: ("energy_eV", "rayleigh_cross_section_cm2"),
+    COMPTON_PAIR_PRODUCTION: (
+        "energy_eV",
+        "compton_cross_section_cm2",
+        "pair_production_cross_section_cm2",
+        "triplet_production_cross_section_cm2",
+    ),
+    PHOTOELECTRIC: ("energy_eV", "photoelectric_cross_section_cm2"),
+}
+"""
+Names of the columns of the known tables.
+Keys are the beginning of the table titles and values, the names of the
+columns. Stopping powers are in MeV cm2/g and cross sections, in cm2 per
+molecule, except the photoelectric cross sections which are given per atom
+in one table per element (followed by the cross sections of each shell).
+The Rayleigh table starts with the atomic form factors (``NQ`` rows) before
+the cross sections (``NE`` rows).
+"""
+
+
+def _parse_row(line):
+    """
+    Returns the values of a line of numbers or ``None``.
+    Fortran double precision exponents (``D``) are supported.
+    """
+    values = line.replace("D", "E").replace("d", "e").split()
+    if not values:
+        return None
+
+    try:
+        return [float(value) for value in values]
+    except ValueError:
+        return None
+
+
+def _parse_title(line):
+    return line.strip().lstrip("*").strip().rstrip(".").strip()
+
+
+def _parse_parameters(title):
+    """
+    Returns the parameters of a title, e.g. ``NDATA = 119``, as a :class:`dict`.
+    """
+    return dict(
+        (key, float(value))
+        for key, value in re.findall(r"(\w+)\s*=\s*([-+.0-9Ee]+)", title)
+    )
+
+
+def read_tables(fileobj):
+    """
+    Reads the tables of a material file, after its header.
+    A table is a block of consecutive lines of numbers with the same number of
+    columns.
+    Its title is the last title line (starting with ``***``) before the
+    block; tables following the same title are suffixed with ``#2``, ``#3``, etc.
+
+    Args:
+        fileobj (file object): File object positioned after the header.
+
+    Returns:
+        dict(str, numpy.ndarray): Tables. Dictionary where the keys are
+        titles and the values, 2D arrays (one row per line).
+    """
+    tables = {}
+    title = None
+    rows = []
+
+    def _flush():
+        if title is None or len(rows) < 2:
+            return  # Isolated numbers are parameters, not tables
+
+        name = title
+        index = 2
+        while name in tables:
+            name = "{0}#{1}".format(title, index)
+            index += 1
+
+        tables[name] = np.array(rows, dtype=np.float64)
+
+    for line in fileobj:
+        if line.strip().startswith("***"):
+            _flush()
+            rows = []
+            title = _parse_title(line)
+            continue
+
+        row = _parse_row(line)
+        if row is not None and (not rows or len(row) == len(rows[0])):
+            rows.append(row)
+            continue
+
+        _flush()
+        rows = [row] if row is not None else []
+
+    _flush()
+
+    return tables
+
+
+def _loglog_interp(x, xp, fp):
+    """
+    Interpolates linearly in log-log scale.
+    Intervals where one of the values is zero (e.g. cross sections below a
+    threshold) are interpolated linearly.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    index = np.clip(np.searchsorted(xp, x, side="right") - 1, 0, len(xp) - 2)
+    x0, x1 = xp[index], xp[index + 1]
+    f0, f1 = fp[index], fp[index + 1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = (x - x0) / (x1 - x0)
+        linear = f0 + fraction * (f1 - f0)
+        loglog = f0 * np.exp(np.log(x / x0) / np.log(x1 / x0) * np.log(f1 / f0))
+
+    y = np.where((f0 > 0.0) & (f1 > 0.0), loglog, linear)
+    return np.where((x >= xp[0]) & (x <= xp[-1]), y, np.nan)
+
+
+class MaterialTables(object):
+    """
+    Header and tables of a material file.
+
+    Args:
+        header (dict): Header (see :func:`read_material_header <pypenelopetools.pendbase.read_material_header>`).
+        tables (dict(str, numpy.ndarray)): Tables (see :func:`read_tables`).
+
+    Attributes:
+        header (dict): Header of the material file.
+        tables (dict(str, numpy.ndarray)): Tables. Dictionary where the keys
+            are titles and the values, 2D arrays.
+    """
+
+    def __init__(self, header, tables):
+        self.header = header
+        self.tables = tables
+        self._ranges = {}
+
+    def __repr__(self):
+        return "<{0}({1}, {2} tables)>".format(
+            self.__class__.__name__, self.header["name"], len(self.tables)
+        )
+
+    @classmethod
+    def read(cls, fileobj):
+        """
+        Reads a material file.
+
+        Args:
+            fileobj (file object): File object opened with read access.
+        """
+        header = read_material_header(fileobj)
+        return cls(header, read_tables(fileobj))
+
+    @classmethod
+    def read_file(cls, filepath, use_sidecar=True):
+        """
+        Reads a material file, using its sidecar file
+        (``<filepath>.tables``) if it is up to date.
+        Otherwise the material file is parsed and the sidecar file is
+        (re)written next to it, if the directory is writable.
+
+        Args:
+            filepath (str): Path of the material file.
+            use_sidecar (bool, optional): Whether to read and write the
+                sidecar file.
+        """
+        stat = os.stat(filepath)
+        source = [os.path.basename(filepath), stat.st_size, stat.st_mtime_ns]
+        sidecar_filepath = filepath + SIDECAR_EXTENSION
+
+        if use_sidecar:
+            try:
+                header, arrays = read_snapshot(sidecar_filepath)
+            except (OSError, ValueError):
+                pass
+            else:
+                if header.get("source") == source:
+                    return cls._from_snapshot(header, arrays)
+
+        with open(filepath, "r") as fp:
+            tables = cls.read(fp)
+
+        if use_sidecar:
+            try:
+                tables._save(sidecar_filepath, source)
+            except OSError:
+                pass  # Read-only directory
+
+        return tables
+
+    @classmethod
+    def _from_snapshot(cls, header, arrays):
+        material_header = header["material"]
+        material_header["atomic_fractions"] = dict(
+            (int(z), fraction)
+            for z, fraction in material_header["atomic_fractions"].items()
+        )
+        material_header["oscillators"] = [
+            tuple(oscillator) for oscillator in material_header["oscillators"]
+        ]
+
+        tables = dict(
+            (title, arrays["table{0:03d}".format(index)])
+            for index, title in enumerate(header["titles"])
+        )
+        return cls(material_header, tables)
+
+    def _save(self, filepath, source):
+        material_header = dict(self.header)
+        material_header["atomic_fractions"] = dict(
+            (str(z), fraction)
+            for z, fraction in self.header["atomic_fractions"].items()
+        )
+
+        titles = list(self.tables)
+        header = {"source": source, "material": material_header, "titles": titles}
+        arrays = dict(
+            ("table{0:03d}".format(index), self.tables[title])
+            for index, title in enumerate(titles)
+        )
+        write_snapshot(filepath, header, arrays)
+
+    def _iter_columns(self, name):
+        for prefix, columns in TABLE_COLUMNS.items():
+            if name not in columns:
+                continue
+
+            column = columns.index(name)
+            for title, table in self.tables.items():
+                if not title.startswith(prefix) or table.shape[1] <= column:
+                    continue
+
+                # Keep the last rows if the table starts with other data
+                parameters = _parse_parameters(title)
+                count = int(parameters.get("NE", parameters.get("NDATA", 0)))
+                if 0 < count < len(table):
+                    table = table[-count:]
+
+                yield parameters, table[:, 0], table[:, column]
+
+    def get_column(self, name):
+        """
+        Returns a column of a known table (see :data:`TABLE_COLUMNS`) and
+        the energies of the table.
+        For tables given per element (photoelectric cross sections), the
+        column of the first element is returned.
+
+        Args:
+            name (str): Name of the column, e.g.
+                ``electron_collision_stopping_power_MeV_cm2_per_g``.
+
+        Returns:
+            tuple(numpy.ndarray, numpy.ndarray): Energies in eV and values.
+
+        Raises:
+            KeyError: If the material file does not contain the column.
+        """
+        for _parameters, energies, values in self._iter_columns(name):
+            return energies, values
+
+        raise KeyError("No table with column {0}".format(name))
+
+    def _check_particle(self, particle):
+        if particle not in (ELECTRON, POSITRON):
+            raise ValueError("Particle must be {0} or {1}".format(ELECTRON, POSITRON))
+
+    def _get_stopping_powers(self, particle, kind):
+        self._check_particle(particle)
+        energies, values = self.get_column(
+            "{0}_{1}_stopping_power_MeV_cm2_per_g".format(particle, kind)
+        )
+        return energies, values * 1e6
+
+    def collision_stopping_power_eV_cm2_per_g(self, energies_eV, particle=ELECTRON):
+        """
+        Args:
+            energies_eV (array_like): Kinetic energies in eV.
+            particle (str, optional): ``electron`` or ``positron``.
+
+        Returns:
+            numpy.ndarray: Collision mass stopping powers in eV cm2/g.
+        """
+        energies, values = self._get_stopping_powers(particle, "collision")
+        return _loglog_interp(energies_eV, energies, values)
+
+    def radiative_stopping_power_eV_cm2_per_g(self, energies_eV, particle=ELECTRON):
+        """
+        Args:
+            energies_eV (array_like): Kinetic energies in eV.
+            particle (str, optional): ``electron`` or ``positron``.
+
+        Returns:
+            numpy.ndarray: Radiative mass stopping powers in eV cm2/g.
+        """
+        energies, values = self._get_stopping_powers(particle, "radiative")
+        return _loglog_interp(energies_eV, energies, values)
+
+    def stopping_power_eV_cm2_per_g(self, energies_eV, particle=ELECTRON):
+        """
+        Args:
+            energies_eV (array_like): Kinetic energies in eV.
+            particle (str, optional): ``electron`` or ``positron``.
+
+        Returns:
+            numpy.ndarray: Total (collision and radiative) mass stopping
+            powers in eV cm2/g.
+        """
+        energies, values = self._get_total_stopping_powers(particle)
+        return _loglog_interp(energies_eV, energies, values)
+
+    def _get_total_stopping_powers(self, particle):
+        energies, collision = self._get_stopping_powers(particle, "collision")
+        _energies, radiative = self._get_stopping_powers(particle, "radiative")
+        return energies, collision + radiative
+
+    def _get_csda_ranges(self, particle):
+        if particle not in self._ranges:
+            energies, stopping_powers = self._get_total_stopping_powers(particle)
+
+            # Below the first energy, the stopping power is assumed constant
+            ranges = np.empty_like(energies)
+            ranges[0] = energies[0] / stopping_powers[0]
+            increments = 0.5 * (1.0 / stopping_powers[1:] + 1.0 / stopping_powers[:-1])
+            ranges[1:] = ranges[0] + np.cumsum(increments * np.diff(energies))
+
+            self._ranges[particle] = (energies, ranges)
+
+        return self._ranges[particle]
+
+    def csda_range_g_per_cm2(self, energies_eV, particle=ELECTRON):
+        """
+        Returns the range in the continuous slowing down approximation, i.e.
+        the integral of the inverse of the total stopping power.
+
+        Args:
+            energies_eV (array_like): Kinetic energies in eV.
+            particle (str, optional): ``electron`` or ``positron``.
+
+        Returns:
+            numpy.ndarray: CSDA ranges in g/cm2.
+        """
+        energies, ranges = self._get_csda_ranges(particle)
+        return _loglog_interp(energies_eV, energies, ranges)
+
+    def csda_range_cm(self, energies_eV, particle=ELECTRON):
+        """
+        Args:
+            energies_eV (array_like): Kinetic energies in eV.
+            particle (str, optional): ``electron`` or ``positron``.
+
+        Returns:
+            numpy.ndarray: CSDA ranges in cm.
+        """
+        return (
+            self.csda_range_g_per_cm2(energies_eV, particle)
+            / self.header["density_g_per_cm3"]
+        )
+
+    def photon_cross_section_cm2(self, energies_eV):
+        """
+        Returns the total cross section of photons per molecule: Rayleigh,
+        Compton, pair and triplet production and photoelectric absorption by
+        all the elements.
+
+        Args:
+            energies_eV (array_like): Photon energies in eV.
+
+        Returns:
+            numpy.ndarray: Total cross sections in cm2.
+        """
+        total = 0.0
+        for name in (
+            TABLE_COLUMNS[RAYLEIGH][1:] + TABLE_COLUMNS[COMPTON_PAIR_PRODUCTION][1:]
+        ):
+            energies, values = self.get_column(name)
+            total = total + _loglog_interp(energies_eV, energies, values)
+
+        name = "photoelectric_cross_section_cm2"
+        columns = list(self._iter_columns(name))
+        if not columns:
+            raise KeyError("No table with column {0}".format(name))
+
+        for parameters, energies, values in columns:
+            fraction = self.header["atomic_fractions"][int(parameters["IZ"])]
+            total = total + fraction * _loglog_interp(energies_eV, energies, values)
+
+        return total
+
+    def photon_mass_attenuation_cm2_per_g(self, energies_eV):
+        """
+        Args:
+            energies_eV (array_like): Photon energies in eV.
+
+        Returns:
+            numpy.ndarray: Total mass attenuation coefficients in cm2/g.
+        """
+        molar_mass = sum(
+            fraction * pyxray.element_atomic_weight(z)
+            for z, fraction in self.header["atomic_fractions"].items()
+        )
+        return (
+            self.photon_cross_section_cm2(energies_eV) * AVOGADRO_CONSTANT / molar_mass
+        )
+
+    def photon_attenuation_length_cm(self, energies_eV):
+        """
+        Args:
+            energies_eV (array_like): Photon energies in eV.
+
+        Returns:
+            numpy.ndarray: Mean free paths of photons in cm.
+        """
+        return 1.0 / (
+            self.photon_mass_attenuation_cm2_per_g(energies_eV)
+            * self.header["density_g_per_cm3"]
+        )
@@ -0,0 +1,32 @@
+"""
+PENCYL executable.
+"""
+
+# Standard library modules.
+
+# Third party modules.
+
+# Local modules.
+from pypenelopetools.penelope.program import PenelopeProgramBase
+from pypenelopetools.pencyl.results import create_result
+
+# Globals and constants variables.
+
+
+class PencylProgram(PenelopeProgramBase):
+    """
+    PENCYL executable.
+    The geometry of PENCYL is defined in its input, no geometry file is staged.
+
+    Args:
+        executable (str, optional): Path to the executable.
+    """
+
+    def __init__(self, executable=None):
+        super().__init__("pencyl", executable)
+
+    def get_geometry_filename(self, input):
+        return None
+
+    def create_result(self, filename):
+        return create_result(filename)
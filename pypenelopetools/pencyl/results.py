@@ -3,7 +3,6 @@ Results of PENEPMA simulation.
 """
 
 # Standard library modules.
-import os
 
 # Third party modules.
 from uncertainties import ufloat, unumpy
@@ -94,6 +93,16 @@ class PencylResult(PenelopeResultBase):
         "positrons": KPAR.POSITRON,
     }
 
+    _MERGE_SUM_ATTRIBUTES = frozenset(
+        [
+            "simulation_time_s",
+            "simulated_primary_showers",
+            "upbound_primary_particles",
+            "downbound_primary_particles",
+            "absorbed_primary_particles",
+        ]
+    )
+
     def __init__(self):
         super().__init__()
 
@@ -240,7 +249,39 @@ class PencylResult(PenelopeResultBase):
         self.last_random_seed1 = ufloat(seed1, 0.0)
         self.last_random_seed2 = ufloat(seed2, 0.0)
 
-    def read_directory(self, dirpath):
-        filepath = os.path.join(dirpath, "pencyl-res.dat")
-        with open(filepath, "r") as fp:
-            self.read(fp)
+    @classmethod
+    def merge(cls, results, weights):
+        results = list(results)
+        weights = list(weights)
+        merged = super().merge(results, weights)
+
+        if merged.simulation_time_s.n > 0.0:
+            merged.simulation_speed_1_per_s = ufloat(
+                merged.simulated_primary_showers.n / merged.simulation_time_s.n, 0.0
+            )
+
+        # Seeds are specific to each simulation
+        merged.last_random_seed1 = results[0].last_random_seed1
+        merged.last_random_seed2 = results[0].last_random_seed2
+
+        return merged
+
+    @property
+    def filename(self):
+        return "pencyl-res.dat"
+
+
+def create_result(filename):
+    """
+    Creates the empty result object associated with a PENCYL result file.
+
+    Args:
+        filename (str): Name of a result file (e.g. ``pencyl-res.dat``).
+
+    Returns:
+        :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`:
+        Empty result or ``None`` if the file is not a known result file.
+    """
+    if filename == "pencyl-res.dat":
+        return PencylResult()
+    return None
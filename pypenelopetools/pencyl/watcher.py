@@ -0,0 +1,69 @@
+"""
+Monitoring of a running PENCYL simulation.
+"""
+
+# Standard library modules.
+
+# Third party modules.
+
+# Local modules.
+from pypenelopetools.penelope.watcher import ResultWatcher, ResultSnapshot
+from pypenelopetools.pencyl.results import PencylResult
+
+# Globals and constants variables.
+
+
+class PencylSnapshot(ResultSnapshot):
+    """
+    State of the results of a PENCYL simulation at a given time.
+    Values are ``None`` until ``pencyl-res.dat`` was parsed once.
+    """
+
+    @property
+    def result(self):
+        """:class:`PencylResult <pypenelopetools.pencyl.results.PencylResult>`: Result from ``pencyl-res.dat``."""
+        return self.results.get(PencylResult().filename)
+
+    @property
+    def simulated_primary_showers(self):
+        """ufloat: Number of primary showers simulated."""
+        result = self.result
+        return result.simulated_primary_showers if result is not None else None
+
+    @property
+    def simulation_time_s(self):
+        """ufloat: Simulation time in seconds."""
+        result = self.result
+        return result.simulation_time_s if result is not None else None
+
+    @property
+    def simulation_speed_1_per_s(self):
+        """ufloat: Simulation speed in showers per second."""
+        result = self.result
+        return result.simulation_speed_1_per_s if result is not None else None
+
+    @property
+    def detector_deposited_energies_eV(self):
+        """dict(int, ufloat): Average deposited energy in each energy detector."""
+        result = self.result
+        if result is None:
+            return None
+        return dict(result.average_detector_deposited_energy_eV)
+
+
+class PencylWatcher(ResultWatcher):
+    """
+    Watches ``pencyl-res.dat``.
+
+    Args:
+        dirpath (str): Path of the simulation directory.
+        interval_s (float, optional): Polling interval in seconds.
+        use_inotify (bool, optional): Whether to use inotify when it is
+            available.
+    """
+
+    def __init__(self, dirpath, interval_s=5.0, use_inotify=True):
+        super().__init__(dirpath, [PencylResult()], interval_s, use_inotify)
+
+    def _create_snapshot(self, timestamp, results, changed_filenames):
+        return PencylSnapshot(self.dirpath, timestamp, results, changed_filenames)
@@ -0,0 +1,440 @@
+"""
+Index of the material files (``.mat``) of a directory.
+
+Reading the header of a material file with
+:meth:`Material.read_material <pypenelopetools.material.Material.read_material>`
+is required to know which material it contains.
+A :class:`PendbaseIndex` reads the headers of all the material files of a
+directory once, in parallel, and keeps them in a persistent index file.
+Only the files that changed since the last scan are read again.
+
+Example:
+    Find a brass material file in the ``pendbase`` directory::
+
+        index = PendbaseIndex("/opt/penelope/pendbase")
+        index.refresh()
+        for info in index.find({29: 0.7, 30: 0.3}, tolerance=0.01):
+            print(info.filename, info.density_g_per_cm3)
+"""
+
+# Standard library modules.
+import os
+import json
+import functools
+import tempfile
+import concurrent.futures
+
+# Third party modules.
+import pyxray
+
+# Local modules.
+from pypenelopetools.material import Material, FILENAME_MAXLENGTH
+
+# Globals and constants variables.
+INDEX_FILENAME = ".pendbase-index.json"
+INDEX_VERSION = 1
+
+
+@functools.lru_cache(maxsize=None)
+def _get_atomic_weight(z):
+    return pyxray.element_atomic_weight(z)
+
+
+def _read_value(line):
+    _label, value = line.split("=")
+    return value.split()[0]
+
+
+def read_material_header(fileobj):
+    """
+    Reads the header of a PENELOPE material file (``.mat``): name, density,
+    composition, mean excitation energy and oscillators.
+    Unlike :meth:`Material.read_material <pypenelopetools.material.Material.read_material>`,
+    the composition is returned in atomic fractions, so no atomic weight is
+    required.
+
+    Args:
+        fileobj (file object): File object opened with read access.
+
+    Returns:
+        dict: Header with the keys ``name``, ``density_g_per_cm3``,
+        ``atomic_fractions`` (dict of atomic number and atoms per molecule),
+        ``mean_excitation_energy_eV`` and ``oscillators`` (list of
+        oscillator strength, ionisation energy in eV, resonance energy in eV,
+        atomic number and shell of each oscillator).
+
+    Raises:
+        ValueError: If the file is not a material file.
+    """
+    first_line = fileobj.readline().strip()
+    if first_line[:8] != "PENELOPE":
+        raise ValueError("Not a PENELOPE material file")
+
+    _label, name = fileobj.readline().split(":", 1)
+    density_g_per_cm3 = float(_read_value(fileobj.readline()))
+    element_count = int(_read_value(fileobj.readline()))
+
+    atomic_fractions = {}
+    for _ in range(element_count):
+        part_z, part_af = fileobj.readline().split(",")
+        atomic_fractions[int(_read_value(part_z))] = float(_read_value(part_af))
+
+    mean_excitation_energy_eV = float(_read_value(fileobj.readline()))
+
+    line = fileobj.readline()
+    label, value = line.split("=")
+    if label.strip() != "Number of oscillators":
+        raise ValueError("Number of oscillators not found")
+    oscillator_count = int(value.split()[0])
+
+    oscillators = []
+    for _ in range(oscillator_count):
+        values = fileobj.readline().split()
+        try:
+            f, u, w = map(float, values[1:4])
+            kz, ks = map(int, values[4:6])
+        except ValueError:
+            break  # Truncated file
+        oscillators.append((f, u, w, kz, ks))
+
+    return {
+        "name": name.strip(),
+        "density_g_per_cm3": density_g_per_cm3,
+        "atomic_fractions": atomic_fractions,
+        "mean_excitation_energy_eV": mean_excitation_energy_eV,
+        "oscillators": oscillators,
+    }
+
+
+def _get_file_stat(filepath):
+    stat = os.stat(filepath)
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+def _read_material_file(filepath):
+    stat = _get_file_stat(filepath)
+    with open(filepath, "r") as fp:
+        header = read_material_header(fp)
+    return header, stat
+
+
+class MaterialFileInfo(object):
+    """
+    Header of a material file in the index.
+
+    Attributes:
+        filename (str): Name of the material file.
+        name (str): Name of the material.
+        composition (dict(int, float)): Composition in weight fraction.
+            The keys are atomic numbers and the values, weight fractions.
+        atomic_fractions (dict(int, float)): Number of atoms per molecule of
+            each element.
+        density_g_per_cm3 (float): Density in g/cm3.
+        mean_excitation_energy_eV (float): Mean excitation energy in eV.
+        oscillators (list(tuple(float, float, float, int, int))): Oscillator
+            strength, ionisation energy in eV, resonance energy in eV, atomic
+            number and shell of each oscillator.
+            The first oscillator is the plasmon of the conduction band.
+        stat (tuple(int, int, int)): Size, modification time in ns and inode
+            of the file when it was read.
+    """
+
+    def __init__(
+        self,
+        filename,
+        name,
+        atomic_fractions,
+        density_g_per_cm3,
+        mean_excitation_energy_eV,
+        oscillators,
+        stat,
+    ):
+        self.filename = filename
+        self.name = name
+        self.atomic_fractions = dict(atomic_fractions)
+        self.density_g_per_cm3 = density_g_per_cm3
+        self.mean_excitation_energy_eV = mean_excitation_energy_eV
+        self.oscillators = [tuple(oscillator) for oscillator in oscillators]
+        self.stat = tuple(stat)
+
+        masses = dict(
+            (z, fraction * _get_atomic_weight(z))
+            for z, fraction in self.atomic_fractions.items()
+        )
+        total = sum(masses.values())
+        self.composition = dict((z, mass / total) for z, mass in masses.items())
+
+    def __repr__(self):
+        return "<{0}({1}, {2})>".format(
+            self.__class__.__name__, self.filename, self.name
+        )
+
+    @classmethod
+    def from_dict(cls, filename, values):
+        atomic_fractions = dict(
+            (int(z), fraction) for z, fraction in values["atomic_fractions"].items()
+        )
+        return cls(
+            filename,
+            values["name"],
+            atomic_fractions,
+            values["density_g_per_cm3"],
+            values["mean_excitation_energy_eV"],
+            values["oscillators"],
+            values["stat"],
+        )
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "atomic_fractions": dict(
+                (str(z), fraction) for z, fraction in self.atomic_fractions.items()
+            ),
+            "density_g_per_cm3": self.density_g_per_cm3,
+            "mean_excitation_energy_eV": self.mean_excitation_energy_eV,
+            "oscillators": [list(oscillator) for oscillator in self.oscillators],
+            "stat": list(self.stat),
+        }
+
+    def to_material(self):
+        """
+        Returns:
+            :class:`Material <pypenelopetools.material.Material>`: Material
+            of the file, with the same values as
+            :meth:`Material.read_material <pypenelopetools.material.Material.read_material>`.
+        """
+        fcb = wcb = None
+        if self.oscillators:
+            fcb, _u, wcb, _kz, _ks = self.oscillators[0]
+
+        filename = None
+        if len(self.filename) <= FILENAME_MAXLENGTH:
+            filename = self.filename
+
+        return Material(
+            self.name,
+            self.composition,
+            self.density_g_per_cm3,
+            self.mean_excitation_energy_eV,
+            fcb,
+            wcb,
+            filename,
+        )
+
+    def match(self, composition, tolerance=1e-3):
+        """
+        Returns whether the material has the same elements as *composition*
+        and all its weight fractions are within *tolerance*.
+
+        Args:
+            composition (dict(int, float)): Composition in weight fraction.
+            tolerance (float, optional): Absolute tolerance on the weight
+                fractions.
+        """
+        total = sum(composition.values())
+        if set(composition) != set(self.composition) or total <= 0.0:
+            return False
+
+        return all(
+            abs(wf / total - self.composition[z]) <= tolerance
+            for z, wf in composition.items()
+        )
+
+
+class PendbaseIndex(object):
+    """
+    Persistent index of the material files of a directory.
+
+    Args:
+        dirpath (str): Path of the directory containing the material files.
+        index_filepath (str, optional): Path of the index file.
+            Defaults to :data:`INDEX_FILENAME` in *dirpath*.
+
+    Attributes:
+        dirpath (str): Path of the directory.
+        index_filepath (str): Path of the index file.
+    """
+
+    def __init__(self, dirpath, index_filepath=None):
+        if index_filepath is None:
+            index_filepath = os.path.join(dirpath, INDEX_FILENAME)
+
+        self.dirpath = dirpath
+        self.index_filepath = index_filepath
+        self._infos = {}
+        self._load()
+
+    def __repr__(self):
+        return "<{0}({1}, {2} files)>".format(
+            self.__class__.__name__, self.dirpath, len(self._infos)
+        )
+
+    def __len__(self):
+        return len(self._infos)
+
+    def __iter__(self):
+        return iter(self._infos[filename] for filename in sorted(self._infos))
+
+    def __contains__(self, filename):
+        return filename in self._infos
+
+    def _load(self):
+        try:
+            with open(self.index_filepath, "r") as fp:
+                content = json.load(fp)
+        except (OSError, ValueError):
+            return  # Rebuilt at next refresh
+
+        if content.get("version") != INDEX_VERSION:
+            return
+
+        for filename, values in content["files"].items():
+            self._infos[filename] = MaterialFileInfo.from_dict(filename, values)
+
+    def save(self):
+        """
+        Writes the index file. It is replaced atomically.
+        """
+        content = {
+            "version": INDEX_VERSION,
+            "files": dict(
+                (filename, info.to_dict())
+                for filename, info in sorted(self._infos.items())
+            ),
+        }
+
+        dirpath = os.path.dirname(os.path.abspath(self.index_filepath))
+        fd, tmpfilepath = tempfile.mkstemp(".tmp", dir=dirpath)
+        try:
+            with os.fdopen(fd, "w") as fp:
+                json.dump(content, fp, indent=1)
+            os.replace(tmpfilepath, self.index_filepath)
+        except BaseException:
+            os.remove(tmpfilepath)
+            raise
+
+    def refresh(self, max_workers=None):
+        """
+        Scans the directory, reads the material files that were added or
+        changed since the last scan and saves the index.
+        Files that are not valid material files are ignored.
+
+        Args:
+            max_workers (int, optional): Number of files read at the same time.
+
+        Returns:
+            tuple(set(str), set(str)): Names of the files read and names of
+            the files removed from the index.
+        """
+        filenames = set(
+            filename
+            for filename in os.listdir(self.dirpath)
+            if filename.lower().endswith(".mat")
+        )
+
+        removed = set(self._infos) - filenames
+        for filename in removed:
+            del self._infos[filename]
+
+        changed = []
+        for filename in sorted(filenames):
+            info = self._infos.get(filename)
+            filepath = os.path.join(self.dirpath, filename)
+            try:
+                stat = tuple(_get_file_stat(filepath))
+            except OSError:
+                continue
+            if info is None or info.stat != stat:
+                changed.append(filename)
+
+        read = set()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            futures = dict(
+                (
+                    filename,
+                    executor.submit(
+                        _read_material_file, os.path.join(self.dirpath, filename)
+                    ),
+                )
+                for filename in changed
+            )
+
+            # Atomic weights are looked up in this thread, since pyxray is not
+            # thread-safe
+            for filename, future in futures.items():
+                try:
+                    header, stat = future.result()
+                except (OSError, ValueError, IndexError):
+                    if self._infos.pop(filename, None) is not None:
+                        removed.add(filename)
+                    continue
+
+                self._infos[filename] = MaterialFileInfo(
+                    filename,
+                    header["name"],
+                    header["atomic_fractions"],
+                    header["density_g_per_cm3"],
+                    header["mean_excitation_energy_eV"],
+                    header["oscillators"],
+                    stat,
+                )
+                read.add(filename)
+
+        if read or removed or not os.path.exists(self.index_filepath):
+            self.save()
+
+        return read, removed
+
+    def get(self, filename):
+        """
+        Args:
+            filename (str): Name of a material file.
+
+        Returns:
+            :class:`MaterialFileInfo`: Header of the material file or ``None``.
+        """
+        return self._infos.get(filename)
+
+    def find(
+        self,
+        composition,
+        tolerance=1e-3,
+        density_g_per_cm3=None,
+        density_tolerance=1e-3,
+    ):
+        """
+        Finds the material files with the same composition.
+
+        Args:
+            composition (dict(int, float)): Composition in weight fraction.
+            tolerance (float, optional): Absolute tolerance on the weight
+                fractions.
+            density_g_per_cm3 (float, optional): Density in g/cm3.
+                If ``None``, any density matches.
+            density_tolerance (float, optional): Relative tolerance on the
+                density.
+
+        Returns:
+            list(:class:`MaterialFileInfo`): Headers of the matching files,
+            closest composition first.
+        """
+        total = sum(composition.values())
+        matches = []
+
+        for info in self:
+            if not info.match(composition, tolerance):
+                continue
+
+            if density_g_per_cm3 is not None:
+                difference = abs(info.density_g_per_cm3 - density_g_per_cm3)
+                if difference > density_tolerance * density_g_per_cm3:
+                    continue
+
+            distance = max(
+                abs(wf / total - info.composition[z]) for z, wf in composition.items()
+            )
+            matches.append((distance, info.filename, info))
+
+        matches.sort(key=lambda match: match[:2])
+        return [info for _distance, _filename, info in matches]
@@ -0,0 +1,375 @@
+"""
+Efficiency of simulations.
+
+The efficiency of a Monte Carlo simulation for a quantity is measured by its
+figure of merit :math:`FOM = 1 / (\\sigma_{rel}^2 T)`, where
+:math:`\\sigma_{rel}` is the relative statistical uncertainty of the quantity
+and :math:`T` the simulation time.
+Since :math:`\\sigma_{rel}^2` is inversely proportional to :math:`T`, the
+figure of merit does not depend on the simulation time and the time required
+to reach a relative uncertainty :math:`\\sigma_{target}` is
+:math:`T (\\sigma_{rel} / \\sigma_{target})^2`.
+
+The functions of this module operate on arrays, so they can be applied to
+many runs and quantities at once.
+An :class:`EfficiencyReport` extracts all the quantities with a statistical
+uncertainty from the results of several runs (x-ray intensities, deposited
+energies, detector tallies, channel ranges of spectra and distributions)
+into 2D arrays, with one row per run and one column per quantity.
+
+All uncertainties are one standard deviation, as stored in the results.
+The uncertainties written by PENELOPE programs (and used by the ``REFLIN``
+keyword) are three standard deviations.
+
+Example:
+    Rank the runs of a campaign by their efficiency for Cu Ka1::
+
+        report = EfficiencyReport.from_results([job.results for job in jobs])
+        name = ("pe-intens-01.dat", "total_intensities_1_per_sr_electron", xrayline)
+        for index in report.rank(name):
+            print(report.labels[index], report.get_figures_of_merit(name)[index])
+"""
+
+# Standard library modules.
+
+# Third party modules.
+import numpy as np
+from uncertainties import unumpy
+from uncertainties.core import AffineScalarFunc
+
+# Local modules.
+
+# Globals and constants variables.
+ALL_CHANNELS = "all"
+"""Label of the range of all the channels of an array result."""
+
+
+def get_relative_uncertainties(values, std_devs):
+    """
+    Args:
+        values (array_like): Values.
+        std_devs (array_like): Standard deviations.
+
+    Returns:
+        numpy.ndarray: Relative uncertainties. Infinite if the value is zero
+        and ``nan`` if the value is unknown.
+    """
+    values = np.abs(np.asarray(values, dtype=np.float64))
+    std_devs = np.asarray(std_devs, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        uncertainties = std_devs / values
+    unscored = np.where(np.isnan(values), np.nan, np.inf)
+    return np.where(values > 0.0, uncertainties, unscored)
+
+
+def get_figures_of_merit(relative_uncertainties, simulation_times_s):
+    """
+    Args:
+        relative_uncertainties (array_like): Relative uncertainties.
+        simulation_times_s (array_like): Simulation times in seconds.
+            Broadcast against *relative_uncertainties*, e.g. a column vector
+            of one time per run.
+
+    Returns:
+        numpy.ndarray: Figures of merit :math:`1 / (\\sigma_{rel}^2 T)` in 1/s.
+        Zero if the relative uncertainty is infinite and ``nan`` if it is
+        zero or the time is not positive.
+    """
+    uncertainties = np.asarray(relative_uncertainties, dtype=np.float64)
+    times = np.asarray(simulation_times_s, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        foms = 1.0 / (uncertainties**2 * times)
+    return np.where((uncertainties > 0.0) & (times > 0.0), foms, np.nan)
+
+
+def get_times_to_uncertainty_s(
+    relative_uncertainties, simulation_times_s, target_relative_uncertainty
+):
+    """
+    Args:
+        relative_uncertainties (array_like): Relative uncertainties.
+        simulation_times_s (array_like): Simulation times in seconds.
+        target_relative_uncertainty (float or array_like): Target relative
+            uncertainty.
+
+    Returns:
+        numpy.ndarray: Total simulation times in seconds to reach the target
+        uncertainty. Infinite if the quantity was not scored.
+    """
+    uncertainties = np.asarray(relative_uncertainties, dtype=np.float64)
+    times = np.asarray(simulation_times_s, dtype=np.float64)
+    target = np.asarray(target_relative_uncertainty, dtype=np.float64)
+    if np.any(target <= 0.0):
+        raise ValueError("Target uncertainty must be greater than zero")
+    return times * (uncertainties / target) ** 2
+
+
+def get_simulation_time_s(results):
+    """
+    Returns the simulation time of a run from its main result.
+
+    Args:
+        results (dict(str, :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`)):
+            Results of a run.
+
+    Returns:
+        float: Simulation time in seconds or ``None`` if unknown.
+    """
+    for result in results.values():
+        simulation_time_s = getattr(result, "simulation_time_s", None)
+        if simulation_time_s is not None:
+            return simulation_time_s.n
+    return None
+
+
+def _is_ufloat_array(value):
+    return isinstance(value, np.ndarray) and value.dtype == object and value.size
+
+
+def _extract_channel_ranges(filename, attribute, value, channel_ranges):
+    """
+    Sums the channels (first axis) of an array.
+    Columns of 2D arrays without uncertainty (e.g. energies) are ignored; if
+    several columns have an uncertainty, the column index is added to the
+    channel range label.
+    """
+    nominal_values = unumpy.nominal_values(value).reshape(len(value), -1)
+    variances = unumpy.std_devs(value).reshape(len(value), -1) ** 2
+    columns = np.nonzero(np.any(variances > 0.0, axis=0))[0]
+
+    quantities = {}
+    for label, (start, stop) in channel_ranges.items():
+        values = np.sum(nominal_values[start:stop], axis=0)
+        std_devs = np.sqrt(np.sum(variances[start:stop], axis=0))
+
+        for column in columns:
+            key = label if len(columns) == 1 else (label, int(column))
+            quantities[(filename, attribute, key)] = (
+                float(values[column]),
+                float(std_devs[column]),
+            )
+
+    return quantities
+
+
+def extract_quantities(results, channel_ranges=None):
+    """
+    Extracts the quantities with a statistical uncertainty from the results
+    of a run:
+
+    * values (e.g. backscattered fraction);
+    * entries of dictionaries of values (e.g. intensity of each x-ray line,
+      energy deposited in each body);
+    * sums over ranges of channels of arrays of values (e.g. spectra).
+
+    Values without uncertainty (e.g. simulation time, random seeds, detector
+    angles) are ignored.
+
+    Args:
+        results (dict(str, :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`)):
+            Results of a run.
+        channel_ranges (dict(str, tuple(int, int)), optional): Ranges of
+            channels (start and stop indexes) summed in arrays.
+            The sum of all channels (:data:`ALL_CHANNELS`) is always included.
+
+    Returns:
+        dict(tuple, tuple(float, float)): Dictionary where the keys are the
+        names of the quantities, tuples of the file name, the attribute name
+        and the key in the dictionary or the channel range label (``None``
+        for values), and the values, value and standard deviation.
+    """
+    channel_ranges = dict(channel_ranges or {})
+    channel_ranges.setdefault(ALL_CHANNELS, (None, None))
+
+    quantities = {}
+
+    for filename, result in results.items():
+        for attribute, value in vars(result).items():
+            if attribute.startswith("_"):
+                continue
+
+            if isinstance(value, AffineScalarFunc):
+                if value.s > 0.0:
+                    quantities[(filename, attribute, None)] = (value.n, value.s)
+
+            elif isinstance(value, dict):
+                items = [
+                    (key, v)
+                    for key, v in value.items()
+                    if isinstance(v, AffineScalarFunc)
+                ]
+                if any(v.s > 0.0 for _key, v in items):
+                    for key, v in items:
+                        quantities[(filename, attribute, key)] = (v.n, v.s)
+
+            elif _is_ufloat_array(value):
+                quantities.update(
+                    _extract_channel_ranges(filename, attribute, value, channel_ranges)
+                )
+
+    return quantities
+
+
+class EfficiencyReport(object):
+    """
+    Values, uncertainties and simulation times of quantities in several runs.
+
+    Args:
+        names (list(tuple)): Names of the quantities
+            (see :func:`extract_quantities`).
+        values (array_like): Values, one row per run and one column per quantity.
+            ``nan`` if the quantity is unknown in a run.
+        std_devs (array_like): Standard deviations, same shape as *values*.
+        simulation_times_s (array_like): Simulation time of each run in seconds.
+        labels (list, optional): Label of each run. Defaults to the run indexes.
+
+    Attributes:
+        names (list(tuple)): Names of the quantities.
+        values (numpy.ndarray): Values.
+        std_devs (numpy.ndarray): Standard deviations.
+        simulation_times_s (numpy.ndarray): Simulation times in seconds.
+        labels (list): Labels of the runs.
+    """
+
+    def __init__(self, names, values, std_devs, simulation_times_s, labels=None):
+        self.names = list(names)
+        self.values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.names))
+        self.std_devs = np.asarray(std_devs, dtype=np.float64).reshape(
+            self.values.shape
+        )
+        self.simulation_times_s = np.asarray(
+            simulation_times_s, dtype=np.float64
+        ).reshape(len(self.values))
+
+        if labels is None:
+            labels = list(range(len(self.values)))
+        if len(labels) != len(self.values):
+            raise ValueError("One label per run is required")
+        self.labels = list(labels)
+
+        self._indexes = dict((name, index) for index, name in enumerate(self.names))
+
+    def __repr__(self):
+        return "<{0}({1} runs, {2} quantities)>".format(
+            self.__class__.__name__, len(self.labels), len(self.names)
+        )
+
+    @classmethod
+    def from_results(cls, results_list, labels=None, channel_ranges=None):
+        """
+        Creates a report from the results of several runs.
+        The quantities are the union of the quantities of all runs
+        (see :func:`extract_quantities`).
+
+        Args:
+            results_list (iterable(dict(str, :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`))):
+                Results of each run.
+            labels (list, optional): Label of each run.
+            channel_ranges (dict(str, tuple(int, int)), optional): Ranges of
+                channels summed in arrays.
+
+        Returns:
+            :class:`EfficiencyReport`: Report.
+        """
+        quantities_list = []
+        simulation_times_s = []
+        indexes = {}
+
+        for results in results_list:
+            quantities = extract_quantities(results, channel_ranges)
+            for name in quantities:
+                indexes.setdefault(name, len(indexes))
+            quantities_list.append(quantities)
+
+            simulation_time_s = get_simulation_time_s(results)
+            simulation_times_s.append(
+                np.nan if simulation_time_s is None else simulation_time_s
+            )
+
+        values = np.full((len(quantities_list), len(indexes)), np.nan)
+        std_devs = np.full_like(values, np.nan)
+        for row, quantities in enumerate(quantities_list):
+            if not quantities:
+                continue
+            columns = [indexes[name] for name in quantities]
+            values[row, columns], std_devs[row, columns] = zip(*quantities.values())
+
+        return cls(list(indexes), values, std_devs, simulation_times_s, labels)
+
+    def _get_columns(self, name):
+        if name is None:
+            return slice(None)
+        return self._indexes[name]
+
+    def get_relative_uncertainties(self, name=None):
+        """
+        Args:
+            name (tuple, optional): Name of a quantity. If ``None``, all
+                quantities are returned.
+
+        Returns:
+            numpy.ndarray: Relative uncertainties, one per run (and per
+            quantity if *name* is ``None``).
+        """
+        columns = self._get_columns(name)
+        return get_relative_uncertainties(
+            self.values[:, columns], self.std_devs[:, columns]
+        )
+
+    def get_figures_of_merit(self, name=None):
+        """
+        Args:
+            name (tuple, optional): Name of a quantity. If ``None``, all
+                quantities are returned.
+
+        Returns:
+            numpy.ndarray: Figures of merit in 1/s.
+        """
+        times = self.simulation_times_s
+        if name is None:
+            times = times[:, np.newaxis]
+        return get_figures_of_merit(self.get_relative_uncertainties(name), times)
+
+    def get_times_to_uncertainty_s(self, target_relative_uncertainty, name=None):
+        """
+        Args:
+            target_relative_uncertainty (float): Target relative uncertainty.
+            name (tuple, optional): Name of a quantity. If ``None``, all
+                quantities are returned.
+
+        Returns:
+            numpy.ndarray: Total simulation times in seconds to reach the
+            target uncertainty.
+        """
+        times = self.simulation_times_s
+        if name is None:
+            times = times[:, np.newaxis]
+        return get_times_to_uncertainty_s(
+            self.get_relative_uncertainties(name), times, target_relative_uncertainty
+        )
+
+    def get_remaining_times_s(self, target_relative_uncertainty, name=None):
+        """
+        Same as :meth:`get_times_to_uncertainty_s`, minus the time already
+        simulated. Zero if the target is reached.
+        """
+        times = self.simulation_times_s
+        if name is None:
+            times = times[:, np.newaxis]
+        total = self.get_times_to_uncertainty_s(target_relative_uncertainty, name)
+        return np.maximum(total - times, 0.0)
+
+    def rank(self, name):
+        """
+        Returns the indexes of the runs, the most efficient first for a
+        quantity. Runs where the quantity is unknown are last.
+
+        Args:
+            name (tuple): Name of a quantity.
+
+        Returns:
+            numpy.ndarray: Indexes of the runs.
+        """
+        foms = self.get_figures_of_merit(name)
+        foms = np.where(np.isnan(foms), -np.inf, foms)
+        return np.argsort(-foms, kind="stable")
@@ -0,0 +1,434 @@
+"""
+Throughput and progress metrics of running simulations.
+
+A :class:`MetricsCollector` samples the main result file of each registered
+run through a :class:`ResultWatcher <pypenelopetools.penelope.watcher.ResultWatcher>`
+and derives the simulation speed, the estimated time remaining until the
+target number of showers, simulation time or uncertainty is reached, and
+whether the run stalled.
+Samples are exported as a `Prometheus <https://prometheus.io>`_ text file
+(e.g. for the textfile collector of the node exporter) or as JSON lines.
+
+Example:
+    Export the metrics of two simulations every 30 seconds::
+
+        collector = MetricsCollector(stall_timeout_s=900.0)
+        collector.add_run("epma1", PenepmaWatcher("/simulation/epma1"), target_uncertainty=0.01)
+        collector.add_run("epma2", PenepmaWatcher("/simulation/epma2"), target_showers=1e6)
+
+        while True:
+            collector.write_prometheus("/var/lib/node_exporter/penelope.prom")
+            time.sleep(30)
+"""
+
+# Standard library modules.
+import os
+import math
+import time
+import json
+import tempfile
+
+# Third party modules.
+
+# Local modules.
+
+# Globals and constants variables.
+PROMETHEUS_METRICS = (
+    (
+        "penelope_simulated_showers",
+        "simulated_showers",
+        "Number of simulated primary showers.",
+    ),
+    (
+        "penelope_simulation_time_seconds",
+        "simulation_time_s",
+        "Simulation time in seconds.",
+    ),
+    (
+        "penelope_simulation_speed_showers_per_second",
+        "speed_1_per_s",
+        "Simulation speed in showers per second.",
+    ),
+    (
+        "penelope_relative_uncertainty",
+        "relative_uncertainty",
+        "Relative uncertainty (3 sigma) of the termination quantity.",
+    ),
+    (
+        "penelope_eta_seconds",
+        "eta_s",
+        "Estimated time in seconds until the target is reached.",
+    ),
+    (
+        "penelope_last_progress_timestamp_seconds",
+        "last_progress_timestamp",
+        "Time when the number of showers last increased.",
+    ),
+    ("penelope_stalled", "stalled", "Whether the run stalled (1) or not (0)."),
+)
+
+PROMETHEUS_FILE_MODE = 0o644
+"""Permissions of the Prometheus text file (readable by all users)."""
+
+
+def _get_main_result(results):
+    for result in results.values():
+        if hasattr(result, "simulated_primary_showers"):
+            return result
+    return None
+
+
+def _get_reference_line_uncertainty(results):
+    result = _get_main_result(results)
+    uncertainty = getattr(result, "reference_line_uncertainty", None)
+    if uncertainty is None or uncertainty.n <= 0.0:
+        return None  # No reference line
+    return uncertainty.n
+
+
+def _format_prometheus_value(value):
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def _format_prometheus_label(value):
+    # Only backslashes, double quotes and line feeds are escaped
+    value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return '"{0}"'.format(value)
+
+
+class RunMetrics(object):
+    """
+    Metrics of a run at a given time.
+    Values are ``None`` when they are unknown.
+
+    Attributes:
+        name (str): Name of the run.
+        timestamp (float): Time (see :func:`time.time`) of the sample.
+        simulated_showers (float): Number of simulated primary showers.
+        simulation_time_s (float): Simulation time in seconds.
+        speed_1_per_s (float): Simulation speed in showers per second.
+        relative_uncertainty (float): Relative uncertainty (3 sigma) of the
+            quantity used as termination condition.
+        eta_s (float): Estimated time in seconds until the first target is
+            reached.
+        last_progress_timestamp (float): Time when the number of showers last
+            increased, or when the run was added if it never progressed.
+        stalled (bool): Whether the number of showers did not increase for
+            longer than the stall timeout.
+    """
+
+    def __init__(
+        self,
+        name,
+        timestamp,
+        simulated_showers=None,
+        simulation_time_s=None,
+        speed_1_per_s=None,
+        relative_uncertainty=None,
+        eta_s=None,
+        last_progress_timestamp=None,
+        stalled=False,
+    ):
+        self.name = name
+        self.timestamp = timestamp
+        self.simulated_showers = simulated_showers
+        self.simulation_time_s = simulation_time_s
+        self.speed_1_per_s = speed_1_per_s
+        self.relative_uncertainty = relative_uncertainty
+        self.eta_s = eta_s
+        self.last_progress_timestamp = last_progress_timestamp
+        self.stalled = stalled
+
+    def __repr__(self):
+        return "<{0}({1}, showers={2}, speed={3}, eta={4}, stalled={5})>".format(
+            self.__class__.__name__,
+            self.name,
+            self.simulated_showers,
+            self.speed_1_per_s,
+            self.eta_s,
+            self.stalled,
+        )
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: Metrics as a dictionary serializable in JSON.
+        """
+        return {
+            "name": self.name,
+            "timestamp": self.timestamp,
+            "simulated_showers": self.simulated_showers,
+            "simulation_time_s": self.simulation_time_s,
+            "speed_1_per_s": self.speed_1_per_s,
+            "relative_uncertainty": self.relative_uncertainty,
+            "eta_s": self.eta_s,
+            "last_progress_timestamp": self.last_progress_timestamp,
+            "stalled": self.stalled,
+        }
+
+
+class _Run(object):
+    def __init__(
+        self,
+        watcher,
+        target_showers,
+        target_time_s,
+        target_uncertainty,
+        uncertainty_getter,
+        timestamp,
+    ):
+        self.watcher = watcher
+        self.target_showers = target_showers
+        self.target_time_s = target_time_s
+        self.target_uncertainty = target_uncertainty
+        self.uncertainty_getter = uncertainty_getter
+        self.last_showers = None
+        self.last_progress_timestamp = timestamp
+
+
+class MetricsCollector(object):
+    """
+    Samples the progress of several runs.
+
+    Args:
+        stall_timeout_s (float, optional): Duration in seconds without any
+            new shower after which a run is considered stalled.
+            It should be longer than the interval between two dumps of the
+            results (:class:`DUMPP <pypenelopetools.penelope.keywords.DUMPP>`).
+
+    Attributes:
+        stall_timeout_s (float): Duration in seconds after which a run
+            without progress is stalled.
+    """
+
+    def __init__(self, stall_timeout_s=600.0):
+        self.stall_timeout_s = stall_timeout_s
+        self._runs = {}
+
+    def add_run(
+        self,
+        name,
+        watcher,
+        target_showers=None,
+        target_time_s=None,
+        target_uncertainty=None,
+        uncertainty_getter=None,
+    ):
+        """
+        Registers a run.
+        The targets are usually the termination conditions of the input
+        (``NSIMSH``, ``TIME`` and the tolerance of ``REFLIN``).
+
+        Args:
+            name (str): Name of the run, unique in the collector.
+            watcher (:class:`ResultWatcher <pypenelopetools.penelope.watcher.ResultWatcher>`):
+                Watcher of the simulation directory, which must watch the
+                main result file (e.g. ``penepma-res.dat``).
+            target_showers (float, optional): Number of showers to simulate.
+            target_time_s (float, optional): Simulation time in seconds.
+            target_uncertainty (float, optional): Relative uncertainty
+                (3 sigma) to reach.
+            uncertainty_getter (callable, optional): Function returning the
+                current relative uncertainty (3 sigma) from the results of
+                the watcher, or ``None`` if it is unknown.
+                Defaults to the uncertainty of the reference line of PENEPMA
+                (see :class:`REFLIN <pypenelopetools.penepma.keywords.REFLIN>`).
+        """
+        if name in self._runs:
+            raise ValueError("Run {0} already exists".format(name))
+
+        if uncertainty_getter is None:
+            uncertainty_getter = _get_reference_line_uncertainty
+
+        self._runs[name] = _Run(
+            watcher,
+            target_showers,
+            target_time_s,
+            target_uncertainty,
+            uncertainty_getter,
+            time.time(),
+        )
+
+    def remove_run(self, name):
+        """
+        Unregisters a run, e.g. once it is finished.
+
+        Args:
+            name (str): Name of the run.
+        """
+        del self._runs[name]
+
+    def _estimate_eta(self, run, showers, time_s, speed, uncertainty):
+        etas = []
+
+        if run.target_time_s is not None and time_s is not None:
+            etas.append(run.target_time_s - time_s)
+
+        if speed is not None and speed > 0.0:
+            if run.target_showers is not None:
+                etas.append((run.target_showers - showers) / speed)
+
+            # The uncertainty decreases as the inverse square root of the
+            # number of showers
+            if run.target_uncertainty is not None and uncertainty is not None:
+                required_showers = showers * (uncertainty / run.target_uncertainty) ** 2
+                etas.append((required_showers - showers) / speed)
+
+        if not etas:
+            return None
+        return max(0.0, min(etas))
+
+    def _sample_run(self, name, run, timestamp):
+        run.watcher.refresh()
+        results = run.watcher.results
+
+        metrics = RunMetrics(name, timestamp)
+
+        result = _get_main_result(results)
+        if result is not None:
+            showers = result.simulated_primary_showers.n
+            time_s = result.simulation_time_s.n
+
+            speed = getattr(result, "simulation_speed_1_per_s", None)
+            if speed is not None:
+                speed = speed.n
+            elif time_s > 0.0:
+                speed = showers / time_s
+
+            uncertainty = run.uncertainty_getter(results)
+
+            if run.last_showers is None or showers > run.last_showers:
+                run.last_showers = showers
+                run.last_progress_timestamp = timestamp
+
+            metrics.simulated_showers = showers
+            metrics.simulation_time_s = time_s
+            metrics.speed_1_per_s = speed
+            metrics.relative_uncertainty = uncertainty
+            metrics.eta_s = self._estimate_eta(run, showers, time_s, speed, uncertainty)
+
+        metrics.last_progress_timestamp = run.last_progress_timestamp
+        metrics.stalled = timestamp - run.last_progress_timestamp > self.stall_timeout_s
+
+        return metrics
+
+    def sample(self, timestamp=None):
+        """
+        Re-parses the result files that changed and returns the metrics of
+        all runs.
+
+        Args:
+            timestamp (float, optional): Time of the sample.
+                Defaults to the current time.
+
+        Returns:
+            list(:class:`RunMetrics`): Metrics of each run, sorted by name.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        return [
+            self._sample_run(name, self._runs[name], timestamp)
+            for name in sorted(self._runs)
+        ]
+
+    def format_prometheus(self, metrics=None):
+        """
+        Formats metrics in the Prometheus text exposition format.
+
+        Args:
+            metrics (list(:class:`RunMetrics`), optional): Metrics to format.
+                Defaults to a new sample (see :meth:`sample`).
+
+        Returns:
+            str: Metrics.
+        """
+        if metrics is None:
+            metrics = self.sample()
+
+        lines = []
+
+        for metric_name, attribute, description in PROMETHEUS_METRICS:
+            lines.append("# HELP {0} {1}".format(metric_name, description))
+            lines.append("# TYPE {0} gauge".format(metric_name))
+
+            for run_metrics in metrics:
+                value = getattr(run_metrics, attribute)
+                if value is None:
+                    continue
+
+                lines.append(
+                    "{0}{{run={1}}} {2}".format(
+                        metric_name,
+                        _format_prometheus_label(run_metrics.name),
+                        _format_prometheus_value(value),
+                    )
+                )
+
+        lines.append("# HELP penelope_speed_showers_per_second Total simulation speed.")
+        lines.append("# TYPE penelope_speed_showers_per_second gauge")
+        speed = sum(m.speed_1_per_s for m in metrics if m.speed_1_per_s is not None)
+        lines.append(
+            "penelope_speed_showers_per_second {0}".format(
+                _format_prometheus_value(speed)
+            )
+        )
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, filepath, metrics=None):
+        """
+        Writes metrics in a Prometheus text file.
+        The file is replaced atomically, so it is never read partially
+        written, and is readable by all users (e.g. a node exporter running
+        as another user).
+
+        Args:
+            filepath (str): Path of the text file (``.prom``).
+            metrics (list(:class:`RunMetrics`), optional): Metrics to write.
+                Defaults to a new sample (see :meth:`sample`).
+        """
+        content = self.format_prometheus(metrics)
+
+        dirpath = os.path.dirname(os.path.abspath(filepath))
+        fd, tmpfilepath = tempfile.mkstemp(".tmp", dir=dirpath)
+        try:
+            with os.fdopen(fd, "w", encoding="utf8") as fp:
+                fp.write(content)
+            os.chmod(tmpfilepath, PROMETHEUS_FILE_MODE)
+            os.replace(tmpfilepath, filepath)
+        except BaseException:
+            os.remove(tmpfilepath)
+            raise
+
+    def write_jsonlines(self, fileobj, metrics=None):
+        """
+        Writes metrics as JSON lines, one object per run.
+        Infinite and unknown values are written as ``null``.
+
+        Args:
+            fileobj (file object): File object opened with write access.
+            metrics (list(:class:`RunMetrics`), optional): Metrics to write.
+                Defaults to a new sample (see :meth:`sample`).
+        """
+        if metrics is None:
+            metrics = self.sample()
+
+        for run_metrics in metrics:
+            values = run_metrics.to_dict()
+            for key, value in values.items():
+                if isinstance(value, float) and not math.isfinite(value):
+                    values[key] = None
+
+            fileobj.write(json.dumps(values, sort_keys=True) + "\n")
+        fileobj.flush()
+
+    @property
+    def names(self):
+        """list(str): Names of the registered runs."""
+        return sorted(self._runs)
@@ -0,0 +1,438 @@
+"""
+Optimization of the variance-reduction parameters of a simulation with short
+pilot runs.
+
+Interaction forcing (``IFORCE``), bremsstrahlung splitting (``IBRSPL``) and
+x-ray splitting (``IXRSPL``) can reduce the simulation time by orders of
+magnitude, but their best values depend on the geometry and on the quantities
+of interest.
+A :class:`VarianceReductionOptimizer` runs the same simulation for a short
+time with different variance-reduction parameters and compares their
+efficiency :math:`1 / (\\sigma^2 T)`, where :math:`\\sigma` is the relative
+uncertainty of a quantity of interest and :math:`T` the simulation time
+(see :mod:`pypenelopetools.penelope.efficiency`).
+With several quantities of interest, the efficiency of the least precise one
+is used.
+All pilot runs start from the same random seeds.
+
+Parameters are searched over a grid of candidate values, either exhaustively
+(:meth:`VarianceReductionOptimizer.grid_search`) or by moving one parameter
+at a time to the neighbouring candidate values as long as the efficiency
+improves (:meth:`VarianceReductionOptimizer.adaptive_search`).
+
+Bodies are identified by a tuple of labels: ``(kb,)`` for PENEPMA and PENMAIN
+and ``(kl, kc)`` for PENCYL.
+
+Example:
+    Splitting of x-rays in the first body of a PENEPMA simulation::
+
+        target = UncertaintyTarget(pyxray.xray_line(29, "Ka1"), 1, 0.01)
+        optimizer = VarianceReductionOptimizer(
+            PenepmaProgram(), input, "/simulation/pilot", [target.get_uncertainty],
+            geometry=geometry, material_filepaths=["Cu.mat"], pilot_time_s=60.0
+        )
+        runs = optimizer.grid_search(xray_splittings={(1,): [1, 2, 4, 8, 16]})
+        runs[0].variance_reduction.apply(input)
+"""
+
+# Standard library modules.
+import os
+import copy
+import math
+import itertools
+
+# Third party modules.
+
+# Local modules.
+from pypenelopetools.penelope.runner import Job, JobStatus, LocalScheduler
+from pypenelopetools.penelope.efficiency import (
+    get_figures_of_merit,
+    get_simulation_time_s,
+)
+
+# Globals and constants variables.
+FORCING = "IFORCE"
+BREMSSTRAHLUNG_SPLITTING = "IBRSPL"
+XRAY_SPLITTING = "IXRSPL"
+
+
+class VarianceReduction(object):
+    """
+    Variance-reduction parameters of a simulation.
+
+    Args:
+        forcings (dict(tuple, tuple(float, float, float)), optional):
+            Interaction forcings. The keys are tuples of the body labels, the
+            type of particle (:class:`KPAR <pypenelopetools.penelope.enums.KPAR>`)
+            and the type of interaction (:class:`ICOL <pypenelopetools.penelope.enums.ICOL>`),
+            e.g. ``((1,), KPAR.ELECTRON, ICOL.HARD_BREMSSTRAHLUNG_EMISSION)``.
+            The values are the forcing factor and the weight window (lower
+            and upper limits).
+        bremsstrahlung_splittings (dict(tuple(int), int), optional):
+            Splitting numbers of bremsstrahlung photons. The keys are body labels.
+        xray_splittings (dict(tuple(int), int), optional):
+            Splitting numbers of characteristic x-rays. The keys are body labels.
+
+    Attributes:
+        forcings (dict(tuple, tuple(float, float, float))): Interaction forcings.
+        bremsstrahlung_splittings (dict(tuple(int), int)): Splitting numbers
+            of bremsstrahlung photons.
+        xray_splittings (dict(tuple(int), int)): Splitting numbers of
+            characteristic x-rays.
+    """
+
+    def __init__(
+        self, forcings=None, bremsstrahlung_splittings=None, xray_splittings=None
+    ):
+        self.forcings = dict(forcings or {})
+        self.bremsstrahlung_splittings = dict(bremsstrahlung_splittings or {})
+        self.xray_splittings = dict(xray_splittings or {})
+
+    def __repr__(self):
+        return "<{0}({1} forcings, {2} bremsstrahlung splittings, {3} x-ray splittings)>".format(
+            self.__class__.__name__,
+            len(self.forcings),
+            len(self.bremsstrahlung_splittings),
+            len(self.xray_splittings),
+        )
+
+    def __eq__(self, other):
+        return isinstance(other, VarianceReduction) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    @property
+    def key(self):
+        """tuple: Hashable representation of the parameters."""
+        return tuple(tuple(sorted(values)) for values in self.get_keywords().values())
+
+    def get_keywords(self):
+        """
+        Returns the values of the variance-reduction keywords.
+
+        Returns:
+            dict(str, list(tuple)): Dictionary where the keys are the keyword
+            names (``IFORCE``, ``IBRSPL`` and ``IXRSPL``) and the values, the
+            arguments of each keyword, body labels first.
+        """
+        forcings = []
+        for (body, kpar, icol), (forcer, wlow, whig) in sorted(self.forcings.items()):
+            forcings.append(tuple(body) + (kpar, icol, forcer, wlow, whig))
+
+        bremsstrahlung_splittings = [
+            tuple(body) + (n,)
+            for body, n in sorted(self.bremsstrahlung_splittings.items())
+        ]
+        xray_splittings = [
+            tuple(body) + (n,) for body, n in sorted(self.xray_splittings.items())
+        ]
+
+        return {
+            FORCING: forcings,
+            BREMSSTRAHLUNG_SPLITTING: bremsstrahlung_splittings,
+            XRAY_SPLITTING: xray_splittings,
+        }
+
+    def apply(self, input):
+        """
+        Replaces the variance-reduction keywords of an input.
+
+        Args:
+            input: Input of PENEPMA, PENMAIN or PENCYL.
+        """
+        for name, values_list in self.get_keywords().items():
+            keyword = getattr(input, name)
+            keyword.clear()
+            for values in values_list:
+                keyword.add(*values)
+
+
+class PilotRun(object):
+    """
+    Result of a pilot run.
+
+    Attributes:
+        variance_reduction (:class:`VarianceReduction`): Parameters of the run.
+        job (:class:`Job <pypenelopetools.penelope.runner.Job>`): Job of the run.
+        uncertainties (list(float)): Relative uncertainty of each quantity of
+            interest. Infinite if the quantity is unknown.
+        simulation_time_s (float): Simulation time in seconds.
+        efficiency (float): Efficiency :math:`1 / (\\sigma^2 T)` of the least
+            precise quantity, in 1/s. Zero if the run failed.
+    """
+
+    def __init__(self, variance_reduction, job, uncertainties, simulation_time_s):
+        self.variance_reduction = variance_reduction
+        self.job = job
+        self.uncertainties = list(uncertainties)
+        self.simulation_time_s = simulation_time_s
+
+        uncertainty = max(self.uncertainties, default=math.inf)
+        efficiency = float(get_figures_of_merit(uncertainty, simulation_time_s))
+        if job.status is not JobStatus.SUCCEEDED or math.isnan(efficiency):
+            efficiency = 0.0
+        self.efficiency = efficiency
+
+    def __repr__(self):
+        return "<{0}({1}, efficiency={2:g} /s)>".format(
+            self.__class__.__name__, self.job.name, self.efficiency
+        )
+
+
+class VarianceReductionOptimizer(object):
+    """
+    Optimizer of the variance-reduction parameters.
+
+    Args:
+        program (:class:`PenelopeProgramBase <pypenelopetools.penelope.program.PenelopeProgramBase>`):
+            Program to run.
+        input: Input of the simulation. Its variance-reduction keywords are
+            replaced in the pilot runs.
+        workdir (str): Path of the directory where the pilot runs are
+            simulated, each one in a sub-directory.
+        uncertainty_getters (iterable(callable)): Functions returning the
+            relative uncertainty of a quantity of interest from the results of
+            a run, e.g. :meth:`UncertaintyTarget.get_uncertainty <pypenelopetools.penepma.termination.UncertaintyTarget.get_uncertainty>`.
+            They should return infinity if the quantity is unknown.
+        geometry (:class:`Geometry <pypenelopetools.pengeom.geometry.Geometry>`, optional):
+            Geometry of the simulation.
+        material_filepaths (iterable(str), optional): Paths of the material files.
+        pilot_time_s (float, optional): Simulation time of each pilot run in
+            seconds (``TIME`` keyword).
+        max_workers (int, optional): Number of pilot runs at the same time.
+            Defaults to the number of processors.
+
+    Attributes:
+        runs (list(:class:`PilotRun`)): All pilot runs, in the order they were
+            simulated.
+    """
+
+    def __init__(
+        self,
+        program,
+        input,
+        workdir,
+        uncertainty_getters,
+        geometry=None,
+        material_filepaths=(),
+        pilot_time_s=60.0,
+        max_workers=None,
+    ):
+        self.program = program
+        self.input = input
+        self.workdir = workdir
+        self.uncertainty_getters = list(uncertainty_getters)
+        if not self.uncertainty_getters:
+            raise ValueError("At least one uncertainty getter is required")
+        self.geometry = geometry
+        self.material_filepaths = list(material_filepaths)
+        self.pilot_time_s = pilot_time_s
+        self.max_workers = max_workers
+
+        self.runs = []
+        self._runs = {}
+
+    def __repr__(self):
+        return "<{0}({1}, {2} runs)>".format(
+            self.__class__.__name__, self.workdir, len(self.runs)
+        )
+
+    def _create_job(self, variance_reduction, index):
+        input = copy.deepcopy(self.input)
+        variance_reduction.apply(input)
+        input.TIME.set(self.pilot_time_s)
+
+        workdir = os.path.join(self.workdir, "pilot-{0:03d}".format(index))
+        return Job(
+            self.program,
+            input,
+            workdir,
+            self.geometry,
+            self.material_filepaths,
+        )
+
+    def _run_jobs(self, jobs):
+        with LocalScheduler(self.max_workers) as scheduler:
+            scheduler.run(jobs)
+
+    def evaluate(self, variance_reductions):
+        """
+        Runs pilot runs with the specified parameters.
+        Parameters that were already evaluated are not simulated again.
+
+        Args:
+            variance_reductions (iterable(:class:`VarianceReduction`)): Parameters.
+
+        Returns:
+            list(:class:`PilotRun`): Pilot runs, in the same order as
+            *variance_reductions*.
+        """
+        variance_reductions = list(variance_reductions)
+
+        jobs = {}
+        for variance_reduction in variance_reductions:
+            if variance_reduction in self._runs or variance_reduction in jobs:
+                continue
+            index = len(self._runs) + len(jobs)
+            jobs[variance_reduction] = self._create_job(variance_reduction, index)
+
+        self._run_jobs(list(jobs.values()))
+
+        for variance_reduction, job in jobs.items():
+            uncertainties = []
+            simulation_time_s = None
+
+            if job.status is JobStatus.SUCCEEDED:
+                uncertainties = [
+                    getter(job.results) for getter in self.uncertainty_getters
+                ]
+                simulation_time_s = get_simulation_time_s(job.results)
+
+            if simulation_time_s is None:
+                simulation_time_s = self.pilot_time_s
+
+            run = PilotRun(variance_reduction, job, uncertainties, simulation_time_s)
+            self._runs[variance_reduction] = run
+            self.runs.append(run)
+
+        return [
+            self._runs[variance_reduction] for variance_reduction in variance_reductions
+        ]
+
+    def _create_parameters(self, forcings, bremsstrahlung_splittings, xray_splittings):
+        """
+        Returns the parameters to search: a list of kind, key and candidate
+        values.
+        """
+        parameters = []
+
+        for key, (forcers, wlow, whig) in sorted((forcings or {}).items()):
+            values = [(forcer, wlow, whig) for forcer in forcers]
+            parameters.append((FORCING, key, values))
+
+        for body, values in sorted((bremsstrahlung_splittings or {}).items()):
+            parameters.append((BREMSSTRAHLUNG_SPLITTING, body, list(values)))
+
+        for body, values in sorted((xray_splittings or {}).items()):
+            parameters.append((XRAY_SPLITTING, body, list(values)))
+
+        for _kind, key, values in parameters:
+            if not values:
+                raise ValueError("No candidate value for {0}".format(key))
+
+        return parameters
+
+    def _create_variance_reduction(self, parameters, indexes):
+        attributes = {
+            FORCING: {},
+            BREMSSTRAHLUNG_SPLITTING: {},
+            XRAY_SPLITTING: {},
+        }
+
+        for (kind, key, values), index in zip(parameters, indexes):
+            attributes[kind][key] = values[index]
+
+        return VarianceReduction(
+            attributes[FORCING],
+            attributes[BREMSSTRAHLUNG_SPLITTING],
+            attributes[XRAY_SPLITTING],
+        )
+
+    def grid_search(
+        self, forcings=None, bremsstrahlung_splittings=None, xray_splittings=None
+    ):
+        """
+        Runs a pilot run for every combination of candidate values.
+
+        Args:
+            forcings (dict(tuple, tuple(list(float), float, float)), optional):
+                Candidate forcing factors. The keys are tuples of the body
+                labels, ``KPAR`` and ``ICOL`` (see :class:`VarianceReduction`)
+                and the values, the list of candidate forcing factors and the
+                weight window.
+            bremsstrahlung_splittings (dict(tuple(int), list(int)), optional):
+                Candidate splitting numbers of bremsstrahlung photons of each body.
+            xray_splittings (dict(tuple(int), list(int)), optional):
+                Candidate splitting numbers of x-rays of each body.
+
+        Returns:
+            list(:class:`PilotRun`): Pilot runs, the most efficient first.
+        """
+        parameters = self._create_parameters(
+            forcings, bremsstrahlung_splittings, xray_splittings
+        )
+
+        variance_reductions = [
+            self._create_variance_reduction(parameters, indexes)
+            for indexes in itertools.product(
+                *[range(len(values)) for _kind, _key, values in parameters]
+            )
+        ]
+
+        runs = self.evaluate(variance_reductions)
+        return sorted(runs, key=lambda run: run.efficiency, reverse=True)
+
+    def adaptive_search(
+        self,
+        forcings=None,
+        bremsstrahlung_splittings=None,
+        xray_splittings=None,
+        max_rounds=10,
+    ):
+        """
+        Searches the most efficient candidate values, starting from the first
+        candidate value of each parameter.
+        At each round, the neighbouring candidate values of each parameter
+        (previous and next in its list) are evaluated in parallel, and the
+        most efficient one is kept if it improves the efficiency.
+        The candidate values should therefore be ordered, e.g. ``[1, 2, 4, 8]``.
+
+        Args:
+            forcings (dict(tuple, tuple(list(float), float, float)), optional):
+                Candidate forcing factors (see :meth:`grid_search`).
+            bremsstrahlung_splittings (dict(tuple(int), list(int)), optional):
+                Candidate splitting numbers of bremsstrahlung photons.
+            xray_splittings (dict(tuple(int), list(int)), optional):
+                Candidate splitting numbers of x-rays.
+            max_rounds (int, optional): Maximum number of rounds.
+
+        Returns:
+            :class:`PilotRun`: Most efficient pilot run.
+        """
+        parameters = self._create_parameters(
+            forcings, bremsstrahlung_splittings, xray_splittings
+        )
+
+        indexes = (0,) * len(parameters)
+        (best,) = self.evaluate([self._create_variance_reduction(parameters, indexes)])
+
+        for _ in range(max_rounds):
+            neighbours = []
+            for position, (_kind, _key, values) in enumerate(parameters):
+                for step in (-1, 1):
+                    index = indexes[position] + step
+                    if 0 <= index < len(values):
+                        neighbour = list(indexes)
+                        neighbour[position] = index
+                        neighbours.append(tuple(neighbour))
+
+            if not neighbours:
+                break
+
+            runs = self.evaluate(
+                self._create_variance_reduction(parameters, neighbour)
+                for neighbour in neighbours
+            )
+
+            improved = False
+            for neighbour, run in zip(neighbours, runs):
+                if run.efficiency > best.efficiency:
+                    best = run
+                    indexes = neighbour
+                    improved = True
+
+            if not improved:
+                break
+
+        return best
@@ -0,0 +1,263 @@
+"""
+Definition of the executables of PENELOPE and its main programs.
+
+The path of an executable is resolved in the following order:
+
+1. the *executable* argument of the program;
+2. the environment variable ``<NAME>_EXECUTABLE`` (e.g. ``PENEPMA_EXECUTABLE``);
+3. the executable named after the program in the ``PATH``.
+"""
+
+# Standard library modules.
+import os
+import copy
+import math
+import shutil
+
+# Third party modules.
+
+# Local modules.
+from pypenelopetools.penelope.ranecu import (
+    allocate_seeds,
+    jump_seeds,
+    DEFAULT_SEEDS,
+    DEFAULT_DISTANCE,
+    PERIOD,
+)
+
+# Globals and constants variables.
+
+
+class PenelopeProgramBase(object):
+    """
+    Base class of a PENELOPE executable.
+    PENELOPE programs read their input from the standard input and write their
+    results in their current working directory.
+
+    Args:
+        name (str): Name of the program (e.g. ``penepma``).
+        executable (str, optional): Path to the executable.
+
+    Attributes:
+        name (str): Name of the program.
+    """
+
+    def __init__(self, name, executable=None):
+        self.name = name
+        self._executable = executable
+
+    def __repr__(self):
+        return "<{0}({1})>".format(self.__class__.__name__, self.name)
+
+    @property
+    def executable(self):
+        """
+        str: Path to the executable.
+
+        Raises:
+            FileNotFoundError: If the executable cannot be found.
+        """
+        if self._executable is not None:
+            return self._executable
+
+        envvar = "{0}_EXECUTABLE".format(self.name.upper())
+        if os.environ.get(envvar):
+            return os.environ[envvar]
+
+        executable = shutil.which(self.name)
+        if executable is None:
+            raise FileNotFoundError(
+                "Cannot find {0} executable. Specify its path with {1}".format(
+                    self.name, envvar
+                )
+            )
+        return executable
+
+    @executable.setter
+    def executable(self, executable):
+        self._executable = executable
+
+    def create_command(self):
+        """
+        Returns:
+            list(str): Command line arguments to start the program.
+        """
+        return [self.executable]
+
+    def get_default_input_filename(self):
+        """
+        Returns:
+            str: Name of the input file written in the work directory.
+        """
+        return self.name + ".in"
+
+    def write_input(self, input, fileobj):
+        """
+        Writes the input of the program.
+
+        Args:
+            input: Input of the program (e.g.
+                :class:`PenepmaInput <pypenelopetools.penepma.input.PenepmaInput>`).
+            fileobj (file object): File object opened with write access.
+        """
+        input.write(fileobj)
+
+    def get_geometry_filename(self, input):
+        """
+        Returns:
+            str: Name of the geometry file (``.geo``) read by the program or
+            ``None`` if the program does not read a geometry file.
+        """
+        keyword = getattr(input, "GEOMFN", None)
+        if keyword is None:
+            return None
+
+        (filename,) = keyword.get()
+        return filename
+
+    def split_input(self, input, count, distance=DEFAULT_DISTANCE):
+        """
+        Splits an input in *count* inputs of independent simulations of the
+        same problem, which can be run in parallel.
+        Each input starts from seeds of the random-number generator separated
+        by *distance* steps (see :func:`allocate_seeds <pypenelopetools.penelope.ranecu.allocate_seeds>`),
+        and the number of showers (``NSIMSH``) and the simulation time
+        (``TIME``) are divided between the inputs.
+        When the input selects the N-th sequence of ``RAND0`` (``RSEED -N``),
+        whose seeds are unknown, the inputs start from the default seeds
+        advanced by ``(N - 1) * count * distance`` steps, so inputs with
+        different values of N do not share seeds.
+        Resuming from a dump file (``RESUME``) is disabled.
+
+        Args:
+            input: Input of the program.
+            count (int): Number of inputs.
+            distance (int, optional): Number of random numbers available to
+                each simulation.
+
+        Returns:
+            list: Inputs.
+
+        Raises:
+            ValueError: If the seeds of the ``RAND0`` sequence do not fit in
+                the period of the generator.
+        """
+        if count < 1:
+            raise ValueError("At least one input is required")
+        if not hasattr(input, "RSEED"):
+            raise ValueError("Input does not define the random seeds")
+
+        seeds = input.RSEED.get()
+        if None in seeds:
+            seeds = DEFAULT_SEEDS
+        elif seeds[0] < 0:
+            # Each sequence of RAND0 gets its own block of seeds
+            sequence = -seeds[0]
+            if sequence * count * distance > PERIOD:
+                raise ValueError(
+                    "Seeds of sequence {0} of RAND0 exceed the period of the "
+                    "generator, use positive seeds".format(sequence)
+                )
+            seeds = jump_seeds(*DEFAULT_SEEDS, (sequence - 1) * count * distance)
+
+        (nsimsh,) = input.NSIMSH.get()
+        (timea,) = input.TIME.get()
+
+        inputs = []
+        for iseed1, iseed2 in allocate_seeds(count, distance, seeds):
+            split = copy.deepcopy(input)
+            split.RSEED.set(iseed1, iseed2)
+            split.RESUME.set(None)
+
+            if nsimsh is not None:
+                split.NSIMSH.set(math.ceil(nsimsh / count))
+            if timea is not None:
+                split.TIME.set(timea / count)
+
+            inputs.append(split)
+
+        return inputs
+
+    def create_result(self, filename):
+        """
+        Creates the empty result object associated with a file written by
+        the program.
+
+        Args:
+            filename (str): Name of a file written by the program.
+
+        Returns:
+            :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`:
+            Empty result or ``None`` if the file is not a known result file.
+        """
+        return None
+
+    def read_progress(self, dirpath):
+        """
+        Reads the progress of a simulation from its main result file.
+
+        Args:
+            dirpath (str): Path of the work directory.
+
+        Returns:
+            tuple(float, float): Number of simulated showers and simulation
+            time in seconds, or ``None`` if the progress is unknown.
+        """
+        for filename in sorted(os.listdir(dirpath)):
+            result = self.create_result(filename)
+            if result is None or not hasattr(result, "simulated_primary_showers"):
+                continue
+
+            try:
+                result.read_directory(dirpath)
+            except (OSError, EOFError, ValueError, IndexError, StopIteration):
+                return None  # Partially written
+
+            return (result.simulated_primary_showers.n, result.simulation_time_s.n)
+
+        return None
+
+    def read_results(self, dirpath):
+        """
+        Reads all known result files in a directory.
+
+        Args:
+            dirpath (str): Path of the work directory.
+
+        Returns:
+            dict(str, :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`):
+            Dictionary where the keys are file names and the values, results.
+        """
+        results = {}
+
+        for filename in sorted(os.listdir(dirpath)):
+            result = self.create_result(filename)
+            if result is None:
+                continue
+
+            result.read_directory(dirpath)
+            results[filename] = result
+
+        return results
+
+
+class MaterialProgram(PenelopeProgramBase):
+    """
+    ``material`` program of PENELOPE, which creates a material file (``.mat``)
+    from a :class:`Material <pypenelopetools.material.Material>`.
+
+    Args:
+        executable (str, optional): Path to the executable.
+    """
+
+    def __init__(self, executable=None):
+        super().__init__("material", executable)
+
+    def write_input(self, input, fileobj):
+        input.write_input(fileobj)
+
+    def get_geometry_filename(self, input):
+        return None
+
+    def split_input(self, input, count, distance=DEFAULT_DISTANCE):
+        raise ValueError("Material program cannot be run in parallel")
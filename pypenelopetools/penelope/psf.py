@@ -0,0 +1,411 @@
+"""
+Weights of the particles of phase-space files (psf).
+
+Impact detectors with the flag IPSF=1 write the state of the detected
+particles in a phase-space file, one particle per line::
+
+    KPAR E X Y Z U V W WGHT ILB(1) ILB(2) ILB(3) ILB(4) NSHI
+
+The weights of these particles show the effect of the variance-reduction
+techniques.
+A :class:`PsfWeightAnalyzer` streams phase-space files in chunks and
+accumulates histograms of the weights (:class:`WeightHistogram`) for each
+detector, type of particle (KPAR) and generation of the particle (ILB(1)).
+From these histograms, it recommends weight windows (:class:`WeightWindow`):
+
+* the lower limit is the weight below which the particles carry a small
+  fraction of the total weight; they are not worth the simulation time and
+  are subjected to Russian roulette;
+* the upper limit is the weight above which a small fraction of the
+  particles are found; these particles dominate the variance and are split;
+* the splitting number of the particles read from the psf brings the typical
+  weight down to the lower limit.
+
+The weight windows can be used for the interaction forcing (WLOW and WHIG of
+``IFORCE``) and for the particles read from a psf by PENMAIN (``WGTWIN`` and
+``IPSPLI``).
+
+Example:
+    Weight window of the photons detected by the first impact detector::
+
+        analyzer = PsfWeightAnalyzer()
+        analyzer.read_file("/simulation/psf-impdet-01.dat")
+        window = analyzer.recommend(kpar=KPAR.PHOTON)
+        window.apply_forcings(input.IFORCE, KPAR.PHOTON)
+"""
+
+# Standard library modules.
+import re
+import os
+import math
+import itertools
+
+# Third party modules.
+import numpy as np
+
+# Local modules.
+
+# Globals and constants variables.
+COLUMN_KPAR = 0
+COLUMN_ENERGY = 1
+COLUMN_WEIGHT = 8
+COLUMN_ILB1 = 9
+
+BIN_EDGES = np.logspace(-40.0, 10.0, 501)
+"""Edges of the bins of the weight histograms (10 bins per decade)."""
+
+PATTERN_DETECTOR = re.compile(r"(\d+)\.dat$")
+
+
+def iter_psf(fileobj, chunk_size=100000):
+    """
+    Reads a phase-space file in chunks of particles.
+    Comment lines (starting with ``#``) and empty lines are skipped.
+
+    Args:
+        fileobj (file object): File object opened with read access.
+        chunk_size (int, optional): Number of lines read at once.
+
+    Yields:
+        numpy.ndarray: 2D array with one row per particle and the columns of
+        the file (KPAR, E, X, Y, Z, U, V, W, WGHT, ILB(1), ...).
+
+    Raises:
+        ValueError: If the lines do not have the same number of columns.
+    """
+    column_count = None
+
+    while True:
+        lines = list(itertools.islice(fileobj, chunk_size))
+        if not lines:
+            return
+
+        values = []
+        row_count = 0
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            values.append(line)
+            row_count += 1
+
+        if not values:
+            continue
+
+        if column_count is None:
+            column_count = len(values[0].split())
+            if column_count <= COLUMN_ILB1:
+                raise ValueError("Not a phase-space file")
+
+        array = np.array(" ".join(values).split(), dtype=np.float64)
+        if array.size != row_count * column_count:
+            raise ValueError("Lines have different numbers of columns")
+
+        yield array.reshape(row_count, column_count)
+
+
+class WeightHistogram(object):
+    """
+    Histogram of the weights of particles, in logarithmic bins
+    (see :data:`BIN_EDGES`).
+
+    Attributes:
+        counts (numpy.ndarray): Number of particles in each bin.
+        weight_sums (numpy.ndarray): Sum of the weights in each bin.
+        count (int): Number of particles.
+        total_weight (float): Sum of the weights.
+        total_weight2 (float): Sum of the squared weights.
+        min_weight (float): Smallest weight.
+        max_weight (float): Largest weight.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros(len(BIN_EDGES) - 1, dtype=np.int64)
+        self.weight_sums = np.zeros(len(BIN_EDGES) - 1, dtype=np.float64)
+        self.count = 0
+        self.total_weight = 0.0
+        self.total_weight2 = 0.0
+        self.min_weight = math.inf
+        self.max_weight = -math.inf
+
+    def __repr__(self):
+        return "<{0}({1:d} particles, weights=[{2:g}, {3:g}])>".format(
+            self.__class__.__name__, self.count, self.min_weight, self.max_weight
+        )
+
+    def add(self, weights):
+        """
+        Adds the weights of particles.
+
+        Args:
+            weights (array_like): Weights.
+        """
+        weights = np.asarray(weights, dtype=np.float64).ravel()
+        if not weights.size:
+            return
+
+        indexes = np.searchsorted(BIN_EDGES, weights, side="right") - 1
+        indexes = np.clip(indexes, 0, len(self.counts) - 1)
+
+        self.counts += np.bincount(indexes, minlength=len(self.counts))
+        self.weight_sums += np.bincount(
+            indexes, weights=weights, minlength=len(self.counts)
+        )
+        self.count += weights.size
+        self.total_weight += float(np.sum(weights))
+        self.total_weight2 += float(np.sum(weights**2))
+        self.min_weight = min(self.min_weight, float(np.min(weights)))
+        self.max_weight = max(self.max_weight, float(np.max(weights)))
+
+    def merge(self, other):
+        """
+        Adds the particles of another histogram.
+
+        Args:
+            other (:class:`WeightHistogram`): Histogram.
+        """
+        self.counts += other.counts
+        self.weight_sums += other.weight_sums
+        self.count += other.count
+        self.total_weight += other.total_weight
+        self.total_weight2 += other.total_weight2
+        self.min_weight = min(self.min_weight, other.min_weight)
+        self.max_weight = max(self.max_weight, other.max_weight)
+
+    @property
+    def effective_count(self):
+        """
+        float: Effective number of particles :math:`(\\sum w)^2 / \\sum w^2`.
+        It is equal to :attr:`count` if all the weights are equal.
+        """
+        if self.total_weight2 <= 0.0:
+            return 0.0
+        return self.total_weight**2 / self.total_weight2
+
+    def get_lower_weight(self, fraction):
+        """
+        Returns the largest bin edge below which the particles carry at most
+        *fraction* of the total weight.
+
+        Args:
+            fraction (float): Fraction of the total weight.
+
+        Returns:
+            float: Weight.
+        """
+        cumulative = np.cumsum(self.weight_sums)
+        index = np.searchsorted(cumulative, fraction * self.total_weight, "right")
+        return max(float(BIN_EDGES[index]), self.min_weight)
+
+    def get_upper_weight(self, fraction):
+        """
+        Returns the smallest bin edge above which at most *fraction* of the
+        particles are found.
+
+        Args:
+            fraction (float): Fraction of the number of particles.
+
+        Returns:
+            float: Weight.
+        """
+        cumulative = np.cumsum(self.counts[::-1])
+        index = np.searchsorted(cumulative, fraction * self.count, "right")
+        return min(float(BIN_EDGES[len(self.counts) - index]), self.max_weight)
+
+    def get_median_weight(self):
+        """
+        Returns:
+            float: Upper edge of the bin containing the median weight.
+        """
+        cumulative = np.cumsum(self.counts)
+        index = np.searchsorted(cumulative, 0.5 * self.count, "left")
+        return min(float(BIN_EDGES[index + 1]), self.max_weight)
+
+
+class WeightWindow(object):
+    """
+    Recommended weight window.
+
+    Attributes:
+        wlow (float): Lower limit of the weight window.
+        whig (float): Upper limit of the weight window.
+        nsplit (int): Splitting number of the particles read from a psf.
+    """
+
+    def __init__(self, wlow, whig, nsplit=1):
+        self.wlow = wlow
+        self.whig = whig
+        self.nsplit = nsplit
+
+    def __repr__(self):
+        return "<{0}(wlow={1:g}, whig={2:g}, nsplit={3:d})>".format(
+            self.__class__.__name__, self.wlow, self.whig, self.nsplit
+        )
+
+    def apply_psf_source(self, input):
+        """
+        Sets the weight window (``WGTWIN``) and the splitting number
+        (``IPSPLI``) of the particles read from psf's by PENMAIN.
+
+        Args:
+            input (:class:`PenmainInput <pypenelopetools.penmain.input.PenmainInput>`):
+                Input.
+        """
+        input.WGTWIN.set(self.wlow, self.whig)
+        input.IPSPLI.set(self.nsplit)
+
+    def apply_forcings(self, keyword, kpar=None):
+        """
+        Sets the weight window of interaction forcings (``IFORCE``).
+
+        Args:
+            keyword (:class:`InteractionForcings <pypenelopetools.penelope.keywords.InteractionForcings>`):
+                Interaction forcings of PENEPMA or PENMAIN, or
+                :class:`IFORCE <pypenelopetools.pencyl.keywords.IFORCE>` of PENCYL.
+            kpar (:class:`KPAR <pypenelopetools.penelope.enums.KPAR>`, optional):
+                Type of particle whose forcings are modified.
+                If ``None``, all forcings are modified.
+        """
+        (values_list,) = keyword.get()
+
+        keyword.clear()
+        for values in values_list:
+            # Body labels, KPAR, ICOL, FORCER, WLOW, WHIG
+            if kpar is None or values[-5] == kpar:
+                values = tuple(values[:-2]) + (self.wlow, self.whig)
+            keyword.add(*values)
+
+
+class PsfWeightAnalyzer(object):
+    """
+    Histograms of the weights of the particles of phase-space files.
+
+    Attributes:
+        histograms (dict(tuple(int, int, int), :class:`WeightHistogram`)):
+            Histograms. The keys are the detector index (``None`` if unknown),
+            the type of particle (KPAR) and the generation (ILB(1)).
+    """
+
+    def __init__(self):
+        self.histograms = {}
+
+    def __repr__(self):
+        return "<{0}({1} histograms)>".format(
+            self.__class__.__name__, len(self.histograms)
+        )
+
+    def add(self, particles, detector=None):
+        """
+        Adds particles.
+
+        Args:
+            particles (numpy.ndarray): 2D array of particles, as yielded by
+                :func:`iter_psf`.
+            detector (int, optional): Index of the detector.
+        """
+        keys = particles[:, [COLUMN_KPAR, COLUMN_ILB1]].astype(np.int64)
+        weights = particles[:, COLUMN_WEIGHT]
+
+        unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        for index, (kpar, ilb1) in enumerate(unique_keys):
+            key = (detector, int(kpar), int(ilb1))
+            histogram = self.histograms.setdefault(key, WeightHistogram())
+            histogram.add(weights[inverse == index])
+
+    def read(self, fileobj, detector=None, chunk_size=100000):
+        """
+        Reads a phase-space file.
+
+        Args:
+            fileobj (file object): File object opened with read access.
+            detector (int, optional): Index of the detector.
+            chunk_size (int, optional): Number of lines read at once.
+        """
+        for particles in iter_psf(fileobj, chunk_size):
+            self.add(particles, detector)
+
+    def read_file(self, filepath, detector=None, chunk_size=100000):
+        """
+        Reads a phase-space file.
+
+        Args:
+            filepath (str): Path of the file.
+            detector (int, optional): Index of the detector. Defaults to the
+                number at the end of the file name (e.g. ``psf-impdet-01.dat``).
+            chunk_size (int, optional): Number of lines read at once.
+        """
+        if detector is None:
+            match = PATTERN_DETECTOR.search(os.path.basename(filepath))
+            if match:
+                detector = int(match.group(1))
+
+        with open(filepath, "r") as fp:
+            self.read(fp, detector, chunk_size)
+
+    def get_histogram(self, detector=None, kpar=None, ilb1=None):
+        """
+        Returns the histogram of the particles matching all the specified
+        criteria.
+
+        Args:
+            detector (int, optional): Index of the detector.
+            kpar (int, optional): Type of particle.
+            ilb1 (int, optional): Generation of the particles.
+
+        Returns:
+            :class:`WeightHistogram`: Histogram.
+        """
+        histogram = WeightHistogram()
+
+        for (key_detector, key_kpar, key_ilb1), other in self.histograms.items():
+            if detector is not None and key_detector != detector:
+                continue
+            if kpar is not None and key_kpar != kpar:
+                continue
+            if ilb1 is not None and key_ilb1 != ilb1:
+                continue
+            histogram.merge(other)
+
+        return histogram
+
+    def recommend(
+        self,
+        detector=None,
+        kpar=None,
+        ilb1=None,
+        roulette_fraction=0.01,
+        split_fraction=0.01,
+        max_split=1000,
+    ):
+        """
+        Recommends a weight window for the particles matching all the
+        specified criteria.
+
+        Args:
+            detector (int, optional): Index of the detector.
+            kpar (int, optional): Type of particle.
+            ilb1 (int, optional): Generation of the particles.
+            roulette_fraction (float, optional): Fraction of the total weight
+                carried by the particles below the lower limit.
+            split_fraction (float, optional): Fraction of the particles above
+                the upper limit.
+            max_split (int, optional): Maximum splitting number.
+
+        Returns:
+            :class:`WeightWindow`: Weight window.
+
+        Raises:
+            ValueError: If no particle matches the criteria.
+        """
+        histogram = self.get_histogram(detector, kpar, ilb1)
+        if not histogram.count:
+            raise ValueError("No particle")
+
+        wlow = histogram.get_lower_weight(roulette_fraction)
+        whig = max(histogram.get_upper_weight(split_fraction), wlow)
+
+        nsplit = int(histogram.get_median_weight() / wlow)
+        nsplit = min(max(nsplit, 1), max_split)
+
+        return WeightWindow(wlow, whig, nsplit)
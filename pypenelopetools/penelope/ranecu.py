@@ -0,0 +1,343 @@
+"""
+RANECU random number generator of PENELOPE and allocation of seeds.
+
+PENELOPE uses the combined multiplicative congruential generator of L'Ecuyer
+(RANECU).
+Its state is the pair of seeds given by
+:class:`RSEED <pypenelopetools.penelope.keywords.RSEED>` and reported as the
+last random seeds in the result files.
+Each seed evolves as
+
+.. math::
+
+   s_1 \\leftarrow 40014 s_1 \\bmod 2147483563 \\qquad
+   s_2 \\leftarrow 40692 s_2 \\bmod 2147483399
+
+so the state after :math:`n` steps is obtained in :math:`O(\\log n)` with a
+modular exponentiation.
+Each simulated random number advances the state by one step.
+
+Parallel simulations must use seeds far apart in the sequence to be
+statistically independent.
+:func:`allocate_seeds` gives seed pairs separated by a fixed distance and
+:func:`find_overlaps` checks, from the initial and last seeds of simulations,
+that the parts of the sequence they used do not overlap.
+
+Example:
+    Seeds for 8 simulations, each using less than :math:`10^{14}` random numbers::
+
+        for iseed1, iseed2 in allocate_seeds(8):
+            input.RSEED.set(iseed1, iseed2)
+"""
+
+# Standard library modules.
+import math
+import functools
+
+# Third party modules.
+import numpy as np
+
+# Local modules.
+
+# Globals and constants variables.
+A1 = 40014
+M1 = 2147483563
+A2 = 40692
+M2 = 2147483399
+
+# Prime factors of M1 - 1 and M2 - 1. A1 and A2 are primitive roots, so the
+# period of each seed is M - 1.
+FACTORS1 = (2, 3, 7, 631, 81031)
+FACTORS2 = (2, 19, 31, 1019, 1789)
+
+ORDER1 = M1 - 1
+ORDER2 = M2 - 1
+
+CYCLE_COUNT = math.gcd(ORDER1, ORDER2)
+"""Number of disjoint cycles of seed pairs."""
+
+PERIOD = ORDER1 * ORDER2 // CYCLE_COUNT
+"""Length of each cycle of seed pairs (about :math:`2.3 \\times 10^{18}`)."""
+
+DEFAULT_SEEDS = (1, 1)
+DEFAULT_DISTANCE = 10**14
+
+
+def _check_seeds(iseed1, iseed2):
+    iseed1 = int(iseed1)
+    iseed2 = int(iseed2)
+    if not 1 <= iseed1 < M1:
+        raise ValueError("Seed 1 must be between 1 and {0}".format(M1 - 1))
+    if not 1 <= iseed2 < M2:
+        raise ValueError("Seed 2 must be between 1 and {0}".format(M2 - 1))
+    return iseed1, iseed2
+
+
+def jump_seeds(iseed1, iseed2, n):
+    """
+    Returns the seeds after *n* steps of the generator.
+
+    Args:
+        iseed1 (int): First seed.
+        iseed2 (int): Second seed.
+        n (int): Number of steps. Negative values go backward.
+
+    Returns:
+        tuple(int, int): Seeds.
+    """
+    iseed1, iseed2 = _check_seeds(iseed1, iseed2)
+    return (
+        iseed1 * pow(A1, n % ORDER1, M1) % M1,
+        iseed2 * pow(A2, n % ORDER2, M2) % M2,
+    )
+
+
+def _powers(a, m, size):
+    """
+    Returns :math:`a^i \\bmod m` for :math:`i = 1, \\ldots, size`.
+    """
+    powers = np.empty(size, dtype=np.int64)
+    if not size:
+        return powers
+
+    powers[0] = a % m
+    n = 1
+    while n < size:
+        k = min(n, size - n)
+        powers[n : n + k] = powers[:k] * powers[n - 1] % m
+        n += k
+
+    return powers
+
+
+class Ranecu(object):
+    """
+    RANECU generator, identical to the function ``RAND`` of PENELOPE.
+
+    Args:
+        iseed1 (int, optional): First seed.
+        iseed2 (int, optional): Second seed.
+    """
+
+    def __init__(self, iseed1=DEFAULT_SEEDS[0], iseed2=DEFAULT_SEEDS[1]):
+        self._iseed1, self._iseed2 = _check_seeds(iseed1, iseed2)
+
+    def __repr__(self):
+        return "<{0}({1}, {2})>".format(
+            self.__class__.__name__, self._iseed1, self._iseed2
+        )
+
+    def rand(self):
+        """
+        Returns:
+            float: Random number uniformly distributed in ]0, 1[.
+        """
+        self._iseed1 = self._iseed1 * A1 % M1
+        self._iseed2 = self._iseed2 * A2 % M2
+
+        iz = self._iseed1 - self._iseed2
+        if iz < 1:
+            iz += M1 - 1
+        return iz * 4.656613057e-10
+
+    def random(self, size):
+        """
+        Args:
+            size (int): Number of random numbers.
+
+        Returns:
+            :class:`numpy.ndarray`: Random numbers, the same as *size* calls
+            to :meth:`rand`.
+        """
+        # Seeds after 1 to size steps, products fit in 64-bit integers
+        seeds1 = self._iseed1 * _powers(A1, M1, size) % M1
+        seeds2 = self._iseed2 * _powers(A2, M2, size) % M2
+        if size:
+            self._iseed1, self._iseed2 = int(seeds1[-1]), int(seeds2[-1])
+
+        iz = seeds1 - seeds2
+        iz[iz < 1] += M1 - 1
+        return iz * 4.656613057e-10
+
+    def jump(self, n):
+        """
+        Advances the generator by *n* steps.
+
+        Args:
+            n (int): Number of steps.
+        """
+        self._iseed1, self._iseed2 = jump_seeds(self._iseed1, self._iseed2, n)
+
+    @property
+    def seeds(self):
+        """tuple(int, int): Current seeds."""
+        return self._iseed1, self._iseed2
+
+
+def _discrete_log_prime(g, h, p, m):
+    """
+    Solves :math:`g^x = h \\pmod m` where *g* has prime order *p*
+    (baby-step giant-step).
+    """
+    step = math.isqrt(p) + 1
+
+    table = {}
+    value = 1
+    for j in range(step):
+        table.setdefault(value, j)
+        value = value * g % m
+
+    factor = pow(g, -step, m)
+    value = h
+    for i in range(step):
+        if value in table:
+            return (i * step + table[value]) % p
+        value = value * factor % m
+
+    raise ValueError("No discrete logarithm")
+
+
+@functools.lru_cache(maxsize=4096)
+def _discrete_log(a, m, factors, h):
+    """
+    Solves :math:`a^x = h \\pmod m` where *a* is a primitive root of *m* and
+    *factors* are the (distinct) prime factors of :math:`m - 1`
+    (Pohlig-Hellman).
+    """
+    order = m - 1
+    x = 0
+    modulus = 1
+
+    for p in factors:
+        cofactor = order // p
+        xp = _discrete_log_prime(pow(a, cofactor, m), pow(h, cofactor, m), p, m)
+
+        # Chinese remainder theorem
+        t = (xp - x) * pow(modulus, -1, p) % p
+        x += modulus * t
+        modulus *= p
+
+    return x
+
+
+def get_position(iseed1, iseed2):
+    """
+    Returns the position of a seed pair in the sequence of the generator.
+    The seed pairs form :data:`CYCLE_COUNT` disjoint cycles of length
+    :data:`PERIOD`.
+    The position is the number of steps from the seed pair
+    :math:`(1, 40692^c \\bmod 2147483399)` where :math:`c` is the cycle,
+    i.e. ``(1, 1)`` for the first cycle.
+
+    Args:
+        iseed1 (int): First seed.
+        iseed2 (int): Second seed.
+
+    Returns:
+        tuple(int, int): Cycle and position.
+    """
+    iseed1, iseed2 = _check_seeds(iseed1, iseed2)
+
+    x1 = _discrete_log(A1, M1, FACTORS1, iseed1)
+    x2 = _discrete_log(A2, M2, FACTORS2, iseed2)
+
+    cycle = (x2 - x1) % CYCLE_COUNT
+    x2 -= cycle
+
+    # Chinese remainder theorem with non-coprime moduli
+    modulus = ORDER2 // CYCLE_COUNT
+    t = (x2 - x1) // CYCLE_COUNT * pow(ORDER1 // CYCLE_COUNT, -1, modulus) % modulus
+    position = (x1 + ORDER1 * t) % PERIOD
+
+    return cycle, position
+
+
+def allocate_seeds(count, distance=DEFAULT_DISTANCE, seeds=DEFAULT_SEEDS):
+    """
+    Allocates seed pairs for independent simulations.
+    Consecutive seed pairs are separated by *distance* steps, so simulations
+    using less than *distance* random numbers each do not overlap.
+
+    Args:
+        count (int): Number of seed pairs.
+        distance (int, optional): Number of steps between two seed pairs.
+        seeds (tuple(int, int), optional): First seed pair.
+
+    Returns:
+        list(tuple(int, int)): Seed pairs.
+
+    Raises:
+        ValueError: If the seed pairs do not fit in the period of the generator.
+    """
+    if count < 0:
+        raise ValueError("Count must be positive")
+    if distance < 1:
+        raise ValueError("Distance must be greater than zero")
+    if count * distance > PERIOD:
+        raise ValueError(
+            "{0} seed pairs separated by {1} steps exceed the period of the generator".format(
+                count, distance
+            )
+        )
+
+    iseed1, iseed2 = _check_seeds(*seeds)
+    jump1 = pow(A1, distance % ORDER1, M1)
+    jump2 = pow(A2, distance % ORDER2, M2)
+
+    allocated = []
+    for _ in range(count):
+        allocated.append((iseed1, iseed2))
+        iseed1 = iseed1 * jump1 % M1
+        iseed2 = iseed2 * jump2 % M2
+
+    return allocated
+
+
+def find_overlaps(runs):
+    """
+    Finds the simulations that used overlapping parts of the sequence of
+    the generator.
+
+    Args:
+        runs (iterable(tuple(tuple(int, int), tuple(int, int)))):
+            Initial and last seed pairs of each simulation, e.g.
+            ``((iseed1, iseed2), (result.last_random_seed1.n, result.last_random_seed2.n))``.
+
+    Returns:
+        list(tuple(int, int)): Indexes of the simulations that overlap.
+    """
+    intervals = []
+
+    for index, (start_seeds, end_seeds) in enumerate(runs):
+        cycle, start = get_position(*start_seeds)
+        end_cycle, end = get_position(*end_seeds)
+        if end_cycle != cycle:
+            raise ValueError(
+                "Last seeds of simulation {0} are not in the sequence of its initial seeds".format(
+                    index
+                )
+            )
+
+        length = (end - start) % PERIOD
+        intervals.append((cycle, start, length, index))
+
+    overlaps = set()
+    intervals.sort()
+
+    for i, (cycle, start, length, index) in enumerate(intervals):
+        for other_cycle, other_start, other_length, other_index in intervals[i + 1 :]:
+            if other_cycle != cycle:
+                break
+            if other_start - start >= length:
+                break
+            overlaps.add(tuple(sorted((index, other_index))))
+
+        # Interval wrapping around the end of the cycle
+        if start + length >= PERIOD:
+            for other_cycle, other_start, _, other_index in intervals:
+                if other_cycle != cycle or other_index == index:
+                    continue
+                if other_start < start + length - PERIOD:
+                    overlaps.add(tuple(sorted((index, other_index))))
+
+    return sorted(overlaps)
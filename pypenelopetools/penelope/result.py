@@ -4,22 +4,79 @@ Definition of base result classes.
 
 # Standard library modules.
 import abc
+import os
 import re
+import copy
+import math
 
 # Third party modules.
+import numpy as np
+from uncertainties import ufloat, unumpy
+from uncertainties.core import AffineScalarFunc
 
 # Local modules.
+from pypenelopetools.penelope.snapshot import (
+    write_snapshot,
+    read_snapshot,
+    dump_state,
+    load_state,
+)
 
 # Globals and constants variables.
 
 PATTERN_NUMBER = re.compile(r"\d\.\d*E[\+\-]\d\d")
 
 
+def _merge_weighted_mean(values, weights):
+    """
+    Shower-weighted mean of results from independent simulations.
+    The uncertainties are combined in quadrature.
+    """
+    total = sum(weights)
+    nominal = sum(w * v.n for w, v in zip(weights, values)) / total
+    std_dev = math.sqrt(sum((w * v.s) ** 2 for w, v in zip(weights, values))) / total
+    return ufloat(nominal, std_dev)
+
+
+def _merge_value(values, weights):
+    first = values[0]
+
+    if isinstance(first, AffineScalarFunc):
+        return _merge_weighted_mean(values, weights)
+
+    if isinstance(first, dict) and any(
+        isinstance(v, AffineScalarFunc) for value in values for v in value.values()
+    ):
+        # Missing keys correspond to values that were not scored in a simulation
+        zero = ufloat(0.0, 0.0)
+        keys = dict.fromkeys(key for value in values for key in value)
+
+        return dict(
+            (key, _merge_weighted_mean([v.get(key, zero) for v in values], weights))
+            for key in keys
+        )
+
+    if isinstance(first, np.ndarray) and first.dtype == object:
+        if any(v.shape != first.shape for v in values):
+            raise ValueError("Results have different shapes")
+        if not first.size:
+            return first.copy()
+
+        total = sum(weights)
+        nominal = sum(w * unumpy.nominal_values(v) for w, v in zip(weights, values))
+        variance = sum((w * unumpy.std_devs(v)) ** 2 for w, v in zip(weights, values))
+        return unumpy.uarray(nominal / total, np.sqrt(variance) / total)
+
+    return copy.deepcopy(first)
+
+
 class PenelopeResultBase(metaclass=abc.ABCMeta):
     """
     Base class representing a type of result.
     """
 
+    _MERGE_SUM_ATTRIBUTES = frozenset()
+
     def _read_until_line_startswith(self, fileobj, prefix):
         """
         Reads until a line that starts with *prefix* is found.
@@ -80,7 +137,6 @@ class PenelopeResultBase(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError
 
-    @abc.abstractmethod
     def read_directory(self, dirpath):
         """
         Read a result file from a directory.
@@ -88,4 +144,117 @@ class PenelopeResultBase(metaclass=abc.ABCMeta):
         Args:
             dirpath (str): Path of a directory.
         """
+        filepath = os.path.join(dirpath, self.filename)
+        with open(filepath, "r") as fp:
+            self.read(fp)
+
+    def save(self, filepath):
+        """
+        Saves the parsed result to a binary snapshot file
+        (see :mod:`pypenelopetools.penelope.snapshot`).
+
+        Args:
+            filepath (str): Path of the snapshot file.
+        """
+        header, arrays = dump_state(self)
+        write_snapshot(filepath, header, arrays)
+
+    def load(self, filepath):
+        """
+        Loads a result saved with :meth:`save`.
+        Loading a snapshot is much faster than reading the result file.
+
+        Args:
+            filepath (str): Path of the snapshot file.
+        """
+        header, arrays = read_snapshot(filepath)
+        load_state(self, header, arrays)
+
+    @classmethod
+    def merge(cls, results, weights):
+        """
+        Merges the results of independent simulations of the same problem
+        (e.g. simulations that only differ by their random seeds).
+        Quantities normalized per primary shower are averaged using the
+        weights, and their uncertainties are combined in quadrature.
+        Counters (e.g. number of showers) are summed.
+        Other values are taken from the first result.
+
+        Args:
+            results (list(:class:`PenelopeResultBase`)): Results to merge.
+            weights (list(float)): Weight of each result, usually the number
+                of simulated primary showers.
+
+        Returns:
+            :class:`PenelopeResultBase`: Merged result.
+        """
+        results = list(results)
+        weights = [float(weight) for weight in weights]
+        if not results:
+            raise ValueError("No result to merge")
+        if len(results) != len(weights):
+            raise ValueError("One weight is required for each result")
+        if sum(weights) <= 0.0:
+            raise ValueError("Sum of weights must be greater than zero")
+
+        merged = copy.deepcopy(results[0])
+
+        for name in vars(merged):
+            values = [getattr(result, name) for result in results]
+
+            if name in cls._MERGE_SUM_ATTRIBUTES:
+                setattr(merged, name, sum(values))
+            else:
+                setattr(merged, name, _merge_value(values, weights))
+
+        return merged
+
+    @abc.abstractproperty
+    def filename(self):
+        """str: Name of the result file written by the main program."""
         raise NotImplementedError
+
+
+def merge_results(results_list):
+    """
+    Merges the results of independent simulations of the same problem.
+    Each result is weighted by the number of primary showers simulated in
+    its simulation.
+
+    Args:
+        results_list (list(dict(str, :class:`PenelopeResultBase`))):
+            Results of each simulation, as returned by
+            :meth:`Job.read_results <pypenelopetools.penelope.runner.Job.read_results>`.
+            Dictionaries where the keys are file names and the values, results.
+
+    Returns:
+        dict(str, :class:`PenelopeResultBase`): Merged results.
+        Only the files written by all simulations are merged.
+
+    Raises:
+        ValueError: If the number of showers of a simulation is unknown.
+    """
+    results_list = list(results_list)
+    if not results_list:
+        return {}
+
+    weights = []
+    for results in results_list:
+        for result in results.values():
+            showers = getattr(result, "simulated_primary_showers", None)
+            if showers is not None:
+                weights.append(showers.n)
+                break
+        else:
+            raise ValueError("Number of simulated showers not found in results")
+
+    filenames = set(results_list[0])
+    for results in results_list[1:]:
+        filenames &= set(results)
+
+    merged = {}
+    for filename in sorted(filenames):
+        results = [results[filename] for results in results_list]
+        merged[filename] = type(results[0]).merge(results, weights)
+
+    return merged
@@ -0,0 +1,854 @@
+"""
+Local execution of PENELOPE programs.
+
+A :class:`Job` stages a work directory (input, geometry and material files)
+and a :class:`LocalScheduler` runs the jobs as sub-processes on a fixed number
+of worker slots.
+
+Checkpointed jobs (see *dump_interval_s* of :class:`Job`) dump the state of
+the simulation alternately in two files, so a valid dump remains if the
+program is killed while writing.
+A checkpointed job whose program is interrupted is queued again and resumed
+from its latest dump without counting as a failure, up to a maximum number of
+resumes.
+It can also be paused with :meth:`LocalScheduler.pause` to free its slot and
+resumed later, on any free slot, with :meth:`LocalScheduler.resume`.
+
+Example:
+    Run two PENEPMA simulations in parallel::
+
+        program = PenepmaProgram("/opt/penelope/bin/penepma")
+        jobs = [
+            Job(program, input1, "/simulation/epma1", geometry1, ["/pendbase/Cu.mat"]),
+            Job(program, input2, "/simulation/epma2", geometry2, ["/pendbase/Cu.mat"]),
+        ]
+
+        with LocalScheduler(max_workers=2) as scheduler:
+            scheduler.run(jobs)
+
+        for job in jobs:
+            print(job.status, job.results["penepma-res.dat"].simulation_time_s)
+"""
+
+# Standard library modules.
+import os
+import copy
+import enum
+import shutil
+import warnings
+import threading
+import subprocess
+import concurrent.futures
+
+# Third party modules.
+
+# Local modules.
+from pypenelopetools.penelope.result import merge_results
+from pypenelopetools.penelope.ranecu import find_overlaps
+
+# Globals and constants variables.
+DUMP_FILENAMES = ("dump-a.dmp", "dump-b.dmp")
+
+DEFAULT_MAX_RESUMES = 10
+"""Default number of resumes of an interrupted job not counted as failures."""
+
+
+class JobStatus(enum.Enum):
+    CREATED = "created"
+    PENDING = "pending"
+    RUNNING = "running"
+    PAUSED = "paused"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    TIMEOUT = "timeout"
+    CANCELLED = "cancelled"
+
+    def __str__(self):
+        return self.value
+
+    @property
+    def done(self):
+        """bool: Whether the job is finished."""
+        return self in (
+            JobStatus.SUCCEEDED,
+            JobStatus.FAILED,
+            JobStatus.TIMEOUT,
+            JobStatus.CANCELLED,
+        )
+
+
+class JobError(RuntimeError):
+    """
+    Raised when a job does not succeed.
+
+    Args:
+        job (:class:`Job`): Job that did not succeed.
+
+    Attributes:
+        job (:class:`Job`): Job that did not succeed.
+    """
+
+    def __init__(self, job):
+        super().__init__(
+            "Job {0} {1} after {2} attempt(s) (return code: {3})".format(
+                job.name, job.status, job.attempts, job.returncode
+            )
+        )
+        self.job = job
+
+
+class Job(object):
+    """
+    Simulation to be run in a work directory.
+
+    Args:
+        program (:class:`PenelopeProgramBase <pypenelopetools.penelope.program.PenelopeProgramBase>`):
+            Program to run.
+        input: Input of the program (e.g.
+            :class:`PenepmaInput <pypenelopetools.penepma.input.PenepmaInput>`).
+        workdir (str): Path of the work directory. It is created if it does
+            not exist.
+        geometry (:class:`Geometry <pypenelopetools.pengeom.geometry.Geometry>`, optional):
+            Geometry written in the work directory under the file name of the
+            ``GEOMFN`` keyword of the input.
+        material_filepaths (iterable(str), optional): Paths of the material
+            files (``.mat``) copied in the work directory.
+        extra_filepaths (iterable(str), optional): Paths of other files
+            copied in the work directory.
+        timeout_s (float, optional): Maximum duration of one attempt in seconds.
+        max_retries (int, optional): Number of times a failed or timed out
+            job is restarted.
+        name (str, optional): Name of the job. Defaults to the name of the
+            work directory.
+        dump_interval_s (float, optional): Interval between two dumps of the
+            simulation state in seconds.
+            If specified, the job is checkpointed: the ``DUMPTO`` and ``DUMPP``
+            keywords are set automatically and an interrupted simulation is
+            resumed from its last dump (``RESUME``), so at most one interval
+            of simulation is lost.
+        max_resumes (int, optional): Number of times an interrupted
+            checkpointed job is resumed without counting as a failure.
+            Further interruptions count as failures, so a program which
+            always crashes after dumping its state is not restarted forever.
+
+    Attributes:
+        program (:class:`PenelopeProgramBase <pypenelopetools.penelope.program.PenelopeProgramBase>`):
+            Program to run.
+        input: Input of the program.
+        workdir (str): Path of the work directory.
+        geometry (:class:`Geometry <pypenelopetools.pengeom.geometry.Geometry>`):
+            Geometry or ``None``.
+        material_filepaths (list(str)): Paths of the material files.
+        extra_filepaths (list(str)): Paths of other files.
+        timeout_s (float): Maximum duration of one attempt in seconds or ``None``.
+        max_retries (int): Number of retries.
+        name (str): Name of the job.
+        dump_interval_s (float): Interval between two dumps in seconds or
+            ``None`` if the job is not checkpointed.
+        max_resumes (int): Number of resumes not counted as failures.
+        status (:class:`JobStatus`): Current status.
+        attempts (int): Number of times the program was started.
+        failures (int): Number of attempts that failed or timed out.
+        resumes (int): Number of times the simulation was resumed after an
+            interruption.
+        returncode (int): Return code of the last attempt or ``None``.
+        simulated_showers (float): Number of showers simulated so far,
+            including the ones of the interrupted attempts.
+        simulation_time_s (float): Simulation time so far in seconds.
+        results (dict(str, :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`)):
+            Results read once the job succeeded.
+            Dictionary where the keys are file names and the values, results.
+            It is empty if the job was terminated while the program was
+            writing its results.
+    """
+
+    def __init__(
+        self,
+        program,
+        input,
+        workdir,
+        geometry=None,
+        material_filepaths=(),
+        extra_filepaths=(),
+        timeout_s=None,
+        max_retries=0,
+        name=None,
+        dump_interval_s=None,
+        max_resumes=DEFAULT_MAX_RESUMES,
+    ):
+        self.program = program
+        self.input = input
+        self.workdir = workdir
+        self.geometry = geometry
+        self.material_filepaths = list(material_filepaths)
+        self.extra_filepaths = list(extra_filepaths)
+        self.timeout_s = timeout_s
+        self.max_retries = max_retries
+
+        if name is None:
+            name = os.path.basename(os.path.normpath(workdir))
+        self.name = name
+        self.dump_interval_s = dump_interval_s
+        self.max_resumes = max_resumes
+
+        self.status = JobStatus.CREATED
+        self.reset()
+
+    def reset(self):
+        """
+        Resets the attempts, progress and results of the job.
+        Dump files are kept, so a checkpointed simulation is resumed.
+        """
+        self.attempts = 0
+        self.failures = 0
+        self.resumes = 0
+        self.returncode = None
+        self.simulated_showers = 0.0
+        self.simulation_time_s = 0.0
+        self.results = {}
+
+    def __repr__(self):
+        return "<{0}({1}, {2})>".format(self.__class__.__name__, self.name, self.status)
+
+    def stage(self):
+        """
+        Creates the work directory and writes or copies all the files read by
+        the program.
+        """
+        os.makedirs(self.workdir, exist_ok=True)
+
+        if self.dump_interval_s is not None and not hasattr(self.input, "DUMPTO"):
+            raise ValueError("Input does not support dump files")
+
+        self.prepare()
+
+        if self.geometry is not None:
+            filename = self.program.get_geometry_filename(self.input)
+            if not filename:
+                raise ValueError("Input does not define a geometry file name")
+
+            with open(os.path.join(self.workdir, filename), "w") as fp:
+                self.geometry.write(fp)
+
+        for filepath in self.material_filepaths + self.extra_filepaths:
+            shutil.copy(filepath, self.workdir)
+
+    def prepare(self):
+        """
+        Writes the input file before each attempt.
+        If the job is checkpointed, the simulation is resumed from the latest
+        dump file and the state is dumped in the other dump file, so a dump
+        interrupted while being written never overwrites the latest one.
+        """
+        input = self.input
+
+        if self.dump_interval_s is not None:
+            resume_filename = self.find_latest_dump()
+            if resume_filename == DUMP_FILENAMES[0]:
+                dump_filename = DUMP_FILENAMES[1]
+            else:
+                dump_filename = DUMP_FILENAMES[0]
+
+            input = copy.deepcopy(input)
+            input.RESUME.set(resume_filename)
+            input.DUMPTO.set(dump_filename)
+            input.DUMPP.set(self.dump_interval_s)
+
+        with open(self.input_filepath, "w") as fp:
+            self.program.write_input(input, fp)
+
+    def find_latest_dump(self):
+        """
+        Returns:
+            str: Name of the most recent non-empty dump file or ``None``.
+        """
+        latest_filename = None
+        latest_mtime = None
+
+        for filename in DUMP_FILENAMES:
+            try:
+                stat = os.stat(os.path.join(self.workdir, filename))
+            except FileNotFoundError:
+                continue
+            if not stat.st_size:
+                continue
+
+            if latest_mtime is None or stat.st_mtime_ns > latest_mtime:
+                latest_filename = filename
+                latest_mtime = stat.st_mtime_ns
+
+        return latest_filename
+
+    def discard_dump(self, filename):
+        """
+        Renames a dump file that cannot be resumed, so that it is not used
+        anymore.
+
+        Args:
+            filename (str): Name of the dump file.
+        """
+        filepath = os.path.join(self.workdir, filename)
+        os.replace(filepath, filepath + ".bad")
+
+    def read_progress(self):
+        """
+        Updates :attr:`simulated_showers` and :attr:`simulation_time_s` from
+        the results written by the program.
+        Programs rewrite their results each time the state is dumped.
+        """
+        progress = self.program.read_progress(self.workdir)
+        if progress is not None:
+            self.simulated_showers, self.simulation_time_s = progress
+
+    def read_results(self):
+        """
+        Reads the results written by the program in the work directory.
+
+        Returns:
+            dict(str, :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`):
+            Dictionary where the keys are file names and the values, results.
+        """
+        return self.program.read_results(self.workdir)
+
+    @property
+    def input_filepath(self):
+        """str: Path of the input file in the work directory."""
+        return os.path.join(self.workdir, self.program.get_default_input_filename())
+
+    @property
+    def log_filepath(self):
+        """str: Path of the file where the standard output of the program is written."""
+        return os.path.join(self.workdir, self.program.name + ".log")
+
+
+class LocalScheduler(object):
+    """
+    Runs jobs as sub-processes on the local computer.
+    At most *max_workers* jobs are running at the same time, the others
+    are queued.
+
+    A checkpointed job (see :attr:`Job.dump_interval_s`) whose program is
+    interrupted (e.g. killed on a shared node) after having dumped its state
+    is put back in the queue and resumed from its latest dump on the next
+    free slot.
+    Such interruptions do not count as retries, up to :attr:`Job.max_resumes`
+    times.
+    A checkpointed job can also be paused with :meth:`pause` to free its slot
+    and resumed later with :meth:`resume`.
+    A running job can be stopped early with :meth:`terminate`, for example
+    once its statistical uncertainties are small enough.
+
+    Args:
+        max_workers (int, optional): Number of worker slots.
+            Defaults to the number of processors.
+        status_callback (callable, optional): Function called with the job as
+            argument each time the status of a job changes.
+            It is called from the worker threads.
+
+    Attributes:
+        max_workers (int): Number of worker slots.
+        status_callback (callable): Function called when the status of a job
+            changes or ``None``.
+    """
+
+    def __init__(self, max_workers=None, status_callback=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.status_callback = status_callback
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            self.max_workers, thread_name_prefix="penelope-worker"
+        )
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._futures = {}
+        self._tasks = {}
+        self._processes = {}
+        self._cancelled = set()
+        self._paused = set()
+        self._terminated = set()
+        self._shutdown = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, value, tb):
+        self.shutdown(cancel=exctype is not None)
+
+    def _set_status(self, job, status):
+        job.status = status
+        if self.status_callback is not None:
+            self.status_callback(job)
+
+    def _get_interruption(self, job):
+        with self._lock:
+            if job in self._cancelled:
+                return JobStatus.CANCELLED
+            if job in self._paused:
+                return JobStatus.PAUSED
+            return None
+
+    def _execute(self, job):
+        with self._lock:
+            if job in self._cancelled:
+                return JobStatus.CANCELLED
+            if job in self._paused:
+                return JobStatus.PAUSED
+            if job in self._terminated:
+                return JobStatus.SUCCEEDED
+
+            with open(job.input_filepath, "r") as stdin, open(
+                job.log_filepath, "w"
+            ) as stdout:
+                process = subprocess.Popen(
+                    job.program.create_command(),
+                    stdin=stdin,
+                    stdout=stdout,
+                    stderr=subprocess.STDOUT,
+                    cwd=job.workdir,
+                )
+            self._processes[job] = process
+
+        try:
+            job.returncode = process.wait(job.timeout_s)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            job.returncode = process.wait()
+            return JobStatus.TIMEOUT
+        finally:
+            with self._lock:
+                self._processes.pop(job, None)
+
+        interruption = self._get_interruption(job)
+        if interruption is not None:
+            return interruption
+        with self._lock:
+            if job in self._terminated:
+                return JobStatus.SUCCEEDED
+        if job.returncode != 0:
+            return JobStatus.FAILED
+        return JobStatus.SUCCEEDED
+
+    def _read(self, job, func):
+        # Parsing is serialized, since the pyxray database used by the
+        # readers is not thread-safe
+        with self._read_lock:
+            return func()
+
+    def _read_terminated_results(self, job):
+        """
+        Reads the results of a terminated job.
+        The program may have been killed while writing its results, in which
+        case the results read before are kept.
+        """
+        try:
+            job.results = self._read(job, job.read_results)
+        except (OSError, EOFError, ValueError, IndexError, StopIteration) as ex:
+            warnings.warn(
+                "Cannot read results of terminated job {0}: {1}".format(job.name, ex),
+                RuntimeWarning,
+            )
+
+    def _run_attempts(self, job):
+        """
+        Runs the job until it is finished, paused or interrupted.
+
+        Returns:
+            :class:`JobStatus`: ``SUCCEEDED``, ``PAUSED`` or ``PENDING`` if the
+            job was interrupted and must be resumed.
+        """
+        while True:
+            interruption = self._get_interruption(job)
+            if interruption is not None:
+                self._set_status(job, interruption)
+                if interruption is JobStatus.PAUSED:
+                    return interruption
+                raise JobError(job)
+
+            # Terminated while paused or between two attempts
+            with self._lock:
+                terminated = job in self._terminated
+            if terminated:
+                self._read_terminated_results(job)
+                self._set_status(job, JobStatus.SUCCEEDED)
+                return JobStatus.SUCCEEDED
+
+            resume_filename = job.find_latest_dump()
+            job.prepare()
+
+            job.attempts += 1
+            self._set_status(job, JobStatus.RUNNING)
+
+            status = self._execute(job)
+
+            if job.dump_interval_s is not None:
+                self._read(job, job.read_progress)
+
+            if status is JobStatus.SUCCEEDED:
+                with self._lock:
+                    terminated = job in self._terminated
+                if terminated:
+                    self._read_terminated_results(job)
+                else:
+                    job.results = self._read(job, job.read_results)
+                self._set_status(job, status)
+                return status
+
+            if status is JobStatus.CANCELLED:
+                self._set_status(job, status)
+                raise JobError(job)
+
+            if status is JobStatus.PAUSED:
+                self._set_status(job, status)
+                return status
+
+            if job.dump_interval_s is not None:
+                latest_filename = job.find_latest_dump()
+
+                # The state was dumped before the interruption: resume from it
+                if (
+                    status is JobStatus.FAILED
+                    and latest_filename != resume_filename
+                    and job.resumes < job.max_resumes
+                ):
+                    job.resumes += 1
+                    return JobStatus.PENDING
+
+                # Nothing was dumped after resuming: the dump may be corrupted
+                if resume_filename is not None and latest_filename == resume_filename:
+                    job.discard_dump(resume_filename)
+
+            job.failures += 1
+            if job.failures > job.max_retries:
+                self._set_status(job, status)
+                raise JobError(job)
+
+    def _run(self, job):
+        with self._lock:
+            future = self._futures[job]
+
+        if not future.running() and not future.set_running_or_notify_cancel():
+            return  # Cancelled while queued
+
+        try:
+            if job.attempts == 0:
+                job.stage()
+
+            status = self._run_attempts(job)
+        except JobError as ex:
+            future.set_exception(ex)
+            return
+        except Exception as ex:
+            self._set_status(job, JobStatus.FAILED)
+            future.set_exception(ex)
+            return
+
+        if status is JobStatus.SUCCEEDED:
+            future.set_result(job)
+            return
+
+        if status is JobStatus.PAUSED:
+            if self._shutdown:
+                self._set_status(job, JobStatus.CANCELLED)
+                future.set_exception(JobError(job))
+            return
+
+        # Interrupted: resume on the next free slot
+        try:
+            self._enqueue(job)
+        except RuntimeError:  # Scheduler is shut down
+            self._set_status(job, JobStatus.CANCELLED)
+            future.set_exception(JobError(job))
+
+    def _enqueue(self, job):
+        self._set_status(job, JobStatus.PENDING)
+        task = self._executor.submit(self._run, job)
+
+        with self._lock:
+            self._tasks[job] = task
+
+    def submit(self, job):
+        """
+        Queues a job.
+
+        Args:
+            job (:class:`Job`): Job to run.
+
+        Returns:
+            :class:`concurrent.futures.Future`: Future whose result is the job
+            once it succeeded.
+            If the job does not succeed, the future raises a :class:`JobError`.
+        """
+        job.reset()
+
+        with self._lock:
+            self._cancelled.discard(job)
+            self._paused.discard(job)
+            self._terminated.discard(job)
+            self._futures[job] = concurrent.futures.Future()
+            future = self._futures[job]
+
+        self._enqueue(job)
+        return future
+
+    def cancel(self, job):
+        """
+        Cancels a job. A queued or paused job is never started again and a
+        running job is terminated.
+
+        Args:
+            job (:class:`Job`): Job to cancel.
+        """
+        with self._lock:
+            self._cancelled.add(job)
+            future = self._futures.get(job)
+            task = self._tasks.get(job)
+            process = self._processes.get(job)
+            paused = job.status is JobStatus.PAUSED
+
+        if future is None or future.done():
+            return
+
+        if future.cancel():
+            self._set_status(job, JobStatus.CANCELLED)
+        elif paused or (task is not None and task.cancel()):
+            self._set_status(job, JobStatus.CANCELLED)
+            future.set_exception(JobError(job))
+
+        if process is not None:
+            process.kill()
+
+    def pause(self, job):
+        """
+        Pauses a checkpointed job. The running program is terminated and
+        its slot is given to the next queued job.
+        The simulation restarts from its latest dump when the job is resumed
+        with :meth:`resume`.
+
+        Args:
+            job (:class:`Job`): Job to pause.
+        """
+        if job.dump_interval_s is None:
+            raise ValueError("Only checkpointed jobs can be paused")
+
+        with self._lock:
+            self._paused.add(job)
+            task = self._tasks.get(job)
+            process = self._processes.get(job)
+
+        if task is not None and task.cancel():
+            self._set_status(job, JobStatus.PAUSED)
+
+        if process is not None:
+            process.kill()
+
+    def resume(self, job):
+        """
+        Queues a paused job. It runs on the next free slot.
+
+        Args:
+            job (:class:`Job`): Job to resume.
+        """
+        with self._lock:
+            self._paused.discard(job)
+
+        if job.status is JobStatus.PAUSED:
+            self._enqueue(job)
+
+    def terminate(self, job):
+        """
+        Stops a job early.
+        The running program is killed and the job succeeds with the results
+        last written by the program (see :class:`DUMPP <pypenelopetools.penelope.keywords.DUMPP>`).
+        If the program is killed while writing its results, they cannot be
+        read and a :class:`RuntimeWarning` is issued.
+        A paused job succeeds with the results written before it was paused
+        and a queued job that never started is cancelled.
+
+        Args:
+            job (:class:`Job`): Job to terminate.
+        """
+        with self._lock:
+            future = self._futures.get(job)
+            if future is None or future.done():
+                return
+
+            started = job.attempts > 0
+            self._terminated.add(job)
+            self._paused.discard(job)
+            task = self._tasks.get(job)
+            process = self._processes.get(job)
+
+        if not started:
+            self.cancel(job)
+            return
+
+        if job.status is JobStatus.PAUSED and (task is None or task.done()):
+            self._enqueue(job)
+
+        if process is not None:
+            process.kill()
+
+    def run(self, jobs):
+        """
+        Runs jobs and waits until they are all finished.
+        Unlike :meth:`submit`, the jobs that do not succeed do not raise an
+        exception. Their :attr:`Job.status` should be checked.
+
+        Args:
+            jobs (iterable(:class:`Job`)): Jobs to run.
+
+        Returns:
+            list(:class:`Job`): Jobs.
+        """
+        jobs = list(jobs)
+        futures = [self.submit(job) for job in jobs]
+        concurrent.futures.wait(futures)
+        return jobs
+
+    def shutdown(self, wait=True, cancel=False):
+        """
+        Shuts down the scheduler. No job can be submitted afterwards.
+        Paused jobs are cancelled.
+
+        Args:
+            wait (bool, optional): Whether to wait until all jobs are finished.
+            cancel (bool, optional): Whether to cancel the queued and running
+                jobs.
+        """
+        self._shutdown = True
+
+        with self._lock:
+            jobs = list(self._futures)
+
+        for job in jobs:
+            if cancel or job.status is JobStatus.PAUSED:
+                self.cancel(job)
+
+        if wait:
+            # Interrupted jobs are queued again until they are finished
+            with self._lock:
+                futures = list(self._futures.values())
+            concurrent.futures.wait(futures)
+
+        self._executor.shutdown(wait)
+
+
+def split_job(job, count):
+    """
+    Splits a job in *count* independent jobs of the same problem
+    (see :meth:`PenelopeProgramBase.split_input <pypenelopetools.penelope.program.PenelopeProgramBase.split_input>`).
+    Each job runs in a sub-directory of the work directory of *job*.
+
+    Args:
+        job (:class:`Job`): Job to split.
+        count (int): Number of jobs.
+
+    Returns:
+        list(:class:`Job`): Jobs.
+    """
+    jobs = []
+
+    for index, input in enumerate(job.program.split_input(job.input, count)):
+        split = copy.copy(job)
+        split.input = input
+        split.workdir = os.path.join(job.workdir, "{0:03d}".format(index))
+        split.name = "{0}-{1:03d}".format(job.name, index)
+        split.status = JobStatus.CREATED
+        split.reset()
+        jobs.append(split)
+
+    return jobs
+
+
+def find_seed_overlaps(jobs):
+    """
+    Finds the succeeded jobs that used overlapping parts of the sequence of
+    the random-number generator, from the seeds of their input and the last
+    seeds reported in their results
+    (see :func:`find_overlaps <pypenelopetools.penelope.ranecu.find_overlaps>`).
+    Jobs started from negative seeds (``RSEED -N``) are ignored.
+
+    Args:
+        jobs (iterable(:class:`Job`)): Jobs.
+
+    Returns:
+        list(tuple(:class:`Job`, :class:`Job`)): Overlapping jobs.
+    """
+    checked_jobs = []
+    runs = []
+
+    for job in jobs:
+        seeds = job.input.RSEED.get()
+        if None in seeds or min(seeds) < 1:
+            continue
+
+        for result in job.results.values():
+            if hasattr(result, "last_random_seed1"):
+                last_seeds = (result.last_random_seed1.n, result.last_random_seed2.n)
+                break
+        else:
+            continue
+
+        checked_jobs.append(job)
+        runs.append((seeds, last_seeds))
+
+    return [(checked_jobs[i], checked_jobs[j]) for i, j in find_overlaps(runs)]
+
+
+def run_parallel(job, count, max_workers=None):
+    """
+    Runs a single simulation as *count* independent simulations in parallel
+    and merges their results
+    (see :func:`merge_results <pypenelopetools.penelope.result.merge_results>`).
+    A warning is issued if the simulations used overlapping random numbers
+    (see :func:`find_seed_overlaps`).
+    The merged results are stored in :attr:`Job.results` of *job*.
+
+    Example:
+        Run a PENEPMA simulation on 8 cores::
+
+            job = Job(PenepmaProgram(), input, "/simulation/epma1", geometry, ["Cu.mat"])
+            results = run_parallel(job, 8)
+            print(results["pe-intens-01.dat"].total_intensities_1_per_sr_electron)
+
+    Args:
+        job (:class:`Job`): Job to run.
+        count (int): Number of simulations.
+        max_workers (int, optional): Number of simulations running at the
+            same time. Defaults to *count*.
+
+    Returns:
+        dict(str, :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`):
+        Merged results.
+
+    Raises:
+        JobError: If one of the simulations does not succeed.
+    """
+    jobs = split_job(job, count)
+
+    with LocalScheduler(max_workers or count) as scheduler:
+        scheduler.run(jobs)
+
+    job.attempts = sum(split.attempts for split in jobs)
+
+    for split in jobs:
+        if split.status is not JobStatus.SUCCEEDED:
+            job.status = split.status
+            raise JobError(split)
+
+    try:
+        overlaps = find_seed_overlaps(jobs)
+    except ValueError as ex:
+        warnings.warn("Cannot check random seeds: {0}".format(ex), RuntimeWarning)
+    else:
+        if overlaps:
+            warnings.warn(
+                "Simulations used overlapping random numbers: {0}".format(
+                    ", ".join("{0.name}/{1.name}".format(*pair) for pair in overlaps)
+                ),
+                RuntimeWarning,
+            )
+
+    job.results = merge_results(split.results for split in jobs)
+    job.status = JobStatus.SUCCEEDED
+    return job.results
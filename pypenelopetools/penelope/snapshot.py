@@ -0,0 +1,426 @@
+"""
+Binary snapshot format for parsed results.
+
+A snapshot file starts with a magic string and a format version, followed by
+a JSON header and the raw data of numpy arrays.
+Each array is aligned on 64 bytes so that it can be memory-mapped without
+any copy (see :func:`read_snapshot`).
+
+The state of a result is converted automatically from its attributes:
+
+* ``ufloat`` values are stored in a single ``(n, 2)`` array of nominal
+  values and standard deviations,
+* dictionaries with integer or :class:`XrayLine` keys and ``ufloat`` values
+  are stored as a key array and a ``(n, 2)`` value array,
+* ``unumpy`` arrays are stored with an extra last dimension of size 2,
+* integers, floats, strings, ``None`` and enumerations are stored in the header.
+
+Example:
+    Convert all PENEPMA results of a campaign to snapshots::
+
+        from pypenelopetools.penepma.results import create_result
+        convert_tree('/simulations', create_result)
+"""
+
+# Standard library modules.
+import os
+import enum
+import json
+import struct
+import importlib
+import functools
+import concurrent.futures
+
+# Third party modules.
+import numpy as np
+from uncertainties import ufloat, unumpy, UFloat
+import pyxray.descriptor
+
+# Local modules.
+
+# Globals and constants variables.
+SNAPSHOT_MAGIC = b"PPTSNAP\x00"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_EXTENSION = ".snap"
+SNAPSHOT_ALIGNMENT = 64
+
+_PREAMBLE = struct.Struct("<8sII")
+
+
+def _align(offset):
+    return -(-offset // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+
+
+def write_snapshot(filepath, header, arrays):
+    """
+    Writes a snapshot file.
+    The file is first written to a temporary file which then replaces
+    *filepath*, so that readers never see a partially written snapshot.
+
+    Args:
+        filepath (str): Path of the snapshot file.
+        header (dict): JSON serializable header.
+        arrays (dict(str, numpy.ndarray)): Arrays to store.
+    """
+    offset = 0
+    entries = []
+    contiguous_arrays = []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        offset = _align(offset)
+        entries.append(
+            {
+                "name": name,
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+                "offset": offset,
+            }
+        )
+        contiguous_arrays.append(array)
+        offset += array.nbytes
+
+    header = dict(header, arrays=entries)
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf8")
+
+    data_offset = _align(_PREAMBLE.size + len(header_bytes))
+
+    tmp_filepath = filepath + ".tmp{0:d}".format(os.getpid())
+    try:
+        with open(tmp_filepath, "wb") as fp:
+            fp.write(
+                _PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header_bytes))
+            )
+            fp.write(header_bytes)
+
+            for entry, array in zip(entries, contiguous_arrays):
+                fp.seek(data_offset + entry["offset"])
+                fp.write(array.tobytes())
+
+            # Pad file so that the last array can always be mapped
+            fp.truncate(data_offset + _align(offset))
+
+        os.replace(tmp_filepath, filepath)
+    except BaseException:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+        raise
+
+
+def read_snapshot(filepath, mmap_mode="r"):
+    """
+    Reads a snapshot file.
+
+    Args:
+        filepath (str): Path of the snapshot file.
+        mmap_mode (str, optional): Memory-map mode (see :class:`numpy.memmap`).
+            If ``None``, arrays are read in memory.
+
+    Returns:
+        tuple(dict, dict(str, numpy.ndarray)): Header and arrays.
+
+    Raises:
+        IOError: If the file is not a snapshot or its version is not supported.
+    """
+    with open(filepath, "rb") as fp:
+        preamble = fp.read(_PREAMBLE.size)
+        if len(preamble) != _PREAMBLE.size:
+            raise IOError("Not a snapshot file: {0}".format(filepath))
+
+        magic, version, header_length = _PREAMBLE.unpack(preamble)
+        if magic != SNAPSHOT_MAGIC:
+            raise IOError("Not a snapshot file: {0}".format(filepath))
+        if version > SNAPSHOT_VERSION:
+            raise IOError(
+                "Unsupported snapshot version {0} (maximum {1})".format(
+                    version, SNAPSHOT_VERSION
+                )
+            )
+
+        header = json.loads(fp.read(header_length).decode("utf8"))
+        data_offset = _align(_PREAMBLE.size + header_length)
+
+        arrays = {}
+        for entry in header.pop("arrays"):
+            dtype = np.dtype(entry["dtype"])
+            shape = tuple(entry["shape"])
+            offset = data_offset + entry["offset"]
+
+            if mmap_mode is None or dtype.itemsize * int(np.prod(shape)) == 0:
+                fp.seek(offset)
+                count = int(np.prod(shape))
+                array = np.fromfile(fp, dtype=dtype, count=count).reshape(shape)
+            else:
+                array = np.memmap(
+                    filepath, dtype=dtype, mode=mmap_mode, offset=offset, shape=shape
+                )
+
+            arrays[entry["name"]] = array
+
+    return header, arrays
+
+
+def _qualified_name(obj_type):
+    return "{0}:{1}".format(obj_type.__module__, obj_type.__qualname__)
+
+
+def _import_qualified_name(name):
+    modulename, qualname = name.split(":")
+    obj = importlib.import_module(modulename)
+    for attr in qualname.split("."):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _encode_subshell(subshell):
+    return [
+        subshell.principal_quantum_number,
+        subshell.azimuthal_quantum_number,
+        subshell.total_angular_momentum_nominator,
+    ]
+
+
+def _encode_xrayline(xrayline):
+    transition = xrayline.transition
+    return [
+        xrayline.atomic_number,
+        _encode_subshell(transition.source_subshell),
+        _encode_subshell(transition.destination_subshell),
+        xrayline.iupac,
+        xrayline.siegbahn,
+        xrayline.energy_eV,
+        xrayline.probability,
+        xrayline.relative_weight,
+    ]
+
+
+@functools.lru_cache(maxsize=None)
+def _decode_xrayline(z, src, dst, iupac, siegbahn, energy_eV, probability, weight):
+    # Direct construction avoids the (slow) queries of the pyxray database
+    transition = pyxray.descriptor.XrayTransition(
+        pyxray.descriptor.AtomicSubshell(*src), pyxray.descriptor.AtomicSubshell(*dst)
+    )
+    return pyxray.descriptor.XrayLine(
+        pyxray.descriptor.Element(z),
+        transition,
+        iupac,
+        siegbahn,
+        energy_eV,
+        probability,
+        weight,
+    )
+
+
+def _encode_ufloats(values):
+    return np.array([[v.nominal_value, v.std_dev] for v in values], dtype=np.float64)
+
+
+def dump_state(obj):
+    """
+    Converts the attributes of an object to a header and arrays.
+
+    Args:
+        obj (object): Object to convert, usually a result.
+
+    Returns:
+        tuple(dict, dict(str, numpy.ndarray)): Header and arrays.
+
+    Raises:
+        TypeError: If an attribute cannot be converted.
+    """
+    attributes = {}
+    arrays = {}
+    scalar_names = []
+    scalar_values = []
+    xraylines = []
+    xrayline_lookup = {}
+
+    for name, value in vars(obj).items():
+        if isinstance(value, UFloat):
+            scalar_names.append(name)
+            scalar_values.append(value)
+
+        elif isinstance(value, enum.Enum):
+            attributes[name] = {
+                "enum": _qualified_name(type(value)),
+                "value": value.value,
+            }
+
+        elif value is None or isinstance(value, (bool, int, float, str)):
+            attributes[name] = {"value": value}
+
+        elif isinstance(value, dict):
+            keys = list(value.keys())
+            if all(isinstance(key, pyxray.descriptor.XrayLine) for key in keys):
+                indexes = []
+                for key in keys:
+                    if key not in xrayline_lookup:
+                        xrayline_lookup[key] = len(xraylines)
+                        xraylines.append(_encode_xrayline(key))
+                    indexes.append(xrayline_lookup[key])
+                attributes[name] = {"dict": "xrayline"}
+                keys = indexes
+            elif all(isinstance(key, int) for key in keys):
+                attributes[name] = {"dict": "int"}
+            else:
+                raise TypeError("Cannot convert keys of attribute {0}".format(name))
+
+            arrays[name + ".keys"] = np.array(keys, dtype=np.int64)
+            arrays[name + ".values"] = _encode_ufloats(value.values()).reshape(-1, 2)
+
+        elif isinstance(value, np.ndarray):
+            attributes[name] = {"uarray": True}
+            arrays[name] = np.stack(
+                [unumpy.nominal_values(value), unumpy.std_devs(value)], axis=-1
+            ).astype(np.float64)
+
+        else:
+            raise TypeError(
+                "Cannot convert attribute {0} of type {1}".format(name, type(value))
+            )
+
+    header = {
+        "class": _qualified_name(type(obj)),
+        "attributes": attributes,
+        "scalars": scalar_names,
+        "xraylines": xraylines,
+    }
+    arrays["scalars"] = _encode_ufloats(scalar_values).reshape(-1, 2)
+
+    return header, arrays
+
+
+def load_state(obj, header, arrays):
+    """
+    Restores the attributes of an object from a header and arrays created by
+    :func:`dump_state`.
+
+    Args:
+        obj (object): Object to restore.
+        header (dict): Header.
+        arrays (dict(str, numpy.ndarray)): Arrays.
+
+    Raises:
+        IOError: If the snapshot was created from another type of object.
+    """
+    classname = _qualified_name(type(obj))
+    if header["class"] != classname:
+        raise IOError(
+            "Snapshot of {0} cannot be loaded in {1}".format(header["class"], classname)
+        )
+
+    for name, (n, s) in zip(header["scalars"], arrays["scalars"].tolist()):
+        setattr(obj, name, ufloat(n, s))
+
+    xraylines = [_decode_xrayline(*_freeze(args)) for args in header["xraylines"]]
+
+    for name, attribute in header["attributes"].items():
+        if "enum" in attribute:
+            enum_class = _import_qualified_name(attribute["enum"])
+            value = enum_class(attribute["value"])
+
+        elif "dict" in attribute:
+            keys = arrays[name + ".keys"].tolist()
+            if attribute["dict"] == "xrayline":
+                keys = [xraylines[index] for index in keys]
+
+            values = arrays[name + ".values"].tolist()
+            value = dict((key, ufloat(n, s)) for key, (n, s) in zip(keys, values))
+
+        elif "uarray" in attribute:
+            array = arrays[name]
+            value = unumpy.uarray(array[..., 0], array[..., 1])
+
+        else:
+            value = attribute["value"]
+
+        setattr(obj, name, value)
+
+
+def _freeze(args):
+    return tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args)
+
+
+def _convert_file(filepath, create_result):
+    filename = os.path.basename(filepath)
+    result = create_result(filename)
+
+    with open(filepath, "r") as fp:
+        result.read(fp)
+
+    snapshot_filepath = filepath + SNAPSHOT_EXTENSION
+    result.save(snapshot_filepath)
+
+    return snapshot_filepath
+
+
+def find_convertible_files(rootdir, create_result, overwrite=False):
+    """
+    Finds the result files in a directory tree that do not have an
+    up-to-date snapshot.
+
+    Args:
+        rootdir (str): Root directory.
+        create_result (callable): Function taking a file name and returning an
+            empty result object or ``None`` if the file is not a result file.
+        overwrite (bool, optional): Whether to include files with an
+            up-to-date snapshot.
+
+    Returns:
+        list(str): Paths of the result files.
+    """
+    filepaths = []
+
+    for dirpath, _dirnames, filenames in os.walk(rootdir):
+        filenames = set(filenames)
+        for filename in sorted(filenames):
+            if create_result(filename) is None:
+                continue
+
+            filepath = os.path.join(dirpath, filename)
+
+            snapshot_filename = filename + SNAPSHOT_EXTENSION
+            if not overwrite and snapshot_filename in filenames:
+                snapshot_filepath = os.path.join(dirpath, snapshot_filename)
+                if (
+                    os.stat(snapshot_filepath).st_mtime_ns
+                    >= os.stat(filepath).st_mtime_ns
+                ):
+                    continue
+
+            filepaths.append(filepath)
+
+    return filepaths
+
+
+def convert_tree(rootdir, create_result, max_workers=None, overwrite=False):
+    """
+    Converts all result files in a directory tree to snapshots, in parallel.
+    The snapshot of a result file is saved next to it with the extension
+    :data:`SNAPSHOT_EXTENSION`.
+    Result files with an up-to-date snapshot are skipped.
+
+    Args:
+        rootdir (str): Root directory.
+        create_result (callable): Function taking a file name and returning an
+            empty result object or ``None`` if the file is not a result file
+            (e.g. :func:`pypenelopetools.penepma.results.create_result`).
+            The function must be picklable (i.e. defined at module level).
+        max_workers (int, optional): Number of worker processes.
+            If ``None``, the number of processors is used.
+        overwrite (bool, optional): Whether to also convert files with an
+            up-to-date snapshot.
+
+    Returns:
+        list(str): Paths of the created snapshot files.
+    """
+    filepaths = find_convertible_files(rootdir, create_result, overwrite)
+    if not filepaths:
+        return []
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    chunksize = max(1, len(filepaths) // (4 * max_workers))
+
+    convert = functools.partial(_convert_file, create_result=create_result)
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        return list(executor.map(convert, filepaths, chunksize=chunksize))
@@ -0,0 +1,358 @@
+"""
+Monitoring of result files rewritten by a running simulation.
+
+PENELOPE main programs periodically rewrite their result files while running
+(see :class:`DUMPP <pypenelopetools.penelope.keywords.DUMPP>`).
+A watcher keeps track of the identity (inode, size and modification time) of
+each result file and only re-parses the files whose identity changed.
+
+Example:
+    Print the number of simulated showers each time the results are dumped::
+
+        watcher = PenepmaWatcher("/simulation/epma1", detector_indexes=[1])
+
+        async def monitor():
+            async for snapshot in watcher.watch():
+                print(snapshot.simulated_primary_showers)
+
+        asyncio.run(monitor())
+"""
+
+# Standard library modules.
+import os
+import io
+import sys
+import time
+import copy
+import errno
+import struct
+import asyncio
+import threading
+import ctypes
+import ctypes.util
+
+# Third party modules.
+
+# Local modules.
+
+# Globals and constants variables.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_PARSE_LOCK = threading.Lock()
+
+_libc = None
+
+
+def _get_libc():
+    """
+    Returns the C library exposing the inotify functions or ``None`` if
+    inotify is not available on this platform.
+    """
+    global _libc
+
+    if not sys.platform.startswith("linux"):
+        return None
+
+    if _libc is None:
+        try:
+            libc = ctypes.CDLL(
+                ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+            )
+            libc.inotify_init1  # Check that the functions exist
+            libc.inotify_add_watch
+        except (OSError, AttributeError):
+            libc = False
+        _libc = libc
+
+    return _libc or None
+
+
+def get_file_identity(filepath):
+    """
+    Returns the identity of a file, i.e. its device, inode, size and
+    modification time.
+    A file is considered changed when its identity changes.
+
+    Args:
+        filepath (str): Path of a file.
+
+    Returns:
+        tuple: Identity or ``None`` if the file does not exist.
+    """
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class InotifyHandle(object):
+    """
+    Thin wrapper around a Linux inotify file descriptor watching one directory.
+
+    Args:
+        dirpath (str): Path of the directory to watch.
+
+    Raises:
+        OSError: If inotify is not available or the watch cannot be created.
+    """
+
+    def __init__(self, dirpath):
+        libc = _get_libc()
+        if libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+        wd = libc.inotify_add_watch(fd, os.fsencode(dirpath), INOTIFY_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err, os.strerror(err), dirpath)
+
+        self.fd = fd
+
+    def read_filenames(self):
+        """
+        Drains the pending events.
+
+        Returns:
+            set(str): Names of the files associated with the events.
+        """
+        filenames = set()
+
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+
+            offset = 0
+            while offset < len(data):
+                _wd, _mask, _cookie, length = struct.unpack_from("iIII", data, offset)
+                offset += 16
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                filenames.add(os.fsdecode(name))
+
+        return filenames
+
+    def close(self):
+        """Closes the file descriptor."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class ResultSnapshot(object):
+    """
+    State of the results of a simulation at a given time.
+
+    Args:
+        dirpath (str): Path of the simulation directory.
+        timestamp (float): Time (see :func:`time.time`) when the snapshot was taken.
+        results (dict(str, :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`)):
+            Last successfully parsed results.
+            Dictionary where the keys are file names and the values, results.
+        changed_filenames (set(str)): Names of the files re-parsed since the
+            previous snapshot.
+
+    Attributes:
+        dirpath (str): Path of the simulation directory.
+        timestamp (float): Time when the snapshot was taken.
+        results (dict(str, :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`)):
+            Last successfully parsed results.
+        changed_filenames (frozenset(str)): Names of the re-parsed files.
+    """
+
+    def __init__(self, dirpath, timestamp, results, changed_filenames):
+        self.dirpath = dirpath
+        self.timestamp = timestamp
+        self.results = results
+        self.changed_filenames = frozenset(changed_filenames)
+
+    def __repr__(self):
+        return "<{0}({1}, changed={2})>".format(
+            self.__class__.__name__, self.dirpath, sorted(self.changed_filenames)
+        )
+
+
+class ResultWatcher(object):
+    """
+    Watches the result files of a simulation directory.
+
+    The watched results are given as empty result objects.
+    They are used as prototypes: each time a file changes, a copy of the
+    prototype is created and the file is parsed into it.
+    A file that cannot be parsed (e.g. because it is being rewritten) is
+    retried at the next refresh and the previous result is kept.
+
+    Args:
+        dirpath (str): Path of the simulation directory.
+        results (iterable(:class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`)):
+            Prototypes of the results to watch.
+        interval_s (float, optional): Polling interval in seconds.
+            When inotify is used, this is the maximum time between two checks.
+        use_inotify (bool, optional): Whether to use inotify when it is
+            available. If ``False`` or if inotify is not available, the result
+            files are polled every *interval_s*.
+
+    Attributes:
+        dirpath (str): Path of the simulation directory.
+        interval_s (float): Polling interval in seconds.
+        use_inotify (bool): Whether to use inotify when it is available.
+    """
+
+    def __init__(self, dirpath, results, interval_s=5.0, use_inotify=True):
+        self.dirpath = dirpath
+        self.interval_s = interval_s
+        self.use_inotify = use_inotify
+
+        self._prototypes = {}
+        for result in results:
+            self._prototypes[result.filename] = copy.deepcopy(result)
+
+        self._identities = {}
+        self._results = {}
+        self._stopped = False
+        self._wakeup = None
+
+    def _read_result(self, filename):
+        filepath = os.path.join(self.dirpath, filename)
+        with open(filepath, "r") as fp:
+            content = fp.read()
+
+        # Watchers of several directories may parse in executor threads at
+        # the same time, but pyxray lookups are not thread-safe
+        with _PARSE_LOCK:
+            result = copy.deepcopy(self._prototypes[filename])
+            result.read(io.StringIO(content))
+        return result
+
+    def refresh(self):
+        """
+        Checks the identity of all watched files and re-parses the ones
+        that changed.
+
+        Returns:
+            set(str): Names of the files that were re-parsed.
+        """
+        changed_filenames = set()
+
+        for filename in self._prototypes:
+            identity = get_file_identity(os.path.join(self.dirpath, filename))
+            if identity is None or identity == self._identities.get(filename):
+                continue
+
+            try:
+                result = self._read_result(filename)
+            except (OSError, EOFError, ValueError, IndexError, StopIteration):
+                continue  # Partially written, retry at next refresh
+
+            # Only remember identity once the file was successfully parsed
+            if get_file_identity(os.path.join(self.dirpath, filename)) != identity:
+                continue
+
+            self._identities[filename] = identity
+            self._results[filename] = result
+            changed_filenames.add(filename)
+
+        return changed_filenames
+
+    def snapshot(self, changed_filenames=()):
+        """
+        Returns a snapshot of the last successfully parsed results.
+
+        Args:
+            changed_filenames (iterable(str), optional): Names of the files
+                re-parsed since the previous snapshot.
+        """
+        return self._create_snapshot(
+            time.time(), dict(self._results), changed_filenames
+        )
+
+    def _create_snapshot(self, timestamp, results, changed_filenames):
+        return ResultSnapshot(self.dirpath, timestamp, results, changed_filenames)
+
+    def _create_inotify_handle(self):
+        if not self.use_inotify:
+            return None
+
+        try:
+            return InotifyHandle(self.dirpath)
+        except OSError:
+            return None
+
+    async def watch(self):
+        """
+        Asynchronous iterator yielding a snapshot each time at least one
+        result file was re-parsed.
+        The files are parsed in the default executor of the event loop, so
+        several directories can be watched without blocking each other.
+        The iteration ends when :meth:`stop` is called.
+        """
+        self._stopped = False
+
+        loop = asyncio.get_running_loop()
+        wakeup = self._wakeup = asyncio.Event()
+        handle = self._create_inotify_handle()
+
+        if handle is not None:
+
+            def _on_event():
+                if self._prototypes.keys() & handle.read_filenames():
+                    wakeup.set()
+
+            loop.add_reader(handle.fd, _on_event)
+
+        try:
+            while not self._stopped:
+                # Parsing is slow: do not block the event loop
+                changed_filenames = await loop.run_in_executor(None, self.refresh)
+                if changed_filenames:
+                    yield self.snapshot(changed_filenames)
+
+                if self._stopped:
+                    break
+
+                try:
+                    await asyncio.wait_for(wakeup.wait(), self.interval_s)
+                except asyncio.TimeoutError:
+                    pass
+                wakeup.clear()
+
+        finally:
+            self._wakeup = None
+            if handle is not None:
+                loop.remove_reader(handle.fd)
+                handle.close()
+
+    def stop(self):
+        """
+        Stops the iteration of :meth:`watch` after the current check.
+        This method must be called from the event loop running :meth:`watch`.
+        """
+        self._stopped = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    @property
+    def results(self):
+        """
+        dict(str, :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`):
+        Last successfully parsed results.
+        Dictionary where the keys are file names and the values, results.
+        """
+        return dict(self._results)
@@ -0,0 +1,42 @@
+"""
+PENEPMA executable.
+"""
+
+# Standard library modules.
+import math
+
+# Third party modules.
+
+# Local modules.
+from pypenelopetools.penelope.program import PenelopeProgramBase
+from pypenelopetools.penelope.ranecu import DEFAULT_DISTANCE
+from pypenelopetools.penepma.results import create_result
+
+# Globals and constants variables.
+
+
+class PenepmaProgram(PenelopeProgramBase):
+    """
+    PENEPMA executable.
+
+    Args:
+        executable (str, optional): Path to the executable.
+    """
+
+    def __init__(self, executable=None):
+        super().__init__("penepma", executable)
+
+    def split_input(self, input, count, distance=DEFAULT_DISTANCE):
+        inputs = super().split_input(input, count, distance)
+
+        # The tolerance on the reference line applies to each simulation.
+        # It is relaxed so that the merged result reaches the original tolerance.
+        izs1s200, idet, tol = input.REFLIN.get()
+        if tol is not None:
+            for split in inputs:
+                split.REFLIN.set(izs1s200, idet, tol * math.sqrt(count))
+
+        return inputs
+
+    def create_result(self, filename):
+        return create_result(filename)
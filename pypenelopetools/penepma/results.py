@@ -4,6 +4,8 @@ Results of PENEPMA simulation.
 
 # Standard library modules.
 import os
+import math
+import re
 
 # Third party modules.
 from uncertainties import ufloat, unumpy
@@ -15,6 +17,8 @@ from pypenelopetools.penelope.result import PenelopeResultBase
 from pypenelopetools.penelope.enums import KPAR
 
 # Globals and constants variables.
+PATTERN_DETECTOR_FILENAME = re.compile(r"^pe-(intens|spect)-(\d\d)\.dat$")
+PATTERN_ENERGY_FILENAME = re.compile(r"^pe-energy-(el|ph)-(\w+)\.dat$")
 
 
 class PenepmaResult(PenelopeResultBase):
@@ -90,6 +94,16 @@ class PenepmaResult(PenelopeResultBase):
             Relative uncertainty of the x-ray line used as a termination condition
     """
 
+    _MERGE_SUM_ATTRIBUTES = frozenset(
+        [
+            "simulation_time_s",
+            "simulated_primary_showers",
+            "upbound_primary_particles",
+            "downbound_primary_particles",
+            "absorbed_primary_particles",
+        ]
+    )
+
     def __init__(self):
         super().__init__()
 
@@ -234,13 +248,37 @@ class PenepmaResult(PenelopeResultBase):
             self._read_until_line_startswith(fileobj, "Reference line")
             (val,) = self._read_all_values(fileobj.readline())
             self.reference_line_uncertainty = ufloat(val, 0.0)
-        except IOError:
+        except (IOError, EOFError):
             self.reference_line_uncertainty = ufloat(0.0, 0.0)
 
-    def read_directory(self, dirpath):
-        filepath = os.path.join(dirpath, "penepma-res.dat")
-        with open(filepath, "r") as fp:
-            self.read(fp)
+    @classmethod
+    def merge(cls, results, weights):
+        results = list(results)
+        weights = list(weights)
+        merged = super().merge(results, weights)
+
+        if merged.simulation_time_s.n > 0.0:
+            merged.simulation_speed_1_per_s = ufloat(
+                merged.simulated_primary_showers.n / merged.simulation_time_s.n, 0.0
+            )
+
+        # Seeds are specific to each simulation
+        merged.last_random_seed1 = results[0].last_random_seed1
+        merged.last_random_seed2 = results[0].last_random_seed2
+
+        # Relative uncertainty of the merged reference line
+        total = sum(map(float, weights))
+        variance = sum(
+            (float(weight) * result.reference_line_uncertainty.n) ** 2
+            for weight, result in zip(weights, results)
+        )
+        merged.reference_line_uncertainty = ufloat(math.sqrt(variance) / total, 0.0)
+
+        return merged
+
+    @property
+    def filename(self):
+        return "penepma-res.dat"
 
 
 class PenepmaPhotonDetectorResultBase(PenelopeResultBase):
@@ -428,12 +466,9 @@ class PenepmaEmittedIntensityResult(
         # Read intensity table
         super()._read_intensity_table(fileobj)
 
-    def read_directory(self, dirpath):
-        filepath = os.path.join(
-            dirpath, "pe-intens-{:02d}.dat".format(self.detector_index)
-        )
-        with open(filepath, "r") as fp:
-            self.read(fp)
+    @property
+    def filename(self):
+        return "pe-intens-{:02d}.dat".format(self.detector_index)
 
 
 class PenepmaSpectrumResult(PenepmaPhotonDetectorResultBase):
@@ -515,12 +550,9 @@ class PenepmaSpectrumResult(PenepmaPhotonDetectorResultBase):
 
         self.spectrum = unumpy.uarray(spectrum, spectrum_unc)
 
-    def read_directory(self, dirpath):
-        filepath = os.path.join(
-            dirpath, "pe-spect-{:02d}.dat".format(self.detector_index)
-        )
-        with open(filepath, "r") as fp:
-            self.read(fp)
+    @property
+    def filename(self):
+        return "pe-spect-{:02d}.dat".format(self.detector_index)
 
     @property
     def energies_eV(self):
@@ -546,10 +578,9 @@ class PenepmaGeneratedIntensityResult(PenepmaIntensityResultMixin, PenelopeResul
     def read(self, fileobj):
         super()._read_intensity_table(fileobj)
 
-    def read_directory(self, dirpath):
-        filepath = os.path.join(dirpath, "pe-gen-ph.dat")
-        with open(filepath, "r") as fp:
-            self.read(fp)
+    @property
+    def filename(self):
+        return "pe-gen-ph.dat"
 
 
 class PenepmaAngularResult(PenelopeResultBase):
@@ -570,18 +601,15 @@ class PenepmaAngularResult(PenelopeResultBase):
 
         self.distribution = unumpy.uarray(distribution, distribution_unc)
 
-    def read_directory(self, dirpath):
+    @property
+    def filename(self):
         if self.kpar == KPAR.ELECTRON:
-            filename = "pe-anel.dat"
+            return "pe-anel.dat"
         elif self.kpar == KPAR.PHOTON:
-            filename = "pe-anga.dat"
+            return "pe-anga.dat"
         else:
             raise ValueError(f"No distribution for particle {self.kpar}")
 
-        filepath = os.path.join(dirpath, filename)
-        with open(filepath, "r") as fp:
-            self.read(fp)
-
     @property
     def angles_rad(self):
         """numpy array: Nominal values of the angle axis in radians."""
@@ -612,7 +640,8 @@ class PenepmaEnergyResult(PenelopeResultBase):
 
         self.distribution = unumpy.uarray(distribution, distribution_unc)
 
-    def read_directory(self, dirpath):
+    @property
+    def filename(self):
         if self.kpar == KPAR.ELECTRON:
             kpar_suffix = "el"
         elif self.kpar == KPAR.PHOTON:
@@ -620,11 +649,7 @@ class PenepmaEnergyResult(PenelopeResultBase):
         else:
             raise ValueError(f"No distribution for particle {self.kpar}")
 
-        filepath = os.path.join(
-            dirpath, f"pe-energy-{kpar_suffix}-{self.direction}.dat"
-        )
-        with open(filepath, "r") as fp:
-            self.read(fp)
+        return f"pe-energy-{kpar_suffix}-{self.direction}.dat"
 
     @property
     def energies_eV(self):
@@ -635,3 +660,40 @@ class PenepmaEnergyResult(PenelopeResultBase):
     def probability_density_1_per_eV_particle(self):
         """numpy array: Nominal values of the probability density axis in (1/(eV*particle))."""
         return unumpy.nominal_values(self.distribution[:, 1])
+
+
+def create_result(filename):
+    """
+    Creates the empty result object associated with a PENEPMA result file.
+
+    Args:
+        filename (str): Name of a result file (e.g. ``pe-intens-01.dat``).
+
+    Returns:
+        :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`:
+        Empty result or ``None`` if the file is not a known result file.
+    """
+    if filename == "penepma-res.dat":
+        return PenepmaResult()
+    if filename == "pe-gen-ph.dat":
+        return PenepmaGeneratedIntensityResult()
+    if filename == "pe-anel.dat":
+        return PenepmaAngularResult(KPAR.ELECTRON)
+    if filename == "pe-anga.dat":
+        return PenepmaAngularResult(KPAR.PHOTON)
+
+    match = PATTERN_DETECTOR_FILENAME.match(filename)
+    if match:
+        kind, detector_index = match.groups()
+        if kind == "intens":
+            return PenepmaEmittedIntensityResult(int(detector_index))
+        else:
+            return PenepmaSpectrumResult(int(detector_index))
+
+    match = PATTERN_ENERGY_FILENAME.match(filename)
+    if match:
+        kpar_suffix, direction = match.groups()
+        kpar = KPAR.ELECTRON if kpar_suffix == "el" else KPAR.PHOTON
+        return PenepmaEnergyResult(kpar, direction)
+
+    return None
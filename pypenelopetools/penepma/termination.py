@@ -0,0 +1,281 @@
+"""
+Termination of PENEPMA simulations based on the statistical uncertainty of
+several x-ray lines.
+
+The keyword :class:`REFLIN <pypenelopetools.penepma.keywords.REFLIN>` stops
+PENEPMA when the intensity of a single x-ray line in a single detector reaches
+a relative uncertainty.
+A :class:`TerminationController` watches the intensities
+(``pe-intens-XX.dat``) written by running simulations and stops them as soon
+as the intensities of all the specified x-ray lines reach their target.
+The simulation time (:class:`TIME <pypenelopetools.penelope.keywords.TIME>`)
+and number of showers (:class:`NSIMSH <pypenelopetools.penelope.keywords.NSIMSH>`)
+of the input remain upper limits.
+
+Example:
+    Simulate until Cu Ka1 and Cu La1 are known within 1% (3 sigma), on 8 cores::
+
+        controller = TerminationController(
+            [
+                UncertaintyTarget(pyxray.xray_line(29, "Ka1"), 1, 0.01),
+                UncertaintyTarget(pyxray.xray_line(29, "La1"), 1, 0.01),
+            ]
+        )
+        job = Job(PenepmaProgram(), input, "/simulation/epma1", geometry, ["Cu.mat"])
+        results = controller.run(job, count=8)
+"""
+
+# Standard library modules.
+import math
+import concurrent.futures
+
+# Third party modules.
+
+# Local modules.
+from pypenelopetools.penelope.result import merge_results
+from pypenelopetools.penelope.runner import (
+    LocalScheduler,
+    JobStatus,
+    JobError,
+    split_job,
+)
+from pypenelopetools.penepma.results import (
+    PenepmaResult,
+    PenepmaEmittedIntensityResult,
+)
+from pypenelopetools.penepma.watcher import PenepmaWatcher
+
+# Globals and constants variables.
+
+
+class UncertaintyTarget(object):
+    """
+    Target relative uncertainty of the total intensity of an x-ray line
+    measured by a photon detector.
+
+    Args:
+        xrayline (:obj:`XrayLine`): X-ray line.
+        detector_index (int): Index of the photon detector.
+        relative_uncertainty (float): Relative statistical uncertainty
+            (3 sigma), as the tolerance of :class:`REFLIN <pypenelopetools.penepma.keywords.REFLIN>`.
+
+    Attributes:
+        xrayline (:obj:`XrayLine`): X-ray line.
+        detector_index (int): Index of the photon detector.
+        relative_uncertainty (float): Relative statistical uncertainty (3 sigma).
+    """
+
+    def __init__(self, xrayline, detector_index, relative_uncertainty):
+        if relative_uncertainty <= 0.0:
+            raise ValueError("Relative uncertainty must be greater than zero")
+
+        self.xrayline = xrayline
+        self.detector_index = detector_index
+        self.relative_uncertainty = relative_uncertainty
+
+    def __repr__(self):
+        return "<{0}({1}, detector={2}, {3:g})>".format(
+            self.__class__.__name__,
+            self.xrayline,
+            self.detector_index,
+            self.relative_uncertainty,
+        )
+
+    def get_uncertainty(self, results):
+        """
+        Returns the current relative uncertainty (3 sigma) of the x-ray line.
+
+        Args:
+            results (dict(str, :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`)):
+                Results of a simulation.
+                Dictionary where the keys are file names and the values, results.
+
+        Returns:
+            float: Relative uncertainty or infinity if the intensity is not
+            known yet or is zero.
+        """
+        filename = PenepmaEmittedIntensityResult(self.detector_index).filename
+        result = results.get(filename)
+        if result is None:
+            return math.inf
+
+        intensity = result.total_intensities_1_per_sr_electron.get(self.xrayline)
+        if intensity is None or intensity.n <= 0.0:
+            return math.inf
+
+        return 3.0 * intensity.s / intensity.n
+
+    def is_reached(self, results):
+        """
+        Returns whether the uncertainty of the x-ray line is at most the target.
+
+        Args:
+            results (dict(str, :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`)):
+                Results of a simulation.
+        """
+        return self.get_uncertainty(results) <= self.relative_uncertainty
+
+
+class TerminationController(object):
+    """
+    Stops PENEPMA simulations once all targets are reached.
+
+    Args:
+        targets (iterable(:class:`UncertaintyTarget`)): Targets.
+        interval_s (float, optional): Interval in seconds between two checks of
+            the intensities. It is also used as dump interval
+            (:class:`DUMPP <pypenelopetools.penelope.keywords.DUMPP>`) of the
+            jobs that are not checkpointed, since PENEPMA only rewrites its
+            results when it dumps its state.
+
+    Attributes:
+        targets (list(:class:`UncertaintyTarget`)): Targets.
+        interval_s (float): Interval in seconds between two checks.
+    """
+
+    def __init__(self, targets, interval_s=30.0):
+        self.targets = list(targets)
+        if not self.targets:
+            raise ValueError("At least one target is required")
+        self.interval_s = interval_s
+
+    def __repr__(self):
+        return "<{0}({1} targets)>".format(self.__class__.__name__, len(self.targets))
+
+    @property
+    def detector_indexes(self):
+        """list(int): Indexes of the photon detectors of the targets."""
+        return sorted(set(target.detector_index for target in self.targets))
+
+    def get_uncertainties(self, results):
+        """
+        Returns the current relative uncertainty of each target.
+
+        Args:
+            results (dict(str, :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`)):
+                Results of a simulation, e.g. :attr:`PenepmaSnapshot.results <pypenelopetools.penepma.watcher.PenepmaSnapshot>`.
+
+        Returns:
+            dict(:class:`UncertaintyTarget`, float): Dictionary where the keys
+            are the targets and the values, relative uncertainties (3 sigma).
+        """
+        return dict(
+            (target, target.get_uncertainty(results)) for target in self.targets
+        )
+
+    def is_converged(self, results):
+        """
+        Returns whether all targets are reached.
+
+        Args:
+            results (dict(str, :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`)):
+                Results of a simulation.
+        """
+        return all(target.is_reached(results) for target in self.targets)
+
+    def create_watcher(self, dirpath):
+        """
+        Returns a watcher of the result files needed to check the targets.
+
+        Args:
+            dirpath (str): Path of the simulation directory.
+
+        Returns:
+            :class:`PenepmaWatcher <pypenelopetools.penepma.watcher.PenepmaWatcher>`:
+            Watcher.
+        """
+        return PenepmaWatcher(
+            dirpath, self.detector_indexes, self.interval_s, use_inotify=False
+        )
+
+    def _read_current_results(self, jobs, watchers):
+        results_list = []
+
+        for job in jobs:
+            if job.attempts == 0:
+                continue  # Not started yet
+
+            watcher = watchers[job]
+            watcher.refresh()
+
+            results = watcher.results
+            if PenepmaResult().filename in results:
+                results_list.append(results)
+
+        if not results_list:
+            return {}
+
+        return merge_results(results_list)
+
+    def run(self, job, count=1, max_workers=None):
+        """
+        Runs a simulation until all targets are reached, or until the
+        simulation ends by itself.
+        If *count* is greater than one, the simulation is split in *count*
+        independent simulations
+        (see :func:`split_job <pypenelopetools.penelope.runner.split_job>`)
+        whose results are merged to check the targets.
+        Once the targets are reached, the running simulations are stopped
+        and the queued ones are not started.
+        A simulation stopped while writing its results keeps the results
+        last read to check the targets.
+
+        Args:
+            job (:class:`Job <pypenelopetools.penelope.runner.Job>`): Job to run.
+            count (int, optional): Number of simulations.
+            max_workers (int, optional): Number of simulations running at the
+                same time. Defaults to *count*.
+
+        Returns:
+            dict(str, :class:`PenelopeResultBase <pypenelopetools.penelope.result.PenelopeResultBase>`):
+            Results, merged if the simulation was split.
+            They are also stored in :attr:`Job.results <pypenelopetools.penelope.runner.Job.results>`
+            of *job*.
+
+        Raises:
+            JobError: If one of the simulations fails.
+        """
+        if count > 1:
+            jobs = split_job(job, count)
+        else:
+            jobs = [job]
+
+        for split in jobs:
+            if split.dump_interval_s is None:
+                split.dump_interval_s = self.interval_s
+
+        watchers = dict((split, self.create_watcher(split.workdir)) for split in jobs)
+
+        with LocalScheduler(max_workers or count) as scheduler:
+            futures = [scheduler.submit(split) for split in jobs]
+
+            while True:
+                _done, not_done = concurrent.futures.wait(futures, self.interval_s)
+                if not not_done:
+                    break
+
+                if self.is_converged(self._read_current_results(jobs, watchers)):
+                    for split in jobs:
+                        scheduler.terminate(split)
+                    break
+
+        if count > 1:
+            job.attempts = sum(split.attempts for split in jobs)
+
+        results_list = []
+        for split in jobs:
+            if split.status is JobStatus.SUCCEEDED:
+                # Results partially written when terminated: use the last
+                # results read to check the targets
+                if not split.results:
+                    split.results = dict(watchers[split].results)
+
+                if split.results:
+                    results_list.append(split.results)
+            elif split.status is not JobStatus.CANCELLED or split.attempts > 0:
+                job.status = split.status
+                raise JobError(split)
+
+        job.results = merge_results(results_list)
+        job.status = JobStatus.SUCCEEDED
+        return job.results
@@ -0,0 +1,105 @@
+"""
+Monitoring of a running PENEPMA simulation.
+"""
+
+# Standard library modules.
+
+# Third party modules.
+
+# Local modules.
+from pypenelopetools.penelope.watcher import ResultWatcher, ResultSnapshot
+from pypenelopetools.penepma.results import (
+    PenepmaResult,
+    PenepmaEmittedIntensityResult,
+)
+
+# Globals and constants variables.
+
+
+class PenepmaSnapshot(ResultSnapshot):
+    """
+    State of the results of a PENEPMA simulation at a given time.
+    Values are ``None`` until the corresponding file was parsed once.
+    """
+
+    @property
+    def result(self):
+        """:class:`PenepmaResult <pypenelopetools.penepma.results.PenepmaResult>`: Result from ``penepma-res.dat``."""
+        return self.results.get(PenepmaResult().filename)
+
+    @property
+    def simulated_primary_showers(self):
+        """ufloat: Number of primary showers simulated."""
+        result = self.result
+        return result.simulated_primary_showers if result is not None else None
+
+    @property
+    def simulation_time_s(self):
+        """ufloat: Simulation time in seconds."""
+        result = self.result
+        return result.simulation_time_s if result is not None else None
+
+    @property
+    def simulation_speed_1_per_s(self):
+        """ufloat: Simulation speed in showers per second."""
+        result = self.result
+        return result.simulation_speed_1_per_s if result is not None else None
+
+    @property
+    def reference_line_uncertainty(self):
+        """ufloat: Relative uncertainty of the x-ray line used as a termination condition."""
+        result = self.result
+        return result.reference_line_uncertainty if result is not None else None
+
+    @property
+    def intensities(self):
+        """
+        dict(int, :class:`PenepmaEmittedIntensityResult <pypenelopetools.penepma.results.PenepmaEmittedIntensityResult>`):
+        Emitted intensities. Dictionary where the keys are detector indexes
+        and the values, the intensity results.
+        """
+        intensities = {}
+        for result in self.results.values():
+            if isinstance(result, PenepmaEmittedIntensityResult):
+                intensities[result.detector_index] = result
+        return intensities
+
+
+class PenepmaWatcher(ResultWatcher):
+    """
+    Watches ``penepma-res.dat`` and the ``pe-intens-XX.dat`` of the specified
+    detectors.
+
+    Args:
+        dirpath (str): Path of the simulation directory.
+        detector_indexes (iterable(int), optional): Indexes of the photon
+            detectors whose intensities are watched.
+        interval_s (float, optional): Polling interval in seconds.
+        use_inotify (bool, optional): Whether to use inotify when it is
+            available.
+    """
+
+    def __init__(self, dirpath, detector_indexes=(), interval_s=5.0, use_inotify=True):
+        results = [PenepmaResult()]
+        for detector_index in detector_indexes:
+            results.append(PenepmaEmittedIntensityResult(detector_index))
+
+        super().__init__(dirpath, results, interval_s, use_inotify)
+
+    @classmethod
+    def from_input(cls, dirpath, input, interval_s=5.0, use_inotify=True):
+        """
+        Creates a watcher for all the photon detectors defined in a
+        :class:`PenepmaInput <pypenelopetools.penepma.input.PenepmaInput>`.
+
+        Args:
+            dirpath (str): Path of the simulation directory.
+            input (:class:`PenepmaInput <pypenelopetools.penepma.input.PenepmaInput>`):
+                Input of the simulation.
+        """
+        (detectors,) = input.photon_detectors.get()
+        detector_indexes = range(1, len(detectors) + 1)
+        return cls(dirpath, detector_indexes, interval_s, use_inotify)
+
+    def _create_snapshot(self, timestamp, results, changed_filenames):
+        return PenepmaSnapshot(self.dirpath, timestamp, results, changed_filenames)
@@ -4,12 +4,14 @@ Definition of base PENGEOM classes.
 
 # Standard library modules.
 import abc
+import collections
 import math
-import re
 
 # Third party modules.
 
 # Local modules.
+
+# Globals and constants variables.
 LINE_SIZE = 64
 LINE_KEYWORDS_SIZE = 8
 LINE_EXTRA = "1" * LINE_SIZE
@@ -17,10 +19,149 @@ LINE_START = "X" * LINE_SIZE
 LINE_SEPARATOR = "0" * LINE_SIZE
 LINE_END = "END      0000000000000000000000000000000000000000000000000000000"
 
-PATTERN_LINE = re.compile(r"([A-Z= ]{8})\(([0-9\-\+\, ]*)\)(.*)")
-PATTERN_EXPLINE = re.compile(r"([A-Z0-9\-= ]{8})\(([0-9\+\-\.Ee ]*)\,([0-9 ]{4})\)(.*)")
+LINE_KEYWORDS = frozenset(["SURFACE", "MODULE", "MATERIAL", "INDICES="])
 
-# Globals and constants variables.
+GeoRecord = collections.namedtuple("GeoRecord", ["keyword", "value", "termination"])
+GeoRecord.__doc__ = """
+Parsed line of a geometry file.
+The value is a :obj:`str` for the lines with integer(s) between parentheses
+(e.g. ``INDICES=``, ``MATERIAL``) and a :obj:`float` for the lines with a
+value in exponent format (e.g. ``X-SHIFT=``).
+"""
+
+GeoSection = collections.namedtuple(
+    "GeoSection", ["keyword", "index", "description", "records", "extra_records"]
+)
+GeoSection.__doc__ = """
+Parsed ``SURFACE`` or ``MODULE`` section of a geometry file.
+The records after the line of ones (``1111...``), if any, are stored in
+*extra_records*.
+"""
+
+
+def _parse_line(line):
+    # Fixed layout: 8-character keyword, then text between parentheses.
+    # String methods are several times faster than regular expressions.
+    end = line.find(")", LINE_KEYWORDS_SIZE)
+    if line[LINE_KEYWORDS_SIZE : LINE_KEYWORDS_SIZE + 1] != "(" or end < 0:
+        raise IOError('Cannot parse line: "{0}"'.format(line))
+
+    keyword = line[:LINE_KEYWORDS_SIZE].strip()
+    text = line[LINE_KEYWORDS_SIZE + 1 : end].strip()
+    termination = line[end + 1 :].strip()
+    return keyword, text, termination
+
+
+def parse_record(line):
+    """
+    Parses a line of a geometry file.
+
+    Args:
+        line (str): Line, stripped of its trailing white spaces.
+
+    Returns:
+        :obj:`GeoRecord`: Parsed line.
+    """
+    keyword, text, termination = _parse_line(line)
+    if keyword in LINE_KEYWORDS:
+        return GeoRecord(keyword, text, termination)
+
+    value, _, index = text.partition(",")
+    try:
+        value = float(value)
+        index = int(index)
+    except ValueError:
+        raise IOError('Cannot parse line: "{0}"'.format(line))
+
+    if index != 0:
+        raise RuntimeError("Index different than zero is not supported: " + line)
+
+    return GeoRecord(keyword, value, termination)
+
+
+def iter_records(lines):
+    """
+    Parses lines up to the next separator line (``0000...``).
+    The separator line is consumed.
+
+    Args:
+        lines (iterator(str)): Iterator over the lines of a file.
+
+    Yields:
+        :obj:`GeoRecord`: Parsed line.
+    """
+    for line in lines:
+        line = line.rstrip()
+        if line == LINE_SEPARATOR:
+            return
+        yield parse_record(line)
+
+
+def read_title(lines):
+    """
+    Reads the header of a geometry file, from the start line (``XXXX...``) to
+    the first separator line (``0000...``).
+
+    Args:
+        lines (iterator(str)): Iterator over the lines of a file.
+
+    Returns:
+        str: Title of the geometry.
+    """
+    line = next(lines, "").rstrip()
+    if line != LINE_START:
+        raise IOError("Expected start line")
+
+    title = ""
+    for line in lines:
+        line = line.rstrip()
+        if line == LINE_SEPARATOR:
+            return title
+        title += line.lstrip("C").strip()
+
+    raise IOError("Unexpected end of file in title")
+
+
+def iter_sections(lines):
+    """
+    Parses the ``SURFACE`` and ``MODULE`` sections of a geometry file up to
+    the end line.
+    Each line is read only once, so the lines can come from a non-seekable
+    stream.
+
+    Args:
+        lines (iterator(str)): Iterator over the lines of a file, positioned
+            after the title (see :func:`read_title`).
+
+    Yields:
+        :obj:`GeoSection`: Parsed section.
+    """
+    lines = iter(lines)
+
+    for line in lines:
+        line = line.rstrip()
+        if line == LINE_END:
+            return
+
+        keyword, index, description = _parse_line(line)
+
+        records = []
+        extra_records = []
+        current = records
+        for line in lines:
+            line = line.rstrip()
+            if line == LINE_SEPARATOR:
+                break
+            elif line == LINE_EXTRA:
+                current = extra_records
+            else:
+                current.append(parse_record(line))
+        else:
+            raise IOError("Unexpected end of file in {0} section".format(keyword))
+
+        yield GeoSection(keyword, int(index), description, records, extra_records)
+
+    raise IOError("Expected end line")
 
 
 def _toexponent(number):
@@ -90,67 +231,6 @@ class GeometryBase(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError
 
-    def _peek_next_line(self, fileobj):
-        """
-        Returns the next line without advancing the current position.
-
-        Args:
-            fileobj (file object): File object opened with read access.
-
-        Returns:
-            str: Next line, stripped of all trailing white spaces.
-        """
-        # Remember the current position
-        offset = fileobj.tell()
-
-        # Read line
-        line = self._read_next_line(fileobj)
-
-        # Roll back to previous position
-        fileobj.seek(offset)
-
-        return line
-
-    def _read_next_line(self, fileobj):
-        """
-        Returns the next line and advances the current position.
-
-        Args:
-            fileobj (file object): File object opened with read access.
-
-        Returns:
-            str: Next line, stripped of all trailing white spaces.
-        """
-        return fileobj.readline().rstrip()
-
-    def _parse_line(self, line):
-        match = PATTERN_LINE.match(line)
-        if not match:
-            raise IOError('Cannot parse line: "{0}"'.format(line))
-
-        keyword, text, termination = match.groups()
-        keyword = keyword.strip()
-        text = text.strip()
-        termination = termination.strip()
-
-        return keyword, text, termination
-
-    def _parse_expline(self, line):
-        match = PATTERN_EXPLINE.match(line)
-        if not match:
-            raise IOError('Cannot parse line: "{0}"'.format(line))
-
-        keyword, value, index, termination = match.groups()
-        keyword = keyword.strip()
-        value = float(value)
-        index = int(index)
-        termination = termination.strip()
-
-        if index != 0:
-            raise RuntimeError("Index different than zero is not supported: " + line)
-
-        return keyword, value, termination
-
     @abc.abstractmethod
     def _write(self, fileobj, index_lookup):  # pragma: no cover
         """
@@ -0,0 +1,627 @@
+"""
+Compiled representation of a geometry for fast queries (e.g. point location).
+"""
+
+# Standard library modules.
+import math
+import concurrent.futures
+
+# Third party modules.
+import numpy as np
+
+# Local modules.
+from pypenelopetools.pengeom.module import Module
+from pypenelopetools.pengeom.surface import SurfaceImplicit, SurfaceReduced
+from pypenelopetools.pengeom.transformation import Shift
+from pypenelopetools.material import VACUUM
+
+# Globals and constants variables.
+QUADRIC_TERMS = ("xx", "xy", "xz", "yy", "yz", "zz", "x", "y", "z", "0")
+"""Order of the coefficients of the compiled quadrics."""
+
+DEFAULT_CHUNK_SIZE = 65536
+"""Default number of points evaluated at once."""
+
+SURFACE_KEY_DIGITS = 12
+"""Number of significant digits of the coefficients compared by
+:func:`get_surface_key`."""
+
+SURFACE_KEY_NOISE = 1e-14
+"""Coefficients smaller than this fraction of the largest coefficient are
+considered null by :func:`get_surface_key` (rounding errors of rotations)."""
+
+IDENTITY = (np.identity(3), np.zeros(3))
+
+
+def _rotation_z(angle_deg):
+    c = math.cos(math.radians(angle_deg))
+    s = math.sin(math.radians(angle_deg))
+    return np.array([[c, -s, 0.0], [s, c, 0.0], [0.0, 0.0, 1.0]])
+
+
+def _rotation_y(angle_deg):
+    c = math.cos(math.radians(angle_deg))
+    s = math.sin(math.radians(angle_deg))
+    return np.array([[c, 0.0, s], [0.0, 1.0, 0.0], [-s, 0.0, c]])
+
+
+def get_rotation_matrix(rotation):
+    """
+    Returns the matrix of a rotation.
+    As in PENGEOM, the rotation is applied in three steps: a rotation of
+    *omega* around the z-axis, then of *theta* around the y-axis and finally
+    of *phi* around the z-axis.
+
+    Args:
+        rotation (:obj:`Rotation <pypenelopetools.pengeom.transformation.Rotation>`):
+            Rotation.
+
+    Returns:
+        :class:`numpy.ndarray`: 3x3 rotation matrix.
+    """
+    return (
+        _rotation_z(rotation.phi_deg)
+        @ _rotation_y(rotation.theta_deg)
+        @ _rotation_z(rotation.omega_deg)
+    )
+
+
+def get_transformation(rotation, shift):
+    """
+    Returns the affine transformation ``r -> matrix @ r + vector`` of a
+    rotation followed by a shift.
+
+    Args:
+        rotation (:obj:`Rotation <pypenelopetools.pengeom.transformation.Rotation>`):
+            Rotation.
+        shift (:obj:`Shift <pypenelopetools.pengeom.transformation.Shift>`):
+            Shift.
+
+    Returns:
+        tuple: matrix (3x3) and vector (3)
+    """
+    vector = np.array([shift.x_cm, shift.y_cm, shift.z_cm], dtype=float)
+    return get_rotation_matrix(rotation), vector
+
+
+def compose_transformations(outer, inner):
+    """
+    Returns the transformation applying *inner* first, then *outer*.
+
+    Args:
+        outer (tuple): matrix and vector of the outer transformation
+        inner (tuple): matrix and vector of the inner transformation
+
+    Returns:
+        tuple: matrix (3x3) and vector (3)
+    """
+    outer_matrix, outer_vector = outer
+    inner_matrix, inner_vector = inner
+    return outer_matrix @ inner_matrix, outer_matrix @ inner_vector + outer_vector
+
+
+def get_quadric(surface):
+    """
+    Returns the quadric ``F(r) = r.A.r + b.r + c`` of a surface, with its
+    scaling (reduced form only), rotation and shift applied.
+
+    Args:
+        surface (:obj:`SurfaceImplicit <pypenelopetools.pengeom.surface.SurfaceImplicit>` or :obj:`SurfaceReduced <pypenelopetools.pengeom.surface.SurfaceReduced>`):
+            Surface.
+
+    Returns:
+        tuple: symmetric matrix A (3x3), vector b (3) and constant c
+    """
+    if isinstance(surface, SurfaceReduced):
+        i1, i2, i3, i4, i5 = surface.indices
+        scale = surface.scale
+        matrix = np.diag([i1 / scale.x**2, i2 / scale.y**2, i3 / scale.z**2])
+        vector = np.array([0.0, 0.0, i4 / scale.z])
+        constant = float(i5)
+
+    elif isinstance(surface, SurfaceImplicit):
+        a = surface.coefficients
+        matrix = np.array(
+            [
+                [a["xx"], a["xy"] / 2, a["xz"] / 2],
+                [a["xy"] / 2, a["yy"], a["yz"] / 2],
+                [a["xz"] / 2, a["yz"] / 2, a["zz"]],
+            ],
+            dtype=float,
+        )
+        vector = np.array([a["x"], a["y"], a["z"]], dtype=float)
+        constant = float(a["0"])
+
+    else:
+        raise ValueError("Unknown surface: {0!r}".format(surface))
+
+    transformation = get_transformation(surface.rotation, surface.shift)
+    return transform_quadric((matrix, vector, constant), transformation)
+
+
+def transform_quadric(quadric, transformation):
+    """
+    Returns the quadric of the surface moved by an affine transformation.
+
+    Args:
+        quadric (tuple): matrix A, vector b and constant c
+        transformation (tuple): matrix and vector of the transformation
+
+    Returns:
+        tuple: matrix A (3x3), vector b (3) and constant c
+    """
+    matrix, vector, constant = quadric
+    rotation, shift = transformation
+
+    # F'(r) = F(R^T (r - T))
+    new_matrix = rotation @ matrix @ rotation.T
+    rotated_vector = rotation @ vector
+    new_vector = rotated_vector - 2.0 * new_matrix @ shift
+    new_constant = constant + shift @ new_matrix @ shift - rotated_vector @ shift
+
+    return new_matrix, new_vector, float(new_constant)
+
+
+def get_quadric_coefficients(quadric):
+    """
+    Returns the coefficients of a quadric in the order of
+    :data:`QUADRIC_TERMS`.
+
+    Args:
+        quadric (tuple): matrix A, vector b and constant c
+
+    Returns:
+        :class:`numpy.ndarray`: 10 coefficients
+    """
+    matrix, vector, constant = quadric
+    return np.array(
+        [
+            matrix[0, 0],
+            2.0 * matrix[0, 1],
+            2.0 * matrix[0, 2],
+            matrix[1, 1],
+            2.0 * matrix[1, 2],
+            matrix[2, 2],
+            vector[0],
+            vector[1],
+            vector[2],
+            constant,
+        ]
+    )
+
+
+def get_surface_key(surface):
+    """
+    Returns a key identifying the quadric of a surface, after its scaling,
+    rotation and shift.
+    Surfaces with the same key are numerically identical and define the same
+    sides.
+    The coefficients are divided by their largest absolute value and rounded
+    to :data:`SURFACE_KEY_DIGITS` significant digits, so surfaces whose
+    equations only differ by a positive factor have the same key.
+    Surfaces with opposite orientations (e.g. ``z - 1 = 0`` and
+    ``1 - z = 0``) have different keys.
+
+    Args:
+        surface (:obj:`SurfaceImplicit <pypenelopetools.pengeom.surface.SurfaceImplicit>` or :obj:`SurfaceReduced <pypenelopetools.pengeom.surface.SurfaceReduced>`):
+            Surface.
+
+    Returns:
+        tuple: 10 normalized coefficients
+    """
+    coefficients = get_quadric_coefficients(get_quadric(surface))
+    scale = np.abs(coefficients).max()
+    if scale > 0.0:
+        coefficients = coefficients / scale
+    coefficients[np.abs(coefficients) < SURFACE_KEY_NOISE] = 0.0
+
+    template = "{{:.{0:d}e}}".format(SURFACE_KEY_DIGITS - 1)
+    return tuple(float(template.format(value)) for value in coefficients)
+
+
+def evaluate_quadrics(coefficients, points):
+    """
+    Evaluates quadrics at points.
+
+    Args:
+        coefficients (:class:`numpy.ndarray`): Coefficients of S quadrics,
+            array of shape (S, 10) (see :data:`QUADRIC_TERMS`).
+        points (:class:`numpy.ndarray`): Array of shape (N, 3).
+
+    Returns:
+        :class:`numpy.ndarray`: Values, array of shape (N, S).
+    """
+    return _get_terms(points) @ np.asarray(coefficients).T
+
+
+def evaluate_quadric_pairs(coefficients, points):
+    """
+    Evaluates quadrics at points, for pairs of quadrics and points.
+
+    Args:
+        coefficients (:class:`numpy.ndarray`): Coefficients of N quadrics,
+            array of shape (N, 10) (see :data:`QUADRIC_TERMS`).
+        points (:class:`numpy.ndarray`): Array of shape (N, 3).
+
+    Returns:
+        :class:`numpy.ndarray`: Values, array of N values.
+    """
+    return np.einsum("ij,ij->i", _get_terms(points), np.asarray(coefficients))
+
+
+def _get_terms(points):
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    x, y, z = points[:, 0], points[:, 1], points[:, 2]
+    return np.column_stack(
+        [x * x, x * y, x * z, y * y, y * z, z * z, x, y, z, np.ones_like(x)]
+    )
+
+
+def map_chunks(func, args, max_workers=None):
+    """
+    Calls a function for each chunk of work, in this process or in worker
+    processes, and yields the results in the order of the chunks.
+    If the iteration is stopped early (e.g. :meth:`close`), the chunks not
+    yet started are cancelled.
+
+    Args:
+        func (callable): Function, defined at module level to be picklable.
+        args (list(tuple)): Arguments of the function for each chunk.
+        max_workers (int, optional): Number of worker processes.
+            If ``1`` or if there is a single chunk, the function is called in
+            this process.
+            If ``None``, the number of processors is used.
+
+    Yields:
+        Result of the function for each chunk.
+    """
+    args = list(args)
+    if max_workers == 1 or len(args) <= 1:
+        for chunk_args in args:
+            yield func(*chunk_args)
+        return
+
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers)
+    try:
+        futures = [executor.submit(func, *chunk_args) for chunk_args in args]
+        for future in futures:
+            yield future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+class CompiledGeometry(object):
+    """
+    Flat array representation of a geometry.
+    Modules are identified by their index in the geometry file.
+    Index 0 stands for the region outside all modules, so arrays over the
+    modules have one more entry than the number of modules and can be
+    indexed directly with the results of :meth:`locate`.
+
+    Args:
+        quadrics (:class:`numpy.ndarray`):
+            Coefficients of the S compiled surfaces, array of shape (S, 10)
+            (see :data:`QUADRIC_TERMS`).
+        surface_indices (:class:`numpy.ndarray`):
+            Index in the geometry file of each compiled surface.
+            A surface used by modules with different transformations is
+            compiled once per transformation.
+        module_offsets (:class:`numpy.ndarray`):
+            Offsets of the surfaces of each module in *module_surfaces*
+            (CSR layout), array of M + 2 integers.
+        module_surfaces (:class:`numpy.ndarray`):
+            Compiled surfaces limiting the modules.
+        module_pointers (:class:`numpy.ndarray`):
+            Side pointer (-1 or 1) of each surface in *module_surfaces*.
+        parents (:class:`numpy.ndarray`):
+            Index of the parent module of each module, -1 for top-level
+            modules and the outside region.
+        material_indices (:class:`numpy.ndarray`):
+            Material index of each module, 0 for vacuum and the outside
+            region.
+        materials (dict(int, :class:`Material <pypenelopetools.material.Material>`), optional):
+            Materials by index.
+        modules (list(:obj:`Module <pypenelopetools.pengeom.module.Module>`), optional):
+            Modules by index, ``None`` for the outside region.
+        transformations (list(tuple), optional):
+            Matrix and vector of the transformation of each module from its
+            local frame to the global frame (see
+            :func:`get_module_transformations`).
+            Identity transformations by default.
+
+    Attributes:
+        depths (:class:`numpy.ndarray`):
+            Nesting level of each module, 0 for top-level modules and -1 for
+            the outside region.
+    """
+
+    def __init__(
+        self,
+        quadrics,
+        surface_indices,
+        module_offsets,
+        module_surfaces,
+        module_pointers,
+        parents,
+        material_indices,
+        materials=None,
+        modules=None,
+        transformations=None,
+    ):
+        self.quadrics = np.asarray(quadrics, dtype=float).reshape(-1, 10)
+        self.surface_indices = np.asarray(surface_indices, dtype=int)
+        self.module_offsets = np.asarray(module_offsets, dtype=int)
+        self.module_surfaces = np.asarray(module_surfaces, dtype=int)
+        self.module_pointers = np.asarray(module_pointers, dtype=np.int8)
+        self.parents = np.asarray(parents, dtype=int)
+        self.material_indices = np.asarray(material_indices, dtype=int)
+        self.materials = dict(materials or {})
+        self.modules = list(modules or [None] * len(self.parents))
+        self.transformations = list(transformations or [IDENTITY] * len(self.parents))
+
+        if len(self.module_offsets) != len(self.parents) + 1:
+            raise ValueError("Module offsets and parents do not match")
+        if len(self.material_indices) != len(self.parents):
+            raise ValueError("Material indices and parents do not match")
+
+        self.depths = self._calculate_depths(self.parents)
+
+        # Precompute the groups of modules used by contains()
+        counts = np.diff(self.module_offsets)
+        self._bounded_modules = np.flatnonzero(counts > 0)
+        self._bounded_offsets = self.module_offsets[self._bounded_modules]
+        self._levels = [
+            np.flatnonzero(self.depths == depth)
+            for depth in range(1, self.depths.max(initial=0) + 1)
+        ]
+
+    def __repr__(self):
+        return "<{0}({1:d} modules, {2:d} surfaces)>".format(
+            self.__class__.__name__, self.module_count, self.surface_count
+        )
+
+    @staticmethod
+    def _calculate_depths(parents):
+        depths = np.full(len(parents), -2, dtype=int)
+        depths[0] = -1
+
+        for index in range(len(parents)):
+            chain = []
+            while depths[index] == -2:
+                chain.append(index)
+                index = parents[index]
+                if index < 0:
+                    depth = -1
+                    break
+                if len(chain) > len(parents):
+                    raise ValueError("Cyclic module hierarchy")
+            else:
+                depth = depths[index]
+
+            for index in reversed(chain):
+                depth += 1
+                depths[index] = depth
+
+        return depths
+
+    def evaluate_surfaces(self, points):
+        """
+        Evaluates the quadric of each compiled surface at points.
+
+        Args:
+            points (:class:`numpy.ndarray`): Array of shape (N, 3), in cm.
+
+        Returns:
+            :class:`numpy.ndarray`: Values, array of shape (N, S).
+        """
+        return evaluate_quadrics(self.quadrics, points)
+
+    def contains(self, points):
+        """
+        Returns whether points are inside each module.
+        A point is inside a module if it is on the side given by the side
+        pointer of every surface limiting the module and it is inside the
+        parent module.
+        Points inside a submodule are also inside its parent modules.
+
+        Args:
+            points (:class:`numpy.ndarray`): Array of shape (N, 3), in cm.
+
+        Returns:
+            :class:`numpy.ndarray`: Boolean array of shape (N, M + 1).
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        inside = np.zeros((len(points), len(self.parents)), dtype=bool)
+        if len(self._bounded_modules) == 0:
+            return inside
+
+        positive = self.evaluate_surfaces(points) >= 0.0
+        matches = positive[:, self.module_surfaces] == (self.module_pointers > 0)
+        inside[:, self._bounded_modules] = np.logical_and.reduceat(
+            matches, self._bounded_offsets, axis=1
+        )
+
+        for modules in self._levels:
+            inside[:, modules] &= inside[:, self.parents[modules]]
+
+        return inside
+
+    def locate(self, points, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Returns the index of the module containing each point, i.e. the
+        innermost module whose region includes the point, or 0 if the point
+        is outside all modules.
+
+        Args:
+            points (:class:`numpy.ndarray`): Array of shape (N, 3), in cm.
+            chunk_size (int, optional): Number of points evaluated at once.
+
+        Returns:
+            :class:`numpy.ndarray`: Module indexes, array of N integers.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        scores = (self.depths + 1).astype(np.int32)
+
+        located = np.zeros(len(points), dtype=int)
+        for start in range(0, len(points), chunk_size):
+            inside = self.contains(points[start : start + chunk_size])
+            located[start : start + chunk_size] = np.argmax(
+                np.where(inside, scores, 0), axis=1
+            )
+
+        return located
+
+    def locate_materials(self, points, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Returns the material index at each point, 0 for vacuum and outside
+        all modules.
+
+        Args:
+            points (:class:`numpy.ndarray`): Array of shape (N, 3), in cm.
+            chunk_size (int, optional): Number of points evaluated at once.
+
+        Returns:
+            :class:`numpy.ndarray`: Material indexes, array of N integers.
+        """
+        return self.material_indices[self.locate(points, chunk_size)]
+
+    @property
+    def module_count(self):
+        """int: Number of modules (excluding the outside region)."""
+        return len(self.parents) - 1
+
+    @property
+    def surface_count(self):
+        """int: Number of compiled surfaces."""
+        return len(self.quadrics)
+
+
+def get_module_transformations(geometry, modules, parents):
+    """
+    Returns the transformation of each module from its local frame to the
+    global frame: the composition of its own rotation and shift with those
+    of its ancestors, and with the tilt and rotation of the geometry.
+
+    Args:
+        geometry (:obj:`Geometry <pypenelopetools.pengeom.geometry.Geometry>`):
+            Geometry.
+        modules (list): Modules, ``None`` followed by the modules in index
+            order (see :attr:`CompiledGeometry.modules`).
+        parents (:class:`numpy.ndarray`): Index of the parent of each module,
+            -1 for the top-level modules and the outside region.
+
+    Returns:
+        list: Matrix and vector of each module.
+        The first entry is the transformation of the frame of the top-level
+        modules (tilt and rotation of the geometry).
+    """
+    root = IDENTITY
+    if geometry.tilt_deg != 0.0 or geometry.rotation_deg != 0.0:
+        root = get_transformation(geometry._create_extra_rotation(), Shift())
+
+    # From the top-level modules to the innermost ones
+    depths = CompiledGeometry._calculate_depths(parents)
+    transformations = [root] * len(modules)
+    for index in np.argsort(depths, kind="stable")[1:]:
+        module = modules[index]
+        parent = parents[index]
+        outer = root if parent < 0 else transformations[parent]
+        local = get_transformation(module.rotation, module.shift)
+        transformations[index] = compose_transformations(outer, local)
+
+    return transformations
+
+
+def compile_geometry(geometry, index_lookup=None):
+    """
+    Compiles a geometry into flat arrays.
+    The transformations of the modules are applied to their surfaces and
+    submodules, and the tilt and rotation of the geometry to its top-level
+    modules, as in the geometry file written by
+    :meth:`Geometry.write <pypenelopetools.pengeom.geometry.Geometry.write>`.
+
+    Args:
+        geometry (:obj:`Geometry <pypenelopetools.pengeom.geometry.Geometry>`):
+            Geometry.
+        index_lookup (dict, optional):
+            Lookup table of the indexes of the surfaces, modules and
+            materials.
+            If ``None``, the lookup table is generated by
+            :meth:`indexify <pypenelopetools.pengeom.geometry.Geometry.indexify>`.
+
+    Returns:
+        :obj:`CompiledGeometry`: Compiled geometry.
+    """
+    if index_lookup is None:
+        index_lookup = geometry.indexify()
+
+    modules = [None]
+    for obj, index in sorted(
+        (
+            (obj, index)
+            for obj, index in index_lookup.items()
+            if isinstance(obj, Module)
+        ),
+        key=lambda item: item[1],
+    ):
+        if index != len(modules):
+            raise ValueError("Module indexes must be consecutive from 1")
+        modules.append(obj)
+
+    # Hierarchy
+    parents = np.full(len(modules), -1, dtype=int)
+    for index, module in enumerate(modules[1:], 1):
+        for submodule in module.get_modules():
+            subindex = index_lookup[submodule]
+            if parents[subindex] not in (-1, index):
+                raise ValueError(
+                    "Module {0:d} belongs to several modules".format(subindex)
+                )
+            parents[subindex] = index
+
+    transformations = get_module_transformations(geometry, modules, parents)
+
+    # Surfaces
+    quadrics = []
+    surface_indices = []
+    compiled_lookup = {}
+    module_offsets = [0, 0]
+    module_surfaces = []
+    module_pointers = []
+    material_indices = [0]
+
+    for index, module in enumerate(modules[1:], 1):
+        transformation = transformations[index]
+        key = (transformation[0].tobytes(), transformation[1].tobytes())
+
+        for surface in module.get_surfaces():
+            compiled_index = compiled_lookup.get((surface, key))
+            if compiled_index is None:
+                quadric = transform_quadric(get_quadric(surface), transformation)
+                compiled_index = len(quadrics)
+                quadrics.append(get_quadric_coefficients(quadric))
+                surface_indices.append(index_lookup[surface])
+                compiled_lookup[(surface, key)] = compiled_index
+
+            module_surfaces.append(compiled_index)
+            module_pointers.append(int(module.get_surface_pointer(surface)))
+
+        module_offsets.append(len(module_surfaces))
+        material_indices.append(index_lookup[module.material])
+
+    materials = {0: VACUUM}
+    for module in modules[1:]:
+        materials[index_lookup[module.material]] = module.material
+
+    return CompiledGeometry(
+        np.array(quadrics).reshape(-1, 10),
+        surface_indices,
+        module_offsets,
+        module_surfaces,
+        module_pointers,
+        parents,
+        material_indices,
+        materials,
+        modules,
+        transformations,
+    )
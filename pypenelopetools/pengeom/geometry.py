@@ -8,31 +8,78 @@ from itertools import chain
 from operator import methodcaller, attrgetter
 
 # Third party modules.
+import numpy as np
 
 # Local modules.
-from pypenelopetools.pengeom.mixin import ModuleMixin
+from pypenelopetools.pengeom.mixin import ModuleMixin, get_modification_count
 from pypenelopetools.pengeom.module import Module
+from pypenelopetools.pengeom.transformation import Rotation
 from pypenelopetools.pengeom.surface import SurfaceImplicit, SurfaceReduced
+from pypenelopetools.pengeom.compiled import (
+    get_surface_key,
+    get_module_transformations,
+    SURFACE_KEY_DIGITS,
+)
 from pypenelopetools.pengeom.base import (
     GeometryBase,
     LINE_SIZE,
     LINE_START,
     LINE_SEPARATOR,
     LINE_END,
+    read_title,
+    iter_sections,
 )
 from pypenelopetools.material import VACUUM
 
 # Globals and constants variables.
 
 
-def _topological_sort(d, k):
+def _topological_sort(d, keys):
     """
-    Togological sort.
-    http://stackoverflow.com/questions/108586/topological-sort-recursive-using-generators
+    Topological sort of the keys and their dependencies.
+    Dependencies are listed before the keys depending on them and each key
+    is listed only once.
+    The sort is iterative and runs in linear time of the number of keys and
+    dependencies, so deep dependency chains do not hit the recursion limit.
+
+    Args:
+        d (dict): dependencies of each key
+        keys (iterable): keys to sort
+
+    Returns:
+        list: sorted keys
+
+    Raises:
+        ValueError: if the dependencies are cyclic
     """
-    for ii in d.get(k, []):
-        yield from _topological_sort(d, ii)
-    yield k
+    ordered = []
+    done = set()
+    visiting = set()
+
+    for key in keys:
+        if key in done:
+            continue
+
+        visiting.add(key)
+        stack = [(key, iter(d.get(key, ())))]
+        while stack:
+            current, dependencies = stack[-1]
+
+            for dependency in dependencies:
+                if dependency in done:
+                    continue
+                if dependency in visiting:
+                    raise ValueError("Cyclic dependency on {0!r}".format(dependency))
+                visiting.add(dependency)
+                stack.append((dependency, iter(d.get(dependency, ()))))
+                break
+            else:
+                stack.pop()
+                visiting.discard(current)
+                done.add(current)
+                ordered.append(current)
+
+    return ordered
 
 
 class Geometry(ModuleMixin, GeometryBase):
@@ -52,59 +99,51 @@ class Geometry(ModuleMixin, GeometryBase):
         self.title = title
         self.tilt_deg = tilt_deg
         self.rotation_deg = rotation_deg
-        self._modules = set()
+        self._modules = {}
+
+        self._index_lookup = None
+        self._index_lookup_modification_count = None
 
     def _read(self, fileobj, material_lookup, surface_lookup, module_lookup):
-        line = self._read_next_line(fileobj)
-        if line != LINE_START:
-            raise IOError("Expected start line")
-
-        line = self._read_next_line(fileobj)
-        self.title = ""
-        while line != LINE_SEPARATOR:
-            line = line.lstrip("C").strip()
-            self.title += line
-            line = self._read_next_line(fileobj)
-
-        line = self._peek_next_line(fileobj)
-        while line != LINE_END:
-            # Parse section name
-            section_name, index, _ = self._parse_line(line)
-            index = int(index)
+        lines = iter(fileobj)
+        self.title = read_title(lines)
 
+        for section in iter_sections(lines):
             # Parse surface or module
-            if section_name == "SURFACE":
-                # Read 2 lines down the INDICES line
-                offset = fileobj.tell()
-                self._read_next_line(fileobj)
-                indices_line = self._read_next_line(fileobj)
-                _, indices, _ = self._parse_line(indices_line)
-                indices = map(int, indices.split(","))
-                fileobj.seek(offset)
+            if section.keyword == "SURFACE":
+                records = section.records
+                if not records or records[0].keyword != "INDICES=":
+                    raise IOError(
+                        "Expected INDICES in surface {0:d}".format(section.index)
+                    )
+                indices = map(int, records[0].value.split(","))
 
                 if sum(indices) == 0:
                     surface = SurfaceImplicit()
                 else:
                     surface = SurfaceReduced()
 
-                surface._read(fileobj, material_lookup, surface_lookup, module_lookup)
-                surface_lookup[index] = surface
+                surface._read_section(
+                    section, material_lookup, surface_lookup, module_lookup
+                )
+                surface_lookup[section.index] = surface
 
-            elif section_name == "MODULE":
+            elif section.keyword == "MODULE":
                 module = Module()
-                module._read(fileobj, material_lookup, surface_lookup, module_lookup)
+                module._read_section(
+                    section, material_lookup, surface_lookup, module_lookup
+                )
                 self.add_module(module)
-                module_lookup[index] = module
+                module_lookup[section.index] = module
 
             else:
-                raise IOError("Cannot read {} section".format(section_name))
-
-            # Next line
-            line = self._peek_next_line(fileobj).rstrip()
+                raise IOError("Cannot read {} section".format(section.keyword))
 
     def read(self, fileobj, material_lookup):
         """
         Reads a geometry file (``.geo``).
+        The file is read once, line by line, so it can be a non-seekable
+        stream.
 
         Args:
             fileobj (file object):
@@ -126,13 +165,14 @@ class Geometry(ModuleMixin, GeometryBase):
         fileobj.write("       " + self.title + "\n")
         fileobj.write(LINE_SEPARATOR + "\n")
 
-        # Surfaces
-        surfaces = sorted(
-            (index_lookup[surface], surface) for surface in self.get_surfaces()
-        )
+        # Surfaces (identical surfaces share an index and are written once)
+        surfaces = {}
+        for module in self.get_modules():
+            for surface in module.get_surfaces():
+                surfaces.setdefault(index_lookup[surface], surface)
 
-        for _index, surface in surfaces:
-            surface._write(fileobj, index_lookup)
+        for index in sorted(surfaces):
+            surfaces[index]._write(fileobj, index_lookup)
 
         # Modules
         modules = sorted(
@@ -193,53 +233,115 @@ class Geometry(ModuleMixin, GeometryBase):
         materials of this geometry to their index used in the geometry file.
         The lookup table is a dictionary where the keys are surfaces, modules
         and materials instances, and the values, an integer index.
+        Surfaces which are numerically identical once their scale, rotation
+        and shift are applied (see
+        :func:`get_surface_key <pypenelopetools.pengeom.compiled.get_surface_key>`)
+        and which belong to modules with the same rotations and shifts
+        share the same index, so they are only written once in the geometry
+        file.
+
+        The lookup table is cached and only regenerated when modules, surfaces
+        or materials are added, removed or changed.
+        A new dictionary is returned at each call, so it can be modified.
         """
+        modification_count = get_modification_count()
+        if (
+            self._index_lookup is None
+            or self._index_lookup_modification_count != modification_count
+        ):
+            self._index_lookup = self._indexify()
+            self._index_lookup_modification_count = modification_count
+
+        return dict(self._index_lookup)
+
+    def _indexify(self):
+        modules = self.get_modules()
+
+        # Single pass over the modules to collect materials, surfaces and
+        # module dependencies (dictionaries keep the insertion order)
+        materials = {}
+        surfaces = {}
+        modules_dep = {}
+        for module in modules:
+            materials[module.material] = None
+            surfaces.update(dict.fromkeys(module.get_surfaces()))
+            modules_dep[module] = module.get_modules()
+
         index_lookup = {}
 
         # Materials
+        materials.pop(VACUUM, None)
         index_lookup[VACUUM] = 0
-        for i, material in enumerate(self.get_materials(), 1):
+        for i, material in enumerate(materials, 1):
             index_lookup[material] = i
 
-        # Surfaces
-        for i, surface in enumerate(self.get_surfaces(), 1):
-            index_lookup[surface] = i
-
         # Modules
-        modules_dep = {}  # module dependencies
-        for module in self.get_modules():
-            modules_dep.setdefault(module, [])
-            for submodule in module.get_modules():
-                modules_dep[module].append(submodule)
-
-        modules_order = []
-        for module in modules_dep:
-            for dep_module in _topological_sort(modules_dep, module):
-                if dep_module not in modules_order:
-                    modules_order.append(dep_module)
-
+        modules_order = _topological_sort(modules_dep, modules)
         for i, module in enumerate(modules_order, 1):
             index_lookup[module] = i
 
+        # Surfaces, interned on their normalized quadric coefficients and
+        # on the transformations of the modules using them, as PENGEOM
+        # applies the transformation of a module to its surfaces
+        frames = self._get_surface_frames(modules_order, index_lookup)
+        surface_indexes = {}
+        for surface in surfaces:
+            key = (get_surface_key(surface), frames[surface])
+            index_lookup[surface] = surface_indexes.setdefault(
+                key, len(surface_indexes) + 1
+            )
+
         return index_lookup
 
+    def _get_surface_frames(self, modules_order, index_lookup):
+        """
+        Returns the combined transformations of the modules using each
+        surface, rounded as the surface keys.
+        """
+        parents = np.full(len(modules_order) + 1, -1, dtype=int)
+        for i, module in enumerate(modules_order, 1):
+            for submodule in module.get_modules():
+                if submodule in index_lookup:
+                    parents[index_lookup[submodule]] = i
+
+        transformations = get_module_transformations(
+            self, [None] + list(modules_order), parents
+        )
+
+        frames = {}
+        for (matrix, vector), module in zip(transformations[1:], modules_order):
+            values = np.concatenate([matrix.ravel(), vector])
+            frame = tuple(np.round(values, SURFACE_KEY_DIGITS) + 0.0)
+            for surface in module.get_surfaces():
+                frames.setdefault(surface, set()).add(frame)
+
+        return {surface: tuple(sorted(frame)) for surface, frame in frames.items()}
+
     def _create_extra_module(self):
         extra = Module(VACUUM, description="Extra module for rotation and tilt")
 
         ## Find all unlinked modules
-        all_modules = set(self.get_modules())
+        all_modules = self.get_modules()
         linked_modules = set(chain(*map(methodcaller("get_modules"), all_modules)))
-        unlinked_modules = all_modules - linked_modules
-        for module in unlinked_modules:
-            extra.add_module(module)
+        for module in all_modules:
+            if module not in linked_modules:
+                extra.add_module(module)
 
-        ## Change of Euler angles convention from ZXZ to ZYZ
-        extra.rotation.omega_deg = (self.rotation_deg - 90.0) % 360.0
-        extra.rotation.theta_deg = self.tilt_deg
-        extra.rotation.phi_deg = 90.0
+        rotation = self._create_extra_rotation()
+        extra.rotation.omega_deg = rotation.omega_deg
+        extra.rotation.theta_deg = rotation.theta_deg
+        extra.rotation.phi_deg = rotation.phi_deg
 
         return extra
 
+    def _create_extra_rotation(self):
+        ## Change of Euler angles convention from ZXZ to ZYZ
+        return Rotation(
+            omega_deg=(self.rotation_deg - 90.0) % 360.0,
+            theta_deg=self.tilt_deg,
+            phi_deg=90.0,
+        )
+
     @property
     def title(self):
         """
@@ -10,6 +10,30 @@ Mixins used to create geometry objects.
 
 # Globals and constants variables.
 
+_modification_count = 0
+
+
+def _notify_modification():
+    """
+    Increments the modification counter shared by all geometry objects.
+    Must be called whenever a change affects the index lookup of a geometry.
+    """
+    global _modification_count
+    _modification_count += 1
+
+
+def get_modification_count():
+    """
+    Returns the number of modifications affecting index lookups (added or
+    removed modules and surfaces, changed materials) since the start of the
+    interpreter.
+    It is used to invalidate cached index lookups.
+
+    Returns:
+        int: modification count
+    """
+    return _modification_count
+
 
 class DescriptionMixin(object):
     """
@@ -29,6 +53,8 @@ class DescriptionMixin(object):
 class ModuleMixin(object):
     """
     Mixin that adds methods to add, pop and clear modules.
+    Modules are kept in insertion order, so that the indexes and files of a
+    geometry do not depend on hash values.
     """
 
     def add_module(self, module):
@@ -41,7 +67,8 @@ class ModuleMixin(object):
         """
         if module == self:
             raise ValueError("Cannot add this module to this module.")
-        self._modules.add(module)
+        self._modules[module] = None
+        _notify_modification()
 
     def pop_module(self, module):
         """
@@ -51,17 +78,19 @@ class ModuleMixin(object):
             module (:obj:`Module <pypenelopetools.pengeom.module.Module>`):
                 Module to remove.
         """
-        self._modules.discard(module)
+        self._modules.pop(module, None)
+        _notify_modification()
 
     def clear_modules(self):
         """
         Clear all modules.
         """
         self._modules.clear()
+        _notify_modification()
 
     def get_modules(self):
         """
         Returns:
-            tuple: All modules.
+            tuple: All modules, in insertion order.
         """
         return tuple(self._modules)
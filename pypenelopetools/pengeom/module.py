@@ -10,8 +10,17 @@ import enum
 
 # Local modules.
 from pypenelopetools.pengeom.transformation import Rotation, Shift
-from pypenelopetools.pengeom.mixin import DescriptionMixin, ModuleMixin
-from pypenelopetools.pengeom.base import GeometryBase, LINE_EXTRA, LINE_SEPARATOR
+from pypenelopetools.pengeom.mixin import (
+    DescriptionMixin,
+    ModuleMixin,
+    _notify_modification,
+)
+from pypenelopetools.pengeom.base import (
+    GeometryBase,
+    LINE_EXTRA,
+    LINE_SEPARATOR,
+    iter_sections,
+)
 from pypenelopetools.material import VACUUM
 
 # Globals and constants variables.
@@ -49,7 +58,7 @@ class Module(DescriptionMixin, ModuleMixin, GeometryBase):
         self.description = description
 
         self._surfaces = {}
-        self._modules = set()
+        self._modules = {}
 
         self._rotation = Rotation()
         self._shift = Shift()
@@ -65,11 +74,24 @@ class Module(DescriptionMixin, ModuleMixin, GeometryBase):
         )
 
     def _read(self, fileobj, material_lookup, surface_lookup, module_lookup):
-        line = self._read_next_line(fileobj)
-        _, _, self.description = self._parse_line(line)
+        section = next(iter_sections(fileobj))
+        self._read_section(section, material_lookup, surface_lookup, module_lookup)
 
-        line = self._read_next_line(fileobj)
-        keyword, material_index, _ = self._parse_line(line)
+    def _read_section(self, section, material_lookup, surface_lookup, module_lookup):
+        """
+        Sets this module from a parsed section.
+
+        Args:
+            section (:obj:`GeoSection <pypenelopetools.pengeom.base.GeoSection>`):
+                Parsed ``MODULE`` section.
+            material_lookup, surface_lookup, module_lookup (dict):
+                Lookup tables (see
+                :meth:`_read <pypenelopetools.pengeom.base.GeometryBase._read>`).
+        """
+        self.description = section.description
+
+        records = iter(section.records)
+        keyword, material_index, _ = next(records, ("", None, ""))
         if keyword != "MATERIAL":
             raise IOError(
                 'Expected keyword "MATERIAL" instead of "{0}"'.format(keyword)
@@ -80,9 +102,7 @@ class Module(DescriptionMixin, ModuleMixin, GeometryBase):
             raise IOError("No material {0} in lookup table".format(material_index))
         self.material = material_lookup[material_index]
 
-        line = self._read_next_line(fileobj)
-        while line != LINE_EXTRA and line != LINE_SEPARATOR:
-            keyword, index, termination = self._parse_line(line)
+        for keyword, index, termination in records:
             index = int(index)
 
             if keyword == "SURFACE":
@@ -97,14 +117,8 @@ class Module(DescriptionMixin, ModuleMixin, GeometryBase):
             else:
                 raise IOError("Unknown keyword: {0}".format(keyword))
 
-            line = self._read_next_line(fileobj)
-
-        if line == LINE_EXTRA:
-            extra_offset = fileobj.tell()
-            self.rotation._read(fileobj, material_lookup, surface_lookup, module_lookup)
-
-            fileobj.seek(extra_offset)
-            self.shift._read(fileobj, material_lookup, surface_lookup, module_lookup)
+        self.rotation._read_records(section.extra_records)
+        self.shift._read_records(section.extra_records)
 
     def _write(self, fileobj, index_lookup):
         index = index_lookup[self]
@@ -119,13 +133,15 @@ class Module(DescriptionMixin, ModuleMixin, GeometryBase):
         line = self._create_line("MATERIAL", text)
         fileobj.write(line + "\n")
 
-        # Surface pointers
+        # Surface pointers (identical surfaces share an index)
         surfaces = sorted(
-            (index_lookup[surface], surface, pointer)
-            for surface, pointer in self._surfaces.items()
+            set(
+                (index_lookup[surface], int(pointer))
+                for surface, pointer in self._surfaces.items()
+            )
         )
 
-        for index, surface, pointer in surfaces:
+        for index, pointer in surfaces:
             text = "{:4d}".format(index)
             termination = ", SIDE POINTER=({:2d})".format(pointer)
             line = self._create_line("SURFACE", text, termination)
@@ -173,6 +189,7 @@ class Module(DescriptionMixin, ModuleMixin, GeometryBase):
         if surface in self._surfaces:
             raise ValueError("Module already contains this surface.")
         self._surfaces[surface] = pointer
+        _notify_modification()
 
     def pop_surface(self, surface):
         """
@@ -183,12 +200,14 @@ class Module(DescriptionMixin, ModuleMixin, GeometryBase):
                 Surface to remove.
         """
         self._surfaces.pop(surface)
+        _notify_modification()
 
     def clear_surfaces(self):
         """
         Clear all surfaces.
         """
         self._surfaces.clear()
+        _notify_modification()
 
     def get_surface_pointer(self, surface):
         """
@@ -206,10 +225,20 @@ class Module(DescriptionMixin, ModuleMixin, GeometryBase):
     def get_surfaces(self):
         """
         Returns:
-            tuple: All surfaces.
+            tuple: All surfaces, in insertion order.
         """
         return tuple(self._surfaces.keys())
 
+    @property
+    def material(self):
+        """:obj:`Material <pypenelopetools.material.Material>`: Material of the module."""
+        return self._material
+
+    @material.setter
+    def material(self, material):
+        self._material = material
+        _notify_modification()
+
     @property
     def rotation(self):
         """:obj:`Rotation <pypenelopetools.pengeom.transformation.Rotation>`: Rotation of the module."""
@@ -0,0 +1,821 @@
+"""
+Bounding volume hierarchy and batched ray tracing through a compiled
+geometry.
+"""
+
+# Standard library modules.
+import os
+
+# Third party modules.
+import numpy as np
+
+# Local modules.
+from pypenelopetools.pengeom.compiled import (
+    evaluate_quadric_pairs,
+    get_quadric_coefficients,
+    map_chunks,
+    transform_quadric,
+    SURFACE_KEY_NOISE,
+)
+
+# Globals and constants variables.
+DEFAULT_LEAF_SIZE = 4
+"""Default maximum number of modules in a leaf of the hierarchy."""
+
+DEFAULT_CHUNK_SIZE = 4096
+"""Default number of rays traced at once."""
+
+TOLERANCE = 1e-9
+"""Relative tolerance used to classify quadrics."""
+
+
+def _get_quadric_matrices(coefficients):
+    xx, xy, xz, yy, yz, zz, x, y, z, c = coefficients
+    matrix = np.array(
+        [[xx, xy / 2, xz / 2], [xy / 2, yy, yz / 2], [xz / 2, yz / 2, zz]]
+    )
+    return matrix, np.array([x, y, z]), c
+
+
+def get_half_space_bounding_box(coefficients, pointer):
+    """
+    Returns a bounding box of the region on one side of a quadric.
+    The box is exact for planes normal to an axis, ellipsoids and cylinders,
+    and infinite along the axes where the region is unbounded or cannot be
+    bounded simply (e.g. hyperboloids).
+
+    Args:
+        coefficients (:class:`numpy.ndarray`): 10 coefficients of the quadric
+            (see :data:`QUADRIC_TERMS <pypenelopetools.pengeom.compiled.QUADRIC_TERMS>`).
+        pointer (int): Side pointer of the region, -1 or 1.
+
+    Returns:
+        tuple: lower and upper corners of the box.
+        The lower corner is greater than the upper one if the region is
+        empty.
+    """
+    lower = np.full(3, -np.inf)
+    upper = np.full(3, np.inf)
+
+    # Region G(r) < 0
+    matrix, vector, constant = _get_quadric_matrices(
+        -pointer * np.asarray(coefficients)
+    )
+    scale = np.abs(matrix).max()
+
+    # Plane
+    if scale <= TOLERANCE * max(np.abs(vector).max(), 1e-300):
+        norm = np.abs(vector).max()
+        axes = np.flatnonzero(np.abs(vector) > TOLERANCE * norm)
+        if len(axes) == 1:
+            axis = axes[0]
+            bound = -constant / vector[axis]
+            if vector[axis] > 0:
+                upper[axis] = bound
+            else:
+                lower[axis] = bound
+        return lower, upper
+
+    eigenvalues, eigenvectors = np.linalg.eigh(matrix)
+    if eigenvalues.min() < -TOLERANCE * scale:
+        return lower, upper  # Indefinite quadric, region unbounded
+
+    null = eigenvalues <= TOLERANCE * scale
+    inverses = np.where(null, 0.0, 1.0 / np.where(null, 1.0, eigenvalues))
+    pseudo_inverse = (eigenvectors * inverses) @ eigenvectors.T
+
+    null_vectors = eigenvectors[:, null]
+    norm = max(np.abs(vector).max(), 1.0)
+    if np.abs(null_vectors.T @ vector).max(initial=0.0) > TOLERANCE * norm:
+        return lower, upper  # Paraboloid
+
+    center = -0.5 * pseudo_inverse @ vector
+    squared = -(constant + 0.5 * vector @ center)
+    if squared < 0.0:
+        return np.full(3, np.inf), np.full(3, -np.inf)  # Empty region
+
+    bounded = np.abs(null_vectors).max(axis=1, initial=0.0) <= TOLERANCE
+    half_widths = np.sqrt(squared * np.clip(np.diag(pseudo_inverse), 0.0, None))
+    lower[bounded] = center[bounded] - half_widths[bounded]
+    upper[bounded] = center[bounded] + half_widths[bounded]
+    return lower, upper
+
+
+def _transform_box(lower, upper, transformation):
+    """
+    Returns the axis-aligned box around a box moved by a transformation,
+    i.e. around its 8 transformed corners.
+    Infinite sides are supported.
+    """
+    if (lower > upper).any():
+        return np.full(3, np.inf), np.full(3, -np.inf)
+
+    # Rounding errors of the rotation must not mix infinite sides
+    matrix, vector = transformation
+    matrix = np.where(np.abs(matrix) < SURFACE_KEY_NOISE, 0.0, matrix)
+
+    with np.errstate(invalid="ignore"):
+        products = np.stack([matrix * lower, matrix * upper])
+    products = np.where(matrix == 0.0, 0.0, products)
+
+    return (
+        vector + products.min(axis=0).sum(axis=1),
+        vector + products.max(axis=0).sum(axis=1),
+    )
+
+
+def _get_surface_boxes(compiled, index):
+    """
+    Returns the boxes of the regions delimited by each surface of a module,
+    in the global frame and in the local frame of the module, as arrays of
+    shape (2, S, 3) for the lower and upper corners.
+    """
+    matrix, vector = compiled.transformations[index]
+    inverse = (matrix.T, -matrix.T @ vector)
+
+    start, stop = compiled.module_offsets[index : index + 2]
+    lowers = np.full((2, stop - start, 3), -np.inf)
+    uppers = np.full((2, stop - start, 3), np.inf)
+    for i, (surface, pointer) in enumerate(
+        zip(compiled.module_surfaces[start:stop], compiled.module_pointers[start:stop])
+    ):
+        coefficients = compiled.quadrics[surface]
+        lowers[0, i], uppers[0, i] = get_half_space_bounding_box(coefficients, pointer)
+
+        quadric = transform_quadric(_get_quadric_matrices(coefficients), inverse)
+        lowers[1, i], uppers[1, i] = get_half_space_bounding_box(
+            get_quadric_coefficients(quadric), pointer
+        )
+
+    return lowers, uppers
+
+
+def _intersect_frames(compiled, index, lowers, uppers):
+    """
+    Returns the intersection of a box in the global frame and a box in the
+    local frame of a module, given as arrays of shape (2, 3).
+    """
+    lower, upper = _transform_box(lowers[1], uppers[1], compiled.transformations[index])
+    return np.maximum(lowers[0], lower), np.minimum(uppers[0], upper)
+
+
+def get_module_bounding_boxes(compiled):
+    """
+    Returns a bounding box of each module of a compiled geometry: the
+    intersection of the boxes of the regions delimited by its surfaces, of
+    the same boxes computed in the local frame of the module (before its
+    rotation and shift, and the tilt and rotation of the geometry) and of
+    the box of its parent module.
+    The local boxes keep the modules of a tilted geometry bounded.
+
+    Args:
+        compiled (:obj:`CompiledGeometry <pypenelopetools.pengeom.compiled.CompiledGeometry>`):
+            Compiled geometry.
+
+    Returns:
+        tuple: lower and upper corners, arrays of shape (M + 1, 3).
+        The first entry (outside region) is infinite.
+    """
+    count = len(compiled.parents)
+    lowers = np.full((count, 3), -np.inf)
+    uppers = np.full((count, 3), np.inf)
+
+    for index in np.argsort(compiled.depths, kind="stable")[1:]:
+        surface_lowers, surface_uppers = _get_surface_boxes(compiled, index)
+        lowers[index], uppers[index] = _intersect_frames(
+            compiled,
+            index,
+            surface_lowers.max(axis=1, initial=-np.inf),
+            surface_uppers.min(axis=1, initial=np.inf),
+        )
+
+        parent = compiled.parents[index]
+        if parent > 0:
+            np.maximum(lowers[index], lowers[parent], out=lowers[index])
+            np.minimum(uppers[index], uppers[parent], out=uppers[index])
+
+    return lowers, uppers
+
+
+def intersect_boxes(origins, inverse_directions, lowers, uppers, max_distance):
+    """
+    Returns whether rays intersect boxes (slab test), for pairs of rays and
+    boxes.
+
+    Args:
+        origins (:class:`numpy.ndarray`): Origins, array of shape (N, 3).
+        inverse_directions (:class:`numpy.ndarray`): Inverse of the
+            components of the directions, array of shape (N, 3).
+        lowers, uppers (:class:`numpy.ndarray`): Corners of the boxes, arrays
+            of shape (N, 3).
+        max_distance (float): Maximum distance along the rays.
+
+    Returns:
+        :class:`numpy.ndarray`: Boolean array of N values.
+    """
+    with np.errstate(invalid="ignore"):
+        t1 = (lowers - origins) * inverse_directions
+        t2 = (uppers - origins) * inverse_directions
+
+    # NaN when a ray is parallel to and on a face: consider the slab crossed
+    near = np.nan_to_num(np.minimum(t1, t2), nan=-np.inf, posinf=np.inf)
+    far = np.nan_to_num(np.maximum(t1, t2), nan=np.inf, neginf=-np.inf)
+
+    near = np.maximum(near.max(axis=1), 0.0)
+    far = np.minimum(far.min(axis=1), max_distance)
+    return near <= far
+
+
+def _expand_ranges(starts, counts):
+    """
+    Returns the concatenation of ``range(start, start + count)``.
+    """
+    total = counts.sum()
+    if total == 0:
+        return np.zeros(0, dtype=int)
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(starts - offsets, counts) + np.arange(total)
+
+
+def find_parent_pairs(compiled, pair_points, pair_modules, selected):
+    """
+    Returns the position of the pair of the same point and of the parent
+    module, for selected pairs of points and modules.
+
+    Args:
+        compiled (:obj:`CompiledGeometry <pypenelopetools.pengeom.compiled.CompiledGeometry>`):
+            Compiled geometry.
+        pair_points, pair_modules (:class:`numpy.ndarray`): Pairs of point
+            indexes and modules, sorted by point and module.
+        selected (:class:`numpy.ndarray`): Positions of the selected pairs.
+
+    Returns:
+        :class:`numpy.ndarray`: Positions of the parent pairs, -1 if the
+        parent module is not paired with the point.
+    """
+    module_count = len(compiled.parents)
+    keys = pair_points * module_count + pair_modules
+    parent_keys = (
+        pair_points[selected] * module_count + compiled.parents[pair_modules[selected]]
+    )
+    if len(keys) == 0:
+        return np.full(len(parent_keys), -1)
+
+    positions = np.minimum(np.searchsorted(keys, parent_keys), len(keys) - 1)
+    return np.where(keys[positions] == parent_keys, positions, -1)
+
+
+class BoundingVolumeHierarchy(object):
+    """
+    Bounding volume hierarchy over boxes, stored in flat arrays.
+    Nodes are split at the median of the box centres along their longest
+    axis.
+
+    Args:
+        lowers, uppers (:class:`numpy.ndarray`): Corners of the boxes,
+            arrays of shape (K, 3).
+        items (:class:`numpy.ndarray`, optional): Item associated with each
+            box. If ``None``, the index of the box.
+        leaf_size (int, optional): Maximum number of boxes in a leaf.
+
+    Attributes:
+        node_lowers, node_uppers (:class:`numpy.ndarray`): Corners of the
+            nodes.
+        node_children (:class:`numpy.ndarray`): Indexes of the two children
+            of each node, -1 for leaves.
+        node_starts, node_counts (:class:`numpy.ndarray`): Range of the items
+            of each leaf in *ordered_items*.
+        ordered_items (:class:`numpy.ndarray`): Items sorted by leaf.
+    """
+
+    def __init__(self, lowers, uppers, items=None, leaf_size=DEFAULT_LEAF_SIZE):
+        lowers = np.asarray(lowers, dtype=float).reshape(-1, 3)
+        uppers = np.asarray(uppers, dtype=float).reshape(-1, 3)
+        if items is None:
+            items = np.arange(len(lowers))
+        items = np.asarray(items, dtype=int)
+
+        # Empty boxes are never hit
+        valid = (lowers <= uppers).all(axis=1)
+        lowers, uppers, items = lowers[valid], uppers[valid], items[valid]
+
+        # Unbounded boxes are sorted as if centred at the origin
+        finite = np.isfinite(lowers) & np.isfinite(uppers)
+        centers = np.zeros_like(lowers)
+        centers[finite] = (lowers[finite] + uppers[finite]) / 2
+
+        node_lowers = []
+        node_uppers = []
+        node_children = []
+        node_starts = []
+        node_counts = []
+        order = np.arange(len(items))
+
+        def add_node(start, stop):
+            members = order[start:stop]
+            node_lowers.append(lowers[members].min(axis=0, initial=np.inf))
+            node_uppers.append(uppers[members].max(axis=0, initial=-np.inf))
+            node_children.append([-1, -1])
+            node_starts.append(start)
+            node_counts.append(stop - start)
+            return len(node_starts) - 1
+
+        stack = [(add_node(0, len(items)), 0, len(items))]
+        while stack:
+            node, start, stop = stack.pop()
+            if stop - start <= leaf_size:
+                continue
+
+            members = order[start:stop]
+            extent = np.ptp(centers[members], axis=0)
+            axis = int(np.argmax(extent))
+            order[start:stop] = members[
+                np.argsort(centers[members, axis], kind="stable")
+            ]
+
+            middle = (start + stop) // 2
+            left = add_node(start, middle)
+            right = add_node(middle, stop)
+            node_children[node] = [left, right]
+            node_counts[node] = 0
+            stack.append((left, start, middle))
+            stack.append((right, middle, stop))
+
+        self.node_lowers = np.array(node_lowers).reshape(-1, 3)
+        self.node_uppers = np.array(node_uppers).reshape(-1, 3)
+        self.node_children = np.array(node_children, dtype=int).reshape(-1, 2)
+        self.node_starts = np.array(node_starts, dtype=int)
+        self.node_counts = np.array(node_counts, dtype=int)
+        self.ordered_items = items[order]
+        self._item_lowers = lowers[order]
+        self._item_uppers = uppers[order]
+
+    def __len__(self):
+        return len(self.ordered_items)
+
+    def _search(self, count, hit):
+        """
+        Traverses the hierarchy breadth first for *count* queries at once.
+        *hit(queries, lowers, uppers)* returns whether each query matches a
+        box.
+        """
+        if len(self.ordered_items) == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+
+        found_queries = []
+        found_positions = []
+
+        queries = np.arange(count)
+        nodes = np.zeros(count, dtype=int)
+        while len(queries):
+            selected = hit(queries, self.node_lowers[nodes], self.node_uppers[nodes])
+            queries, nodes = queries[selected], nodes[selected]
+
+            leaf = self.node_children[nodes, 0] < 0
+            counts = self.node_counts[nodes[leaf]]
+            found_queries.append(np.repeat(queries[leaf], counts))
+            found_positions.append(
+                _expand_ranges(self.node_starts[nodes[leaf]], counts)
+            )
+
+            queries = np.repeat(queries[~leaf], 2)
+            nodes = self.node_children[nodes[~leaf]].ravel()
+
+        queries = np.concatenate(found_queries)
+        positions = np.concatenate(found_positions)
+
+        # Test the boxes of the items
+        selected = hit(
+            queries, self._item_lowers[positions], self._item_uppers[positions]
+        )
+        queries, items = queries[selected], self.ordered_items[positions[selected]]
+
+        order = np.lexsort((items, queries))
+        return queries[order], items[order]
+
+    def query(self, points):
+        """
+        Returns the pairs of points and items whose box contains the point.
+
+        Args:
+            points (:class:`numpy.ndarray`): Array of shape (N, 3).
+
+        Returns:
+            tuple: point indexes and items, arrays of the same length sorted
+            by point.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+
+        def hit(queries, lowers, uppers):
+            xyz = points[queries]
+            return ((lowers <= xyz) & (xyz <= uppers)).all(axis=1)
+
+        return self._search(len(points), hit)
+
+    def intersect(self, origins, directions, max_distance=np.inf):
+        """
+        Returns the pairs of rays and items whose box is crossed by the ray.
+        The hierarchy is traversed breadth first for all rays at once.
+
+        Args:
+            origins (:class:`numpy.ndarray`): Origins, array of shape (N, 3).
+            directions (:class:`numpy.ndarray`): Directions, array of shape
+                (N, 3).
+            max_distance (float, optional): Maximum distance along the rays.
+
+        Returns:
+            tuple: ray indexes and items, arrays of the same length sorted
+            by ray.
+        """
+        origins = np.asarray(origins, dtype=float).reshape(-1, 3)
+        with np.errstate(divide="ignore"):
+            inverse_directions = 1.0 / np.asarray(directions, dtype=float).reshape(
+                -1, 3
+            )
+
+        def hit(rays, lowers, uppers):
+            return intersect_boxes(
+                origins[rays], inverse_directions[rays], lowers, uppers, max_distance
+            )
+
+        return self._search(len(origins), hit)
+
+
+def intersect_quadrics(coefficients, origins, directions):
+    """
+    Returns the distances along rays to the two intersections with quadrics.
+
+    Args:
+        coefficients (:class:`numpy.ndarray`): Coefficients of the quadrics,
+            array of shape (N, 10).
+        origins, directions (:class:`numpy.ndarray`): Rays, arrays of shape
+            (N, 3).
+
+    Returns:
+        :class:`numpy.ndarray`: Distances, array of shape (N, 2), NaN where
+        there is no intersection.
+    """
+    xx, xy, xz, yy, yz, zz, x, y, z, c = np.asarray(coefficients).T
+    ox, oy, oz = np.asarray(origins).T
+    dx, dy, dz = np.asarray(directions).T
+
+    a = xx * dx * dx + xy * dx * dy + xz * dx * dz + yy * dy * dy
+    a += yz * dy * dz + zz * dz * dz
+    b = 2 * xx * ox * dx + xy * (ox * dy + oy * dx) + xz * (ox * dz + oz * dx)
+    b += 2 * yy * oy * dy + yz * (oy * dz + oz * dy) + 2 * zz * oz * dz
+    b += x * dx + y * dy + z * dz
+    c = (
+        xx * ox * ox
+        + xy * ox * oy
+        + xz * ox * oz
+        + yy * oy * oy
+        + yz * oy * oz
+        + zz * oz * oz
+        + x * ox
+        + y * oy
+        + z * oz
+        + c
+    )
+
+    distances = np.full((len(a), 2), np.nan)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        linear = np.abs(a) <= TOLERANCE * np.abs(b)
+        distances[linear, 0] = -c[linear] / b[linear]
+
+        discriminant = b * b - 4 * a * c
+        quadratic = ~linear & (a != 0.0) & (discriminant >= 0.0)
+        a, b, c = a[quadratic], b[quadratic], c[quadratic]
+        q = -0.5 * (b + np.copysign(np.sqrt(discriminant[quadratic]), b))
+        distances[quadratic, 0] = q / a
+        distances[quadratic, 1] = np.where(q != 0.0, c / q, q / a)
+
+    return distances
+
+
+class RaySegments(object):
+    """
+    Segments of rays inside modules, in CSR layout: the segments of ray *i*
+    are ``offsets[i]`` to ``offsets[i + 1]``, ordered along the ray.
+
+    Args:
+        offsets (:class:`numpy.ndarray`): Offsets of the segments of each
+            ray, array of N + 1 integers.
+        modules (:class:`numpy.ndarray`): Module index of each segment.
+        materials (:class:`numpy.ndarray`): Material index of each segment.
+        starts (:class:`numpy.ndarray`): Distance from the origin to the
+            start of each segment (cm).
+        lengths (:class:`numpy.ndarray`): Path length of each segment (cm).
+    """
+
+    def __init__(self, offsets, modules, materials, starts, lengths):
+        self.offsets = np.asarray(offsets, dtype=int)
+        self.modules = np.asarray(modules, dtype=int)
+        self.materials = np.asarray(materials, dtype=int)
+        self.starts = np.asarray(starts, dtype=float)
+        self.lengths = np.asarray(lengths, dtype=float)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def concatenate(cls, segments_list):
+        """
+        Returns the segments of several batches of rays, one after the other.
+
+        Args:
+            segments_list (list(:obj:`RaySegments`)): Batches.
+
+        Returns:
+            :obj:`RaySegments`: Segments.
+        """
+        offsets = [np.zeros(1, dtype=int)]
+        total = 0
+        for segments in segments_list:
+            offsets.append(segments.offsets[1:] + total)
+            total += segments.offsets[-1]
+
+        def concatenate(name):
+            return np.concatenate(
+                [getattr(segments, name) for segments in segments_list] or [np.zeros(0)]
+            )
+
+        return cls(
+            np.concatenate(offsets),
+            concatenate("modules"),
+            concatenate("materials"),
+            concatenate("starts"),
+            concatenate("lengths"),
+        )
+
+    def get_segments(self, index):
+        """
+        Returns the segments of a ray.
+
+        Args:
+            index (int): Index of the ray.
+
+        Returns:
+            list(tuple): module index, material index and path length (cm)
+            of each segment, ordered along the ray.
+        """
+        start, stop = self.offsets[index : index + 2]
+        return list(
+            zip(
+                self.modules[start:stop].tolist(),
+                self.materials[start:stop].tolist(),
+                self.lengths[start:stop].tolist(),
+            )
+        )
+
+    def get_path_lengths(self, material_count=None):
+        """
+        Returns the total path length of each ray in each material.
+
+        Args:
+            material_count (int, optional): Number of columns. If ``None``,
+                the largest material index plus one.
+
+        Returns:
+            :class:`numpy.ndarray`: Path lengths (cm), array of shape
+            (N, material_count).
+        """
+        if material_count is None:
+            material_count = self.materials.max(initial=0) + 1
+
+        rays = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+        path_lengths = np.zeros((len(self), material_count))
+        np.add.at(path_lengths, (rays, self.materials), self.lengths)
+        return path_lengths
+
+
+class RayTracer(object):
+    """
+    Batched ray tracer through a compiled geometry.
+    Rays are only tested against the surfaces of the modules whose bounding
+    box they cross, found with a :class:`BoundingVolumeHierarchy`.
+
+    Args:
+        compiled (:obj:`CompiledGeometry <pypenelopetools.pengeom.compiled.CompiledGeometry>`):
+            Compiled geometry.
+        leaf_size (int, optional): Maximum number of modules in a leaf of the
+            hierarchy.
+    """
+
+    def __init__(self, compiled, leaf_size=DEFAULT_LEAF_SIZE):
+        self.compiled = compiled
+
+        lowers, uppers = get_module_bounding_boxes(compiled)
+        self.module_lowers = lowers
+        self.module_uppers = uppers
+
+        modules = np.arange(1, len(compiled.parents))
+        self.hierarchy = BoundingVolumeHierarchy(
+            lowers[1:], uppers[1:], modules, leaf_size
+        )
+
+    def _contains(self, points, point_indexes, modules):
+        """
+        Returns whether points are inside modules, for pairs of points and
+        modules, considering only the surfaces of each module.
+        """
+        compiled = self.compiled
+        starts = compiled.module_offsets[modules]
+        counts = compiled.module_offsets[modules + 1] - starts
+        positions = _expand_ranges(starts, counts)
+        pairs = np.repeat(np.arange(len(modules)), counts)
+
+        surfaces = compiled.module_surfaces[positions]
+        values = evaluate_quadric_pairs(
+            compiled.quadrics[surfaces], points[point_indexes[pairs]]
+        )
+        matches = (values >= 0.0) == (compiled.module_pointers[positions] > 0)
+
+        # All surfaces of a module must match; modules without surfaces
+        # contain nothing
+        inside = counts > 0
+        failed = pairs[~matches]
+        inside[failed] = False
+        return inside
+
+    def _trace(self, origins, directions, max_distance):
+        compiled = self.compiled
+        ray_count = len(origins)
+
+        # Candidate modules and their surfaces
+        rays, modules = self.hierarchy.intersect(origins, directions, max_distance)
+        starts = compiled.module_offsets[modules]
+        counts = compiled.module_offsets[modules + 1] - starts
+        surface_rays = np.repeat(rays, counts)
+        surfaces = compiled.module_surfaces[_expand_ranges(starts, counts)]
+
+        surface_count = max(len(compiled.quadrics), 1)
+        keys = np.unique(surface_rays * surface_count + surfaces)
+        surface_rays, surfaces = np.divmod(keys, surface_count)
+
+        # Crossings, sorted along each ray
+        distances = intersect_quadrics(
+            compiled.quadrics[surfaces], origins[surface_rays], directions[surface_rays]
+        )
+        crossing_rays = np.repeat(surface_rays, 2)
+        distances = distances.ravel()
+        valid = (distances > 0.0) & (distances < max_distance)
+        crossing_rays, distances = crossing_rays[valid], distances[valid]
+
+        # Intervals between crossings, including the origin and max distance
+        interval_rays = np.concatenate([crossing_rays, np.arange(ray_count)])
+        interval_starts = np.concatenate([distances, np.zeros(ray_count)])
+        order = np.lexsort((interval_starts, interval_rays))
+        interval_rays, interval_starts = interval_rays[order], interval_starts[order]
+
+        interval_stops = np.empty_like(interval_starts)
+        interval_stops[:-1] = interval_starts[1:]
+        last = np.ones(len(interval_rays), dtype=bool)
+        last[:-1] = interval_rays[1:] != interval_rays[:-1]
+        interval_stops[last] = max_distance
+
+        # Module of each interval, from a point inside it
+        middles = np.where(
+            np.isfinite(interval_stops),
+            (interval_starts + interval_stops) / 2,
+            interval_starts + 1.0,
+        )
+        points = origins[interval_rays] + middles[:, np.newaxis] * (
+            directions[interval_rays]
+        )
+        interval_modules = self._locate_intervals(points, interval_rays, rays, modules)
+
+        # Merge consecutive intervals in the same module
+        lengths = interval_stops - interval_starts
+        keep = (interval_modules > 0) & (lengths > 0.0)
+        interval_rays = interval_rays[keep]
+        interval_modules = interval_modules[keep]
+        interval_starts = interval_starts[keep]
+        interval_stops = interval_stops[keep]
+
+        first = np.ones(len(interval_rays), dtype=bool)
+        first[1:] = (
+            (interval_rays[1:] != interval_rays[:-1])
+            | (interval_modules[1:] != interval_modules[:-1])
+            | (interval_starts[1:] != interval_stops[:-1])
+        )
+        groups = np.cumsum(first) - 1
+        segment_stops = np.zeros(first.sum())
+        segment_stops[groups] = interval_stops  # Last interval of the group
+
+        segment_rays = interval_rays[first]
+        segment_modules = interval_modules[first]
+        segment_starts = interval_starts[first]
+
+        offsets = np.zeros(ray_count + 1, dtype=int)
+        offsets[1:] = np.cumsum(np.bincount(segment_rays, minlength=ray_count))
+
+        return RaySegments(
+            offsets,
+            segment_modules,
+            compiled.material_indices[segment_modules],
+            segment_starts,
+            segment_stops - segment_starts,
+        )
+
+    def _locate_intervals(self, points, point_rays, rays, modules):
+        """
+        Returns the innermost module containing each point, among the
+        candidate modules of its ray.
+        """
+        compiled = self.compiled
+
+        # Pairs of points and candidate modules of their ray
+        ray_starts = np.searchsorted(rays, point_rays, side="left")
+        ray_counts = np.searchsorted(rays, point_rays, side="right") - ray_starts
+        pair_points = np.repeat(np.arange(len(points)), ray_counts)
+        pair_modules = modules[_expand_ranges(ray_starts, ray_counts)]
+
+        inside = self._contains(points, pair_points, pair_modules)
+
+        # A point is only inside a module if it is inside its parent
+        for depth in range(1, compiled.depths.max(initial=0) + 1):
+            selected = np.flatnonzero(inside & (compiled.depths[pair_modules] == depth))
+            positions = find_parent_pairs(compiled, pair_points, pair_modules, selected)
+            inside[selected] = (positions >= 0) & inside[positions]
+
+        # Innermost module
+        scores = np.where(inside, compiled.depths[pair_modules] + 1, 0)
+        order = np.lexsort((-pair_modules, scores, pair_points))
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = pair_points[order[1:]] != pair_points[order[:-1]]
+        order = order[last & (scores[order] > 0)]
+
+        located = np.zeros(len(points), dtype=int)
+        located[pair_points[order]] = pair_modules[order]
+        return located
+
+    def trace(
+        self,
+        origins,
+        directions,
+        max_distance=np.inf,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        max_workers=1,
+    ):
+        """
+        Traces rays through the geometry.
+
+        Args:
+            origins (:class:`numpy.ndarray`): Origins (cm), array of shape
+                (N, 3).
+            directions (:class:`numpy.ndarray`): Directions, array of shape
+                (N, 3). They do not need to be normalized.
+            max_distance (float, optional): Maximum distance along the rays
+                (cm). Segments extending to infinity have an infinite length.
+            chunk_size (int, optional): Number of rays traced at once.
+            max_workers (int, optional): Number of worker processes.
+                If ``1``, the rays are traced in this process.
+                If ``None``, the number of processors is used.
+
+        Returns:
+            :obj:`RaySegments`: Segments of the rays inside modules.
+        """
+        origins = np.asarray(origins, dtype=float).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=float).reshape(-1, 3)
+        if origins.shape != directions.shape:
+            raise ValueError("Origins and directions must have the same shape")
+
+        norms = np.linalg.norm(directions, axis=1)
+        if (norms == 0.0).any():
+            raise ValueError("Directions cannot be null")
+        directions = directions / norms[:, np.newaxis]
+
+        if not len(origins):
+            return RaySegments([0], [], [], [], [])
+
+        # A few tasks per worker, so the tracer is only pickled a few times
+        step = chunk_size
+        if max_workers != 1:
+            workers = max_workers or os.cpu_count() or 1
+            step = max(step, -(-len(origins) // (4 * workers)))
+
+        args = [
+            (
+                self,
+                origins[start : start + step],
+                directions[start : start + step],
+                max_distance,
+                chunk_size,
+            )
+            for start in range(0, len(origins), step)
+        ]
+        results = map_chunks(_trace_rays, args, max_workers)
+        return RaySegments.concatenate(list(results))
+
+
+def _trace_rays(tracer, origins, directions, max_distance, chunk_size):
+    results = [
+        tracer._trace(
+            origins[start : start + chunk_size],
+            directions[start : start + chunk_size],
+            max_distance,
+        )
+        for start in range(0, len(origins), chunk_size)
+    ]
+    return RaySegments.concatenate(results)
@@ -0,0 +1,447 @@
+"""
+Restructuring of the module tree of a geometry to reduce the number of
+surfaces PENGEOM tests at each step of a particle.
+"""
+
+# Standard library modules.
+import itertools
+
+# Third party modules.
+import numpy as np
+
+# Local modules.
+from pypenelopetools.pengeom.compiled import (
+    compile_geometry,
+    evaluate_quadrics,
+    get_module_transformations,
+    SURFACE_KEY_NOISE,
+)
+from pypenelopetools.pengeom.module import Module, SidePointer
+from pypenelopetools.pengeom.raytrace import (
+    get_module_bounding_boxes,
+    _get_quadric_matrices,
+    TOLERANCE,
+)
+from pypenelopetools.pengeom.surface import (
+    SurfaceImplicit,
+    xplane,
+    yplane,
+    zplane,
+)
+from pypenelopetools.pengeom.volume import estimate_volumes, get_geometry_bounding_box
+from pypenelopetools.material import VACUUM
+
+# Globals and constants variables.
+DEFAULT_MAX_CHILDREN = 8
+"""Default maximum number of submodules of a module after rebalancing."""
+
+DEFAULT_PADDING = 0.01
+"""Default margin between a top-level container and its submodules, as a
+fraction of the size of the container."""
+
+DEFAULT_COUNT = 100000
+"""Default number of points sampled to estimate the volume of the modules."""
+
+PLANES = (xplane, yplane, zplane)
+"""Functions creating a plane perpendicular to the x, y and z axes."""
+
+
+def get_surface_tests(compiled):
+    """
+    Returns the number of surfaces tested at each step of a particle in each
+    module of a compiled geometry.
+    In a module, PENGEOM computes the distance to the surfaces limiting the
+    module and its direct submodules. Outside all modules, it computes the
+    distance to the surfaces of the top-level modules.
+
+    Args:
+        compiled (:obj:`CompiledGeometry <pypenelopetools.pengeom.compiled.CompiledGeometry>`):
+            Compiled geometry.
+
+    Returns:
+        :class:`numpy.ndarray`: Number of distinct surfaces of each module,
+        index 0 being the region outside all modules.
+    """
+    surfaces = [set() for _ in range(len(compiled.parents))]
+    for index in range(1, len(compiled.parents)):
+        start, stop = compiled.module_offsets[index : index + 2]
+        own_surfaces = compiled.module_surfaces[start:stop]
+        surfaces[index].update(own_surfaces)
+        surfaces[max(compiled.parents[index], 0)].update(own_surfaces)
+
+    return np.array([len(s) for s in surfaces])
+
+
+def _find_split(lowers, uppers):
+    """
+    Returns the axis, the position and the two sides of the plane separating
+    the boxes in the most balanced way, or ``None`` if no plane separates
+    them.
+    """
+    count = len(lowers)
+    best = None
+    for axis in range(3):
+        order = np.argsort(lowers[:, axis], kind="stable")
+        left_uppers = np.maximum.accumulate(uppers[order, axis])[:-1]
+        right_lowers = np.minimum.accumulate(lowers[order[::-1], axis])[::-1][1:]
+
+        splits = np.flatnonzero(left_uppers < right_lowers)
+        if len(splits) == 0:
+            continue
+
+        split = splits[np.argmin(np.abs(2 * (splits + 1) - count))]
+        balance = abs(2 * (split + 1) - count)
+        if best is None or balance < best[0]:
+            position = (left_uppers[split] + right_lowers[split]) / 2
+            best = (balance, axis, position, order[: split + 1], order[split + 1 :])
+
+    return best[1:] if best is not None else None
+
+
+def _create_plane(axis, value, transformation):
+    """
+    Returns the plane perpendicular to *axis* at *value* in the global frame,
+    expressed in the frame of a transformation.
+    """
+    matrix, vector = transformation
+    if np.array_equal(matrix, np.identity(3)):
+        return PLANES[axis](float(value - vector[axis]))
+
+    # Plane x_global = value in the local frame
+    normal = np.where(np.abs(matrix[axis]) < SURFACE_KEY_NOISE, 0.0, matrix[axis])
+    coefficients = {
+        "x": float(normal[0]),
+        "y": float(normal[1]),
+        "z": float(normal[2]),
+        "0": float(vector[axis] - value),
+    }
+    description = "Plane {0}={1:4.2f} cm".format("XYZ"[axis], value)
+    return SurfaceImplicit(coefficients, description)
+
+
+def _partition(lowers, uppers, members, cell, max_children, transformation):
+    """
+    Splits modules in at most *max_children* groups by recursively cutting
+    the largest group with a plane separating the boxes of its modules.
+    Returns the modules and the cell (region between the cutting planes) of
+    each group. Cells do not overlap and contain the boxes of their modules.
+    A cell is defined by its lower and upper corners and its planes (lower
+    and upper plane along each axis, ``None`` if the cell is unbounded).
+    """
+    groups = [(members, cell)]
+    unsplittable = []
+    while groups and len(groups) + len(unsplittable) < max_children:
+        groups.sort(key=lambda group: -len(group[0]))
+        members, cell = groups.pop(0)
+
+        split = None
+        if len(members) > 1:
+            split = _find_split(lowers[members], uppers[members])
+        if split is None:
+            unsplittable.append((members, cell))
+            continue
+
+        # The cutting plane is shared by both cells
+        axis, position, left, right = split
+        plane = _create_plane(axis, position, transformation)
+        lower, upper, planes = cell
+
+        left_upper = upper.copy()
+        left_upper[axis] = position
+        left_planes = list(planes)
+        left_planes[2 * axis + 1] = plane
+        groups.append((members[left], (lower, left_upper, left_planes)))
+
+        right_lower = lower.copy()
+        right_lower[axis] = position
+        right_planes = list(planes)
+        right_planes[2 * axis] = plane
+        groups.append((members[right], (right_lower, upper, right_planes)))
+
+    groups = unsplittable + groups
+    groups.sort(key=lambda group: group[0].min())
+    return [(np.sort(members), cell) for members, cell in groups]
+
+
+def _contains_box(coefficients, pointer, lower, upper):
+    """
+    Returns whether a finite box is on the side *pointer* of a quadric.
+    Only convex sides are considered, for which the box is inside if its
+    corners are.
+    """
+    if not (np.isfinite(lower).all() and np.isfinite(upper).all()):
+        return False
+
+    matrix, _vector, _constant = _get_quadric_matrices(coefficients)
+    scale = np.abs(matrix).max()
+    if np.linalg.eigvalsh(pointer * matrix).max() > TOLERANCE * scale:
+        return False
+
+    corners = np.array(list(itertools.product(*zip(lower, upper))))
+    values = pointer * evaluate_quadrics(coefficients[np.newaxis], corners)[:, 0]
+    return bool((values >= 0.0).all())
+
+
+def _rebalance(
+    compiled,
+    lowers,
+    uppers,
+    members,
+    cell,
+    max_children,
+    padding,
+    material,
+    parent_surfaces,
+    transformation,
+):
+    """
+    Returns the modules to put directly inside the parent of *members*: the
+    modules which are not grouped and the new containers.
+    The parent has no surfaces (*parent_surfaces* is ``None``) for the
+    top-level modules.
+    """
+    modules = [compiled.modules[index] for index in members]
+    if len(members) <= max_children:
+        return modules, []
+
+    groups = _partition(lowers, uppers, members, cell, max_children, transformation)
+    if len(groups) == 1:
+        return modules, []
+
+    children = []
+    containers = []
+    for group, group_cell in groups:
+        if len(group) == 1:
+            children.append(compiled.modules[group[0]])
+            continue
+
+        container = Module(material, "Container of {0:d} modules".format(len(group)))
+        lower, upper, planes = group_cell
+        lower = lower.copy()
+        upper = upper.copy()
+
+        if parent_surfaces is None:
+            # Top-level containers are bounded by the box around their
+            # modules where their cell is unbounded
+            box_lower = lowers[group].min(axis=0)
+            box_upper = uppers[group].max(axis=0)
+            size = box_upper - box_lower
+            margin = np.where(np.isfinite(size), padding * size, 0.0)
+
+            planes = list(planes)
+            for axis in range(3):
+                if planes[2 * axis] is None and np.isfinite(box_lower[axis]):
+                    lower[axis] = box_lower[axis] - margin[axis]
+                    planes[2 * axis] = _create_plane(axis, lower[axis], transformation)
+                if planes[2 * axis + 1] is None and np.isfinite(box_upper[axis]):
+                    upper[axis] = box_upper[axis] + margin[axis]
+                    planes[2 * axis + 1] = _create_plane(
+                        axis, upper[axis], transformation
+                    )
+
+        for i, plane in enumerate(planes):
+            if plane is not None:
+                pointer = SidePointer.NEGATIVE if i % 2 else SidePointer.POSITIVE
+                container.add_surface(plane, pointer)
+
+        # Surfaces of the parent, unless the cell is on their inner side
+        for surface, pointer, coefficients in parent_surfaces or []:
+            if not _contains_box(coefficients, pointer, lower, upper):
+                container.add_surface(surface, pointer)
+
+        subchildren, subcontainers = _rebalance(
+            compiled,
+            lowers,
+            uppers,
+            group,
+            (lower, upper, planes),
+            max_children,
+            padding,
+            material,
+            parent_surfaces,
+            transformation,
+        )
+        for submodule in subchildren:
+            container.add_module(submodule)
+
+        children.append(container)
+        containers.extend(subcontainers)
+        containers.append(container)
+
+    return children, containers
+
+
+class RebalanceReport(object):
+    """
+    Number of surfaces tested by PENGEOM at each step of a particle, before
+    and after rebalancing a geometry.
+    The expected number of tests is the mean of the number of tests in each
+    module (see :func:`get_surface_tests`) weighted by its volume, including
+    the region outside all modules in the sampled box.
+
+    Args:
+        estimate_before, estimate_after (:obj:`VolumeEstimate <pypenelopetools.pengeom.volume.VolumeEstimate>`):
+            Volumes of the modules before and after rebalancing.
+        container_count (int): Number of added container modules.
+
+    Attributes:
+        tests_before, tests_after (float): Expected number of surface tests
+            per step.
+        max_tests_before, max_tests_after (int): Maximum number of surface
+            tests per step.
+    """
+
+    def __init__(self, estimate_before, estimate_after, container_count):
+        self.estimate_before = estimate_before
+        self.estimate_after = estimate_after
+        self.container_count = container_count
+
+        self.tests_before, self.max_tests_before = self._get_tests(estimate_before)
+        self.tests_after, self.max_tests_after = self._get_tests(estimate_after)
+
+    def __repr__(self):
+        return "<{0}({1:d} containers, {2:.1f} -> {3:.1f} tests)>".format(
+            self.__class__.__name__,
+            self.container_count,
+            self.tests_before,
+            self.tests_after,
+        )
+
+    @staticmethod
+    def _get_tests(estimate):
+        tests = get_surface_tests(estimate.compiled)
+        mean = float((estimate.counts * tests).sum() / max(estimate.count, 1))
+        return mean, int(tests.max())
+
+    @property
+    def speedup(self):
+        """float: Ratio of the expected number of tests before and after."""
+        return self.tests_before / self.tests_after
+
+
+def rebalance_geometry(
+    geometry,
+    max_children=DEFAULT_MAX_CHILDREN,
+    padding=DEFAULT_PADDING,
+    count=DEFAULT_COUNT,
+    bounds=None,
+    seed=None,
+):
+    """
+    Groups the submodules of the modules of a geometry (and its top-level
+    modules) with more than *max_children* submodules into nested container
+    modules, so that fewer surfaces are tested at each step of a particle.
+
+    The bounding boxes of the submodules are clustered by recursively cutting
+    them with axis-aligned planes which do not cross any box. Each cluster is
+    enclosed in a container made of the material of the parent module and
+    delimited by the cutting planes around the cluster and the surfaces of
+    the parent, so that containers only take space from the body of their
+    parent and the material at every point is unchanged. Top-level
+    containers are made of vacuum and bounded by the box around their
+    modules. Submodules whose boxes cannot be separated are left in their
+    parent.
+
+    The geometry is modified in place.
+
+    Args:
+        geometry (:obj:`Geometry <pypenelopetools.pengeom.geometry.Geometry>`):
+            Geometry.
+        max_children (int, optional): Maximum number of submodules of a
+            module after rebalancing, if its submodules can be separated.
+        padding (float, optional): Margin between a top-level container and
+            the boxes of its submodules, as a fraction of the size of the
+            container.
+        count (int, optional): Number of points sampled to estimate the
+            volume of the modules for the report.
+        bounds (tuple, optional): Lower and upper corners of the sampled box
+            (cm). If ``None``, the bounding box of the geometry is used.
+        seed (int, optional): Seed of the random number generator.
+            The same points are sampled before and after rebalancing.
+
+    Returns:
+        :obj:`RebalanceReport`: Number of surface tests per step before and
+        after rebalancing.
+
+    Raises:
+        ValueError: If the geometry is unbounded and *bounds* is ``None``.
+    """
+    if max_children < 2:
+        raise ValueError("Maximum number of children must be at least 2")
+
+    compiled = compile_geometry(geometry)
+    if bounds is None:
+        bounds = get_geometry_bounding_box(compiled)
+
+    # Same points before and after rebalancing
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    estimate_before = estimate_volumes(compiled, count, bounds, seed)
+
+    lowers, uppers = get_module_bounding_boxes(compiled)
+    transformations = get_module_transformations(
+        geometry, compiled.modules, compiled.parents
+    )
+
+    # Submodules of each module, top-level modules for index 0
+    children = [[] for _ in range(len(compiled.parents))]
+    for index in range(1, len(compiled.parents)):
+        children[max(compiled.parents[index], 0)].append(index)
+
+    containers = []
+    for index, members in enumerate(children):
+        # Modules with an empty box are left in their parent
+        members = np.array(members, dtype=int)
+        members = members[(lowers[members] <= uppers[members]).all(axis=1)]
+        if len(members) <= max_children:
+            continue
+
+        parent = compiled.modules[index]
+        material = VACUUM
+        parent_surfaces = None
+        if parent is not None:
+            parent_surfaces = []
+            material = parent.material
+            start, stop = compiled.module_offsets[index : index + 2]
+            for surface, compiled_index, pointer in zip(
+                parent.get_surfaces(),
+                compiled.module_surfaces[start:stop],
+                compiled.module_pointers[start:stop],
+            ):
+                parent_surfaces.append(
+                    (
+                        surface,
+                        SidePointer(int(pointer)),
+                        compiled.quadrics[compiled_index],
+                    )
+                )
+
+        modules, new_containers = _rebalance(
+            compiled,
+            lowers,
+            uppers,
+            members,
+            (np.full(3, -np.inf), np.full(3, np.inf), [None] * 6),
+            max_children,
+            padding,
+            material,
+            parent_surfaces,
+            transformations[index],
+        )
+        if not new_containers:
+            continue
+
+        if parent is not None:
+            for member in members:
+                parent.pop_module(compiled.modules[member])
+            for module in modules:
+                parent.add_module(module)
+
+        containers.extend(new_containers)
+
+    for container in containers:
+        geometry.add_module(container)
+
+    estimate_after = estimate_volumes(compile_geometry(geometry), count, bounds, seed)
+
+    return RebalanceReport(estimate_before, estimate_after, len(containers))
@@ -14,13 +14,20 @@ __all__ = [
 
 # Standard library modules.
 import os
+import collections.abc
+import types
 
 # Third party modules.
 
 # Local modules.
 from pypenelopetools.pengeom.transformation import Rotation, Shift, Scale
-from pypenelopetools.pengeom.base import GeometryBase, LINE_EXTRA, LINE_SEPARATOR
-from pypenelopetools.pengeom.mixin import DescriptionMixin
+from pypenelopetools.pengeom.base import (
+    GeometryBase,
+    LINE_EXTRA,
+    LINE_SEPARATOR,
+    iter_sections,
+)
+from pypenelopetools.pengeom.mixin import DescriptionMixin, _notify_modification
 
 # Globals and constants variables.
 
@@ -39,6 +46,23 @@ class SurfaceBase(DescriptionMixin, GeometryBase):
         self._rotation = Rotation()
         self._shift = Shift()
 
+    def _read(self, fileobj, material_lookup, surface_lookup, module_lookup):
+        section = next(iter_sections(fileobj))
+        self._read_section(section, material_lookup, surface_lookup, module_lookup)
+
+    def _read_section(self, section, material_lookup, surface_lookup, module_lookup):
+        """
+        Sets this surface from a parsed section.
+
+        Args:
+            section (:obj:`GeoSection <pypenelopetools.pengeom.base.GeoSection>`):
+                Parsed ``SURFACE`` section.
+            material_lookup, surface_lookup, module_lookup (dict):
+                Lookup tables (see
+                :meth:`_read <pypenelopetools.pengeom.base.GeometryBase._read>`).
+        """
+        raise NotImplementedError
+
     def _write(self, fileobj, index_lookup):
         index = index_lookup[self]
         text = "{:4d}".format(index)
@@ -86,29 +110,25 @@ class SurfaceImplicit(SurfaceBase):
             self.description, ", ".join(coeffs), str(self.rotation), str(self.shift)
         )
 
-    def _read(self, fileobj, material_lookup, surface_lookup, module_lookup):
-        line = self._read_next_line(fileobj)
-        _, _, self.description = self._parse_line(line)
+    def _read_section(self, section, material_lookup, surface_lookup, module_lookup):
+        self.description = section.description
 
-        line = self._read_next_line(fileobj)
-        if line != "INDICES=( 0, 0, 0, 0, 0)":
+        records = section.records
+        if not records or records[0] != ("INDICES=", "0, 0, 0, 0, 0", ""):
             raise IOError(
-                'Expected line "INDICES=( 0, 0, 0, 0, 0)" instead of "{0}"'.format(line)
+                'Expected line "INDICES=( 0, 0, 0, 0, 0)" in surface {0:d}'.format(
+                    section.index
+                )
             )
 
-        line = self._read_next_line(fileobj)
-        while line != LINE_EXTRA and line != LINE_SEPARATOR:
-            keyword, value, _ = self._parse_expline(line)
+        coefficients = {}
+        for keyword, value, _ in records[1:]:
             key = keyword[1:-1].lower()
-            self.coefficients[key] = value
-            line = self._read_next_line(fileobj)
-
-        if line == LINE_EXTRA:
-            extra_offset = fileobj.tell()
-            self.rotation._read(fileobj, material_lookup, surface_lookup, module_lookup)
+            coefficients[key] = value
+        self.coefficients = coefficients
 
-            fileobj.seek(extra_offset)
-            self.shift._read(fileobj, material_lookup, surface_lookup, module_lookup)
+        self.rotation._read_records(section.extra_records)
+        self.shift._read_records(section.extra_records)
 
     def _create_coefficient_line(self, key):
         value = self.coefficients[key]
@@ -149,6 +169,8 @@ class SurfaceImplicit(SurfaceBase):
         coefficient (e.g. ``xx``) and the values the coefficient values.
         If the argument is a :obj:`list`, the list must contain 10 values,
         one for each coefficient.
+        The returned mapping is read-only; coefficients are changed by
+        assigning a new :obj:`dict` or :obj:`list`.
 
         Examples:
 
@@ -157,11 +179,11 @@ class SurfaceImplicit(SurfaceBase):
           >>> s.coefficients = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
           >>> s.coefficients = {'xx': 1.0, 'xy': 1.0}
         """
-        return self._coefficients
+        return types.MappingProxyType(self._coefficients)
 
     @coefficients.setter
     def coefficients(self, coefficients):
-        if isinstance(coefficients, dict):
+        if isinstance(coefficients, collections.abc.Mapping):
             self._coefficients = {
                 "xx": 0.0,
                 "xy": 0.0,
@@ -195,6 +217,8 @@ class SurfaceImplicit(SurfaceBase):
                 "0": coefficients[9],
             }
 
+        _notify_modification()
+
 
 class SurfaceReduced(SurfaceBase):
     """
@@ -224,26 +248,20 @@ class SurfaceReduced(SurfaceBase):
             str(self.shift),
         )
 
-    def _read(self, fileobj, material_lookup, surface_lookup, module_lookup):
-        line = self._read_next_line(fileobj)
-        _, _, self.description = self._parse_line(line)
+    def _read_section(self, section, material_lookup, surface_lookup, module_lookup):
+        self.description = section.description
 
-        line = self._read_next_line(fileobj)
-        keyword, text, _termination = self._parse_line(line)
+        records = section.records
+        keyword = records[0].keyword if records else ""
         if keyword != "INDICES=":
             raise IOError(
                 'Expected keyword "INDICES=" instead of "{0}"'.format(keyword)
             )
-        self.indices = tuple(map(int, text.split(",")))
-
-        extra_offset = fileobj.tell()
-        self.rotation._read(fileobj, material_lookup, surface_lookup, module_lookup)
-
-        fileobj.seek(extra_offset)
-        self.shift._read(fileobj, material_lookup, surface_lookup, module_lookup)
+        self.indices = tuple(map(int, records[0].value.split(",")))
 
-        fileobj.seek(extra_offset)
-        self.scale._read(fileobj, material_lookup, surface_lookup, module_lookup)
+        self.rotation._read_records(records[1:])
+        self.shift._read_records(records[1:])
+        self.scale._read_records(records[1:])
 
     def _write(self, fileobj, index_lookup):
         super()._write(fileobj, index_lookup)
@@ -278,6 +296,7 @@ class SurfaceReduced(SurfaceBase):
                 )
 
         self._indices = tuple(indices)
+        _notify_modification()
 
     @property
     def scale(self):
@@ -9,11 +9,18 @@ import math
 # Third party modules.
 
 # Local modules.
-from pypenelopetools.pengeom.base import GeometryBase, LINE_SEPARATOR
+from pypenelopetools.pengeom.mixin import _notify_modification
+from pypenelopetools.pengeom.base import GeometryBase, iter_records
 
 # Globals and constants variables.
 
 
+def _to_degrees(value, termination):
+    if termination.startswith("RAD"):
+        return math.degrees(value)
+    return value
+
+
 class Rotation(GeometryBase):
     """
     Represents a rotation using 3 Euler angles (YZY).
@@ -40,21 +47,24 @@ class Rotation(GeometryBase):
         )
 
     def _read(self, fileobj, material_lookup, surface_lookup, module_lookup):
-        line = self._peek_next_line(fileobj)
-        while line != LINE_SEPARATOR:
-            keyword, value, termination = self._parse_expline(line)
+        self._read_records(iter_records(fileobj))
 
-            if termination.startswith("RAD"):
-                value = math.degrees(value)
+    def _read_records(self, records):
+        """
+        Sets the angles from the parsed lines of a section.
+        Lines with other keywords are ignored.
 
+        Args:
+            records (iterable(:obj:`GeoRecord <pypenelopetools.pengeom.base.GeoRecord>`)):
+                Parsed lines.
+        """
+        for keyword, value, termination in records:
             if keyword == "OMEGA=":
-                self.omega_deg = value
+                self.omega_deg = _to_degrees(value, termination)
             elif keyword == "THETA=":
-                self.theta_deg = value
+                self.theta_deg = _to_degrees(value, termination)
             elif keyword == "PHI=":
-                self.phi_deg = value
-
-            line = self._read_next_line(fileobj)
+                self.phi_deg = _to_degrees(value, termination)
 
     def _write(self, fileobj, index_lookup):
         line = self._create_expline(
@@ -82,6 +92,7 @@ class Rotation(GeometryBase):
         if angle < 0 or angle > 360.0:
             raise ValueError("Angle ({0}) must be between [0,360].".format(angle))
         self._omega = angle
+        _notify_modification()
 
     @property
     def theta_deg(self):
@@ -95,6 +106,7 @@ class Rotation(GeometryBase):
         if angle < 0 or angle > 360:
             raise ValueError("Angle ({0}) must be between [0,360].".format(angle))
         self._theta = angle
+        _notify_modification()
 
     @property
     def phi_deg(self):
@@ -110,6 +122,7 @@ class Rotation(GeometryBase):
         if angle < 0 or angle > 360:
             raise ValueError("Angle ({0}) must be between [0,360].".format(angle))
         self._phi = angle
+        _notify_modification()
 
 
 class Shift(GeometryBase):
@@ -138,10 +151,18 @@ class Shift(GeometryBase):
         )
 
     def _read(self, fileobj, material_lookup, surface_lookup, module_lookup):
-        line = self._peek_next_line(fileobj)
-        while line != LINE_SEPARATOR:
-            keyword, value, _ = self._parse_expline(line)
+        self._read_records(iter_records(fileobj))
+
+    def _read_records(self, records):
+        """
+        Sets the translations from the parsed lines of a section.
+        Lines with other keywords are ignored.
 
+        Args:
+            records (iterable(:obj:`GeoRecord <pypenelopetools.pengeom.base.GeoRecord>`)):
+                Parsed lines.
+        """
+        for keyword, value, _ in records:
             if keyword == "X-SHIFT=":
                 self.x_cm = value
             elif keyword == "Y-SHIFT=":
@@ -149,8 +170,6 @@ class Shift(GeometryBase):
             elif keyword == "Z-SHIFT=":
                 self.z_cm = value
 
-            line = self._read_next_line(fileobj)
-
     def _write(self, fileobj, index_lookup):
         line = self._create_expline(
             "X-SHIFT=", self.x_cm, "              (DEFAULT=0.0)"
@@ -175,6 +194,7 @@ class Shift(GeometryBase):
     @x_cm.setter
     def x_cm(self, shift):
         self._x = shift
+        _notify_modification()
 
     @property
     def y_cm(self):
@@ -184,6 +204,7 @@ class Shift(GeometryBase):
     @y_cm.setter
     def y_cm(self, shift):
         self._y = shift
+        _notify_modification()
 
     @property
     def z_cm(self):
@@ -193,6 +214,7 @@ class Shift(GeometryBase):
     @z_cm.setter
     def z_cm(self, shift):
         self._z = shift
+        _notify_modification()
 
 
 class Scale(GeometryBase):
@@ -217,10 +239,18 @@ class Scale(GeometryBase):
         return "(x={0:g}, y={1:g}, z={2:g})".format(self.x, self.y, self.z)
 
     def _read(self, fileobj, material_lookup, surface_lookup, module_lookup):
-        line = self._peek_next_line(fileobj)
-        while line != LINE_SEPARATOR:
-            keyword, value, _ = self._parse_expline(line)
+        self._read_records(iter_records(fileobj))
+
+    def _read_records(self, records):
+        """
+        Sets the scaling factors from the parsed lines of a section.
+        Lines with other keywords are ignored.
 
+        Args:
+            records (iterable(:obj:`GeoRecord <pypenelopetools.pengeom.base.GeoRecord>`)):
+                Parsed lines.
+        """
+        for keyword, value, _ in records:
             if keyword == "X-SCALE=":
                 self.x = value
             elif keyword == "Y-SCALE=":
@@ -228,8 +258,6 @@ class Scale(GeometryBase):
             elif keyword == "Z-SCALE=":
                 self.z = value
 
-            line = self._read_next_line(fileobj)
-
     def _write(self, fileobj, index_lookup):
         line = self._create_expline("X-SCALE=", self.x, "              (DEFAULT=1.0)")
         fileobj.write(line + "\n")
@@ -252,6 +280,7 @@ class Scale(GeometryBase):
         if scale == 0.0:
             raise ValueError("X scale cannot be equal to 0.")
         self._x = scale
+        _notify_modification()
 
     @property
     def y(self):
@@ -265,6 +294,7 @@ class Scale(GeometryBase):
         if scale == 0.0:
             raise ValueError("Y scale cannot be equal to 0.")
         self._y = scale
+        _notify_modification()
 
     @property
     def z(self):
@@ -278,3 +308,4 @@ class Scale(GeometryBase):
         if scale == 0.0:
             raise ValueError("Z scale cannot be equal to 0.")
         self._z = scale
+        _notify_modification()
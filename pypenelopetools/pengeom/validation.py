@@ -0,0 +1,363 @@
+"""
+Detection of overlapping modules, modules outside their parent and unused
+surfaces in a geometry, before it is given to PENGEOM.
+"""
+
+# Standard library modules.
+import collections
+import contextlib
+
+# Third party modules.
+import numpy as np
+
+# Local modules.
+from pypenelopetools.pengeom.compiled import evaluate_quadric_pairs, map_chunks
+from pypenelopetools.pengeom.raytrace import (
+    BoundingVolumeHierarchy,
+    find_parent_pairs,
+    _expand_ranges,
+    _get_surface_boxes,
+    _intersect_frames,
+)
+
+# Globals and constants variables.
+DEFAULT_COUNT = 1000000
+"""Default number of sampled points."""
+
+DEFAULT_CHUNK_SIZE = 65536
+"""Default number of points sampled at once."""
+
+DEFAULT_PADDING = 0.1
+"""Default padding of the sampled box, as a fraction of its size."""
+
+OVERLAP = "overlap"
+"""Point inside two sibling modules."""
+
+UNENCLOSED = "unenclosed"
+"""Point inside a module but outside its parent module."""
+
+UNUSED_SURFACE = "unused surface"
+"""Surface which never limits its module."""
+
+EMPTY_MODULE = "empty module"
+"""Module containing none of the sampled points."""
+
+ERRORS = frozenset([OVERLAP, UNENCLOSED])
+"""Kinds of issues which make a geometry invalid for PENGEOM."""
+
+GeometryIssue = collections.namedtuple(
+    "GeometryIssue", ["kind", "modules", "surface", "point"]
+)
+GeometryIssue.__doc__ = """
+Issue found in a geometry.
+
+Attributes:
+    kind (str): Kind of issue (:data:`OVERLAP`, :data:`UNENCLOSED`,
+        :data:`UNUSED_SURFACE` or :data:`EMPTY_MODULE`).
+    modules (tuple(int)): Indexes of the modules involved: the two sibling
+        modules of an overlap, a module and its parent if it is unenclosed,
+        or a single module.
+    surface (int): Index of the unused surface in the geometry file, or
+        ``None``.
+    point (tuple(float)): Coordinates (cm) of the first sampled point where
+        the issue occurs, in the laboratory frame (i.e. with the tilt and
+        rotation of the geometry), or ``None``.
+"""
+
+
+def _get_bounding_boxes(compiled, padding):
+    """
+    Returns two boxes for each module: the box of the region delimited by
+    its surfaces and the box of the points where a point is tested against
+    the module.
+    The latter contains the points where at most one of its surfaces does not
+    match its side pointer, within the first box enlarged by *padding*.
+    A surface limiting a module excludes points just across the face it
+    forms, so these points are enough to find the surfaces which are used.
+    """
+    count = len(compiled.parents)
+    lowers = np.full((count, 3), np.inf)
+    uppers = np.full((count, 3), -np.inf)
+    loose_lowers = lowers.copy()
+    loose_uppers = uppers.copy()
+
+    for index in range(1, count):
+        start, stop = compiled.module_offsets[index : index + 2]
+        if start == stop:
+            continue
+
+        # Boxes in the global and local frames, intersected at the end
+        surface_lowers, surface_uppers = _get_surface_boxes(compiled, index)
+        lowers[index], uppers[index] = _intersect_frames(
+            compiled, index, surface_lowers.max(axis=1), surface_uppers.min(axis=1)
+        )
+
+        # Union of the intersections of all surfaces but one
+        loose_lower = np.full((2, 3), np.inf)
+        loose_upper = np.full((2, 3), -np.inf)
+        surface_count = surface_lowers.shape[1]
+        for skipped in range(surface_count):
+            others = np.arange(surface_count) != skipped
+            lower = surface_lowers[:, others].max(axis=1, initial=-np.inf)
+            upper = surface_uppers[:, others].min(axis=1, initial=np.inf)
+            for frame in range(2):
+                if (lower[frame] <= upper[frame]).all():
+                    np.minimum(loose_lower[frame], lower[frame], out=loose_lower[frame])
+                    np.maximum(loose_upper[frame], upper[frame], out=loose_upper[frame])
+        loose_lowers[index], loose_uppers[index] = _intersect_frames(
+            compiled, index, loose_lower, loose_upper
+        )
+
+        margin = padding * (uppers[index] - lowers[index])
+        np.maximum(loose_lowers[index], lowers[index] - margin, out=loose_lowers[index])
+        np.minimum(loose_uppers[index], uppers[index] + margin, out=loose_uppers[index])
+
+    return lowers, uppers, loose_lowers, loose_uppers
+
+
+def _get_first_points(keys, points, divisor):
+    """
+    Returns the unique keys, split with *divisor*, and the first point of
+    each.
+    """
+    keys, indexes = np.unique(keys, return_index=True)
+    return np.divmod(keys, divisor), points[indexes]
+
+
+def _get_run_pairs(values):
+    """
+    Returns the positions of every pair of elements within the runs of equal
+    elements of the sorted array *values*.
+    """
+    firsts = [np.empty(0, dtype=int)]
+    seconds = [np.empty(0, dtype=int)]
+    offset = 1
+    while True:
+        shared = np.flatnonzero(values[offset:] == values[: len(values) - offset])
+        if len(shared) == 0:
+            break
+        firsts.append(shared)
+        seconds.append(shared + offset)
+        offset += 1
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+
+def _check(compiled, hierarchy, box_lowers, box_uppers, start, stop, per_box, seed):
+    """
+    Samples points *start* to *stop*, *per_box* points uniformly in each
+    box, and returns the errors, the positions in :attr:`module_surfaces` of
+    the surfaces which limit their module and the modules containing a point.
+    """
+    rng = np.random.default_rng(seed)
+    boxes = np.arange(start, stop) // per_box
+    points = box_lowers[boxes] + rng.random((len(boxes), 3)) * (
+        box_uppers[boxes] - box_lowers[boxes]
+    )
+    module_count = len(compiled.parents)
+
+    # Surfaces of the modules whose box contains each point
+    pair_points, pair_modules = hierarchy.query(points)
+    starts = compiled.module_offsets[pair_modules]
+    counts = compiled.module_offsets[pair_modules + 1] - starts
+    positions = _expand_ranges(starts, counts)
+    pairs = np.repeat(np.arange(len(pair_modules)), counts)
+
+    values = evaluate_quadric_pairs(
+        compiled.quadrics[compiled.module_surfaces[positions]],
+        points[pair_points[pairs]],
+    )
+    matches = (values >= 0.0) == (compiled.module_pointers[positions] > 0)
+    mismatches = np.bincount(pairs[~matches], minlength=len(pair_modules))
+
+    # A surface limits its module if it alone excludes a point
+    used = np.unique(positions[~matches & (mismatches[pairs] == 1)])
+
+    # Regions delimited by the surfaces of each module alone and regions
+    # inside the parent modules
+    regions = mismatches == 0
+    inside = regions.copy()
+    for depth in range(1, compiled.depths.max(initial=0) + 1):
+        selected = np.flatnonzero(inside & (compiled.depths[pair_modules] == depth))
+        parent_pairs = find_parent_pairs(compiled, pair_points, pair_modules, selected)
+        inside[selected] = (parent_pairs >= 0) & inside[parent_pairs]
+
+    issues = []
+
+    # Sibling modules (top-level modules are siblings) sharing a point
+    selected = np.flatnonzero(inside)
+    groups = (
+        pair_points[selected] * (module_count + 1)
+        + compiled.parents[pair_modules[selected]]
+        + 1
+    )
+    selected = selected[np.argsort(groups, kind="stable")]
+    groups = np.sort(groups, kind="stable")
+    firsts, seconds = _get_run_pairs(groups)
+    modules1 = pair_modules[selected[firsts]]
+    modules2 = pair_modules[selected[seconds]]
+    (modules1, modules2), first_points = _get_first_points(
+        np.minimum(modules1, modules2) * module_count + np.maximum(modules1, modules2),
+        points[pair_points[selected[firsts]]],
+        module_count,
+    )
+    for module1, module2, point in zip(modules1, modules2, first_points):
+        modules = (int(module1), int(module2))
+        issues.append(GeometryIssue(OVERLAP, modules, None, tuple(point)))
+
+    # Modules extending outside their parent
+    selected = np.flatnonzero(regions & (compiled.parents[pair_modules] > 0))
+    parent_pairs = find_parent_pairs(compiled, pair_points, pair_modules, selected)
+    selected = selected[(parent_pairs < 0) | ~regions[parent_pairs]]
+    (_, modules), first_points = _get_first_points(
+        pair_modules[selected], points[pair_points[selected]], module_count
+    )
+    for module, point in zip(modules, first_points):
+        modules = (int(module), int(compiled.parents[module]))
+        issues.append(GeometryIssue(UNENCLOSED, modules, None, tuple(point)))
+
+    return issues, used, np.unique(pair_modules[regions])
+
+
+def check_geometry(
+    compiled,
+    count=DEFAULT_COUNT,
+    bounds=None,
+    padding=DEFAULT_PADDING,
+    seed=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    max_workers=1,
+    stop_on_error=True,
+):
+    """
+    Checks a compiled geometry by sampling points and evaluating the
+    surfaces of the modules at these points.
+    The same number of points is sampled uniformly in the bounding box of
+    each module, enlarged by *padding*, so that small modules are checked as
+    thoroughly as large ones.
+    Each point is only tested against the modules whose bounding box
+    contains it.
+    The following issues are reported:
+
+        * :data:`OVERLAP`: point inside two sibling modules (modules with the
+          same parent or top-level modules);
+        * :data:`UNENCLOSED`: point inside the surfaces of a module, but
+          outside its parent module;
+        * :data:`UNUSED_SURFACE`: surface which does not limit its module at
+          any sampled point, e.g. a surface with the wrong side pointer or
+          outside the module;
+        * :data:`EMPTY_MODULE`: module whose surfaces contain none of the
+          sampled points.
+
+    Overlaps and unenclosed modules are errors for PENGEOM (see
+    :data:`ERRORS`). Each is reported once per module or pair of modules.
+    Unused surfaces and empty modules can only be found once all points are
+    sampled, so they are not reported if the check stops on an error.
+    Small regions may be missed; increase *count* to detect them.
+
+    Args:
+        compiled (:obj:`CompiledGeometry <pypenelopetools.pengeom.compiled.CompiledGeometry>`):
+            Compiled geometry.
+        count (int, optional): Number of sampled points.
+        bounds (tuple, optional): Lower and upper corners of the region
+            where points are sampled (cm), used for unbounded modules.
+            If ``None``, the bounding box of the modules enlarged by
+            *padding* is used.
+        padding (float, optional): Fraction of the size of the bounding
+            boxes added on each side, so that the surfaces limiting the
+            modules are also checked.
+        seed (int, optional): Seed of the random number generator.
+        chunk_size (int, optional): Number of points sampled at once.
+        max_workers (int, optional): Number of worker processes.
+            If ``1``, the points are sampled in this process.
+            If ``None``, the number of processors is used.
+        stop_on_error (bool, optional): Whether to stop sampling after the
+            first chunk of points with an error.
+
+    Returns:
+        list(:obj:`GeometryIssue`): Issues, errors first.
+    """
+    lowers, uppers, loose_lowers, loose_uppers = _get_bounding_boxes(compiled, padding)
+
+    if bounds is None:
+        # Top-level modules, and submodules which may extend outside them
+        # (modules with an empty box are ignored)
+        valid = (lowers <= uppers).all(axis=1)
+        toplevel = valid & (compiled.depths == 0)
+        lower = lowers[toplevel].min(axis=0, initial=np.inf)
+        upper = uppers[toplevel].max(axis=0, initial=-np.inf)
+        finite = np.isfinite(lowers) & np.isfinite(uppers) & valid[:, np.newaxis]
+        lower = np.minimum(lower, np.where(finite, lowers, np.inf).min(axis=0))
+        upper = np.maximum(upper, np.where(finite, uppers, -np.inf).max(axis=0))
+
+        margin = padding * np.maximum(upper - lower, 1e-6)
+        lower, upper = lower - margin, upper + margin
+    else:
+        lower, upper = bounds
+    lower = np.asarray(lower, dtype=float)
+    upper = np.asarray(upper, dtype=float)
+
+    if not (np.isfinite(lower).all() and np.isfinite(upper).all()):
+        raise ValueError("Geometry is unbounded, specify the bounds")
+    if (upper <= lower).any():
+        raise ValueError("Bounds must have a positive volume")
+
+    modules = np.arange(1, len(compiled.parents))
+    hierarchy = BoundingVolumeHierarchy(loose_lowers[1:], loose_uppers[1:], modules)
+
+    # Boxes where points are sampled
+    box_lowers = np.maximum(loose_lowers[1:], lower)
+    box_uppers = np.minimum(loose_uppers[1:], upper)
+    valid = (box_lowers < box_uppers).all(axis=1)
+    box_lowers, box_uppers = box_lowers[valid], box_uppers[valid]
+    if len(box_lowers) == 0:
+        box_lowers, box_uppers = lower[np.newaxis], upper[np.newaxis]
+
+    per_box = max(1, count // len(box_lowers))
+    total = per_box * len(box_lowers)
+    ranges = [
+        (start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(ranges))
+
+    errors = {}
+    used = np.zeros(len(compiled.module_surfaces), dtype=bool)
+    nonempty = np.zeros(len(compiled.parents), dtype=bool)
+
+    def process(result):
+        chunk_errors, chunk_used, chunk_nonempty = result
+        for issue in chunk_errors:
+            errors.setdefault((issue.kind, issue.modules), issue)
+        used[chunk_used] = True
+        nonempty[chunk_nonempty] = True
+        return stop_on_error and bool(chunk_errors)
+
+    args = [
+        (compiled, hierarchy, box_lowers, box_uppers, start, stop, per_box, s)
+        for (start, stop), s in zip(ranges, seeds)
+    ]
+
+    # Do not wait for the remaining chunks after an error
+    with contextlib.closing(map_chunks(_check, args, max_workers)) as results:
+        for result in results:
+            if process(result):
+                break
+
+    issues = sorted(errors.values(), key=lambda issue: (issue.kind, issue.modules))
+    if errors and stop_on_error:
+        return issues
+
+    # Empty modules, and unused surfaces of the other modules
+    for module in np.flatnonzero(~nonempty[1:]) + 1:
+        issues.append(GeometryIssue(EMPTY_MODULE, (int(module),), None, None))
+
+    positions = np.flatnonzero(~used)
+    surface_modules = (
+        np.searchsorted(compiled.module_offsets, positions, side="right") - 1
+    )
+    for position, module in zip(positions, surface_modules):
+        if not nonempty[module]:
+            continue
+        surface = compiled.surface_indices[compiled.module_surfaces[position]]
+        issues.append(GeometryIssue(UNUSED_SURFACE, (int(module),), int(surface), None))
+
+    return issues
@@ -0,0 +1,243 @@
+"""
+Monte Carlo estimation of the volume and mass of the modules of a geometry.
+"""
+
+# Standard library modules.
+
+# Third party modules.
+import numpy as np
+
+# Local modules.
+from pypenelopetools.pengeom.compiled import map_chunks
+from pypenelopetools.pengeom.raytrace import get_module_bounding_boxes
+
+# Globals and constants variables.
+DEFAULT_COUNT = 1000000
+"""Default number of sampled points."""
+
+DEFAULT_CHUNK_SIZE = 65536
+"""Default number of points sampled at once."""
+
+
+def get_geometry_bounding_box(compiled):
+    """
+    Returns the bounding box of all modules of a compiled geometry.
+
+    Args:
+        compiled (:obj:`CompiledGeometry <pypenelopetools.pengeom.compiled.CompiledGeometry>`):
+            Compiled geometry.
+
+    Returns:
+        tuple: lower and upper corners (cm), arrays of 3 values.
+        Coordinates are infinite if a top-level module is unbounded.
+    """
+    lowers, uppers = get_module_bounding_boxes(compiled)
+    toplevel = np.flatnonzero(compiled.depths == 0)
+    if len(toplevel) == 0:
+        return np.zeros(3), np.zeros(3)
+    return lowers[toplevel].min(axis=0), uppers[toplevel].max(axis=0)
+
+
+def _count_modules(compiled, lower, upper, count, seed):
+    """
+    Samples *count* points uniformly in a box and returns the number of
+    points in each module.
+    """
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(lower, upper, size=(count, 3))
+    located = compiled.locate(points, chunk_size=count)
+    return np.bincount(located, minlength=len(compiled.parents))
+
+
+class VolumeEstimate(object):
+    """
+    Volumes and masses of the modules of a geometry estimated from points
+    sampled uniformly in a box.
+    Arrays are indexed by module index, index 0 being the region of the box
+    outside all modules.
+
+    Args:
+        compiled (:obj:`CompiledGeometry <pypenelopetools.pengeom.compiled.CompiledGeometry>`):
+            Compiled geometry.
+        lower, upper (:class:`numpy.ndarray`): Corners of the sampled box (cm).
+        counts (:class:`numpy.ndarray`): Number of points in each module.
+
+    Attributes:
+        box_volume_cm3 (float): Volume of the sampled box.
+        count (int): Total number of sampled points.
+        volumes_cm3 (:class:`numpy.ndarray`): Volume of each module,
+            excluding its submodules.
+        volume_uncertainties_cm3 (:class:`numpy.ndarray`): Standard
+            uncertainty of the volumes.
+        masses_g (:class:`numpy.ndarray`): Mass of each module, from the
+            density of its material.
+        mass_uncertainties_g (:class:`numpy.ndarray`): Standard uncertainty
+            of the masses.
+    """
+
+    def __init__(self, compiled, lower, upper, counts):
+        self.compiled = compiled
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.counts = np.asarray(counts, dtype=np.int64)
+
+        self.box_volume_cm3 = float(np.prod(self.upper - self.lower))
+        self.count = int(self.counts.sum())
+
+        # Binomial estimate of the fraction of the box in each module
+        fractions = self.counts / max(self.count, 1)
+        self.volumes_cm3 = self.box_volume_cm3 * fractions
+        self.volume_uncertainties_cm3 = self.box_volume_cm3 * np.sqrt(
+            fractions * (1.0 - fractions) / max(self.count, 1)
+        )
+
+        densities = np.array(
+            [
+                compiled.materials[index].density_g_per_cm3
+                for index in compiled.material_indices
+            ]
+        )
+        self.masses_g = self.volumes_cm3 * densities
+        self.mass_uncertainties_g = self.volume_uncertainties_cm3 * densities
+
+    def __repr__(self):
+        return "<{0}({1:d} modules, {2:d} points)>".format(
+            self.__class__.__name__, self.compiled.module_count, self.count
+        )
+
+    def get_volume_cm3(self, module):
+        """
+        Returns the volume of a module and its uncertainty.
+
+        Args:
+            module (:obj:`Module <pypenelopetools.pengeom.module.Module>` or int):
+                Module or its index.
+
+        Returns:
+            tuple: volume and standard uncertainty (cm3).
+        """
+        index = self._get_index(module)
+        return self.volumes_cm3[index], self.volume_uncertainties_cm3[index]
+
+    def get_mass_g(self, module):
+        """
+        Returns the mass of a module and its uncertainty.
+
+        Args:
+            module (:obj:`Module <pypenelopetools.pengeom.module.Module>` or int):
+                Module or its index.
+
+        Returns:
+            tuple: mass and standard uncertainty (g).
+        """
+        index = self._get_index(module)
+        return self.masses_g[index], self.mass_uncertainties_g[index]
+
+    def get_material_volumes_cm3(self):
+        """
+        Returns the volume filled by each material.
+
+        Returns:
+            dict: volume and standard uncertainty (cm3) by material index.
+            Index 0 is vacuum, including the region outside all modules.
+        """
+        return self._sum_by_material()
+
+    def get_material_masses_g(self):
+        """
+        Returns the mass of each material.
+
+        Returns:
+            dict: mass and standard uncertainty (g) by material index.
+        """
+        densities = {
+            index: material.density_g_per_cm3
+            for index, material in self.compiled.materials.items()
+        }
+        return {
+            index: (volume * densities[index], uncertainty * densities[index])
+            for index, (volume, uncertainty) in self.get_material_volumes_cm3().items()
+        }
+
+    def _get_index(self, module):
+        if isinstance(module, (int, np.integer)):
+            return int(module)
+        return self.compiled.modules.index(module)
+
+    def _sum_by_material(self):
+        # The counts of the modules of a material follow a multinomial
+        # distribution, so the fraction of the box filled by a material is
+        # again binomial
+        fractions = np.bincount(
+            self.compiled.material_indices,
+            weights=self.counts,
+            minlength=max(self.compiled.materials, default=0) + 1,
+        ) / max(self.count, 1)
+        volumes = self.box_volume_cm3 * fractions
+        uncertainties = self.box_volume_cm3 * np.sqrt(
+            fractions * (1.0 - fractions) / max(self.count, 1)
+        )
+        return {
+            index: (volumes[index], uncertainties[index])
+            for index in sorted(self.compiled.materials)
+        }
+
+
+def estimate_volumes(
+    compiled,
+    count=DEFAULT_COUNT,
+    bounds=None,
+    seed=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    max_workers=1,
+):
+    """
+    Estimates the volume and mass of each module of a compiled geometry by
+    sampling points uniformly in its bounding box.
+    The standard uncertainty of a volume :math:`V` estimated with :math:`N`
+    points in a box of volume :math:`V_{box}` is
+    :math:`\\sqrt{V (V_{box} - V) / N}`.
+
+    Points are sampled in chunks, each with its own random stream spawned
+    from *seed*, so the results only depend on *seed*, *count* and
+    *chunk_size*, not on the number of workers.
+
+    Args:
+        compiled (:obj:`CompiledGeometry <pypenelopetools.pengeom.compiled.CompiledGeometry>`):
+            Compiled geometry.
+        count (int, optional): Number of sampled points.
+        bounds (tuple, optional): Lower and upper corners of the sampled box
+            (cm). It must enclose all modules for the volumes to be correct.
+            If ``None``, the bounding box of the geometry is used.
+        seed (int, optional): Seed of the random number generator.
+        chunk_size (int, optional): Number of points sampled at once.
+        max_workers (int, optional): Number of worker processes.
+            If ``1``, the points are sampled in this process.
+            If ``None``, the number of processors is used.
+
+    Returns:
+        :obj:`VolumeEstimate`: Estimated volumes and masses.
+    """
+    if bounds is None:
+        lower, upper = get_geometry_bounding_box(compiled)
+    else:
+        lower, upper = bounds
+    lower = np.asarray(lower, dtype=float)
+    upper = np.asarray(upper, dtype=float)
+
+    if not (np.isfinite(lower).all() and np.isfinite(upper).all()):
+        raise ValueError("Geometry is unbounded, specify the bounds")
+    if (upper <= lower).any():
+        raise ValueError("Bounds must have a positive volume")
+    if count < 1:
+        raise ValueError("Count must be greater than 0")
+
+    chunk_counts = [chunk_size] * (count // chunk_size)
+    if count % chunk_size:
+        chunk_counts.append(count % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_counts))
+
+    args = [(compiled, lower, upper, n, s) for n, s in zip(chunk_counts, seeds)]
+    results = list(map_chunks(_count_modules, args, max_workers))
+
+    return VolumeEstimate(compiled, lower, upper, np.sum(results, axis=0))
@@ -0,0 +1,288 @@
+"""
+Rasterization of a geometry onto a grid of voxels.
+"""
+
+# Standard library modules.
+import os
+
+# Third party modules.
+import numpy as np
+
+# Local modules.
+from pypenelopetools.pengeom.compiled import map_chunks
+
+# Globals and constants variables.
+DEFAULT_CHUNK_SIZE = 262144
+"""Default number of points located at once."""
+
+MAX_INDEX = np.iinfo(np.uint16).max
+"""Maximum module or material index in a voxel grid."""
+
+
+def get_grid_edges(input):
+    """
+    Returns the edges of the voxels of the dose box defined by the
+    ``GRIDX``, ``GRIDY`` and ``GRIDZ`` keywords of an input.
+
+    Args:
+        input (:obj:`InputBase <pypenelopetools.penelope.input.InputBase>`):
+            Input (e.g. of PENMAIN or PENEPMA).
+
+    Returns:
+        tuple: x, y and z edges (cm), arrays with one more value than the
+        number of bins along each axis.
+    """
+    edges = []
+    for keyword in (input.GRIDX, input.GRIDY, input.GRIDZ):
+        lower, upper, bins = keyword.get()
+        if lower is None or upper is None or bins is None:
+            raise ValueError("Keyword {0} is not defined".format(keyword.name))
+        edges.append(np.linspace(lower, upper, bins + 1))
+    return tuple(edges)
+
+
+def _get_mode(values):
+    """
+    Returns the most frequent value of each row, the smallest one in case of
+    tie.
+    """
+    values = np.sort(values, axis=1)
+    positions = np.arange(values.shape[1])
+
+    starts = np.ones(values.shape, dtype=bool)
+    starts[:, 1:] = values[:, 1:] != values[:, :-1]
+    run_starts = np.maximum.accumulate(np.where(starts, positions, 0), axis=1)
+    best = np.argmax(positions - run_starts, axis=1)
+
+    return values[np.arange(len(values)), best]
+
+
+def _get_count_dtype(sample_count):
+    return np.uint8 if sample_count <= np.iinfo(np.uint8).max else np.uint16
+
+
+def _voxelize(compiled, edges, supersampling, start, stop, chunk_size):
+    """
+    Returns the module index and, with supersampling, the number of samples
+    in each material of voxels *start* to *stop* (in C order).
+    """
+    x_edges, y_edges, z_edges = edges
+    shape = (len(x_edges) - 1, len(y_edges) - 1, len(z_edges) - 1)
+
+    # Relative positions of the samples inside a voxel
+    offsets = (np.arange(supersampling) + 0.5) / supersampling
+    offsets = np.stack(np.meshgrid(offsets, offsets, offsets, indexing="ij"), axis=-1)
+    offsets = offsets.reshape(-1, 3)
+    sample_count = len(offsets)
+
+    material_count = max(compiled.materials, default=0) + 1
+    modules = np.empty(stop - start, dtype=np.uint16)
+    counts = None
+    if supersampling > 1:
+        counts = np.empty(
+            (stop - start, material_count), dtype=_get_count_dtype(sample_count)
+        )
+
+    step = max(1, chunk_size // sample_count)
+    for chunk_start in range(start, stop, step):
+        chunk_stop = min(chunk_start + step, stop)
+        ix, iy, iz = np.unravel_index(np.arange(chunk_start, chunk_stop), shape)
+        lowers = np.column_stack([x_edges[ix], y_edges[iy], z_edges[iz]])
+        sizes = (
+            np.column_stack([x_edges[ix + 1], y_edges[iy + 1], z_edges[iz + 1]])
+            - lowers
+        )
+
+        points = lowers[:, np.newaxis, :] + offsets * sizes[:, np.newaxis, :]
+        located = compiled.locate(points.reshape(-1, 3), chunk_size=chunk_size)
+        located = located.reshape(-1, sample_count)
+
+        chunk = slice(chunk_start - start, chunk_stop - start)
+        modules[chunk] = _get_mode(located) if sample_count > 1 else located[:, 0]
+
+        if counts is not None:
+            materials = compiled.material_indices[located]
+            rows = np.repeat(np.arange(len(materials)), sample_count)
+            counts[chunk] = np.bincount(
+                rows * material_count + materials.ravel(),
+                minlength=len(materials) * material_count,
+            ).reshape(-1, material_count)
+
+    return modules, counts
+
+
+class VoxelGrid(object):
+    """
+    Geometry rasterized onto a grid of voxels.
+    Arrays over the voxels have shape (NX, NY, NZ) and are indexed with the
+    bins along x, y and z.
+
+    Args:
+        compiled (:obj:`CompiledGeometry <pypenelopetools.pengeom.compiled.CompiledGeometry>`):
+            Compiled geometry.
+        x_edges, y_edges, z_edges (:class:`numpy.ndarray`):
+            Edges of the voxels along each axis (cm).
+        module_indices (:class:`numpy.ndarray`):
+            Module of each voxel, 0 outside all modules.
+        material_counts (:class:`numpy.ndarray`, optional):
+            Number of samples of each voxel in each material, array of shape
+            (NX, NY, NZ, number of materials) of uint8 (or uint16 above 6
+            samples per axis).
+        supersampling (int, optional): Number of samples along each axis
+            of a voxel.
+
+    Attributes:
+        material_indices (:class:`numpy.ndarray`):
+            Material of each voxel (the material of its module), 0 for
+            vacuum and outside all modules.
+    """
+
+    def __init__(
+        self,
+        compiled,
+        x_edges,
+        y_edges,
+        z_edges,
+        module_indices,
+        material_counts=None,
+        supersampling=1,
+    ):
+        self.compiled = compiled
+        self.x_edges = np.asarray(x_edges, dtype=float)
+        self.y_edges = np.asarray(y_edges, dtype=float)
+        self.z_edges = np.asarray(z_edges, dtype=float)
+        self.module_indices = np.asarray(module_indices, dtype=np.uint16)
+        self.material_indices = compiled.material_indices.astype(np.uint16)[
+            self.module_indices
+        ]
+        self.material_counts = material_counts
+        self.supersampling = supersampling
+
+    def __repr__(self):
+        return "<{0}(shape={1}, supersampling={2:d})>".format(
+            self.__class__.__name__, self.shape, self.supersampling
+        )
+
+    def get_material_fractions(self, material_index):
+        """
+        Returns the fraction of each voxel filled by a material.
+        Without supersampling, fractions are either 0 or 1 depending on the
+        material at the centre of the voxels.
+
+        Args:
+            material_index (int): Material index, 0 for vacuum.
+
+        Returns:
+            :class:`numpy.ndarray`: Fractions, array of shape (NX, NY, NZ).
+        """
+        if self.material_counts is None:
+            return (self.material_indices == material_index).astype(np.float32)
+
+        if material_index >= self.material_counts.shape[-1]:
+            return np.zeros(self.shape, dtype=np.float32)
+
+        counts = self.material_counts[..., material_index]
+        return counts.astype(np.float32) / self.supersampling**3
+
+    @property
+    def shape(self):
+        """tuple: Number of voxels along x, y and z."""
+        return self.module_indices.shape
+
+    @property
+    def voxel_volumes_cm3(self):
+        """:class:`numpy.ndarray`: Volume of each voxel."""
+        return (
+            np.diff(self.x_edges)[:, np.newaxis, np.newaxis]
+            * np.diff(self.y_edges)[np.newaxis, :, np.newaxis]
+            * np.diff(self.z_edges)[np.newaxis, np.newaxis, :]
+        )
+
+
+def voxelize(
+    compiled,
+    x_edges,
+    y_edges,
+    z_edges,
+    supersampling=1,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    max_workers=1,
+):
+    """
+    Rasterizes a compiled geometry onto a grid of voxels.
+    Each voxel is sampled on a regular grid of *supersampling*\\ :sup:`3`
+    points. Its module is the most frequent one among the samples (the one
+    at its centre without supersampling), and with supersampling the number
+    of samples in each material gives the partial-volume fractions.
+
+    The edges of a dose box defined in an input are given by
+    :func:`get_grid_edges`.
+
+    Args:
+        compiled (:obj:`CompiledGeometry <pypenelopetools.pengeom.compiled.CompiledGeometry>`):
+            Compiled geometry.
+        x_edges, y_edges, z_edges (:class:`numpy.ndarray`):
+            Edges of the voxels along each axis (cm), in increasing order.
+        supersampling (int, optional): Number of samples along each axis of
+            a voxel.
+        chunk_size (int, optional): Number of points located at once.
+        max_workers (int, optional): Number of worker processes.
+            If ``1``, the voxels are located in this process.
+            If ``None``, the number of processors is used.
+
+    Returns:
+        :obj:`VoxelGrid`: Voxel grid.
+    """
+    edges = tuple(np.asarray(e, dtype=float) for e in (x_edges, y_edges, z_edges))
+    for e in edges:
+        if e.ndim != 1 or len(e) < 2 or (np.diff(e) <= 0.0).any():
+            raise ValueError("Edges must be increasing, with at least 2 values")
+    if supersampling < 1:
+        raise ValueError("Supersampling must be greater than 0")
+    if supersampling**3 > MAX_INDEX:
+        raise ValueError("Supersampling must be at most 40")
+    if compiled.module_count > MAX_INDEX or max(compiled.materials) > MAX_INDEX:
+        raise ValueError("Too many modules or materials for a voxel grid")
+
+    shape = tuple(len(e) - 1 for e in edges)
+    voxel_count = int(np.prod(shape))
+
+    # Split the voxels in chunks of about chunk_size points
+    step = max(1, chunk_size // supersampling**3)
+    if max_workers != 1:
+        # A few tasks per worker, each located in chunks
+        workers = max_workers or os.cpu_count() or 1
+        step = max(step, -(-voxel_count // (4 * workers)))
+    ranges = [
+        (start, min(start + step, voxel_count)) for start in range(0, voxel_count, step)
+    ]
+
+    args = [
+        (compiled, edges, supersampling, start, stop, chunk_size)
+        for start, stop in ranges
+    ]
+    results = list(map_chunks(_voxelize, args, max_workers))
+
+    module_indices = np.empty(voxel_count, dtype=np.uint16)
+    material_counts = None
+    if supersampling > 1:
+        material_counts = np.empty(
+            (voxel_count, results[0][1].shape[1]),
+            dtype=_get_count_dtype(supersampling**3),
+        )
+
+    for (start, stop), (modules, counts) in zip(ranges, results):
+        module_indices[start:stop] = modules
+        if material_counts is not None:
+            material_counts[start:stop] = counts
+
+    if material_counts is not None:
+        material_counts = material_counts.reshape(shape + (-1,))
+
+    return VoxelGrid(
+        compiled,
+        *edges,
+        module_indices.reshape(shape),
+        material_counts,
+        supersampling,
+    )
@@ -0,0 +1,26 @@
+"""
+PENMAIN executable.
+"""
+
+# Standard library modules.
+
+# Third party modules.
+
+# Local modules.
+from pypenelopetools.penelope.program import PenelopeProgramBase
+
+# Globals and constants variables.
+
+
+class PenmainProgram(PenelopeProgramBase):
+    """
+    PENMAIN executable.
+    No reader exists for the results of PENMAIN, the result files are
+    left in the work directory.
+
+    Args:
+        executable (str, optional): Path to the executable.
+    """
+
+    def __init__(self, executable=None):
+        super().__init__("penmain", executable)
@@ -0,0 +1,490 @@
+"""
+Planning of the simulation parameters of materials and bodies.
+
+The absorption energies (EABS), the elastic scattering parameters (C1, C2),
+the cutoff energy losses (WCC, WCR) and the maximum step lengths (DSMAX) have
+a large effect on the speed of a simulation.
+A :class:`SimulationPlanner` proposes values for these parameters from the
+ranges and attenuation lengths of the materials
+(see :class:`MaterialTables <pypenelopetools.materialtables.MaterialTables>`)
+and the sizes of the bodies of the geometry:
+
+* A particle is absorbed when its energy is below the energy at which its
+  range (electrons and positrons) or attenuation length (photons) is a fraction
+  *accuracy* of the size of the smallest body of its material.
+  The absorption energies are never larger than the lowest energy of interest
+  (e.g. the energy of the lowest x-ray line detected), so the particles that
+  can still be detected are tracked.
+* C1 and C2 are equal to *accuracy*, within the interval recommended in the
+  manual of PENELOPE (0.01 to 0.2).
+* WCC and WCR are equal to the absorption energies, but not larger than the
+  energy resolution of the detectors.
+* DSMAX is a fraction *step_fraction* of the size of the body.
+
+The sizes of the bodies are given explicitly, calculated from the layers and
+cylinders of PENCYL (:class:`GeometryDefinitions <pypenelopetools.pencyl.keywords.GeometryDefinitions>`)
+or estimated from the surfaces of the modules of PENGEOM
+(see :func:`get_module_size_cm`).
+The resulting :class:`SimulationPlan` adds the ``MFNAME``/``MSIMPA`` and
+``DSMAX`` keywords to an input.
+
+Example:
+    Parameters of a PENEPMA simulation with a thin film::
+
+        planner = SimulationPlanner(accuracy=0.05, min_energy_eV=900.0)
+        plan = planner.plan_pengeom(geometry, {copper: copper_tables, silicon: silicon_tables})
+        plan.apply(penepma_input)
+"""
+
+# Standard library modules.
+import math
+
+# Third party modules.
+import numpy as np
+
+# Local modules.
+from pypenelopetools.materialtables import ELECTRON, POSITRON
+from pypenelopetools.material import VACUUM
+from pypenelopetools.pengeom.surface import SurfaceReduced
+
+# Globals and constants variables.
+MIN_ABSORPTION_ENERGY_eV = 50.0
+"""Lowest absorption energy accepted by PENELOPE."""
+
+MIN_C = 0.01
+MAX_C = 0.2
+
+PLANE_INDICES = (0, 0, 0, 1, 0)
+CYLINDER_INDICES = (1, 1, 0, 0, -1)
+SPHERE_INDICES = (1, 1, 1, 0, -1)
+
+
+def _get_plane_normal(surface):
+    """
+    Returns the unit normal of a plane surface, with a positive first
+    non-zero component.
+    """
+    theta = math.radians(surface.rotation.theta_deg)
+    phi = math.radians(surface.rotation.phi_deg)
+    normal = np.array(
+        [
+            math.sin(theta) * math.cos(phi),
+            math.sin(theta) * math.sin(phi),
+            math.cos(theta),
+        ]
+    )
+    normal[np.abs(normal) < 1e-9] = 0.0
+
+    if normal[np.nonzero(normal)[0][0]] < 0.0:
+        normal = -normal
+
+    return normal
+
+
+def get_module_size_cm(module):
+    """
+    Estimates the size of a module of PENGEOM, i.e. its smallest dimension,
+    from its limiting surfaces: the largest distance between parallel planes
+    and the diameter of cylinders and spheres.
+    Only reduced surfaces of planes, cylinders and spheres are considered.
+
+    Args:
+        module (:class:`Module <pypenelopetools.pengeom.module.Module>`): Module.
+
+    Returns:
+        float: Size in cm or ``None`` if it cannot be estimated.
+    """
+    distances = {}
+    sizes = []
+
+    for surface in module.get_surfaces():
+        if not isinstance(surface, SurfaceReduced):
+            continue
+
+        if surface.indices == PLANE_INDICES:
+            normal = _get_plane_normal(surface)
+            shift = surface.shift
+            distance = float(np.dot(normal, [shift.x_cm, shift.y_cm, shift.z_cm]))
+            key = tuple(np.round(normal, 9))
+            distances.setdefault(key, []).append(distance)
+
+        elif surface.indices == CYLINDER_INDICES:
+            sizes.append(2.0 * min(surface.scale.x, surface.scale.y))
+
+        elif surface.indices == SPHERE_INDICES:
+            scale = surface.scale
+            sizes.append(2.0 * min(scale.x, scale.y, scale.z))
+
+    for values in distances.values():
+        if len(values) > 1:
+            sizes.append(max(values) - min(values))
+
+    sizes = [size for size in sizes if size > 0.0]
+    if not sizes:
+        return None
+
+    return min(sizes)
+
+
+def _get_largest_energy_below(energies, values, threshold):
+    """
+    Returns the largest energy below which all *values* are lower than
+    *threshold*, interpolated in log-log scale, or ``None`` if the first value
+    already exceeds it.
+    """
+    above = np.nonzero(~(values <= threshold))[0]
+    if len(above) == 0:
+        return float(energies[-1])
+
+    index = above[0]
+    if index == 0:
+        return None
+
+    x0, x1 = np.log(energies[index - 1 : index + 1])
+    y0, y1 = np.log(values[index - 1 : index + 1])
+    if y1 == y0:
+        return float(energies[index - 1])
+
+    x = x0 + (np.log(threshold) - y0) * (x1 - x0) / (y1 - y0)
+    return float(np.exp(x))
+
+
+class MaterialParameters(object):
+    """
+    Simulation parameters of a material, as defined by the ``MSIMPA`` keyword.
+
+    Attributes:
+        eabs1 (float): Absorption energy of electrons in eV.
+        eabs2 (float): Absorption energy of photons in eV.
+        eabs3 (float): Absorption energy of positrons in eV.
+        c1 (float): Elastic scattering coefficient.
+        c2 (float): Elastic scattering coefficient.
+        wcc (float): Cutoff energy losses for inelastic collisions in eV.
+        wcr (float): Cutoff energy losses for Bremsstrahlung emission in eV.
+    """
+
+    def __init__(self, eabs1, eabs2, eabs3, c1, c2, wcc, wcr):
+        self.eabs1 = eabs1
+        self.eabs2 = eabs2
+        self.eabs3 = eabs3
+        self.c1 = c1
+        self.c2 = c2
+        self.wcc = wcc
+        self.wcr = wcr
+
+    def __repr__(self):
+        return "<{0}(eabs=({1:g}, {2:g}, {3:g}) eV, c1={4:g}, c2={5:g}, wcc={6:g} eV, wcr={7:g} eV)>".format(
+            self.__class__.__name__, *self.to_tuple()
+        )
+
+    def to_tuple(self):
+        """
+        Returns:
+            tuple(float): Parameters in the order of the ``MSIMPA`` keyword.
+        """
+        return (
+            self.eabs1,
+            self.eabs2,
+            self.eabs3,
+            self.c1,
+            self.c2,
+            self.wcc,
+            self.wcr,
+        )
+
+
+class SimulationPlan(object):
+    """
+    Simulation parameters of the materials and bodies of a geometry.
+
+    Attributes:
+        materials (dict(int, :class:`MaterialParameters`)): Parameters of the
+            materials. The keys are material indexes.
+        filenames (dict(int, str)): File names of the material files.
+            The keys are material indexes.
+        dsmax (dict(tuple(int), float)): Maximum step lengths in cm.
+            The keys are the body labels: ``(kb,)`` for PENGEOM and
+            ``(kl, kc)`` for PENCYL.
+    """
+
+    def __init__(self):
+        self.materials = {}
+        self.filenames = {}
+        self.dsmax = {}
+
+    def __repr__(self):
+        return "<{0}({1:d} materials, {2:d} bodies)>".format(
+            self.__class__.__name__, len(self.materials), len(self.dsmax)
+        )
+
+    def apply(self, input):
+        """
+        Replaces the materials and maximum step lengths of an input by the
+        ones of this plan.
+
+        Args:
+            input: Input of PENEPMA, PENMAIN or PENCYL, with ``materials`` and
+                ``DSMAX`` keywords.
+
+        Raises:
+            ValueError: If the file name of a material is unknown.
+        """
+        for index in self.materials:
+            if self.filenames.get(index) is None:
+                raise ValueError("No file name for material {0:d}".format(index))
+
+        input.materials.clear()
+        for index, parameters in sorted(self.materials.items()):
+            input.materials.add(index, self.filenames[index], *parameters.to_tuple())
+
+        input.DSMAX.clear()
+        for body, dsmax in sorted(self.dsmax.items()):
+            input.DSMAX.add(*body, dsmax)
+
+
+class SimulationPlanner(object):
+    """
+    Planner of the simulation parameters.
+
+    Args:
+        accuracy (float, optional): Fraction of the size of the bodies
+            travelled by the particles below their absorption energy.
+            It is also used as C1 and C2.
+        min_energy_eV (float, optional): Lowest energy of interest in eV,
+            e.g. the energy of the lowest x-ray line detected or the lower
+            limit of the energy window of the detectors.
+            Absorption energies are not larger than this energy.
+        energy_resolution_eV (float, optional): Energy resolution of the
+            detectors in eV. Cutoff energy losses are not larger than this
+            energy.
+        step_fraction (float, optional): Maximum step length as a fraction of
+            the size of the bodies.
+
+    Attributes:
+        accuracy (float): Fraction of the size of the bodies.
+        min_energy_eV (float): Lowest energy of interest in eV or ``None``.
+        energy_resolution_eV (float): Energy resolution in eV or ``None``.
+        step_fraction (float): Maximum step length as a fraction of the size
+            of the bodies.
+    """
+
+    def __init__(
+        self,
+        accuracy=0.05,
+        min_energy_eV=None,
+        energy_resolution_eV=None,
+        step_fraction=0.1,
+    ):
+        if accuracy <= 0.0:
+            raise ValueError("Accuracy must be greater than 0")
+        if step_fraction <= 0.0:
+            raise ValueError("Step fraction must be greater than 0")
+
+        self.accuracy = accuracy
+        self.min_energy_eV = min_energy_eV
+        self.energy_resolution_eV = energy_resolution_eV
+        self.step_fraction = step_fraction
+
+    def __repr__(self):
+        return "<{0}(accuracy={1:g})>".format(self.__class__.__name__, self.accuracy)
+
+    def _limit_absorption_energy(self, energy_eV):
+        if energy_eV is None:
+            energy_eV = MIN_ABSORPTION_ENERGY_eV
+        if self.min_energy_eV is not None:
+            energy_eV = min(energy_eV, self.min_energy_eV)
+        return max(energy_eV, MIN_ABSORPTION_ENERGY_eV)
+
+    def _limit_cutoff_energy(self, energy_eV):
+        if self.energy_resolution_eV is not None:
+            energy_eV = min(energy_eV, self.energy_resolution_eV)
+        return energy_eV
+
+    def get_charged_absorption_energy_eV(self, tables, size_cm, particle=ELECTRON):
+        """
+        Returns the absorption energy of electrons or positrons in a material,
+        i.e. the largest energy with a CSDA range smaller than a fraction
+        *accuracy* of *size_cm*.
+
+        Args:
+            tables (:class:`MaterialTables <pypenelopetools.materialtables.MaterialTables>`):
+                Tables of the material.
+            size_cm (float): Size of the smallest body of the material in cm.
+            particle (str, optional): ``electron`` or ``positron``.
+
+        Returns:
+            float: Absorption energy in eV.
+        """
+        energies, _values = tables.get_column(
+            particle + "_collision_stopping_power_MeV_cm2_per_g"
+        )
+        ranges_cm = tables.csda_range_cm(energies, particle)
+        energy_eV = _get_largest_energy_below(
+            energies, ranges_cm, self.accuracy * size_cm
+        )
+        return self._limit_absorption_energy(energy_eV)
+
+    def get_photon_absorption_energy_eV(self, tables, size_cm):
+        """
+        Returns the absorption energy of photons in a material, i.e. the
+        largest energy below which all attenuation lengths are smaller than a
+        fraction *accuracy* of *size_cm*.
+
+        Args:
+            tables (:class:`MaterialTables <pypenelopetools.materialtables.MaterialTables>`):
+                Tables of the material.
+            size_cm (float): Size of the smallest body of the material in cm.
+
+        Returns:
+            float: Absorption energy in eV.
+        """
+        energies, _values = tables.get_column("photoelectric_cross_section_cm2")
+        lengths_cm = tables.photon_attenuation_length_cm(energies)
+        energy_eV = _get_largest_energy_below(
+            energies, lengths_cm, self.accuracy * size_cm
+        )
+        return self._limit_absorption_energy(energy_eV)
+
+    def plan_material(self, tables, size_cm):
+        """
+        Returns the simulation parameters of a material.
+
+        Args:
+            tables (:class:`MaterialTables <pypenelopetools.materialtables.MaterialTables>`):
+                Tables of the material.
+            size_cm (float): Size of the smallest body of the material in cm.
+
+        Returns:
+            :class:`MaterialParameters`: Parameters.
+        """
+        eabs1 = self.get_charged_absorption_energy_eV(tables, size_cm, ELECTRON)
+        eabs2 = self.get_photon_absorption_energy_eV(tables, size_cm)
+        eabs3 = self.get_charged_absorption_energy_eV(tables, size_cm, POSITRON)
+        c = min(max(self.accuracy, MIN_C), MAX_C)
+        wcc = self._limit_cutoff_energy(eabs1)
+        wcr = self._limit_cutoff_energy(eabs2)
+        return MaterialParameters(eabs1, eabs2, eabs3, c, c, wcc, wcr)
+
+    def get_dsmax_cm(self, size_cm):
+        """
+        Args:
+            size_cm (float): Size of a body in cm.
+
+        Returns:
+            float: Maximum step length in cm.
+        """
+        return self.step_fraction * size_cm
+
+    def plan(self, bodies, tables, filenames=None):
+        """
+        Returns the simulation parameters of bodies.
+
+        Args:
+            bodies (dict(tuple(int), tuple(int, float))): Material index and
+                size in cm of each body. The keys are the body labels.
+                Bodies of unknown size (``None``) only get a maximum step
+                length if their material is in other bodies.
+            tables (dict(int, :class:`MaterialTables <pypenelopetools.materialtables.MaterialTables>`)):
+                Tables of the materials. The keys are material indexes.
+            filenames (dict(int, str), optional): File names of the material
+                files. The keys are material indexes.
+
+        Returns:
+            :class:`SimulationPlan`: Plan.
+
+        Raises:
+            ValueError: If the size of all the bodies of a material is unknown.
+            KeyError: If the tables of a material are missing.
+        """
+        sizes = {}
+        for body, (material_index, size_cm) in bodies.items():
+            if material_index == 0:
+                continue
+            sizes.setdefault(material_index, [])
+            if size_cm is not None:
+                sizes[material_index].append(size_cm)
+
+        plan = SimulationPlan()
+        plan.filenames.update(filenames or {})
+
+        for material_index, material_sizes in sorted(sizes.items()):
+            if not material_sizes:
+                raise ValueError(
+                    "Unknown size of the bodies of material {0:d}".format(
+                        material_index
+                    )
+                )
+            plan.materials[material_index] = self.plan_material(
+                tables[material_index], min(material_sizes)
+            )
+
+        for body, (material_index, size_cm) in bodies.items():
+            if material_index == 0 or size_cm is None:
+                continue
+            plan.dsmax[body] = self.get_dsmax_cm(size_cm)
+
+        return plan
+
+    def plan_pengeom(self, geometry, tables, sizes=None):
+        """
+        Returns the simulation parameters of a geometry of PENGEOM.
+
+        Args:
+            geometry (:class:`Geometry <pypenelopetools.pengeom.geometry.Geometry>`):
+                Geometry.
+            tables (dict(:class:`Material <pypenelopetools.material.Material>`, :class:`MaterialTables <pypenelopetools.materialtables.MaterialTables>`)):
+                Tables of the materials of the geometry.
+            sizes (dict(:class:`Module <pypenelopetools.pengeom.module.Module>`, float), optional):
+                Sizes in cm of modules, overriding the ones estimated from
+                their surfaces (see :func:`get_module_size_cm`).
+
+        Returns:
+            :class:`SimulationPlan`: Plan.
+        """
+        sizes = sizes or {}
+        index_lookup = geometry.indexify()
+
+        bodies = {}
+        for module in geometry.get_modules():
+            size_cm = sizes.get(module)
+            if size_cm is None:
+                size_cm = get_module_size_cm(module)
+            bodies[(index_lookup[module],)] = (index_lookup[module.material], size_cm)
+
+        material_tables = {}
+        filenames = {}
+        for material in geometry.get_materials():
+            if material is VACUUM:
+                continue
+            material_tables[index_lookup[material]] = tables[material]
+            filenames[index_lookup[material]] = material.filename
+
+        return self.plan(bodies, material_tables, filenames)
+
+    def plan_pencyl(self, geometry_definitions, tables, filenames=None):
+        """
+        Returns the simulation parameters of a geometry of PENCYL.
+        The size of a body (cylinder KC in layer KL) is the smallest of the
+        height of the layer and the width of the cylinder (diameter if its
+        inner radius is zero).
+
+        Args:
+            geometry_definitions (:class:`GeometryDefinitions <pypenelopetools.pencyl.keywords.GeometryDefinitions>`):
+                Layers and cylinders.
+            tables (dict(int, :class:`MaterialTables <pypenelopetools.materialtables.MaterialTables>`)):
+                Tables of the materials. The keys are material indexes.
+            filenames (dict(int, str), optional): File names of the material
+                files. The keys are material indexes.
+
+        Returns:
+            :class:`SimulationPlan`: Plan.
+        """
+        (layers,) = geometry_definitions.get()
+
+        bodies = {}
+        for kl, (zlow, zhigh, _xcen, _ycen, cylinders) in enumerate(layers, 1):
+            for kc, (material_index, rin, rout) in enumerate(cylinders or (), 1):
+                width = rout - rin if rin > 0.0 else 2.0 * rout
+                bodies[(kl, kc)] = (material_index, min(zhigh - zlow, width))
+
+        return self.plan(bodies, tables, filenames)
@@ -1,6 +1,7 @@
 """"""
 
 # Standard library modules.
+import sys
 from pathlib import Path
 
 # Third party modules.
@@ -10,7 +11,58 @@ import pytest
 
 # Globals and constants variables.
 
+STUB_SCRIPT = """#!{executable}
+# Stub of a PENELOPE program: reads the input from stdin, writes the dump file
+# and copies the files of STUB_RESULTS_DIR in the current directory, also when
+# dumping if STUB_DUMP_RESULTS is set.
+import os
+import sys
+import time
+import shutil
+
+def copy_results():
+    dirpath = os.environ.get("STUB_RESULTS_DIR")
+    if dirpath:
+        for filename in os.listdir(dirpath):
+            shutil.copy(os.path.join(dirpath, filename), filename)
+
+keywords = {{}}
+for line in sys.stdin.read().splitlines():
+    if line[:6].strip():
+        keywords[line[:6].strip()] = line[7:].split("[")[0].strip()
+
+with open("stub-attempts", "a") as fp:
+    fp.write("x")
+with open("stub-attempts") as fp:
+    attempts = len(fp.read())
+
+with open("stub-resumes", "a") as fp:
+    fp.write(keywords.get("RESUME", "") + "\\n")
+
+if "DUMPTO" in keywords:
+    if os.environ.get("STUB_DUMP_RESULTS"):
+        copy_results()
+    with open(keywords["DUMPTO"], "w") as fp:
+        fp.write("dump {{0}}".format(attempts))
+
+if attempts <= int(os.environ.get("STUB_SLEEP_ATTEMPTS", sys.maxsize)):
+    time.sleep(float(os.environ.get("STUB_SLEEP_S", 0)))
+
+if attempts <= int(os.environ.get("STUB_FAIL_ATTEMPTS", 0)):
+    sys.exit(1)
+
+copy_results()
+"""
+
 
 @pytest.fixture
 def testdatadir():
     return Path(__file__).parent.joinpath("testdata").resolve()
+
+
+@pytest.fixture
+def stub_executable(tmp_path):
+    filepath = tmp_path.joinpath("stub.py")
+    filepath.write_text(STUB_SCRIPT.format(executable=sys.executable))
+    filepath.chmod(0o755)
+    return str(filepath)
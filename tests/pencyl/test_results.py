@@ -100,3 +100,16 @@ def testread_directory(testdatadir):
     result = PencylResult()
     result.read_directory(dirpath)
     _test_result(result)
+
+
+def testsaveload(testdatadir, tmp_path):
+    dirpath = testdatadir.joinpath("pencyl", "1-disc")
+    result = PencylResult()
+    result.read_directory(dirpath)
+
+    filepath = str(tmp_path.joinpath("pencyl-res.dat.snap"))
+    result.save(filepath)
+
+    result = PencylResult()
+    result.load(filepath)
+    _test_result(result)
@@ -0,0 +1,28 @@
+""" """
+
+# Standard library modules.
+import shutil
+
+# Third party modules.
+
+# Local modules.
+from pypenelopetools.pencyl.watcher import PencylWatcher
+
+# Globals and constants variables.
+
+
+def testrefresh(testdatadir, tmp_path):
+    watcher = PencylWatcher(str(tmp_path), use_inotify=False)
+    assert watcher.snapshot().simulated_primary_showers is None
+
+    shutil.copy(
+        testdatadir.joinpath("pencyl", "1-disc", "pencyl-res.dat"),
+        tmp_path.joinpath("pencyl-res.dat"),
+    )
+    assert watcher.refresh() == {"pencyl-res.dat"}
+
+    snapshot = watcher.snapshot()
+    assert snapshot.simulated_primary_showers.n > 0
+    assert snapshot.detector_deposited_energies_eV == dict(
+        snapshot.result.average_detector_deposited_energy_eV
+    )
@@ -0,0 +1,112 @@
+""" """
+
+# Standard library modules.
+import math
+
+# Third party modules.
+import numpy as np
+import pyxray
+import pytest
+
+# Local modules.
+from pypenelopetools.penelope.efficiency import (
+    get_relative_uncertainties,
+    get_figures_of_merit,
+    get_times_to_uncertainty_s,
+    extract_quantities,
+    EfficiencyReport,
+    ALL_CHANNELS,
+)
+from pypenelopetools.penepma.program import PenepmaProgram
+
+# Globals and constants variables.
+KA1_NAME = (
+    "pe-intens-01.dat",
+    "total_intensities_1_per_sr_electron",
+    pyxray.xray_line(29, "Ka1"),
+)
+
+
+@pytest.fixture
+def results(testdatadir):
+    program = PenepmaProgram("penepma")
+    return program.read_results(str(testdatadir.joinpath("penepma")))
+
+
+def testget_relative_uncertainties():
+    uncertainties = get_relative_uncertainties([2.0, -4.0, 0.0, np.nan], [0.2] * 4)
+    np.testing.assert_allclose(uncertainties[:2], [0.1, 0.05])
+    assert uncertainties[2] == math.inf
+    assert math.isnan(uncertainties[3])
+
+
+def testget_figures_of_merit():
+    uncertainties = np.array([[0.1, 0.01], [math.inf, 0.0]])
+    foms = get_figures_of_merit(uncertainties, np.array([[10.0], [20.0]]))
+    np.testing.assert_allclose(foms[0], [10.0, 1000.0])
+    assert foms[1, 0] == 0.0
+    assert math.isnan(foms[1, 1])
+
+
+def testget_times_to_uncertainty_s():
+    times = get_times_to_uncertainty_s([0.1, 0.01], 100.0, 0.01)
+    np.testing.assert_allclose(times, [10000.0, 100.0])
+
+    with pytest.raises(ValueError):
+        get_times_to_uncertainty_s([0.1], 100.0, 0.0)
+
+
+def testextract_quantities(results):
+    quantities = extract_quantities(results, {"first": (0, 10)})
+
+    value, std_dev = quantities[KA1_NAME]
+    assert value == pytest.approx(2.114718e-5)
+    assert std_dev == pytest.approx(5.40e-7 / 3.0)
+
+    assert ("penepma-res.dat", "upbound_fraction", None) in quantities
+    assert ("penepma-res.dat", "simulation_time_s", None) not in quantities
+    assert ("pe-intens-01.dat", "theta1_deg", None) not in quantities
+
+    spectrum = results["pe-spect-01.dat"].spectrum
+    value, _std_dev = quantities[("pe-spect-01.dat", "spectrum", ALL_CHANNELS)]
+    assert value == pytest.approx(sum(v.n for v in spectrum[:, 1]))
+    value, _std_dev = quantities[("pe-spect-01.dat", "spectrum", "first")]
+    assert value == pytest.approx(sum(v.n for v in spectrum[:10, 1]))
+
+
+def testreport(results):
+    simulation_time_s = results["penepma-res.dat"].simulation_time_s.n
+    report = EfficiencyReport.from_results([results, {}], labels=["a", "b"])
+
+    assert KA1_NAME in report.names
+    assert report.values.shape == (2, len(report.names))
+    assert np.isnan(report.values[1]).all()
+    assert np.isnan(report.simulation_times_s[1])
+
+    uncertainty = (5.40e-7 / 3.0) / 2.114718e-5
+    uncertainties = report.get_relative_uncertainties(KA1_NAME)
+    assert uncertainties[0] == pytest.approx(uncertainty)
+
+    foms = report.get_figures_of_merit(KA1_NAME)
+    assert foms[0] == pytest.approx(1.0 / (uncertainty**2 * simulation_time_s))
+    assert report.get_figures_of_merit().shape == report.values.shape
+
+    times = report.get_times_to_uncertainty_s(0.001, KA1_NAME)
+    assert times[0] == pytest.approx(simulation_time_s * (uncertainty / 0.001) ** 2)
+
+    remaining = report.get_remaining_times_s(0.5)
+    assert remaining[0, report.names.index(KA1_NAME)] == 0.0
+
+    assert report.rank(KA1_NAME).tolist() == [0, 1]
+
+
+def testreport_rank():
+    names = [("a", "x", None)]
+    report = EfficiencyReport(
+        names, [[1.0], [1.0], [np.nan]], [[0.1], [0.01], [0.1]], [10.0, 10.0, 1.0]
+    )
+    assert report.rank(names[0]).tolist() == [1, 0, 2]
+    assert report.labels == [0, 1, 2]
+
+    with pytest.raises(ValueError):
+        EfficiencyReport(names, [[1.0]], [[0.1]], [1.0], labels=["a", "b"])
@@ -0,0 +1,133 @@
+""" """
+
+# Standard library modules.
+import io
+import os
+import json
+import stat
+import shutil
+
+# Third party modules.
+import pytest
+
+# Local modules.
+from pypenelopetools.penelope.metrics import MetricsCollector, RunMetrics
+from pypenelopetools.penepma.watcher import PenepmaWatcher
+
+# Globals and constants variables.
+SHOWERS = 4.4682e4
+SPEED = 2.291479e2
+
+
+@pytest.fixture
+def collector(tmp_path):
+    collector = MetricsCollector(stall_timeout_s=60.0)
+    for name in ["epma1", "epma2"]:
+        tmp_path.joinpath(name).mkdir()
+        watcher = PenepmaWatcher(str(tmp_path.joinpath(name)), use_inotify=False)
+        collector.add_run(name, watcher, target_showers=1e5, target_uncertainty=0.01)
+    return collector
+
+
+def _copy_results(testdatadir, dirpath):
+    shutil.copy(testdatadir.joinpath("penepma", "penepma-res.dat"), dirpath)
+
+
+def testsample_empty(collector):
+    metrics = collector.sample(1e9)
+    assert [m.name for m in metrics] == ["epma1", "epma2"]
+    assert metrics[0].simulated_showers is None
+    assert metrics[0].eta_s is None
+
+    last_progress = metrics[0].last_progress_timestamp
+    assert not collector.sample(last_progress + 30.0)[0].stalled
+    assert collector.sample(last_progress + 90.0)[0].stalled
+
+
+def testsample(collector, testdatadir, tmp_path):
+    _copy_results(testdatadir, tmp_path.joinpath("epma1"))
+
+    metrics = collector.sample(2e9)[0]
+    assert metrics.simulated_showers == pytest.approx(SHOWERS)
+    assert metrics.simulation_time_s == pytest.approx(1.949920e2)
+    assert metrics.speed_1_per_s == pytest.approx(SPEED)
+    assert metrics.relative_uncertainty == pytest.approx(3.559e-2)
+    assert metrics.last_progress_timestamp == 2e9
+
+    # Uncertainty target reached after more showers than the shower target
+    assert metrics.eta_s == pytest.approx((1e5 - SHOWERS) / SPEED)
+
+    # No new shower
+    assert collector.sample(2e9 + 30.0)[0].last_progress_timestamp == 2e9
+    assert collector.sample(2e9 + 90.0)[0].stalled
+
+
+def testsample_eta_uncertainty(tmp_path, testdatadir):
+    _copy_results(testdatadir, tmp_path)
+    collector = MetricsCollector()
+    watcher = PenepmaWatcher(str(tmp_path), use_inotify=False)
+    collector.add_run("epma1", watcher, target_time_s=1e6, target_uncertainty=0.01)
+
+    (metrics,) = collector.sample()
+    required_showers = SHOWERS * (3.559e-2 / 0.01) ** 2
+    assert metrics.eta_s == pytest.approx((required_showers - SHOWERS) / SPEED)
+
+
+def testadd_run_duplicate(collector, tmp_path):
+    with pytest.raises(ValueError):
+        collector.add_run("epma1", PenepmaWatcher(str(tmp_path)))
+
+    collector.remove_run("epma1")
+    assert collector.names == ["epma2"]
+
+
+def testwrite_prometheus(collector, testdatadir, tmp_path):
+    _copy_results(testdatadir, tmp_path.joinpath("epma1"))
+    _copy_results(testdatadir, tmp_path.joinpath("epma2"))
+
+    filepath = tmp_path.joinpath("penelope.prom")
+    collector.write_prometheus(str(filepath))
+
+    lines = filepath.read_text().splitlines()
+    assert "# TYPE penelope_simulated_showers gauge" in lines
+    assert 'penelope_simulated_showers{run="epma1"} 44682.0' in lines
+    assert 'penelope_stalled{run="epma2"} 0.0' in lines
+
+    (line,) = [l for l in lines if l.startswith("penelope_speed_showers_per_second ")]
+    assert float(line.split()[1]) == pytest.approx(2 * SPEED)
+
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == ".tmp"] == []
+
+
+@pytest.mark.skipif(os.name != "posix", reason="requires POSIX permissions")
+def testwrite_prometheus_mode(collector, tmp_path):
+    filepath = tmp_path.joinpath("penelope.prom")
+    collector.write_prometheus(str(filepath))
+
+    assert stat.S_IMODE(filepath.stat().st_mode) == 0o644
+
+
+def testformat_prometheus_special_values():
+    metrics = [
+        RunMetrics('a\\b"c\nd é', 0.0, eta_s=float("inf"), speed_1_per_s=1.0),
+        RunMetrics("e", 0.0, eta_s=float("-inf"), relative_uncertainty=float("nan")),
+    ]
+    lines = MetricsCollector().format_prometheus(metrics).splitlines()
+
+    assert 'penelope_eta_seconds{run="a\\\\b\\"c\\nd é"} +Inf' in lines
+    assert 'penelope_eta_seconds{run="e"} -Inf' in lines
+    assert 'penelope_relative_uncertainty{run="e"} NaN' in lines
+    assert "penelope_speed_showers_per_second 1.0" in lines
+
+
+def testwrite_jsonlines(collector, testdatadir, tmp_path):
+    _copy_results(testdatadir, tmp_path.joinpath("epma2"))
+
+    fileobj = io.StringIO()
+    collector.write_jsonlines(fileobj)
+
+    values = [json.loads(line) for line in fileobj.getvalue().splitlines()]
+    assert [v["name"] for v in values] == ["epma1", "epma2"]
+    assert values[0]["simulated_showers"] is None
+    assert values[1]["simulated_showers"] == pytest.approx(SHOWERS)
+    assert values[1]["stalled"] is False
@@ -0,0 +1,158 @@
+""" """
+
+# Standard library modules.
+import math
+import os
+
+# Third party modules.
+import pyxray
+import pytest
+
+# Local modules.
+from pypenelopetools.penelope.optimizer import (
+    VarianceReduction,
+    VarianceReductionOptimizer,
+)
+from pypenelopetools.penelope.enums import KPAR, ICOL
+from pypenelopetools.penelope.runner import JobStatus
+from pypenelopetools.penepma.input import PenepmaInput
+from pypenelopetools.penepma.program import PenepmaProgram
+from pypenelopetools.penepma.termination import UncertaintyTarget
+from pypenelopetools.pencyl.input import PencylInput
+
+# Globals and constants variables.
+KA1 = pyxray.xray_line(29, "Ka1")
+
+
+class FakeOptimizer(VarianceReductionOptimizer):
+    """Optimizer whose pilot runs return their input as results."""
+
+    def _run_jobs(self, jobs):
+        for job in jobs:
+            job.results = {"input": job.input}
+            job.status = JobStatus.SUCCEEDED
+
+
+def _get_xray_splitting_uncertainty(results):
+    # Most efficient with a splitting number of 4 in body 1
+    ((values,),) = results["input"].IXRSPL.get()
+    return 1.0 + (math.log2(values[1]) - 2.0) ** 2
+
+
+@pytest.fixture
+def input(testdatadir):
+    input = PenepmaInput()
+    with open(testdatadir.joinpath("penepma", "epma1.in"), "r") as fp:
+        input.read(fp)
+    return input
+
+
+def testvariance_reduction_apply():
+    forcing_key = ((1,), KPAR.ELECTRON, ICOL.INNER_SHELL_IMPACT_IONISATION)
+    variance_reduction = VarianceReduction(
+        {forcing_key: (-400.0, 0.9, 1.0)}, {(1,): 2}, {(2,): 4, (1,): 8}
+    )
+
+    keywords = variance_reduction.get_keywords()
+    assert keywords["IFORCE"] == [(1, KPAR.ELECTRON, 5, -400.0, 0.9, 1.0)]
+    assert keywords["IXRSPL"] == [(1, 8), (2, 4)]
+
+    input = PenepmaInput()
+    input.IBRSPL.add(3, 10)
+    variance_reduction.apply(input)
+    assert input.IBRSPL.get() == (((1, 2),),)
+    assert input.IXRSPL.get() == (((1, 8), (2, 4)),)
+    assert len(input.IFORCE.get()[0]) == 1
+
+    input = PencylInput()
+    VarianceReduction(xray_splittings={(1, 2): 4}).apply(input)
+    assert input.IXRSPL.get() == (((1, 2, 4),),)
+
+    assert variance_reduction == VarianceReduction(
+        {forcing_key: (-400.0, 0.9, 1.0)}, {(1,): 2}, {(1,): 8, (2,): 4}
+    )
+    assert variance_reduction != VarianceReduction()
+
+
+def testevaluate(tmp_path, input, stub_executable, testdatadir, monkeypatch):
+    monkeypatch.setenv("STUB_RESULTS_DIR", str(testdatadir.joinpath("penepma")))
+    target = UncertaintyTarget(KA1, 1, 0.01)
+    optimizer = VarianceReductionOptimizer(
+        PenepmaProgram(stub_executable),
+        input,
+        str(tmp_path),
+        [target.get_uncertainty],
+        pilot_time_s=10.0,
+    )
+
+    variance_reduction = VarianceReduction(xray_splittings={(1,): 4})
+    (run,) = optimizer.evaluate([variance_reduction])
+
+    assert run.job.status is JobStatus.SUCCEEDED
+    uncertainty = 3.0 * (5.40e-7 / 3.0) / 2.114718e-5
+    assert run.uncertainties == [pytest.approx(uncertainty)]
+
+    simulation_time_s = run.job.results["penepma-res.dat"].simulation_time_s.n
+    assert run.simulation_time_s == pytest.approx(simulation_time_s)
+    assert run.efficiency == pytest.approx(1.0 / (uncertainty**2 * simulation_time_s))
+
+    with open(os.path.join(run.job.workdir, "penepma.in"), "r") as fp:
+        content = fp.read()
+    assert "IXRSPL" in content
+
+    # Already evaluated
+    assert optimizer.evaluate([VarianceReduction(xray_splittings={(1,): 4})]) == [run]
+    assert len(optimizer.runs) == 1
+
+
+def testevaluate_failed(tmp_path, input, stub_executable, monkeypatch):
+    monkeypatch.setenv("STUB_FAIL_ATTEMPTS", "1")
+    optimizer = VarianceReductionOptimizer(
+        PenepmaProgram(stub_executable),
+        input,
+        str(tmp_path),
+        [UncertaintyTarget(KA1, 1, 0.01).get_uncertainty],
+    )
+
+    (run,) = optimizer.evaluate([VarianceReduction()])
+    assert run.job.status is JobStatus.FAILED
+    assert run.efficiency == 0.0
+
+
+def testgrid_search(tmp_path, input):
+    optimizer = FakeOptimizer(
+        None,
+        input,
+        str(tmp_path),
+        [_get_xray_splitting_uncertainty],
+        pilot_time_s=10.0,
+    )
+
+    runs = optimizer.grid_search(
+        bremsstrahlung_splittings={(1,): [1, 2]},
+        xray_splittings={(1,): [1, 2, 4, 8, 16]},
+    )
+
+    assert len(runs) == 10
+    assert runs[0].variance_reduction.xray_splittings == {(1,): 4}
+    assert runs[0].efficiency == pytest.approx(1.0 / 10.0)
+    assert runs[-1].efficiency == pytest.approx(1.0 / (25.0 * 10.0))
+
+
+def testadaptive_search(tmp_path, input):
+    optimizer = FakeOptimizer(
+        None,
+        input,
+        str(tmp_path),
+        [_get_xray_splitting_uncertainty],
+        pilot_time_s=1.0,
+    )
+
+    run = optimizer.adaptive_search(xray_splittings={(1,): [1, 2, 4, 8, 16, 32]})
+
+    assert run.variance_reduction.xray_splittings == {(1,): 4}
+    assert run.efficiency == pytest.approx(1.0)
+    assert len(optimizer.runs) == 4  # 1, 2, 4 and 8
+
+    with pytest.raises(ValueError):
+        optimizer.adaptive_search(xray_splittings={(1,): []})
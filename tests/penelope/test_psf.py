@@ -0,0 +1,113 @@
+""" """
+
+# Standard library modules.
+import io
+
+# Third party modules.
+import pytest
+
+# Local modules.
+from pypenelopetools.penelope.psf import (
+    iter_psf,
+    WeightHistogram,
+    PsfWeightAnalyzer,
+    WeightWindow,
+)
+from pypenelopetools.penelope.enums import KPAR, ICOL
+from pypenelopetools.penmain.input import PenmainInput
+from pypenelopetools.pencyl.input import PencylInput
+
+# Globals and constants variables.
+
+
+def _create_psf_content():
+    lines = ["# PSF of impact detector", "# KPAR E X Y Z U V W WGHT ILB NSHI"]
+
+    def _add(kpar, weight, ilb1, count):
+        line = " {0:d} 1.0E+04 0.0 0.0 0.0 0.0 0.0 1.0 {1:.6E} {2:d} 1 0 0 1"
+        lines.extend([line.format(kpar, weight, ilb1)] * count)
+
+    _add(2, 0.5, 2, 1000)
+    _add(2, 5e-4, 2, 100)
+    _add(2, 50.0, 2, 5)
+    _add(1, 1.0, 1, 10)
+    lines.append("")
+
+    return "\n".join(lines) + "\n"
+
+
+def testiter_psf():
+    chunks = list(iter_psf(io.StringIO(_create_psf_content()), chunk_size=500))
+    assert [len(chunk) for chunk in chunks] == [498, 500, 117]
+    assert chunks[0].shape[1] == 14
+
+    with pytest.raises(ValueError):
+        list(iter_psf(io.StringIO("1 2 3\n")))
+
+    content = "1 1e4 0 0 0 0 0 1 1.0 1 1 0 0 1\n1 1e4 0 0 0 0 0 1 1.0 1 1 0 0\n"
+    with pytest.raises(ValueError):
+        list(iter_psf(io.StringIO(content)))
+
+
+def testweight_histogram():
+    histogram = WeightHistogram()
+    histogram.add([1.0, 1.0, 4.0])
+    assert histogram.count == 3
+    assert histogram.total_weight == pytest.approx(6.0)
+    assert histogram.effective_count == pytest.approx(36.0 / 18.0)
+    assert histogram.min_weight == 1.0
+    assert histogram.max_weight == 4.0
+
+    other = WeightHistogram()
+    other.add([0.1])
+    histogram.merge(other)
+    assert histogram.count == 4
+    assert histogram.counts.sum() == 4
+    assert histogram.min_weight == 0.1
+
+
+def testanalyzer(tmp_path):
+    filepath = tmp_path.joinpath("psf-impdet-02.dat")
+    filepath.write_text(_create_psf_content())
+
+    analyzer = PsfWeightAnalyzer()
+    analyzer.read_file(str(filepath), chunk_size=300)
+
+    assert sorted(analyzer.histograms) == [(2, 1, 1), (2, 2, 2)]
+    assert analyzer.histograms[(2, 2, 2)].count == 1105
+    assert analyzer.get_histogram(detector=2).count == 1115
+    assert analyzer.get_histogram(detector=1).count == 0
+
+    window = analyzer.recommend(kpar=KPAR.PHOTON)
+    assert window.wlow == pytest.approx(10**-0.4)
+    assert window.whig == pytest.approx(10**-0.3)
+    assert window.nsplit == 1
+
+    window = analyzer.recommend(kpar=KPAR.PHOTON, roulette_fraction=1e-5)
+    assert window.wlow == pytest.approx(5e-4)
+    assert window.nsplit == 1000  # Limited by max_split
+
+    with pytest.raises(ValueError):
+        analyzer.recommend(kpar=KPAR.POSITRON)
+
+
+def testweight_window_apply():
+    window = WeightWindow(0.1, 10.0, 4)
+
+    input = PenmainInput()
+    window.apply_psf_source(input)
+    assert input.WGTWIN.get() == (0.1, 10.0)
+    assert input.IPSPLI.get() == (4,)
+
+    input.IFORCE.add(1, KPAR.PHOTON, ICOL.PHOTOELECTRIC_ABSORPTION, 10.0, 1e-3, 1.0)
+    input.IFORCE.add(1, KPAR.ELECTRON, ICOL.HARD_BREMSSTRAHLUNG_EMISSION, 5, 0.9, 1.0)
+    window.apply_forcings(input.IFORCE, KPAR.PHOTON)
+    ((photon, electron),) = input.IFORCE.get()
+    assert photon[-2:] == (0.1, 10.0)
+    assert electron[-2:] == (0.9, 1.0)
+
+    input = PencylInput()
+    input.IFORCE.add(1, 2, KPAR.PHOTON, ICOL.PHOTOELECTRIC_ABSORPTION, 10.0, 1e-3, 1.0)
+    window.apply_forcings(input.IFORCE)
+    assert input.IFORCE.get()[0][0][:2] == (1, 2)
+    assert input.IFORCE.get()[0][0][-2:] == (0.1, 10.0)
@@ -0,0 +1,112 @@
+""" """
+
+# Standard library modules.
+
+# Third party modules.
+import pytest
+import numpy as np
+
+# Local modules.
+from pypenelopetools.penelope.ranecu import (
+    Ranecu,
+    jump_seeds,
+    get_position,
+    allocate_seeds,
+    find_overlaps,
+    A1,
+    M1,
+    A2,
+    M2,
+    FACTORS1,
+    FACTORS2,
+    PERIOD,
+)
+
+# Globals and constants variables.
+
+
+def testprimitive_roots():
+    for a, m, factors in [(A1, M1, FACTORS1), (A2, M2, FACTORS2)]:
+        assert np.prod(factors, dtype=object) == m - 1
+        assert all(pow(a, (m - 1) // p, m) != 1 for p in factors)
+
+
+def testrand():
+    generator = Ranecu(1, 1)
+    assert generator.rand() == pytest.approx(
+        ((40014 - 40692) + 2147483562) * 4.656613057e-10
+    )
+
+
+def testrandom():
+    generator1 = Ranecu(123, 456)
+    generator2 = Ranecu(123, 456)
+
+    values = generator1.random(1000)
+    expected = [generator2.rand() for _ in range(1000)]
+
+    assert values == pytest.approx(expected)
+    assert generator1.seeds == generator2.seeds
+    assert ((values > 0.0) & (values < 1.0)).all()
+
+
+def testjump():
+    generator1 = Ranecu(123, 456)
+    generator2 = Ranecu(123, 456)
+
+    for _ in range(1000):
+        generator1.rand()
+    generator2.jump(1000)
+
+    assert generator1.seeds == generator2.seeds
+    assert jump_seeds(*generator2.seeds, -1000) == (123, 456)
+
+
+def testjump_seeds_invalid():
+    with pytest.raises(ValueError):
+        jump_seeds(0, 1, 10)
+    with pytest.raises(ValueError):
+        jump_seeds(1, M2, 10)
+
+
+@pytest.mark.parametrize("n", [0, 1, 1000, 10**14, PERIOD - 1])
+def testget_position(n):
+    assert get_position(*jump_seeds(1, 1, n)) == (0, n)
+
+
+def testget_position_cycle():
+    cycle, position = get_position(*jump_seeds(1, A2, 10**15))
+    assert cycle == 1
+    assert position == 10**15
+
+
+def testallocate_seeds():
+    seeds = allocate_seeds(4, 10**12, (5, 7))
+
+    assert seeds[0] == (5, 7)
+    assert seeds[3] == jump_seeds(5, 7, 3 * 10**12)
+
+
+def testallocate_seeds_too_many():
+    with pytest.raises(ValueError):
+        allocate_seeds(3, PERIOD // 2)
+
+
+def testfind_overlaps():
+    seeds = allocate_seeds(3, 1000)
+    runs = [(s, jump_seeds(*s, 1000)) for s in seeds]
+    assert find_overlaps(runs) == []
+
+    runs[0] = (seeds[0], jump_seeds(*seeds[0], 2500))
+    assert find_overlaps(runs) == [(0, 1), (0, 2)]
+
+
+def testfind_overlaps_wrap():
+    start = jump_seeds(1, 1, -10)
+    runs = [(start, jump_seeds(*start, 20)), ((1, 1), jump_seeds(1, 1, 5))]
+    assert find_overlaps(runs) == [(0, 1)]
+
+
+def testfind_overlaps_cycles():
+    runs = [((1, 1), jump_seeds(1, 1, 100)), ((1, A2), jump_seeds(1, A2, 100))]
+    assert find_overlaps(runs) == []
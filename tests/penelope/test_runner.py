@@ -0,0 +1,510 @@
+""" """
+
+# Standard library modules.
+import os
+import time
+import threading
+import concurrent.futures
+
+# Third party modules.
+import pytest
+from uncertainties import ufloat
+
+# Local modules.
+from pypenelopetools.penelope.runner import (
+    Job,
+    JobStatus,
+    JobError,
+    LocalScheduler,
+    split_job,
+    run_parallel,
+    find_seed_overlaps,
+    DUMP_FILENAMES,
+)
+from pypenelopetools.penelope.program import MaterialProgram
+from pypenelopetools.penelope.ranecu import (
+    allocate_seeds,
+    jump_seeds,
+    find_overlaps,
+    DEFAULT_SEEDS,
+    DEFAULT_DISTANCE,
+    PERIOD,
+)
+from pypenelopetools.penepma.program import PenepmaProgram
+from pypenelopetools.penepma.input import PenepmaInput
+from pypenelopetools.penepma.results import PenepmaResult
+from pypenelopetools.material import Material
+from pypenelopetools.pengeom.surface import zplane, cylinder
+from pypenelopetools.pengeom.module import Module, SidePointer
+from pypenelopetools.pengeom.geometry import Geometry
+
+# Globals and constants variables.
+
+MATERIAL_CU = Material("Cu", {29: 1.0}, 8.9)
+
+
+@pytest.fixture
+def input(testdatadir):
+    input = PenepmaInput()
+    with open(testdatadir.joinpath("penepma", "epma1.in"), "r") as fp:
+        input.read(fp)
+    return input
+
+
+@pytest.fixture
+def geometry():
+    module = Module(MATERIAL_CU, "Sample")
+    module.add_surface(zplane(0.0), SidePointer.NEGATIVE)
+    module.add_surface(zplane(-0.1), SidePointer.POSITIVE)
+    module.add_surface(cylinder(1.0), SidePointer.NEGATIVE)
+
+    geometry = Geometry("Cylindrical homogeneous foil")
+    geometry.add_module(module)
+    return geometry
+
+
+@pytest.fixture
+def program(stub_executable, testdatadir, monkeypatch):
+    monkeypatch.setenv("STUB_RESULTS_DIR", str(testdatadir.joinpath("penepma")))
+    return PenepmaProgram(stub_executable)
+
+
+def testexecutable_env(monkeypatch):
+    monkeypatch.setenv("PENEPMA_EXECUTABLE", "/opt/penelope/penepma")
+    assert PenepmaProgram().executable == "/opt/penelope/penepma"
+    assert PenepmaProgram("/bin/penepma").executable == "/bin/penepma"
+
+
+def testexecutable_notfound(monkeypatch):
+    monkeypatch.delenv("PENEPMA_EXECUTABLE", raising=False)
+    monkeypatch.setenv("PATH", "")
+    with pytest.raises(FileNotFoundError):
+        PenepmaProgram().executable
+
+
+def teststage(tmp_path, program, input, geometry, testdatadir):
+    matfilepath = testdatadir.joinpath("material", "mat1.mat")
+    job = Job(program, input, str(tmp_path.joinpath("job")), geometry, [matfilepath])
+    job.stage()
+
+    assert job.name == "job"
+    assert os.path.exists(job.input_filepath)
+    assert os.path.exists(os.path.join(job.workdir, "epma1.geo"))
+    assert os.path.exists(os.path.join(job.workdir, "mat1.mat"))
+
+
+def teststage_material(tmp_path):
+    job = Job(MaterialProgram("material"), MATERIAL_CU, str(tmp_path))
+    job.stage()
+
+    with open(job.input_filepath, "r") as fp:
+        assert Material.read_input(fp).name == "Cu"
+
+
+def testrun(tmp_path, program, input, geometry):
+    statuses = []
+    job = Job(program, input, str(tmp_path.joinpath("job")), geometry)
+
+    with LocalScheduler(
+        1, status_callback=lambda job: statuses.append(job.status)
+    ) as scheduler:
+        assert scheduler.submit(job).result() is job
+
+    assert job.status is JobStatus.SUCCEEDED
+    assert job.attempts == 1
+    assert job.returncode == 0
+    assert statuses == [JobStatus.PENDING, JobStatus.RUNNING, JobStatus.SUCCEEDED]
+
+    result = job.results["penepma-res.dat"]
+    assert isinstance(result, PenepmaResult)
+    assert result.simulated_primary_showers.n == pytest.approx(4.4682e4)
+    assert "pe-intens-01.dat" in job.results
+
+
+def testrun_many(tmp_path, program, input):
+    jobs = [Job(program, input, str(tmp_path.joinpath(str(i)))) for i in range(4)]
+
+    with LocalScheduler(2) as scheduler:
+        scheduler.run(jobs)
+
+    assert all(job.status is JobStatus.SUCCEEDED for job in jobs)
+
+
+def testrun_retry(tmp_path, program, input, monkeypatch):
+    monkeypatch.setenv("STUB_FAIL_ATTEMPTS", "1")
+
+    job = Job(program, input, str(tmp_path), max_retries=1)
+    with LocalScheduler(1) as scheduler:
+        scheduler.run([job])
+
+    assert job.status is JobStatus.SUCCEEDED
+    assert job.attempts == 2
+
+
+def testrun_failed(tmp_path, program, input, monkeypatch):
+    monkeypatch.setenv("STUB_FAIL_ATTEMPTS", "5")
+
+    job = Job(program, input, str(tmp_path), max_retries=1)
+    with LocalScheduler(1) as scheduler:
+        future = scheduler.submit(job)
+        with pytest.raises(JobError):
+            future.result()
+
+    assert job.status is JobStatus.FAILED
+    assert job.attempts == 2
+    assert job.returncode == 1
+    assert job.results == {}
+
+
+def testrun_timeout(tmp_path, program, input, monkeypatch):
+    monkeypatch.setenv("STUB_SLEEP_S", "10")
+
+    job = Job(program, input, str(tmp_path), timeout_s=0.5)
+    with LocalScheduler(1) as scheduler:
+        start = time.time()
+        scheduler.run([job])
+
+    assert job.status is JobStatus.TIMEOUT
+    assert time.time() - start < 5
+
+
+def testcancel(tmp_path, program, input, monkeypatch):
+    monkeypatch.setenv("STUB_SLEEP_S", "10")
+
+    running = threading.Event()
+
+    def callback(job):
+        if job.status is JobStatus.RUNNING:
+            running.set()
+
+    job1 = Job(program, input, str(tmp_path.joinpath("1")))
+    job2 = Job(program, input, str(tmp_path.joinpath("2")))
+
+    # Only the first attempt of job1 is slow
+    tmp_path.joinpath("2").mkdir()
+    tmp_path.joinpath("2", "stub-attempts").write_text("x")
+
+    with LocalScheduler(1, status_callback=callback) as scheduler:
+        future1 = scheduler.submit(job1)
+        future2 = scheduler.submit(job2)
+        assert running.wait(5)
+
+        scheduler.cancel(job2)
+        scheduler.cancel(job1)
+
+        with pytest.raises(JobError):
+            future1.result(5)
+        assert future2.cancelled()
+
+    assert job1.status is JobStatus.CANCELLED
+    assert job2.status is JobStatus.CANCELLED
+
+
+def testsplit_input(input):
+    inputs = PenepmaProgram().split_input(input, 4)
+
+    assert len(inputs) == 4
+    seeds = jump_seeds(*DEFAULT_SEEDS, 9 * 4 * DEFAULT_DISTANCE)
+    assert [split.RSEED.get() for split in inputs] == allocate_seeds(4, seeds=seeds)
+    assert inputs[0].NSIMSH.get()[0] == pytest.approx(5e8)
+    assert inputs[0].TIME.get()[0] == pytest.approx(5e8)
+    assert inputs[0].REFLIN.get()[2] == pytest.approx(2.5e-3)
+    assert inputs[0].RESUME.get() == (None,)
+
+    # Original input is not modified
+    assert input.RSEED.get() == (-10, 1)
+
+
+def testsplit_input_seeds(input):
+    input.RSEED.set(5, 7)
+    inputs = PenepmaProgram().split_input(input, 2, distance=1000)
+    assert inputs[1].RSEED.get() == jump_seeds(5, 7, 1000)
+
+
+def testsplit_input_rand0_sequences(input):
+    runs = []
+    for sequence in [5, 7]:
+        input.RSEED.set(-sequence, 1)
+        for split in PenepmaProgram().split_input(input, 4, distance=1000):
+            seeds = split.RSEED.get()
+            runs.append((seeds, jump_seeds(*seeds, 999)))
+
+    assert len(set(runs)) == 8
+    assert not find_overlaps(runs)
+
+    input.RSEED.set(-5, 1)
+    with pytest.raises(ValueError):
+        PenepmaProgram().split_input(input, 4, distance=PERIOD // 16)
+
+
+def testsplit_input_material():
+    with pytest.raises(ValueError):
+        MaterialProgram().split_input(MATERIAL_CU, 2)
+
+
+def testsplit_job(tmp_path, program, input):
+    job = Job(program, input, str(tmp_path), max_retries=2)
+    jobs = split_job(job, 3)
+
+    assert [split.name for split in jobs] == [
+        tmp_path.name + "-000",
+        tmp_path.name + "-001",
+        tmp_path.name + "-002",
+    ]
+    assert jobs[2].workdir == str(tmp_path.joinpath("002"))
+    assert jobs[2].max_retries == 2
+
+
+def testrun_parallel(tmp_path, program, input):
+    job = Job(program, input, str(tmp_path))
+
+    # The stub writes the same last seeds for all simulations
+    with pytest.warns(RuntimeWarning, match="overlapping"):
+        results = run_parallel(job, 3)
+
+    assert job.status is JobStatus.SUCCEEDED
+    assert job.attempts == 3
+    assert results is job.results
+
+    result = results["penepma-res.dat"]
+    assert result.simulated_primary_showers.n == pytest.approx(3 * 4.4682e4)
+    assert "pe-intens-01.dat" in results
+
+
+def testrun_parallel_failed(tmp_path, program, input, monkeypatch):
+    monkeypatch.setenv("STUB_FAIL_ATTEMPTS", "1")
+
+    job = Job(program, input, str(tmp_path))
+    with pytest.raises(JobError):
+        run_parallel(job, 2)
+
+    assert job.status is JobStatus.FAILED
+
+
+def testfind_seed_overlaps(tmp_path, program, input):
+    jobs = split_job(Job(program, input, str(tmp_path)), 3)
+    for job in jobs:
+        iseed1, iseed2 = job.input.RSEED.get()
+        seeds = jump_seeds(iseed1, iseed2, 10**12)
+        result = PenepmaResult()
+        result.last_random_seed1 = ufloat(seeds[0], 0.0)
+        result.last_random_seed2 = ufloat(seeds[1], 0.0)
+        job.results = {"penepma-res.dat": result}
+
+    assert find_seed_overlaps(jobs) == []
+
+    # Second job used more random numbers than the distance between seeds
+    iseed1, iseed2 = jobs[1].input.RSEED.get()
+    seeds = jump_seeds(iseed1, iseed2, 10**14 + 1)
+    result = jobs[1].results["penepma-res.dat"]
+    result.last_random_seed1 = ufloat(seeds[0], 0.0)
+    result.last_random_seed2 = ufloat(seeds[1], 0.0)
+    assert find_seed_overlaps(jobs) == [(jobs[1], jobs[2])]
+
+
+def _read_resumes(job):
+    with open(os.path.join(job.workdir, "stub-resumes"), "r") as fp:
+        return fp.read().splitlines()
+
+
+def teststage_checkpoint(tmp_path, program, input):
+    job = Job(program, input, str(tmp_path), dump_interval_s=30.0)
+    job.stage()
+
+    staged = PenepmaInput()
+    with open(job.input_filepath, "r") as fp:
+        staged.read(fp)
+
+    assert staged.RESUME.get() == (None,)
+    assert staged.DUMPTO.get() == (DUMP_FILENAMES[0],)
+    assert staged.DUMPP.get() == (30.0,)
+
+    # Latest dump is resumed, the other one is overwritten
+    tmp_path.joinpath(DUMP_FILENAMES[0]).write_text("dump")
+    job.prepare()
+    with open(job.input_filepath, "r") as fp:
+        staged.read(fp)
+
+    assert staged.RESUME.get() == (DUMP_FILENAMES[0],)
+    assert staged.DUMPTO.get() == (DUMP_FILENAMES[1],)
+
+    # Original input is not modified
+    assert input.DUMPTO.get() == ("dump1.dat",)
+
+
+def testrun_checkpoint_interrupted(tmp_path, program, input, monkeypatch):
+    monkeypatch.setenv("STUB_FAIL_ATTEMPTS", "2")
+
+    job = Job(program, input, str(tmp_path), dump_interval_s=30.0)
+    with LocalScheduler(1) as scheduler:
+        scheduler.run([job])
+
+    assert job.status is JobStatus.SUCCEEDED
+    assert job.attempts == 3
+    assert job.resumes == 2
+    assert job.failures == 0
+    assert job.simulated_showers == pytest.approx(4.4682e4)
+    assert job.simulation_time_s == pytest.approx(1.949920e2)
+    assert _read_resumes(job) == ["", DUMP_FILENAMES[0], DUMP_FILENAMES[1]]
+
+
+def testrun_checkpoint_always_interrupted(tmp_path, program, input, monkeypatch):
+    # Program always crashes after dumping its state
+    monkeypatch.setenv("STUB_FAIL_ATTEMPTS", "100")
+
+    job = Job(
+        program,
+        input,
+        str(tmp_path),
+        max_retries=1,
+        dump_interval_s=30.0,
+        max_resumes=3,
+    )
+    with LocalScheduler(1) as scheduler:
+        future = scheduler.submit(job)
+        with pytest.raises(JobError):
+            future.result(30)
+
+    assert job.status is JobStatus.FAILED
+    assert job.resumes == 3
+    assert job.failures == 2
+    assert job.attempts == 5
+
+
+def testrun_checkpoint_corrupted_dump(tmp_path, program, input, monkeypatch):
+    monkeypatch.setenv("STUB_FAIL_ATTEMPTS", "1")
+
+    # Previous run left a dump, which does not allow the program to start
+    tmp_path.joinpath(DUMP_FILENAMES[1]).write_text("corrupted")
+    job = Job(program, input, str(tmp_path), max_retries=1, dump_interval_s=30.0)
+
+    # Program fails before writing a dump
+    monkeypatch.setattr(job, "find_latest_dump", lambda: DUMP_FILENAMES[1])
+    with LocalScheduler(1) as scheduler:
+        scheduler.run([job])
+    monkeypatch.undo()
+
+    assert job.status is JobStatus.SUCCEEDED
+    assert job.failures == 1
+    assert tmp_path.joinpath(DUMP_FILENAMES[1] + ".bad").exists()
+
+
+def _wait_for_file(filepath, timeout_s):
+    # The stub writes the dump file once it has started
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if filepath.exists():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def testpause_resume(tmp_path, program, input, monkeypatch):
+    monkeypatch.setenv("STUB_SLEEP_S", "10")
+    monkeypatch.setenv("STUB_SLEEP_ATTEMPTS", "1")
+
+    statuses = []
+
+    def callback(job):
+        statuses.append((job.name, job.status))
+
+    job1 = Job(program, input, str(tmp_path.joinpath("1")), dump_interval_s=30.0)
+    job2 = Job(program, input, str(tmp_path.joinpath("2")))
+
+    # Only the first attempt of job1 is slow
+    tmp_path.joinpath("2").mkdir()
+    tmp_path.joinpath("2", "stub-attempts").write_text("x")
+
+    with LocalScheduler(1, status_callback=callback) as scheduler:
+        future1 = scheduler.submit(job1)
+        assert _wait_for_file(tmp_path.joinpath("1", DUMP_FILENAMES[0]), 5)
+
+        scheduler.pause(job1)
+        future2 = scheduler.submit(job2)
+        assert future2.result(5) is job2
+        assert job1.status is JobStatus.PAUSED
+
+        scheduler.resume(job1)
+        assert future1.result(5) is job1
+
+    assert ("1", JobStatus.PAUSED) in statuses
+    assert job1.attempts == 2
+    assert _read_resumes(job1) == ["", DUMP_FILENAMES[0]]
+
+
+def testpause_notcheckpointed(tmp_path, program, input):
+    job = Job(program, input, str(tmp_path))
+    with LocalScheduler(1) as scheduler:
+        with pytest.raises(ValueError):
+            scheduler.pause(job)
+
+
+def testterminate_running(tmp_path, program, input, monkeypatch):
+    monkeypatch.setenv("STUB_SLEEP_S", "10")
+    monkeypatch.setenv("STUB_DUMP_RESULTS", "1")
+
+    job = Job(program, input, str(tmp_path), dump_interval_s=30.0)
+
+    with LocalScheduler(1) as scheduler:
+        future = scheduler.submit(job)
+        assert _wait_for_file(tmp_path.joinpath(DUMP_FILENAMES[0]), 5)
+
+        scheduler.terminate(job)
+        assert future.result(5) is job
+
+    assert job.status is JobStatus.SUCCEEDED
+    assert job.attempts == 1
+    assert job.returncode != 0
+    assert job.results["penepma-res.dat"].simulated_primary_showers.n == pytest.approx(
+        4.4682e4
+    )
+
+
+def testterminate_running_partial_results(
+    tmp_path, testdatadir, program, input, monkeypatch
+):
+    # Results file truncated, as if the program was killed while writing it
+    results_dir = tmp_path.joinpath("results")
+    results_dir.mkdir()
+    lines = testdatadir.joinpath("penepma", "penepma-res.dat").read_text()
+    lines = lines.splitlines(True)[:10]
+    results_dir.joinpath("penepma-res.dat").write_text("".join(lines))
+
+    monkeypatch.setenv("STUB_RESULTS_DIR", str(results_dir))
+    monkeypatch.setenv("STUB_SLEEP_S", "10")
+    monkeypatch.setenv("STUB_DUMP_RESULTS", "1")
+
+    job = Job(program, input, str(tmp_path.joinpath("job")), dump_interval_s=30.0)
+
+    with LocalScheduler(1) as scheduler:
+        future = scheduler.submit(job)
+        assert _wait_for_file(tmp_path.joinpath("job", DUMP_FILENAMES[0]), 5)
+
+        with pytest.warns(RuntimeWarning):
+            scheduler.terminate(job)
+            assert future.result(5) is job
+
+    assert job.status is JobStatus.SUCCEEDED
+    assert job.results == {}
+
+
+def testterminate_queued(tmp_path, program, input, monkeypatch):
+    monkeypatch.setenv("STUB_SLEEP_S", "10")
+
+    job1 = Job(program, input, str(tmp_path.joinpath("1")), dump_interval_s=30.0)
+    job2 = Job(program, input, str(tmp_path.joinpath("2")))
+
+    with LocalScheduler(1) as scheduler:
+        scheduler.submit(job1)
+        future2 = scheduler.submit(job2)
+        assert _wait_for_file(tmp_path.joinpath("1", DUMP_FILENAMES[0]), 5)
+
+        scheduler.terminate(job2)
+        with pytest.raises(concurrent.futures.CancelledError):
+            future2.result(5)
+
+        scheduler.terminate(job1)
+
+    assert job1.status is JobStatus.SUCCEEDED
+    assert job2.status is JobStatus.CANCELLED
+    assert job2.attempts == 0
@@ -0,0 +1,80 @@
+""" """
+
+# Standard library modules.
+import os
+import shutil
+
+# Third party modules.
+import numpy as np
+import pytest
+
+# Local modules.
+from pypenelopetools.penelope.snapshot import (
+    write_snapshot,
+    read_snapshot,
+    convert_tree,
+    find_convertible_files,
+    SNAPSHOT_EXTENSION,
+)
+from pypenelopetools.penepma.results import create_result, PenepmaSpectrumResult
+
+# Globals and constants variables.
+
+
+def testwriteread(tmp_path):
+    filepath = str(tmp_path.joinpath("test.snap"))
+    arrays = {
+        "a": np.arange(10, dtype=np.float64),
+        "b": np.ones((3, 2), dtype=np.int32),
+        "empty": np.zeros((0, 2)),
+    }
+    write_snapshot(filepath, {"key": "value"}, arrays)
+
+    header, arrays2 = read_snapshot(filepath)
+    assert header == {"key": "value"}
+    assert isinstance(arrays2["a"], np.memmap)
+    assert arrays2["a"].offset % 64 == 0
+    for name, array in arrays.items():
+        np.testing.assert_array_equal(arrays2[name], array)
+
+    _header, arrays3 = read_snapshot(filepath, mmap_mode=None)
+    assert not isinstance(arrays3["a"], np.memmap)
+    np.testing.assert_array_equal(arrays3["b"], arrays["b"])
+
+
+def testwrite_failure(tmp_path, monkeypatch):
+    def _replace(src, dst):
+        raise OSError("Disk full")
+
+    monkeypatch.setattr(os, "replace", _replace)
+
+    filepath = str(tmp_path.joinpath("test.snap"))
+    with pytest.raises(OSError):
+        write_snapshot(filepath, {}, {"a": np.arange(10)})
+
+    assert os.listdir(str(tmp_path)) == []
+
+
+def testread_invalid(tmp_path):
+    filepath = tmp_path.joinpath("test.snap")
+    filepath.write_bytes(b"not a snapshot file")
+    with pytest.raises(IOError):
+        read_snapshot(str(filepath))
+
+
+def testconvert_tree(testdatadir, tmp_path):
+    for name in ["run1", "run2"]:
+        dirpath = tmp_path.joinpath(name)
+        shutil.copytree(testdatadir.joinpath("penepma"), dirpath)
+
+    filepaths = find_convertible_files(str(tmp_path), create_result)
+    assert len(filepaths) == 2 * 4
+
+    snapshot_filepaths = convert_tree(str(tmp_path), create_result, max_workers=2)
+    assert len(snapshot_filepaths) == 2 * 4
+    assert find_convertible_files(str(tmp_path), create_result) == []
+    assert convert_tree(str(tmp_path), create_result) == []
+
+    result = PenepmaSpectrumResult(1)
+    result.load(str(tmp_path.joinpath("run1", "pe-spect-01.dat" + SNAPSHOT_EXTENSION)))
+    assert len(result.energies_eV) == 1000
@@ -5,6 +5,7 @@
 # Third party modules.
 import pyxray
 import pytest
+from uncertainties import unumpy
 
 # Local modules.
 from pypenelopetools.penepma.results import (
@@ -12,7 +13,11 @@ from pypenelopetools.penepma.results import (
     PenepmaEmittedIntensityResult,
     PenepmaSpectrumResult,
     PenepmaGeneratedIntensityResult,
+    PenepmaAngularResult,
+    PenepmaEnergyResult,
+    create_result,
 )
+from pypenelopetools.penelope.enums import KPAR
 
 # Globals and constants variables.
 
@@ -414,3 +419,165 @@ def testpenepmageneratedintensityresult_read_directory(testdatadir):
     result = PenepmaGeneratedIntensityResult()
     result.read_directory(dirpath)
     _test_penepmageneratedintensityresult(result)
+
+
+def testpenepmaresult_saveload(testdatadir, tmp_path):
+    dirpath = testdatadir.joinpath("penepma")
+    result = PenepmaResult()
+    result.read_directory(dirpath)
+
+    filepath = str(tmp_path.joinpath("penepma-res.dat.snap"))
+    result.save(filepath)
+
+    result = PenepmaResult()
+    result.load(filepath)
+    _test_penepmaresult(result)
+
+
+def testpenepmaemittedintensityresult_saveload(testdatadir, tmp_path):
+    dirpath = testdatadir.joinpath("penepma")
+    result = PenepmaEmittedIntensityResult(1)
+    result.read_directory(dirpath)
+
+    filepath = str(tmp_path.joinpath("pe-intens-01.dat.snap"))
+    result.save(filepath)
+
+    result = PenepmaEmittedIntensityResult(1)
+    result.load(filepath)
+    _test_penepmaemittedintensityresult(result)
+
+
+def testpenepmaspectrumresult_saveload(testdatadir, tmp_path):
+    dirpath = testdatadir.joinpath("penepma")
+    result = PenepmaSpectrumResult(1)
+    result.read_directory(dirpath)
+
+    filepath = str(tmp_path.joinpath("pe-spect-01.dat.snap"))
+    result.save(filepath)
+
+    result = PenepmaSpectrumResult(1)
+    result.load(filepath)
+    _test_penepmaspectrumresult(result)
+
+
+def testpenepmageneratedintensityresult_saveload(testdatadir, tmp_path):
+    dirpath = testdatadir.joinpath("penepma")
+    result = PenepmaGeneratedIntensityResult()
+    result.read_directory(dirpath)
+
+    filepath = str(tmp_path.joinpath("pe-gen-ph.dat.snap"))
+    result.save(filepath)
+
+    result = PenepmaGeneratedIntensityResult()
+    result.load(filepath)
+    _test_penepmageneratedintensityresult(result)
+
+
+def testpenepmaenergyresult_saveload(tmp_path):
+    result = PenepmaEnergyResult(KPAR.PHOTON, "down")
+    result.distribution = unumpy.uarray(
+        [[1.0, 2.0], [3.0, 4.0]], [[0.0, 0.1], [0.0, 0.2]]
+    )
+
+    filepath = str(tmp_path.joinpath("energy.snap"))
+    result.save(filepath)
+
+    result = PenepmaEnergyResult()
+    result.load(filepath)
+    assert result.kpar is KPAR.PHOTON
+    assert result.direction == "down"
+    assert result.energies_eV == pytest.approx([1.0, 3.0])
+    assert unumpy.std_devs(result.distribution[:, 1]) == pytest.approx([0.1, 0.2])
+
+
+def testpenepmaresult_load_wrong_class(testdatadir, tmp_path):
+    result = PenepmaGeneratedIntensityResult()
+    result.read_directory(testdatadir.joinpath("penepma"))
+
+    filepath = str(tmp_path.joinpath("pe-gen-ph.dat.snap"))
+    result.save(filepath)
+
+    with pytest.raises(IOError):
+        PenepmaResult().load(filepath)
+
+
+@pytest.mark.parametrize(
+    "filename,expected_class,expected_args",
+    [
+        ("penepma-res.dat", PenepmaResult, {}),
+        ("pe-intens-03.dat", PenepmaEmittedIntensityResult, {"detector_index": 3}),
+        ("pe-spect-12.dat", PenepmaSpectrumResult, {"detector_index": 12}),
+        ("pe-gen-ph.dat", PenepmaGeneratedIntensityResult, {}),
+        ("pe-anga.dat", PenepmaAngularResult, {"kpar": KPAR.PHOTON}),
+        ("pe-energy-el-up.dat", PenepmaEnergyResult, {"direction": "up"}),
+    ],
+)
+def testcreate_result(filename, expected_class, expected_args):
+    result = create_result(filename)
+    assert isinstance(result, expected_class)
+    assert result.filename == filename
+    for name, value in expected_args.items():
+        assert getattr(result, name) == value
+
+
+def testcreate_result_unknown():
+    assert create_result("epma1.in") is None
+
+
+def testpenepmaresult_merge(testdatadir):
+    result = PenepmaResult()
+    result.read_directory(testdatadir.joinpath("penepma"))
+
+    merged = PenepmaResult.merge([result, result], [1.0, 1.0])
+
+    assert merged.simulated_primary_showers.n == pytest.approx(2 * 4.4682e4)
+    assert merged.simulation_time_s.n == pytest.approx(2 * 1.949920e2)
+    assert merged.simulation_speed_1_per_s.n == pytest.approx(2.291479e2, rel=1e-4)
+    assert merged.upbound_fraction.n == pytest.approx(result.upbound_fraction.n)
+    assert merged.upbound_fraction.s == pytest.approx(
+        result.upbound_fraction.s / 2**0.5
+    )
+    assert merged.average_photon_energy_eV[1].n == pytest.approx(
+        result.average_photon_energy_eV[1].n
+    )
+    assert merged.last_random_seed1.n == pytest.approx(result.last_random_seed1.n)
+    assert merged.reference_line_uncertainty.n == pytest.approx(
+        result.reference_line_uncertainty.n / 2**0.5
+    )
+
+
+def testpenepmaemittedintensityresult_merge(testdatadir):
+    result1 = PenepmaEmittedIntensityResult(1)
+    result1.read_directory(testdatadir.joinpath("penepma"))
+    result2 = PenepmaEmittedIntensityResult(1)
+
+    merged = PenepmaEmittedIntensityResult.merge([result1, result2], [3.0, 1.0])
+
+    xrayline = pyxray.xray_line(29, "Ka1")
+    expected = result1.total_intensities_1_per_sr_electron[xrayline]
+    intensity = merged.total_intensities_1_per_sr_electron[xrayline]
+    assert intensity.n == pytest.approx(expected.n * 0.75)
+    assert intensity.s == pytest.approx(expected.s * 0.75)
+    assert merged.detector_index == 1
+
+
+def testpenepmaspectrumresult_merge(testdatadir):
+    result = PenepmaSpectrumResult(1)
+    result.read_directory(testdatadir.joinpath("penepma"))
+
+    merged = PenepmaSpectrumResult.merge([result, result], [1.0, 2.0])
+
+    assert merged.energies_eV == pytest.approx(result.energies_eV)
+    assert merged.intensities_1_per_sr_electron == pytest.approx(
+        result.intensities_1_per_sr_electron
+    )
+    assert unumpy.std_devs(merged.spectrum)[500] == pytest.approx(
+        unumpy.std_devs(result.spectrum)[500] * 5**0.5 / 3
+    )
+
+
+def testpenepmaresult_merge_error():
+    with pytest.raises(ValueError):
+        PenepmaResult.merge([], [])
+    with pytest.raises(ValueError):
+        PenepmaResult.merge([PenepmaResult()], [0.0])
@@ -0,0 +1,140 @@
+""" """
+
+# Standard library modules.
+import math
+import time
+
+# Third party modules.
+import pyxray
+import pytest
+
+# Local modules.
+from pypenelopetools.penepma.termination import (
+    UncertaintyTarget,
+    TerminationController,
+)
+from pypenelopetools.penepma.program import PenepmaProgram
+from pypenelopetools.penepma.input import PenepmaInput
+from pypenelopetools.penelope.runner import Job, JobStatus
+
+# Globals and constants variables.
+KA1 = pyxray.xray_line(29, "Ka1")
+KA2 = pyxray.xray_line(29, "Ka2")
+
+
+@pytest.fixture
+def results(testdatadir):
+    program = PenepmaProgram("penepma")
+    return program.read_results(str(testdatadir.joinpath("penepma")))
+
+
+@pytest.fixture
+def input(testdatadir):
+    input = PenepmaInput()
+    with open(testdatadir.joinpath("penepma", "epma1.in"), "r") as fp:
+        input.read(fp)
+    return input
+
+
+@pytest.fixture
+def program(stub_executable, testdatadir, monkeypatch):
+    monkeypatch.setenv("STUB_RESULTS_DIR", str(testdatadir.joinpath("penepma")))
+    return PenepmaProgram(stub_executable)
+
+
+def testget_uncertainty(results):
+    target = UncertaintyTarget(KA1, 1, 0.03)
+    assert target.get_uncertainty(results) == pytest.approx(5.40e-7 / 2.114718e-5)
+
+    target = UncertaintyTarget(KA1, 2, 0.03)
+    assert target.get_uncertainty(results) == math.inf
+
+    target = UncertaintyTarget(pyxray.xray_line(13, "Ka1"), 1, 0.03)
+    assert target.get_uncertainty(results) == math.inf
+
+
+def testtarget_invalid():
+    with pytest.raises(ValueError):
+        UncertaintyTarget(KA1, 1, 0.0)
+
+
+def testis_converged(results):
+    controller = TerminationController([UncertaintyTarget(KA1, 1, 0.03)])
+    assert controller.is_converged(results)
+
+    controller = TerminationController(
+        [UncertaintyTarget(KA1, 1, 0.03), UncertaintyTarget(KA2, 1, 0.03)]
+    )
+    assert not controller.is_converged(results)
+    assert controller.is_converged({}) is False
+
+    uncertainties = controller.get_uncertainties(results)
+    assert uncertainties[controller.targets[1]] == pytest.approx(3.79e-7 / 1.088301e-5)
+
+
+def testdetector_indexes():
+    controller = TerminationController(
+        [
+            UncertaintyTarget(KA1, 2, 0.03),
+            UncertaintyTarget(KA2, 1, 0.03),
+            UncertaintyTarget(KA1, 1, 0.03),
+        ]
+    )
+    assert controller.detector_indexes == [1, 2]
+
+
+def testrun_converged(tmp_path, program, input, monkeypatch):
+    monkeypatch.setenv("STUB_SLEEP_S", "30")
+    monkeypatch.setenv("STUB_DUMP_RESULTS", "1")
+
+    controller = TerminationController([UncertaintyTarget(KA1, 1, 0.03)], 0.1)
+    job = Job(program, input, str(tmp_path))
+
+    start = time.monotonic()
+    results = controller.run(job, count=2, max_workers=1)
+    assert time.monotonic() - start < 20
+
+    assert job.status is JobStatus.SUCCEEDED
+    assert job.attempts == 1
+    assert controller.is_converged(results)
+    assert results["penepma-res.dat"].simulated_primary_showers.n == pytest.approx(
+        4.4682e4
+    )
+    assert not tmp_path.joinpath("001", "penepma-res.dat").exists()
+
+
+def testrun_converged_partial_results(tmp_path, program, input, monkeypatch):
+    monkeypatch.setenv("STUB_SLEEP_S", "30")
+    monkeypatch.setenv("STUB_DUMP_RESULTS", "1")
+
+    # Killed while writing the results
+    def _read_results(self, dirpath):
+        raise EOFError("Read until EOF")
+
+    monkeypatch.setattr(PenepmaProgram, "read_results", _read_results)
+
+    controller = TerminationController([UncertaintyTarget(KA1, 1, 0.03)], 0.1)
+    job = Job(program, input, str(tmp_path))
+
+    with pytest.warns(RuntimeWarning):
+        results = controller.run(job)
+
+    assert job.status is JobStatus.SUCCEEDED
+    assert controller.is_converged(results)
+    assert results["penepma-res.dat"].simulated_primary_showers.n == pytest.approx(
+        4.4682e4
+    )
+
+
+def testrun_not_converged(tmp_path, program, input):
+    controller = TerminationController([UncertaintyTarget(KA1, 1, 0.001)], 0.1)
+    job = Job(program, input, str(tmp_path))
+
+    results = controller.run(job, count=2)
+
+    assert job.status is JobStatus.SUCCEEDED
+    assert job.attempts == 2
+    assert not controller.is_converged(results)
+    assert results["penepma-res.dat"].simulated_primary_showers.n == pytest.approx(
+        2 * 4.4682e4
+    )
@@ -0,0 +1,165 @@
+""" """
+
+# Standard library modules.
+import os
+import time
+import shutil
+import asyncio
+
+# Third party modules.
+import pyxray
+import pytest
+
+# Local modules.
+from pypenelopetools.penepma.watcher import PenepmaWatcher
+from pypenelopetools.penepma.input import PenepmaInput
+from pypenelopetools.penelope.watcher import ResultWatcher, _get_libc
+
+# Globals and constants variables.
+
+
+@pytest.fixture
+def rundir(tmp_path):
+    return tmp_path
+
+
+def _copy_result(testdatadir, rundir, filename):
+    shutil.copy(testdatadir.joinpath("penepma", filename), rundir.joinpath(filename))
+
+
+def _rewrite(testdatadir, rundir, filename, old, new):
+    content = testdatadir.joinpath("penepma", filename).read_text()
+    filepath = rundir.joinpath(filename)
+    filepath.write_text(content.replace(old, new))
+    stat = os.stat(filepath)
+    os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+
+def testrefresh(testdatadir, rundir):
+    watcher = PenepmaWatcher(str(rundir), detector_indexes=[1], use_inotify=False)
+    assert watcher.refresh() == set()
+
+    _copy_result(testdatadir, rundir, "penepma-res.dat")
+    assert watcher.refresh() == {"penepma-res.dat"}
+    assert watcher.refresh() == set()
+
+    _copy_result(testdatadir, rundir, "pe-intens-01.dat")
+    assert watcher.refresh() == {"pe-intens-01.dat"}
+
+    snapshot = watcher.snapshot()
+    assert snapshot.simulated_primary_showers.n == pytest.approx(4.4682e4)
+    assert snapshot.simulation_speed_1_per_s.n == pytest.approx(2.291479e2)
+    assert snapshot.reference_line_uncertainty.n == pytest.approx(3.559e-2)
+
+    xrayline = pyxray.xray_line(29, "Ka1")
+    intensity = snapshot.intensities[1].total_intensities_1_per_sr_electron[xrayline]
+    assert intensity.n == pytest.approx(2.114718e-5)
+
+
+def testrefresh_changed(testdatadir, rundir):
+    _copy_result(testdatadir, rundir, "penepma-res.dat")
+    watcher = PenepmaWatcher(str(rundir), use_inotify=False)
+    watcher.refresh()
+
+    _rewrite(testdatadir, rundir, "penepma-res.dat", "4.468200E+04", "8.936400E+04")
+    assert watcher.refresh() == {"penepma-res.dat"}
+    assert watcher.snapshot().simulated_primary_showers.n == pytest.approx(8.9364e4)
+
+
+def testrefresh_partial(testdatadir, rundir):
+    _copy_result(testdatadir, rundir, "penepma-res.dat")
+    watcher = PenepmaWatcher(str(rundir), use_inotify=False)
+    watcher.refresh()
+
+    # Truncated file is ignored and previous result is kept
+    content = testdatadir.joinpath("penepma", "penepma-res.dat").read_text()
+    rundir.joinpath("penepma-res.dat").write_text(content[:300])
+    assert watcher.refresh() == set()
+    assert watcher.snapshot().simulated_primary_showers.n == pytest.approx(4.4682e4)
+
+
+def testsnapshot_empty(rundir):
+    watcher = PenepmaWatcher(str(rundir))
+    snapshot = watcher.snapshot()
+    assert snapshot.result is None
+    assert snapshot.simulated_primary_showers is None
+    assert snapshot.intensities == {}
+
+
+def testfrom_input(rundir):
+    input = PenepmaInput()
+    input.photon_detectors.add(0, 90, 0, 360, 0, 0, 15e3, 1000)
+    input.photon_detectors.add(10, 20, 0, 360, 0, 0, 15e3, 1000)
+
+    watcher = PenepmaWatcher.from_input(str(rundir), input)
+    assert isinstance(watcher, ResultWatcher)
+    assert len(watcher._prototypes) == 3
+
+
+@pytest.mark.parametrize(
+    "use_inotify",
+    [
+        False,
+        pytest.param(
+            True,
+            marks=pytest.mark.skipif(_get_libc() is None, reason="requires inotify"),
+        ),
+    ],
+)
+def testwatch(testdatadir, rundir, use_inotify):
+    watcher = PenepmaWatcher(
+        str(rundir), detector_indexes=[1], interval_s=0.05, use_inotify=use_inotify
+    )
+
+    async def _write_results():
+        await asyncio.sleep(0.1)
+        _copy_result(testdatadir, rundir, "penepma-res.dat")
+        await asyncio.sleep(0.1)
+        _copy_result(testdatadir, rundir, "pe-intens-01.dat")
+
+    async def _watch():
+        task = asyncio.ensure_future(_write_results())
+        snapshots = []
+        async for snapshot in watcher.watch():
+            snapshots.append(snapshot)
+            if snapshot.intensities:
+                watcher.stop()
+        await task
+        return snapshots
+
+    snapshots = asyncio.run(asyncio.wait_for(_watch(), 10.0))
+
+    assert snapshots[0].changed_filenames == {"penepma-res.dat"}
+    assert snapshots[-1].changed_filenames == {"pe-intens-01.dat"}
+    assert snapshots[-1].simulated_primary_showers.n == pytest.approx(4.4682e4)
+
+
+def testwatch_nonblocking(testdatadir, rundir, monkeypatch):
+    _copy_result(testdatadir, rundir, "penepma-res.dat")
+    watcher = PenepmaWatcher(str(rundir), interval_s=0.05, use_inotify=False)
+
+    read_result = watcher._read_result
+
+    def _slow_read_result(filename):
+        time.sleep(0.5)
+        return read_result(filename)
+
+    monkeypatch.setattr(watcher, "_read_result", _slow_read_result)
+
+    async def _tick(ticks):
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def _watch():
+        ticks = []
+        task = asyncio.ensure_future(_tick(ticks))
+        async for _snapshot in watcher.watch():
+            watcher.stop()
+        task.cancel()
+        return ticks
+
+    ticks = asyncio.run(asyncio.wait_for(_watch(), 10.0))
+
+    # The event loop kept running while the file was parsed
+    assert len(ticks) > 10
@@ -0,0 +1,36 @@
+""""""
+
+# Standard library modules.
+
+# Third party modules.
+import pytest
+
+# Local modules.
+from pypenelopetools.pengeom.geometry import Geometry
+from pypenelopetools.pengeom.module import Module, SidePointer
+from pypenelopetools.pengeom.surface import zplane, cylinder, sphere
+from pypenelopetools.material import Material
+
+# Globals and constants variables.
+
+
+@pytest.fixture
+def geometry():
+    # Foil (z from -0.1 to 0 cm, radius 1 cm) containing a sphere of radius
+    # 0.04 cm centred at z=-0.05 cm
+    geometry = Geometry("Foil")
+
+    inclusion = Module(Material("zinc", {30: 1.0}, 7.14), "Inclusion")
+    surface = sphere(0.04)
+    surface.shift.z_cm = -0.05
+    inclusion.add_surface(surface, SidePointer.NEGATIVE)
+    geometry.add_module(inclusion)
+
+    foil = Module(Material("copper", {29: 1.0}, 8.9), "Foil")
+    foil.add_surface(zplane(0.0), SidePointer.NEGATIVE)
+    foil.add_surface(zplane(-0.1), SidePointer.POSITIVE)
+    foil.add_surface(cylinder(1.0, axis="z"), SidePointer.NEGATIVE)
+    foil.add_module(inclusion)
+    geometry.add_module(foil)
+
+    return geometry
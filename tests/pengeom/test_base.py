@@ -0,0 +1,70 @@
+""" """
+
+# Standard library modules.
+
+# Third party modules.
+import pytest
+
+# Local modules.
+from pypenelopetools.pengeom.base import (
+    parse_record,
+    iter_records,
+    read_title,
+    iter_sections,
+    GeoRecord,
+    LINE_SEPARATOR,
+)
+
+# Globals and constants variables.
+
+
+def testparse_record():
+    record = parse_record("SURFACE (   2), SIDE POINTER=( 1)")
+    assert record == GeoRecord("SURFACE", "2", ", SIDE POINTER=( 1)")
+
+    record = parse_record("  THETA=(+9.000000000000000E+01,   0) DEG")
+    assert record == GeoRecord("THETA=", 90.0, "DEG")
+
+    with pytest.raises(IOError):
+        parse_record("X-SHIFT=(abc,   0)")
+
+
+def testiter_records():
+    lines = iter(["X-SHIFT=(+1.0E+00,   0)\n", LINE_SEPARATOR + "\n", "END\n"])
+    assert list(iter_records(lines)) == [GeoRecord("X-SHIFT=", 1.0, "")]
+    assert next(lines) == "END\n"
+
+
+def testread_sections(testdatadir):
+    filepath = testdatadir.joinpath("pengeom", "epma1.geo")
+    with open(filepath, "r") as fp:
+        lines = iter(fp)
+        title = read_title(lines)
+        sections = list(iter_sections(lines))
+
+    assert title == "Cylindrical homogeneous foil"
+    assert [(s.keyword, s.index) for s in sections] == [
+        ("SURFACE", 1),
+        ("SURFACE", 2),
+        ("SURFACE", 3),
+        ("MODULE", 1),
+    ]
+    assert sections[0].description == "Plane Z=0"
+    assert sections[1].records[1] == GeoRecord("Z-SHIFT=", -0.1, "")
+    assert sections[3].records[0] == GeoRecord("MATERIAL", "1", "")
+    assert sections[3].extra_records == []
+
+
+def testread_sections_truncated(testdatadir):
+    filepath = testdatadir.joinpath("pengeom", "epma1.geo")
+    with open(filepath, "r") as fp:
+        lines = fp.read().splitlines()
+
+    with pytest.raises(IOError):
+        list(iter_sections(iter(lines[5:-1])))
+
+    with pytest.raises(IOError):
+        list(iter_sections(iter(lines[5:-2])))
+
+    with pytest.raises(IOError):
+        read_title(iter(lines[1:]))
@@ -0,0 +1,148 @@
+""" """
+
+# Standard library modules.
+
+# Third party modules.
+import numpy as np
+import pytest
+
+# Local modules.
+from pypenelopetools.pengeom.compiled import (
+    compile_geometry,
+    get_rotation_matrix,
+    get_quadric,
+    get_quadric_coefficients,
+    evaluate_quadrics,
+    map_chunks,
+)
+from pypenelopetools.pengeom.module import Module, SidePointer
+from pypenelopetools.pengeom.surface import (
+    SurfaceImplicit,
+    xplane,
+    zplane,
+    cylinder,
+)
+from pypenelopetools.pengeom.transformation import Rotation
+from pypenelopetools.material import VACUUM
+
+# Globals and constants variables.
+
+
+def testget_rotation_matrix():
+    matrix = get_rotation_matrix(Rotation(theta_deg=90.0, phi_deg=90.0))
+    np.testing.assert_allclose(matrix @ [0.0, 0.0, 1.0], [0.0, 1.0, 0.0], atol=1e-12)
+    np.testing.assert_allclose(matrix @ matrix.T, np.identity(3), atol=1e-12)
+
+
+def testget_quadric():
+    points = np.array([[0.5, 0.0, 0.0], [1.5, 0.0, 0.0], [2.5, 0.3, 0.0]])
+
+    # Plane X=2
+    coefficients = get_quadric_coefficients(get_quadric(xplane(2.0)))
+    np.testing.assert_allclose(
+        evaluate_quadrics([coefficients], points)[:, 0], [-1.5, -0.5, 0.5], atol=1e-12
+    )
+
+    # Cylinder along x of radius 0.5 cm, shifted to y=0.3
+    surface = cylinder(0.5, axis="x")
+    surface.shift.y_cm = 0.3
+    coefficients = get_quadric_coefficients(get_quadric(surface))
+    values = evaluate_quadrics([coefficients], points)[:, 0]
+    np.testing.assert_allclose(values, [0.09 / 0.25 - 1.0] * 2 + [-1.0], atol=1e-12)
+
+    # Implicit form of the same cylinder
+    surface = SurfaceImplicit({"yy": 4.0, "zz": 4.0, "0": -1.0})
+    surface.shift.y_cm = 0.3
+    np.testing.assert_allclose(
+        get_quadric_coefficients(get_quadric(surface)), coefficients, atol=1e-12
+    )
+
+
+def testcompile_geometry(geometry):
+    compiled = compile_geometry(geometry)
+    index_lookup = geometry.indexify()
+    inclusion, foil = geometry.get_modules()
+
+    assert compiled.module_count == 2
+    assert compiled.surface_count == 4
+    assert compiled.parents.tolist() == [-1, index_lookup[foil], -1]
+    assert compiled.depths.tolist() == [-1, 1, 0]
+    assert compiled.module_offsets.tolist() == [0, 0, 1, 4]
+    assert compiled.material_indices.tolist() == [0, 1, 2]
+    assert compiled.materials == {
+        0: VACUUM,
+        1: inclusion.material,
+        2: foil.material,
+    }
+    assert compiled.modules == [None, inclusion, foil]
+
+
+def testlocate(geometry):
+    compiled = compile_geometry(geometry)
+    points = [
+        [0.0, 0.0, -0.05],  # Inclusion
+        [0.5, 0.0, -0.05],  # Foil
+        [0.0, 0.0, 0.05],  # Above
+        [1.5, 0.0, -0.05],  # Outside the cylinder
+    ]
+
+    assert compiled.locate(points).tolist() == [1, 2, 0, 0]
+    assert compiled.locate(points, chunk_size=3).tolist() == [1, 2, 0, 0]
+    assert compiled.locate_materials(points).tolist() == [1, 2, 0, 0]
+
+    inside = compiled.contains(points)
+    assert inside[0].tolist() == [False, True, True]
+    assert inside[2].tolist() == [False, False, False]
+
+
+def testlocate_many(geometry):
+    rng = np.random.default_rng(0)
+    points = rng.uniform(-1.0, 1.0, size=(10000, 3)) * [1.0, 1.0, 0.1]
+
+    located = compile_geometry(geometry).locate(points, chunk_size=1000)
+
+    radius = np.linalg.norm(points[:, :2], axis=1)
+    in_foil = (radius < 1.0) & (points[:, 2] < 0.0) & (points[:, 2] > -0.1)
+    distance = np.linalg.norm(points - [0.0, 0.0, -0.05], axis=1)
+    expected = np.where(distance < 0.04, 1, np.where(in_foil, 2, 0))
+    assert (located == expected).all()
+
+
+def testlocate_module_transformation(geometry):
+    inclusion, foil = geometry.get_modules()
+    foil.shift.x_cm = 5.0
+    foil.rotation.theta_deg = 180.0
+
+    compiled = compile_geometry(geometry)
+    points = [[5.0, 0.0, 0.05], [5.5, 0.0, 0.02], [0.0, 0.0, -0.05]]
+    assert compiled.locate(points).tolist() == [1, 2, 0]
+
+
+def testlocate_tilt(geometry):
+    geometry.tilt_deg = 90.0
+
+    compiled = compile_geometry(geometry)
+    points = [[0.0, -0.05, 0.5], [0.0, -0.05, 0.0], [0.0, 0.5, 0.0]]
+    assert compiled.locate(points).tolist() == [2, 1, 0]
+
+
+def testcompile_geometry_several_parents(geometry):
+    inclusion, foil = geometry.get_modules()
+    other = Module()
+    other.add_surface(zplane(5.0), SidePointer.POSITIVE)
+    other.add_module(inclusion)
+    geometry.add_module(other)
+
+    with pytest.raises(ValueError):
+        compile_geometry(geometry)
+
+
+def testmap_chunks():
+    args = [(7, 2), (9, 4), (5, 5)]
+    assert list(map_chunks(divmod, args, max_workers=1)) == [(3, 1), (2, 1), (1, 0)]
+    assert list(map_chunks(divmod, args, max_workers=2)) == [(3, 1), (2, 1), (1, 0)]
+    assert list(map_chunks(divmod, [], max_workers=2)) == []
+
+    results = map_chunks(divmod, args * 10, max_workers=2)
+    assert next(results) == (3, 1)
+    results.close()
@@ -2,13 +2,16 @@
 
 # Standard library modules.
 import io
+import os
+import subprocess
+import sys
 
 # Third party modules.
 import pytest
 
 # Local modules.
 from pypenelopetools.pengeom.geometry import Geometry
-from pypenelopetools.pengeom.surface import zplane, cylinder, xplane
+from pypenelopetools.pengeom.surface import zplane, cylinder, xplane, SurfaceImplicit
 from pypenelopetools.pengeom.module import Module, SidePointer
 from pypenelopetools.material import Material, VACUUM
 
@@ -172,6 +175,208 @@ def testindexify(geometry):
 
     index_lookup2 = geometry.indexify()
     assert index_lookup == index_lookup2
+    assert index_lookup is not index_lookup2
+
+
+def testindexify_order(geometry, material1, material2):
+    index_lookup = geometry.indexify()
+    module1, module2 = geometry.get_modules()
+
+    assert index_lookup[material1] == 1
+    assert index_lookup[material2] == 2
+    assert [index_lookup[s] for s in module1.get_surfaces()] == [1, 2, 3, 4]
+    assert index_lookup[module1] == 1
+    assert index_lookup[module2] == 2
+
+
+WRITE_SCRIPT = """
+import sys
+from pypenelopetools.pengeom.geometry import Geometry
+from pypenelopetools.pengeom.surface import zplane, cylinder
+from pypenelopetools.pengeom.module import Module, SidePointer
+from pypenelopetools.material import Material
+
+geometry = Geometry("Hash seed", tilt_deg=10.0)
+top = zplane(0.0)
+for i in range(20):
+    material = Material("m{0}".format(i % 7), {29 + i % 7: 1.0}, 8.0)
+    module = Module(material, "module {0}".format(i))
+    module.add_surface(top, SidePointer.NEGATIVE)
+    module.add_surface(zplane(-0.1 * (i + 1)), SidePointer.POSITIVE)
+    module.add_surface(cylinder(0.1 * (i + 1)), SidePointer.NEGATIVE)
+    for submodule in geometry.get_modules()[-2:]:
+        module.add_module(submodule)
+    geometry.add_module(module)
+
+geometry.write(sys.stdout)
+"""
+
+
+def testwrite_hash_seed():
+    outputs = set()
+    for seed in ["0", "1", "42"]:
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        process = subprocess.run(
+            [sys.executable, "-c", WRITE_SCRIPT],
+            env=env,
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+        outputs.add(process.stdout)
+
+    assert len(outputs) == 1
+
+
+def testindexify_invalidation(geometry, material1, material2):
+    index_lookup = geometry.indexify()
+    module = next(m for m in geometry.get_modules() if m.material is material2)
+
+    surface = zplane(-2.0)
+    module.add_surface(surface, SidePointer.POSITIVE)
+    assert surface in geometry.indexify()
+
+    module.pop_surface(surface)
+    assert geometry.indexify() == index_lookup
+
+    module.material = VACUUM
+    index_lookup = geometry.indexify()
+    assert material2 not in index_lookup
+    assert index_lookup[material1] == 1
+
+    submodule = Module(material2)
+    geometry.add_module(submodule)
+    module.add_module(submodule)
+    index_lookup = geometry.indexify()
+    assert index_lookup[submodule] < index_lookup[module]
+    assert index_lookup[material1] == 1
+    assert index_lookup[material2] == 2
+
+
+def testindexify_deep():
+    geometry = Geometry()
+
+    modules = [Module(description=str(i)) for i in range(5000)]
+    for parent, child in zip(modules[1:], modules):
+        parent.add_module(child)
+    for module in reversed(modules):
+        geometry.add_module(module)
+
+    index_lookup = geometry.indexify()
+    assert [index_lookup[module] for module in modules] == list(range(1, 5001))
+
+
+def testindexify_cyclic():
+    geometry = Geometry()
+    module1 = Module()
+    module2 = Module()
+    module1.add_module(module2)
+    module2.add_module(module1)
+    geometry.add_module(module1)
+    geometry.add_module(module2)
+
+    with pytest.raises(ValueError):
+        geometry.indexify()
+
+
+def testindexify_interning(material1, material2):
+    geometry = Geometry()
+
+    module1 = Module(material1)
+    module1.add_surface(zplane(0.0), SidePointer.NEGATIVE)
+    module1.add_surface(zplane(-0.1), SidePointer.POSITIVE)
+    geometry.add_module(module1)
+
+    # Same planes, one expressed as an implicit surface
+    surface = zplane(0.0)
+    surface.scale.z = 2.0
+    module2 = Module(material2)
+    module2.add_surface(surface, SidePointer.POSITIVE)
+    module2.add_surface(SurfaceImplicit({"z": 2.0, "0": 0.2}), SidePointer.NEGATIVE)
+    geometry.add_module(module2)
+
+    index_lookup = geometry.indexify()
+    assert [index_lookup[s] for s in module1.get_surfaces()] == [1, 2]
+    assert [index_lookup[s] for s in module2.get_surfaces()] == [1, 2]
+
+    # Changing a transformation invalidates the lookup
+    surface.shift.z_cm = -0.2
+    index_lookup = geometry.indexify()
+    assert [index_lookup[s] for s in module2.get_surfaces()] == [3, 2]
+
+
+def testindexify_interning_coefficients(material1, material2):
+    geometry = Geometry()
+    surfaces = []
+    for material in [material1, material2]:
+        surface = SurfaceImplicit({"z": 1.0})
+        module = Module(material)
+        module.add_surface(surface, SidePointer.NEGATIVE)
+        geometry.add_module(module)
+        surfaces.append(surface)
+
+    index_lookup = geometry.indexify()
+    assert [index_lookup[s] for s in surfaces] == [1, 1]
+
+    # Coefficients cannot be edited in place, only replaced
+    with pytest.raises(TypeError):
+        surfaces[1].coefficients["0"] = -5.0
+
+    coefficients = dict(surfaces[1].coefficients)
+    coefficients["0"] = -5.0
+    surfaces[1].coefficients = coefficients
+    index_lookup = geometry.indexify()
+    assert [index_lookup[s] for s in surfaces] == [1, 2]
+
+
+def testindexify_interning_module_transformation(material1, material2):
+    geometry = Geometry()
+    modules = []
+    for material in [material1, material2]:
+        module = Module(material)
+        module.add_surface(zplane(0.0), SidePointer.NEGATIVE)
+        module.add_surface(zplane(-1.0), SidePointer.POSITIVE)
+        geometry.add_module(module)
+        modules.append(module)
+    modules[0].shift.z_cm = 5.0
+
+    index_lookup = geometry.indexify()
+    assert [index_lookup[s] for s in modules[0].get_surfaces()] == [1, 2]
+    assert [index_lookup[s] for s in modules[1].get_surfaces()] == [3, 4]
+
+    fileobj = io.StringIO()
+    geometry.write(fileobj)
+    lines = fileobj.getvalue().splitlines()
+    assert sum(line.startswith("SURFACE (") and ")," not in line for line in lines) == 4
+
+    # Same transformation
+    modules[1].shift.z_cm = 5.0
+    index_lookup = geometry.indexify()
+    assert [index_lookup[s] for s in modules[1].get_surfaces()] == [1, 2]
+
+
+def testwriteread_interning(material1, material2):
+    geometry = Geometry("Interning")
+    for i, material in enumerate([material1, material2]):
+        module = Module(material)
+        module.add_surface(zplane(-0.1 * i), SidePointer.NEGATIVE)
+        module.add_surface(zplane(-0.1 * (i + 1)), SidePointer.POSITIVE)
+        module.add_surface(cylinder(1.0), SidePointer.NEGATIVE)
+        geometry.add_module(module)
+
+    fileobj = io.StringIO()
+    geometry.write(fileobj)
+    lines = fileobj.getvalue().splitlines()
+    assert sum(line.startswith("SURFACE (") and ")," not in line for line in lines) == 4
+    assert "SURFACE (   2), SIDE POINTER=(-1)" in lines
+
+    fileobj.seek(0)
+    material_lookup = {0: VACUUM, 1: material1, 2: material2}
+    geometry = Geometry()
+    geometry.read(fileobj, material_lookup)
+
+    module1, module2 = geometry.get_modules()
+    assert len(geometry.get_surfaces()) == 4
+    assert set(module1.get_surfaces()) & set(module2.get_surfaces())
 
 
 def testwriteread(geometry, material1, material2):
@@ -219,6 +424,27 @@ def test_epma1_read(testdatadir, material1):
     assert len(geometry.get_materials()) == 1
 
 
+def test_epma1_read_pipe(testdatadir, material1):
+    filepath = testdatadir.joinpath("pengeom", "epma1.geo")
+    with open(filepath, "rb") as fp:
+        content = fp.read()
+
+    # Pipes are not seekable
+    fd_read, fd_write = os.pipe()
+    with os.fdopen(fd_write, "wb") as fp:
+        fp.write(content)
+
+    geometry = Geometry()
+    with os.fdopen(fd_read, "r") as fp:
+        geometry.read(fp, {1: material1})
+
+    assert geometry.title == "Cylindrical homogeneous foil"
+    assert len(geometry.get_surfaces()) == 3
+    (module,) = geometry.get_modules()
+    assert module.description == "Sample"
+    assert module.material is material1
+
+
 def test_epma2_read(testdatadir, material1, material2):
     material_lookup = {1: material1, 2: material2}
 
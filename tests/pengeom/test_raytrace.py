@@ -0,0 +1,217 @@
+""" """
+
+# Standard library modules.
+import math
+
+# Third party modules.
+import numpy as np
+import pytest
+
+# Local modules.
+from pypenelopetools.pengeom.raytrace import (
+    get_half_space_bounding_box,
+    get_module_bounding_boxes,
+    intersect_boxes,
+    BoundingVolumeHierarchy,
+    RayTracer,
+    RaySegments,
+)
+from pypenelopetools.pengeom.compiled import (
+    compile_geometry,
+    get_quadric,
+    get_quadric_coefficients,
+)
+from pypenelopetools.pengeom.geometry import Geometry
+from pypenelopetools.pengeom.module import Module, SidePointer
+from pypenelopetools.pengeom.surface import zplane, cylinder, sphere
+from pypenelopetools.material import Material
+
+# Globals and constants variables.
+
+
+def _coefficients(surface):
+    return get_quadric_coefficients(get_quadric(surface))
+
+
+@pytest.fixture
+def tracer(geometry):
+    return RayTracer(compile_geometry(geometry))
+
+
+def testget_half_space_bounding_box():
+    surface = sphere(2.0)
+    surface.shift.x_cm = 1.0
+    lower, upper = get_half_space_bounding_box(_coefficients(surface), -1)
+    np.testing.assert_allclose(lower, [-1.0, -2.0, -2.0])
+    np.testing.assert_allclose(upper, [3.0, 2.0, 2.0])
+
+    # Outside of a sphere
+    lower, upper = get_half_space_bounding_box(_coefficients(surface), 1)
+    assert np.isinf(lower).all() and np.isinf(upper).all()
+
+    lower, upper = get_half_space_bounding_box(_coefficients(zplane(-0.1)), 1)
+    assert lower.tolist() == [-math.inf, -math.inf, pytest.approx(-0.1)]
+    assert upper.tolist() == [math.inf] * 3
+
+    lower, upper = get_half_space_bounding_box(_coefficients(cylinder(0.5, "x")), -1)
+    assert lower.tolist() == [-math.inf, pytest.approx(-0.5), pytest.approx(-0.5)]
+    assert upper.tolist() == [math.inf, pytest.approx(0.5), pytest.approx(0.5)]
+
+
+def testget_module_bounding_boxes(geometry):
+    lowers, uppers = get_module_bounding_boxes(compile_geometry(geometry))
+    assert np.isinf(lowers[0]).all()
+    np.testing.assert_allclose(lowers[1:], [[-0.04, -0.04, -0.09], [-1, -1, -0.1]])
+    np.testing.assert_allclose(uppers[1:], [[0.04, 0.04, -0.01], [1, 1, 0]], atol=1e-12)
+
+
+def testget_module_bounding_boxes_tilt(geometry):
+    geometry.tilt_deg = 40.0
+    lowers, uppers = get_module_bounding_boxes(compile_geometry(geometry))
+    assert np.isfinite(lowers[1:]).all() and np.isfinite(uppers[1:]).all()
+
+    # Corners of the foil rotated by 40 deg around the x-axis
+    sin, cos = math.sin(math.radians(40.0)), math.cos(math.radians(40.0))
+    np.testing.assert_allclose(lowers[2], [-1.0, -cos - 0.1 * sin, -sin - 0.1 * cos])
+    np.testing.assert_allclose(uppers[2], [1.0, cos, sin])
+
+    # Bounding box of the inclusion contains the rotated sphere
+    center = [0.0, -0.05 * sin, -0.05 * cos]
+    assert (lowers[1] <= np.subtract(center, 0.04) + 1e-12).all()
+    assert (uppers[1] >= np.add(center, 0.04) - 1e-12).all()
+
+
+def testbounding_volume_hierarchy():
+    rng = np.random.default_rng(0)
+    lowers = rng.uniform(-10.0, 10.0, size=(200, 3))
+    uppers = lowers + rng.uniform(0.1, 1.0, size=(200, 3))
+    uppers[0] = [np.inf, np.inf, np.inf]
+    hierarchy = BoundingVolumeHierarchy(lowers, uppers, np.arange(200) + 1)
+    assert len(hierarchy) == 200
+
+    origins = rng.uniform(-12.0, 12.0, size=(50, 3))
+    directions = rng.normal(size=(50, 3))
+    rays, items = hierarchy.intersect(origins, directions, max_distance=20.0)
+
+    expected = []
+    for ray in range(50):
+        hit = intersect_boxes(
+            np.tile(origins[ray], (200, 1)),
+            np.tile(1.0 / directions[ray], (200, 1)),
+            lowers,
+            uppers,
+            20.0,
+        )
+        expected.extend((ray, item + 1) for item in np.flatnonzero(hit))
+
+    assert list(zip(rays.tolist(), items.tolist())) == expected
+
+
+def testbounding_volume_hierarchy_query():
+    lowers = np.array([[0.0, 0.0, 0.0], [1.0, 1.0, 1.0], [-np.inf, -np.inf, 0.5]])
+    uppers = np.array([[2.0, 2.0, 2.0], [3.0, 3.0, 3.0], [np.inf, np.inf, np.inf]])
+    hierarchy = BoundingVolumeHierarchy(lowers, uppers, leaf_size=1)
+
+    points = [[0.5, 0.5, 0.2], [1.5, 1.5, 1.5], [5.0, 0.0, 0.0], [9.0, 9.0, 9.0]]
+    points, items = hierarchy.query(points)
+    assert list(zip(points.tolist(), items.tolist())) == [
+        (0, 0),
+        (1, 0),
+        (1, 1),
+        (1, 2),
+        (3, 2),
+    ]
+
+
+def testtrace(tracer):
+    origins = [[0.0, 0.0, 1.0], [0.5, 0.0, 1.0], [-2.0, 0.0, -0.05], [0, 0, 1]]
+    directions = [[0.0, 0.0, -2.0], [0.0, 0.0, -1.0], [1.0, 0.0, 0.0], [1, 0, 0]]
+    segments = tracer.trace(origins, directions)
+
+    assert len(segments) == 4
+    assert [(m, mat) for m, mat, _ in segments.get_segments(0)] == [
+        (2, 2),
+        (1, 1),
+        (2, 2),
+    ]
+    np.testing.assert_allclose(
+        [length for _, _, length in segments.get_segments(0)], [0.01, 0.08, 0.01]
+    )
+    np.testing.assert_allclose(segments.starts[:3], [1.0, 1.01, 1.09])
+    assert segments.get_segments(1) == [(2, 2, pytest.approx(0.1))]
+    assert segments.get_segments(3) == []
+
+    path_lengths = segments.get_path_lengths()
+    np.testing.assert_allclose(path_lengths[2], [0.0, 0.08, 1.92])
+
+
+def testtrace_max_distance(tracer):
+    segments = tracer.trace([[0.0, 0.0, 1.0]], [[0.0, 0.0, -1.0]], max_distance=1.05)
+    assert segments.get_segments(0) == [
+        (2, 2, pytest.approx(0.01)),
+        (1, 1, pytest.approx(0.04)),
+    ]
+
+
+def testtrace_infinite():
+    geometry = Geometry()
+    module = Module(Material("copper", {29: 1.0}, 8.9))
+    module.add_surface(zplane(0.0), SidePointer.NEGATIVE)
+    geometry.add_module(module)
+
+    segments = RayTracer(compile_geometry(geometry)).trace(
+        [[0.0, 0.0, 1.0], [0.0, 0.0, 1.0]], [[0.0, 0.0, -1.0], [0.0, 0.0, 1.0]]
+    )
+    assert segments.get_segments(0) == [(1, 1, math.inf)]
+    assert segments.get_segments(1) == []
+
+
+def testtrace_random(tracer):
+    rng = np.random.default_rng(1)
+    count = 200
+    origins = rng.uniform(-1.2, 1.2, size=(count, 3)) * [1.0, 1.0, 0.2]
+    directions = rng.normal(size=(count, 3))
+    directions /= np.linalg.norm(directions, axis=1)[:, np.newaxis]
+
+    segments = tracer.trace(origins, directions, max_distance=3.0, chunk_size=64)
+
+    # Compare with the modules located at points sampled along the rays
+    step = 1e-3
+    distances = np.arange(step / 2, 3.0, step)
+    points = (
+        origins[:, np.newaxis, :]
+        + distances[:, np.newaxis] * directions[:, np.newaxis, :]
+    )
+    located = tracer.compiled.locate(points.reshape(-1, 3)).reshape(count, -1)
+    expected = np.stack([(located == m).sum(axis=1) * step for m in (1, 2)], axis=1)
+
+    path_lengths = np.zeros((count, 3))
+    for ray in range(count):
+        for module, _material, length in segments.get_segments(ray):
+            path_lengths[ray, module] += length
+    np.testing.assert_allclose(path_lengths[:, 1:], expected, atol=2.5 * step)
+
+    parallel = tracer.trace(
+        origins, directions, max_distance=3.0, chunk_size=64, max_workers=2
+    )
+    assert (parallel.offsets == segments.offsets).all()
+    np.testing.assert_allclose(parallel.lengths, segments.lengths)
+
+
+def testtrace_empty(tracer):
+    segments = tracer.trace(np.zeros((0, 3)), np.zeros((0, 3)))
+    assert len(segments) == 0
+    assert segments.get_path_lengths().shape == (0, 1)
+
+    with pytest.raises(ValueError):
+        tracer.trace([[0.0, 0.0, 0.0]], [[0.0, 0.0, 0.0]])
+
+
+def testray_segments_concatenate():
+    segments1 = RaySegments([0, 1, 1], [2], [1], [0.0], [1.0])
+    segments2 = RaySegments([0, 2], [1, 2], [2, 1], [0.0, 1.0], [1.0, 0.5])
+    segments = RaySegments.concatenate([segments1, segments2])
+
+    assert len(segments) == 3
+    assert segments.offsets.tolist() == [0, 1, 1, 3]
+    assert segments.get_segments(2) == [(1, 2, 1.0), (2, 1, 0.5)]
@@ -0,0 +1,143 @@
+""" """
+
+# Standard library modules.
+import io
+
+# Third party modules.
+import numpy as np
+import pytest
+
+# Local modules.
+from pypenelopetools.pengeom.rebalance import rebalance_geometry, get_surface_tests
+from pypenelopetools.pengeom.compiled import compile_geometry
+from pypenelopetools.pengeom.validation import check_geometry
+from pypenelopetools.pengeom.volume import get_geometry_bounding_box
+from pypenelopetools.pengeom.geometry import Geometry
+from pypenelopetools.pengeom.module import Module, SidePointer
+from pypenelopetools.pengeom.surface import zplane, sphere
+from pypenelopetools.material import Material, VACUUM
+
+# Globals and constants variables.
+BOUNDS = ([-1.5, -1.5, -1.5], [1.5, 1.5, 1.5])
+
+
+@pytest.fixture
+def geometry(geometry):
+    # Replaces the sphere of the foil by a grid of 6x6 spheres of radius
+    # 0.04 cm centred at z=-0.05 cm
+    inclusion, foil = geometry.get_modules()
+    foil.clear_modules()
+    geometry.clear_modules()
+
+    for x in np.linspace(-0.5, 0.5, 6):
+        for y in np.linspace(-0.5, 0.5, 6):
+            inclusion = Module(inclusion.material)
+            surface = sphere(0.04)
+            surface.shift.x_cm = x
+            surface.shift.y_cm = y
+            surface.shift.z_cm = -0.05
+            inclusion.add_surface(surface, SidePointer.NEGATIVE)
+            geometry.add_module(inclusion)
+            foil.add_module(inclusion)
+
+    geometry.add_module(foil)
+
+    return geometry
+
+
+@pytest.fixture
+def points():
+    random = np.random.default_rng(0)
+    return random.uniform(BOUNDS[0], BOUNDS[1], (100000, 3)) * [1.0, 1.0, 0.1]
+
+
+def testget_surface_tests(geometry):
+    foil = geometry.get_modules()[-1]
+    for inclusion in geometry.get_modules()[2:-1]:
+        foil.pop_module(inclusion)
+        geometry.pop_module(inclusion)
+
+    tests = get_surface_tests(compile_geometry(geometry))
+    assert tests.tolist() == [3, 1, 1, 5]
+
+
+def testrebalance_geometry(geometry, points):
+    materials = compile_geometry(geometry).locate_materials(points)
+
+    report = rebalance_geometry(geometry, count=20000, seed=0)
+    assert report.container_count > 0
+    assert report.max_tests_before == 39
+    assert report.max_tests_after <= 3 + 8 + 6
+    assert report.tests_after < report.tests_before / 2
+    assert report.speedup > 2.0
+
+    compiled = compile_geometry(geometry)
+    assert compiled.module_count == 37 + report.container_count
+    assert (compiled.locate_materials(points) == materials).all()
+    assert check_geometry(compiled, count=50000, seed=0) == []
+
+    for module in geometry.get_modules():
+        assert len(module.get_modules()) <= 8
+        if module.description.startswith("Container"):
+            assert module.material.name == "copper"
+
+    fileobj = io.StringIO()
+    geometry.write(fileobj)
+    assert "Container of" in fileobj.getvalue()
+
+
+def testrebalance_geometry_toplevel(points):
+    geometry = Geometry()
+    material = Material("zinc", {30: 1.0}, 7.14)
+    random = np.random.default_rng(1)
+    for center in random.uniform(-1.0, 1.0, (50, 3)) * [1.0, 1.0, 0.1]:
+        module = Module(material)
+        surface = sphere(0.01)
+        surface.shift.x_cm, surface.shift.y_cm, surface.shift.z_cm = center
+        module.add_surface(surface, SidePointer.NEGATIVE)
+        geometry.add_module(module)
+
+    materials = compile_geometry(geometry).locate_materials(points)
+
+    report = rebalance_geometry(geometry, max_children=4, count=20000, seed=0)
+    assert report.max_tests_before == 50
+    assert report.max_tests_after <= 6 + 4 * 6
+
+    compiled = compile_geometry(geometry)
+    assert (compiled.locate_materials(points) == materials).all()
+    assert check_geometry(compiled, count=50000, seed=0) == []
+    assert np.isfinite(get_geometry_bounding_box(compiled)).all()
+
+    containers = geometry.get_modules()[50:]
+    assert len(containers) == report.container_count
+    assert all(module.material is VACUUM for module in containers)
+    assert all(len(module.get_surfaces()) == 6 for module in containers)
+
+
+def testrebalance_geometry_tilt(geometry, points):
+    geometry.tilt_deg = 30.0
+    materials = compile_geometry(geometry).locate_materials(points)
+
+    report = rebalance_geometry(geometry, count=20000, bounds=BOUNDS, seed=0)
+    assert report.tests_after < report.tests_before
+
+    compiled = compile_geometry(geometry)
+    assert (compiled.locate_materials(points) == materials).all()
+    assert check_geometry(compiled, count=50000, bounds=BOUNDS, seed=0) == []
+
+
+def testrebalance_geometry_unchanged(geometry):
+    report = rebalance_geometry(geometry, max_children=36, count=1000)
+    assert report.container_count == 0
+    assert report.tests_after == report.tests_before
+    assert len(geometry.get_modules()) == 37
+
+    with pytest.raises(ValueError):
+        rebalance_geometry(geometry, max_children=1)
+
+    module = Module(Material("copper", {29: 1.0}, 8.9))
+    module.add_surface(zplane(-1.0), SidePointer.NEGATIVE)
+    geometry.add_module(module)
+    with pytest.raises(ValueError):
+        rebalance_geometry(geometry)
+    assert len(geometry.get_modules()) == 38
@@ -0,0 +1,161 @@
+""" """
+
+# Standard library modules.
+
+# Third party modules.
+import numpy as np
+import pytest
+
+# Local modules.
+from pypenelopetools.pengeom.validation import (
+    check_geometry,
+    OVERLAP,
+    UNENCLOSED,
+    UNUSED_SURFACE,
+    EMPTY_MODULE,
+)
+from pypenelopetools.pengeom.compiled import compile_geometry
+from pypenelopetools.pengeom.geometry import Geometry
+from pypenelopetools.pengeom.module import Module, SidePointer
+from pypenelopetools.pengeom.surface import zplane, sphere
+from pypenelopetools.material import Material
+
+# Globals and constants variables.
+
+
+def _add_sphere(geometry, radius_cm, z_cm, parent=None, x_cm=0.0):
+    module = Module(Material("zinc", {30: 1.0}, 7.14))
+    surface = sphere(radius_cm)
+    surface.shift.x_cm = x_cm
+    surface.shift.z_cm = z_cm
+    module.add_surface(surface, SidePointer.NEGATIVE)
+    geometry.add_module(module)
+    if parent is not None:
+        parent.add_module(module)
+    return module
+
+
+def testcheck_geometry(geometry):
+    compiled = compile_geometry(geometry)
+    assert check_geometry(compiled, count=100000, seed=0) == []
+
+
+def testcheck_geometry_tilt(geometry):
+    geometry.tilt_deg = 40.0
+    compiled = compile_geometry(geometry)
+    assert check_geometry(compiled, count=100000, seed=0) == []
+
+
+def testcheck_geometry_overlap(geometry):
+    inclusion, foil = geometry.get_modules()
+    _add_sphere(geometry, 0.03, -0.06, foil, x_cm=0.05)
+
+    compiled = compile_geometry(geometry)
+    issues = check_geometry(compiled, count=100000, seed=0, stop_on_error=False)
+
+    assert [(issue.kind, issue.modules) for issue in issues] == [
+        (OVERLAP, (1, 2)),
+    ]
+    point = np.array(issues[0].point)
+    assert np.linalg.norm(point - [0.0, 0.0, -0.05]) < 0.04
+    assert np.linalg.norm(point - [0.05, 0.0, -0.06]) < 0.03
+
+
+def testcheck_geometry_overlap_three(geometry):
+    # Concentric spheres: the smallest only overlaps with the inclusion where
+    # the three spheres overlap
+    inclusion, foil = geometry.get_modules()
+    _add_sphere(geometry, 0.03, -0.05, foil)
+    _add_sphere(geometry, 0.02, -0.05, foil)
+
+    compiled = compile_geometry(geometry)
+    issues = check_geometry(compiled, count=100000, seed=0, stop_on_error=False)
+
+    assert [(issue.kind, issue.modules) for issue in issues] == [
+        (OVERLAP, (1, 2)),
+        (OVERLAP, (1, 3)),
+        (OVERLAP, (2, 3)),
+    ]
+    for issue in issues:
+        assert np.linalg.norm(np.array(issue.point) - [0.0, 0.0, -0.05]) < 0.03
+
+
+def testcheck_geometry_overlap_toplevel(geometry):
+    _add_sphere(geometry, 0.5, 0.3)
+
+    compiled = compile_geometry(geometry)
+    issues = check_geometry(compiled, count=100000, seed=0)
+    assert [(issue.kind, issue.modules) for issue in issues] == [
+        (OVERLAP, (2, 3)),
+    ]
+    assert issues[0].point[2] < 0.0
+
+
+def testcheck_geometry_unenclosed(geometry):
+    inclusion, foil = geometry.get_modules()
+    _add_sphere(geometry, 0.04, -0.11, foil, x_cm=0.5)
+
+    compiled = compile_geometry(geometry)
+    issues = check_geometry(compiled, count=100000, seed=0)
+    assert [(issue.kind, issue.modules) for issue in issues] == [
+        (UNENCLOSED, (2, 3)),
+    ]
+    assert issues[0].point[2] < -0.1
+
+
+def testcheck_geometry_warnings(geometry):
+    inclusion, foil = geometry.get_modules()
+    foil.add_surface(zplane(5.0), SidePointer.NEGATIVE)
+
+    empty = Module()
+    empty.add_surface(zplane(2.0), SidePointer.POSITIVE)
+    empty.add_surface(zplane(3.0), SidePointer.NEGATIVE)
+    empty.add_surface(sphere(0.5), SidePointer.NEGATIVE)
+    geometry.add_module(empty)
+
+    compiled = compile_geometry(geometry)
+    index_lookup = geometry.indexify()
+    issues = check_geometry(compiled, count=100000, seed=0)
+
+    assert sorted((issue.kind, issue.modules, issue.surface) for issue in issues) == [
+        (EMPTY_MODULE, (3,), None),
+        (UNUSED_SURFACE, (2,), index_lookup[foil.get_surfaces()[-1]]),
+    ]
+
+
+def testcheck_geometry_parallel(geometry):
+    inclusion, foil = geometry.get_modules()
+    _add_sphere(geometry, 0.04, -0.08, foil)
+    _add_sphere(geometry, 0.04, -0.11, foil, x_cm=0.5)
+
+    compiled = compile_geometry(geometry)
+    issues = check_geometry(compiled, count=50000, seed=1, stop_on_error=False)
+    assert [(issue.kind, issue.modules) for issue in issues] == [
+        (OVERLAP, (1, 2)),
+        (UNENCLOSED, (2, 4)),
+        (UNENCLOSED, (3, 4)),
+    ]
+
+    # Sampling stops after the first chunk with an error
+    issues = check_geometry(compiled, count=50000, seed=1, chunk_size=1000)
+    assert 1 <= len(issues) <= 3
+    parallel = check_geometry(
+        compiled, count=50000, seed=1, chunk_size=1000, max_workers=2
+    )
+    assert parallel == issues
+
+
+def testcheck_geometry_unbounded():
+    geometry = Geometry()
+    module = Module(Material("copper", {29: 1.0}, 8.9))
+    module.add_surface(zplane(0.0), SidePointer.NEGATIVE)
+    geometry.add_module(module)
+    compiled = compile_geometry(geometry)
+
+    with pytest.raises(ValueError):
+        check_geometry(compiled)
+
+    issues = check_geometry(
+        compiled, count=1000, bounds=([-1.0, -1.0, -1.0], [1.0, 1.0, 1.0])
+    )
+    assert issues == []
@@ -0,0 +1,108 @@
+""" """
+
+# Standard library modules.
+import math
+
+# Third party modules.
+import numpy as np
+import pytest
+
+# Local modules.
+from pypenelopetools.pengeom.volume import (
+    estimate_volumes,
+    get_geometry_bounding_box,
+)
+from pypenelopetools.pengeom.compiled import compile_geometry
+from pypenelopetools.pengeom.geometry import Geometry
+from pypenelopetools.pengeom.module import Module, SidePointer
+from pypenelopetools.pengeom.surface import zplane
+from pypenelopetools.material import Material
+
+# Globals and constants variables.
+
+
+@pytest.fixture
+def compiled(geometry):
+    return compile_geometry(geometry)
+
+
+def testget_geometry_bounding_box(compiled):
+    lower, upper = get_geometry_bounding_box(compiled)
+    np.testing.assert_allclose(lower, [-1.0, -1.0, -0.1])
+    np.testing.assert_allclose(upper, [1.0, 1.0, 0.0], atol=1e-12)
+
+
+def testestimate_volumes(geometry, compiled):
+    estimate = estimate_volumes(compiled, count=200000, seed=0, chunk_size=50000)
+    assert estimate.count == 200000
+    assert estimate.box_volume_cm3 == pytest.approx(0.4)
+
+    inclusion, foil = geometry.get_modules()
+    sphere_volume = 4.0 / 3.0 * math.pi * 0.04**3
+    foil_volume = math.pi * 0.1 - sphere_volume
+
+    volume, uncertainty = estimate.get_volume_cm3(inclusion)
+    assert uncertainty > 0.0
+    assert volume == pytest.approx(sphere_volume, abs=4 * uncertainty)
+
+    volume, uncertainty = estimate.get_volume_cm3(2)
+    assert volume == pytest.approx(foil_volume, abs=4 * uncertainty)
+
+    mass, uncertainty = estimate.get_mass_g(foil)
+    assert mass == pytest.approx(foil_volume * 8.9, abs=4 * uncertainty)
+    assert uncertainty == pytest.approx(estimate.volume_uncertainties_cm3[2] * 8.9)
+
+    assert estimate.masses_g[0] == 0.0
+    assert estimate.volumes_cm3.sum() == pytest.approx(0.4)
+
+    volumes = estimate.get_material_volumes_cm3()
+    assert sorted(volumes) == [0, 1, 2]
+    assert volumes[2][0] == estimate.volumes_cm3[2]
+
+    masses = estimate.get_material_masses_g()
+    assert masses[1][0] == pytest.approx(estimate.masses_g[1])
+
+
+def testestimate_volumes_tilt(geometry):
+    geometry.tilt_deg = 40.0
+    compiled = compile_geometry(geometry)
+    assert np.isfinite(get_geometry_bounding_box(compiled)).all()
+
+    estimate = estimate_volumes(compiled, count=200000, seed=0)
+    sphere_volume = 4.0 / 3.0 * math.pi * 0.04**3
+    foil_volume = math.pi * 0.1 - sphere_volume
+
+    volume, uncertainty = estimate.get_volume_cm3(2)
+    assert volume == pytest.approx(foil_volume, abs=4 * uncertainty)
+
+
+def testestimate_volumes_reproducible(compiled):
+    estimate1 = estimate_volumes(compiled, count=30000, seed=1, chunk_size=7000)
+    estimate2 = estimate_volumes(
+        compiled, count=30000, seed=1, chunk_size=7000, max_workers=2
+    )
+    assert estimate1.counts.tolist() == estimate2.counts.tolist()
+
+    estimate3 = estimate_volumes(compiled, count=30000, seed=2, chunk_size=7000)
+    assert estimate1.counts.tolist() != estimate3.counts.tolist()
+
+
+def testestimate_volumes_bounds(compiled):
+    estimate = estimate_volumes(
+        compiled, count=10000, bounds=([-0.04, -0.04, -0.09], [0.04, 0.04, -0.01])
+    )
+    assert estimate.counts[0] == 0
+    assert estimate.counts[2] > 0
+
+    with pytest.raises(ValueError):
+        estimate_volumes(compiled, bounds=([0.0, 0.0, 0.0], [1.0, 0.0, 1.0]))
+
+
+def testestimate_volumes_unbounded():
+    geometry = Geometry()
+    module = Module(Material("copper", {29: 1.0}, 8.9))
+    module.add_surface(zplane(0.0), SidePointer.NEGATIVE)
+    geometry.add_module(module)
+
+    with pytest.raises(ValueError):
+        estimate_volumes(compile_geometry(geometry))
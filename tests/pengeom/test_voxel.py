@@ -0,0 +1,129 @@
+""" """
+
+# Standard library modules.
+
+# Third party modules.
+import numpy as np
+import pytest
+
+# Local modules.
+from pypenelopetools.pengeom.voxel import voxelize, get_grid_edges, _get_mode
+from pypenelopetools.pengeom.compiled import compile_geometry
+from pypenelopetools.pengeom.module import Module, SidePointer
+from pypenelopetools.pengeom.surface import xplane, cylinder
+from pypenelopetools.penmain.input import PenmainInput
+from pypenelopetools.material import Material
+
+# Globals and constants variables.
+
+
+@pytest.fixture
+def compiled(geometry):
+    return compile_geometry(geometry)
+
+
+def testget_mode():
+    values = np.array([[2, 1, 2, 0], [3, 3, 1, 1], [5, 5, 5, 5]])
+    assert _get_mode(values).tolist() == [2, 1, 5]
+
+
+def testvoxelize(compiled):
+    edges = np.linspace(-0.1, 0.1, 21)
+    z_edges = np.linspace(-0.15, 0.05, 21)
+    grid = voxelize(compiled, edges, edges, z_edges)
+
+    assert grid.shape == (20, 20, 20)
+    assert grid.module_indices.dtype == np.uint16
+    assert grid.material_indices.dtype == np.uint16
+    assert grid.material_counts is None
+
+    centers = (z_edges[1:] + z_edges[:-1]) / 2
+    column = np.where(
+        np.abs(centers + 0.05) < 0.04,
+        1,
+        np.where((centers < 0) & (centers > -0.1), 2, 0),
+    )
+    assert grid.module_indices[10, 10].tolist() == column.tolist()
+    assert grid.module_indices[0, 0].tolist() == np.minimum(column * 2, 2).tolist()
+    assert (grid.material_indices == grid.module_indices).all()
+
+    fractions = grid.get_material_fractions(1)
+    assert fractions[10, 10].tolist() == (column == 1).tolist()
+    np.testing.assert_allclose(grid.voxel_volumes_cm3, 1e-6)
+
+
+def testvoxelize_supersampling(compiled):
+    # Voxels straddling the sphere
+    edges = np.linspace(-0.06, 0.06, 4)
+    z_edges = np.linspace(-0.11, 0.01, 4)
+    grid = voxelize(compiled, edges, edges, z_edges, supersampling=20, chunk_size=5000)
+
+    assert grid.material_counts.shape == (3, 3, 3, 3)
+    assert grid.material_counts.dtype == np.uint16
+
+    fractions = [grid.get_material_fractions(index) for index in range(3)]
+    np.testing.assert_allclose(sum(fractions), 1.0)
+
+    volume = (fractions[1] * grid.voxel_volumes_cm3).sum()
+    assert volume == pytest.approx(4.0 / 3.0 * np.pi * 0.04**3, rel=0.01)
+
+    # Centre voxel is in the sphere, top corner voxels are partly in vacuum
+    # and just touch the sphere
+    assert grid.module_indices[1, 1, 1] == 1
+    assert fractions[1][1, 1, 1] == 1.0
+    assert 0.0 < fractions[1][0, 0, 2] < fractions[0][0, 0, 2] < 1.0
+    assert grid.module_indices[0, 0, 2] == 2
+
+    parallel = voxelize(
+        compiled,
+        edges,
+        edges,
+        z_edges,
+        supersampling=20,
+        chunk_size=5000,
+        max_workers=2,
+    )
+    assert (parallel.module_indices == grid.module_indices).all()
+    assert (parallel.material_counts == grid.material_counts).all()
+
+
+def testvoxelize_invalid(compiled):
+    edges = np.linspace(-0.1, 0.1, 3)
+    with pytest.raises(ValueError):
+        voxelize(compiled, edges, edges, [0.0])
+    with pytest.raises(ValueError):
+        voxelize(compiled, edges, edges, [0.1, 0.0])
+    with pytest.raises(ValueError):
+        voxelize(compiled, edges, edges, edges, supersampling=0)
+
+
+def testget_grid_edges(compiled):
+    input = PenmainInput()
+    input.GRIDX.set(-0.1, 0.1, 4)
+    input.GRIDY.set(-0.1, 0.1, 2)
+
+    with pytest.raises(ValueError):
+        get_grid_edges(input)
+
+    input.GRIDZ.set(-0.1, 0.0, 5)
+    x_edges, y_edges, z_edges = get_grid_edges(input)
+    np.testing.assert_allclose(x_edges, [-0.1, -0.05, 0.0, 0.05, 0.1])
+    np.testing.assert_allclose(y_edges, [-0.1, 0.0, 0.1])
+    assert len(z_edges) == 6
+
+    grid = voxelize(compiled, *get_grid_edges(input), supersampling=2)
+    assert grid.shape == (4, 2, 5)
+    assert grid.material_counts.dtype == np.uint8
+
+
+def testvoxelize_module_transformation(geometry):
+    module = Module(Material("copper", {29: 1.0}, 8.9))
+    module.add_surface(xplane(0.0), SidePointer.POSITIVE)
+    module.add_surface(xplane(1.0), SidePointer.NEGATIVE)
+    module.add_surface(cylinder(0.5, axis="x"), SidePointer.NEGATIVE)
+    module.shift.z_cm = 2.0
+    geometry.add_module(module)
+
+    compiled = compile_geometry(geometry)
+    grid = voxelize(compiled, [0.4, 0.6], [-0.1, 0.1], [1.9, 2.1, 3.0])
+    assert grid.module_indices.tolist() == [[[3, 0]]]
@@ -0,0 +1,144 @@
+""" """
+
+# Standard library modules.
+import os
+import sys
+
+# Third party modules.
+import pytest
+
+# Local modules.
+from pypenelopetools.material import Material
+from pypenelopetools.materialstore import MaterialStore, get_material_key
+from pypenelopetools.penelope.program import MaterialProgram
+from pypenelopetools.penelope.runner import JobError
+
+# Globals and constants variables.
+STUB_SCRIPT = """#!{executable}
+# Stub of the material program: writes its input in the material file
+import os
+import sys
+
+lines = sys.stdin.read().splitlines()
+if not os.path.isdir("pdfiles"):
+    sys.exit(1)
+
+with open(os.environ["STUB_RUNS"], "a") as fp:
+    fp.write("x")
+
+with open(lines[-1].strip(), "w") as fp:
+    fp.write("\\n".join(lines[2:-1]))
+"""
+
+
+@pytest.fixture
+def runs_filepath(tmp_path, monkeypatch):
+    filepath = tmp_path.joinpath("runs")
+    monkeypatch.setenv("STUB_RUNS", str(filepath))
+    return filepath
+
+
+@pytest.fixture
+def store(tmp_path, runs_filepath):
+    filepath = tmp_path.joinpath("material.py")
+    filepath.write_text(STUB_SCRIPT.format(executable=sys.executable))
+    filepath.chmod(0o755)
+
+    tmp_path.joinpath("pdfiles").mkdir()
+
+    return MaterialStore(
+        str(tmp_path.joinpath("store")),
+        MaterialProgram(str(filepath)),
+        str(tmp_path.joinpath("pdfiles")),
+    )
+
+
+def _count_runs(runs_filepath):
+    if not runs_filepath.exists():
+        return 0
+    return len(runs_filepath.read_text())
+
+
+def testget_material_key():
+    key = get_material_key(Material("brass", {29: 0.4, 30: 0.6}, 8.9))
+    assert len(key) == 64
+
+    # Name, order and scale of the composition do not matter
+    assert get_material_key(Material("other", {30: 6.0, 29: 4.0}, 8.9)) == key
+    assert get_material_key(Material("brass", {29: 0.40001, 30: 0.6}, 8.9)) == key
+
+    assert get_material_key(Material("brass", {29: 0.4, 30: 0.6}, 8.5)) != key
+    assert get_material_key(Material("brass", {29: 0.5, 30: 0.5}, 8.9)) != key
+    assert get_material_key(Material("brass", {29: 0.4, 30: 0.6}, 8.9, 320.0)) != key
+    assert (
+        get_material_key(Material("brass", {29: 0.4, 30: 0.6}, 8.9, None, 2.6)) == key
+    )
+    assert (
+        get_material_key(Material("brass", {29: 0.4, 30: 0.6}, 8.9, None, 2.6, 13.4))
+        != key
+    )
+
+
+def testget_material_key_empty():
+    with pytest.raises(ValueError):
+        get_material_key(Material("Vacuum", {}, 0.0))
+
+
+def testensure(store, runs_filepath):
+    copper = Material("copper", {29: 1.0}, 8.9)
+    brass = Material("brass", {29: 0.4, 30: 0.6}, 8.9)
+    brass2 = Material("brass2", {30: 0.6, 29: 0.4}, 8.9)
+
+    assert copper not in store
+
+    filepaths = store.ensure([copper, brass, brass2])
+    assert _count_runs(runs_filepath) == 2
+    assert filepaths[1] == filepaths[2]
+    assert copper in store
+
+    with open(filepaths[0], "r") as fp:
+        assert fp.readline().strip() == "1"
+
+    # Already in store
+    assert store.ensure([brass, copper]) == filepaths[1::-1]
+    assert _count_runs(runs_filepath) == 2
+
+    # No work directory left
+    assert len(os.listdir(store.dirpath)) == 2
+
+
+def testensure_failed(tmp_path, store):
+    store.pdfiles_dirpath = None
+
+    with pytest.raises(JobError):
+        store.ensure([Material("copper", {29: 1.0}, 8.9)])
+
+    assert os.listdir(store.dirpath) == []
+
+
+def testlink_all(tmp_path, store, runs_filepath):
+    copper = Material("copper", {29: 1.0}, 8.9)
+    brass = Material("brass", {29: 0.4, 30: 0.6}, 8.9)
+    dirpath = tmp_path.joinpath("epma1")
+
+    filepaths = store.link_all([copper, brass], str(dirpath))
+    assert filepaths == [
+        str(dirpath.joinpath("copper.mat")),
+        str(dirpath.joinpath("brass.mat")),
+    ]
+    assert os.path.samefile(filepaths[0], store.get_filepath(copper))
+
+    # Linking again replaces the files
+    filepath = store.link(brass, str(dirpath), "mat2.mat")
+    assert os.path.samefile(filepath, filepaths[1])
+    assert _count_runs(runs_filepath) == 2
+
+
+def testlink_all_invalid(tmp_path, store):
+    copper = Material("copper", {29: 1.0}, 8.9)
+
+    with pytest.raises(ValueError):
+        store.link(copper, str(tmp_path), "a" * 21 + ".mat")
+
+    with pytest.raises(ValueError):
+        store.link_all([copper, copper], str(tmp_path))
@@ -0,0 +1,194 @@
+""" """
+
+# Standard library modules.
+import io
+import os
+
+# Third party modules.
+import numpy as np
+import pytest
+
+# Local modules.
+from pypenelopetools.materialtables import (
+    MaterialTables,
+    read_tables,
+    SIDECAR_EXTENSION,
+)
+
+# Globals and constants variables.
+STOPPING_POWERS = "Stopping powers for electrons and positrons,  NDATA = 119"
+
+
+def _format_fortran(value):
+    return "{0:15.8E}".format(value).replace("E", "D")
+
+
+def _create_tables_content():
+    lines = [" *** Stopping powers for electrons and positrons ..........."]
+    lines.append("   Energy     Scol,e-    Srad,e-    Scol,e+    Srad,e+")
+    for energy in [1e3, 1e4, 1e5]:
+        values = [energy, 1.0, 2.0, 3.0, 4.0]
+        lines.append(" " + " ".join(_format_fortran(v) for v in values))
+
+    lines.append(" *** Unknown section")
+    lines.append(" 1.0 2.0")
+    lines.append(" 3.0 4.0")
+    lines.append(" not a number")
+    lines.append(" 5.0 6.0 7.0")
+    lines.append(" 8.0 9.0 10.0")
+    lines.append(" 11.0")
+
+    return "\n".join(lines) + "\n"
+
+
+@pytest.fixture
+def filepath(tmp_path, testdatadir):
+    # Excerpt of the material file of copper created by the program material
+    # of PENELOPE 2018: header, stopping powers and photon cross sections
+    content = testdatadir.joinpath("material", "Cu.mat").read_text()
+
+    filepath = tmp_path.joinpath("Cu.mat")
+    filepath.write_text(content)
+    return filepath
+
+
+def testread_tables():
+    tables = read_tables(io.StringIO(_create_tables_content()))
+
+    assert list(tables) == [
+        "Stopping powers for electrons and positrons",
+        "Unknown section",
+        "Unknown section#2",
+    ]
+    assert tables["Stopping powers for electrons and positrons"].shape == (3, 5)
+    assert tables["Unknown section"].tolist() == [[1.0, 2.0], [3.0, 4.0]]
+    assert tables["Unknown section#2"].shape == (2, 3)
+
+
+def testread_tables_fortran_exponent():
+    content = " *** Table\n {0} {1}\n {2} {3}\n".format(
+        _format_fortran(1.0), _format_fortran(2.0), _format_fortran(3.0), "4.0"
+    )
+    tables = read_tables(io.StringIO(content))
+    assert tables["Table"].tolist() == [[1.0, 2.0], [3.0, 4.0]]
+
+
+def testread(filepath):
+    with open(filepath, "r") as fp:
+        tables = MaterialTables.read(fp)
+
+    assert tables.header["name"] == "COPPER  (29)"
+    assert tables.header["density_g_per_cm3"] == pytest.approx(8.96)
+    assert list(tables.tables) == [
+        STOPPING_POWERS,
+        "Rayleigh scattering.  NQ = 250,  NE =  975",
+        "Compton and pair-production cross sections,  NDATA = 140",
+        "Photoelectric cross sections,  IZ = 29,  NSHELL =  7,  NDATA =  311",
+    ]
+    assert tables.tables[STOPPING_POWERS].shape == (119, 5)
+
+
+def testread_file_sidecar(filepath, monkeypatch):
+    tables = MaterialTables.read_file(str(filepath))
+    sidecar_filepath = str(filepath) + SIDECAR_EXTENSION
+    assert os.path.exists(sidecar_filepath)
+
+    # Sidecar is used, the material file is not parsed
+    def _fail(*args):
+        raise AssertionError("Material file parsed")
+
+    with monkeypatch.context() as m:
+        m.setattr(MaterialTables, "read", classmethod(_fail))
+        cached = MaterialTables.read_file(str(filepath))
+
+    assert isinstance(cached.tables[STOPPING_POWERS], np.memmap)
+    assert cached.header == tables.header
+    for title, table in tables.tables.items():
+        np.testing.assert_array_equal(cached.tables[title], table)
+
+    # Modified material file
+    filepath.write_text(filepath.read_text().replace("COPPER", "CUPRUM"))
+    assert MaterialTables.read_file(str(filepath)).header["name"] == "CUPRUM  (29)"
+
+
+def testget_column(filepath):
+    tables = MaterialTables.read_file(str(filepath), use_sidecar=False)
+
+    # Cross sections of the Rayleigh table, after the atomic form factors
+    energies, values = tables.get_column("rayleigh_cross_section_cm2")
+    assert len(energies) == 975
+    assert energies[0] == pytest.approx(49.204)
+    assert values[-1] == pytest.approx(3.78705e-32)
+
+    energies, values = tables.get_column("pair_production_cross_section_cm2")
+    assert energies[-1] == pytest.approx(1e9)
+    assert values[-1] == pytest.approx(5.778e-24)
+
+
+def teststopping_power(filepath):
+    tables = MaterialTables.read_file(str(filepath), use_sidecar=False)
+
+    # Values of the table at 1 MeV, in MeV cm2/g
+    values = tables.collision_stopping_power_eV_cm2_per_g([1e6])
+    np.testing.assert_allclose(values, [1.26291e6])
+
+    values = tables.radiative_stopping_power_eV_cm2_per_g([1e6])
+    np.testing.assert_allclose(values, [4.56852e4])
+
+    values = tables.collision_stopping_power_eV_cm2_per_g([1e6], "positron")
+    np.testing.assert_allclose(values, [1.23098e6])
+
+    values = tables.stopping_power_eV_cm2_per_g([1e6, 1e9], "positron")
+    np.testing.assert_allclose(values, [1.23098e6 + 3.41649e4, 1.78735e6 + 7.62853e7])
+
+    # Between 1 and 1.25 MeV
+    values = tables.collision_stopping_power_eV_cm2_per_g([1.1e6])
+    assert 1.25695e6 < values[0] < 1.26291e6
+
+    assert np.isnan(tables.stopping_power_eV_cm2_per_g([1.0, 1e10])).all()
+
+    with pytest.raises(ValueError):
+        tables.stopping_power_eV_cm2_per_g([1e6], "photon")
+
+
+def testcsda_range(filepath):
+    tables = MaterialTables.read_file(str(filepath), use_sidecar=False)
+
+    energies = np.geomspace(1e3, 1e6, 1000)
+    ranges = tables.csda_range_g_per_cm2(energies)
+    assert np.all(np.diff(ranges) > 0)
+
+    # Integral of the inverse of the stopping power
+    stopping_powers = tables.stopping_power_eV_cm2_per_g(energies)
+    increments = 0.5 * (1.0 / stopping_powers[1:] + 1.0 / stopping_powers[:-1])
+    expected = np.sum(increments * np.diff(energies))
+    assert ranges[-1] - ranges[0] == pytest.approx(expected, rel=1e-3)
+
+    ranges_cm = tables.csda_range_cm(energies)
+    np.testing.assert_allclose(ranges_cm, ranges / 8.96)
+
+
+def testphoton_attenuation(filepath):
+    tables = MaterialTables.read_file(str(filepath), use_sidecar=False)
+
+    # Total attenuation coefficients of copper from NIST XCOM
+    values = tables.photon_mass_attenuation_cm2_per_g([1e4, 1e5, 1e6])
+    np.testing.assert_allclose(values, [215.9, 0.4584, 0.05901], rtol=5e-3)
+
+    # No pair production below 1.022 MeV
+    energies = np.geomspace(1e3, 1e7, 1000)
+    values = tables.photon_mass_attenuation_cm2_per_g(energies)
+    assert np.isfinite(values).all()
+
+    lengths = tables.photon_attenuation_length_cm([1e5])
+    np.testing.assert_allclose(
+        lengths, 1.0 / (tables.photon_mass_attenuation_cm2_per_g([1e5]) * 8.96)
+    )
+
+
+def testget_column_missing():
+    tables = MaterialTables({"name": "x", "density_g_per_cm3": 1.0}, {})
+    with pytest.raises(KeyError):
+        tables.get_column("rayleigh_cross_section_cm2")
+    with pytest.raises(KeyError):
+        tables.photon_cross_section_cm2([1e4])
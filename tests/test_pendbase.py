@@ -0,0 +1,111 @@
+""" """
+
+# Standard library modules.
+import os
+
+# Third party modules.
+import pytest
+
+# Local modules.
+from pypenelopetools.pendbase import PendbaseIndex, read_material_header
+from pypenelopetools.material import Material
+
+# Globals and constants variables.
+
+
+@pytest.fixture
+def pendbase(tmp_path, testdatadir):
+    content = testdatadir.joinpath("material", "mat1.mat").read_text()
+    tmp_path.joinpath("mat1.mat").write_text(content)
+    tmp_path.joinpath("mat2.mat").write_text(
+        content.replace("Material: mat1", "Material: mat2").replace(
+            "6.86012233E-01", "5.00000000E-01"
+        )
+    )
+    tmp_path.joinpath("readme.txt").write_text("Not a material")
+    tmp_path.joinpath("invalid.mat").write_text("Not a material")
+    return tmp_path
+
+
+def testread_material_header(testdatadir):
+    with open(testdatadir.joinpath("material", "mat1.mat"), "r") as fp:
+        header = read_material_header(fp)
+
+    assert header["name"] == "mat1"
+    assert header["density_g_per_cm3"] == pytest.approx(8.9)
+    assert header["atomic_fractions"] == {29: pytest.approx(0.686012233), 30: 1.0}
+    assert header["mean_excitation_energy_eV"] == pytest.approx(326.787)
+    assert header["oscillators"] == [(2.686, 0.0, 13.496, 0, 30)]
+
+
+def testrefresh(pendbase):
+    index = PendbaseIndex(str(pendbase))
+    assert len(index) == 0
+
+    read, removed = index.refresh()
+    assert read == {"mat1.mat", "mat2.mat"}
+    assert removed == set()
+    assert [info.filename for info in index] == ["mat1.mat", "mat2.mat"]
+    assert os.path.exists(index.index_filepath)
+
+    # Nothing changed
+    assert index.refresh() == (set(), set())
+
+    # Changed and removed files
+    filepath = pendbase.joinpath("mat2.mat")
+    filepath.write_text(
+        filepath.read_text().replace("8.90000000E+00", "8.50000000E+00")
+    )
+    pendbase.joinpath("mat1.mat").unlink()
+
+    assert index.refresh() == ({"mat2.mat"}, {"mat1.mat"})
+    assert index.get("mat2.mat").density_g_per_cm3 == pytest.approx(8.5)
+    assert "mat1.mat" not in index
+
+
+def testpersistence(pendbase):
+    PendbaseIndex(str(pendbase)).refresh()
+
+    index = PendbaseIndex(str(pendbase))
+    assert len(index) == 2
+    assert index.refresh() == (set(), set())
+
+    info = index.get("mat1.mat")
+    assert info.composition[29] == pytest.approx(0.4, abs=1e-4)
+    assert info.oscillators[0] == (2.686, 0.0, 13.496, 0, 30)
+
+
+def testto_material(pendbase):
+    index = PendbaseIndex(str(pendbase))
+    index.refresh()
+
+    material = index.get("mat1.mat").to_material()
+
+    with open(pendbase.joinpath("mat1.mat"), "r") as fp:
+        expected = Material.read_material(fp)
+
+    assert material.name == expected.name
+    assert material.filename == "mat1.mat"
+    assert material.composition == pytest.approx(expected.composition)
+    assert material.density_g_per_cm3 == pytest.approx(expected.density_g_per_cm3)
+    assert material.oscillator_strength_fcb == pytest.approx(
+        expected.oscillator_strength_fcb
+    )
+    assert material.plasmon_energy_wcb_eV == pytest.approx(
+        expected.plasmon_energy_wcb_eV
+    )
+
+
+def testfind(pendbase):
+    index = PendbaseIndex(str(pendbase))
+    index.refresh()
+
+    infos = index.find({29: 0.4, 30: 0.6})
+    assert [info.filename for info in infos] == ["mat1.mat"]
+
+    infos = index.find({29: 4.0, 30: 6.0}, tolerance=0.1)
+    assert [info.filename for info in infos] == ["mat1.mat", "mat2.mat"]
+
+    assert index.find({29: 0.4, 30: 0.6}, density_g_per_cm3=8.0) == []
+    assert len(index.find({29: 0.4, 30: 0.6}, density_g_per_cm3=8.9)) == 1
+    assert index.find({29: 1.0}, tolerance=1.0) == []
@@ -0,0 +1,166 @@
+""" """
+
+# Standard library modules.
+
+# Third party modules.
+import numpy as np
+import pytest
+import pyxray
+
+# Local modules.
+from pypenelopetools.planner import (
+    SimulationPlanner,
+    get_module_size_cm,
+    MIN_ABSORPTION_ENERGY_eV,
+)
+from pypenelopetools.materialtables import MaterialTables, AVOGADRO_CONSTANT
+from pypenelopetools.material import Material
+from pypenelopetools.pengeom.geometry import Geometry
+from pypenelopetools.pengeom.module import Module, SidePointer
+from pypenelopetools.pengeom.surface import zplane, xplane, cylinder, sphere
+from pypenelopetools.pencyl.input import PencylInput
+from pypenelopetools.penepma.input import PenepmaInput
+
+# Globals and constants variables.
+ENERGIES_EV = np.geomspace(1e2, 1e6, 81)
+
+
+def _create_tables(density_g_per_cm3=1.0):
+    # Constant stopping power of 1 MeV cm2/g: range of E / 1e6 g/cm2
+    stopping_powers = np.ones_like(ENERGIES_EV)
+    zeros = np.zeros_like(ENERGIES_EV)
+    stopping = np.column_stack(
+        [ENERGIES_EV, stopping_powers, zeros, stopping_powers, zeros]
+    )
+
+    # Attenuation length of E^2 / 1e9 g/cm2 (hydrogen)
+    photoelectric = 1e9 / ENERGIES_EV**2 * pyxray.element_atomic_weight(1)
+    photoelectric /= AVOGADRO_CONSTANT
+    compton = np.column_stack([ENERGIES_EV, zeros, zeros, zeros])
+
+    header = {
+        "name": "test",
+        "density_g_per_cm3": density_g_per_cm3,
+        "atomic_fractions": {1: 1.0},
+    }
+    tables = {
+        "Stopping powers for electrons and positrons": stopping,
+        "Rayleigh scattering": np.column_stack([ENERGIES_EV, zeros]),
+        "Compton and pair-production cross sections": compton,
+        "Photoelectric cross sections,  IZ = 1": np.column_stack(
+            [ENERGIES_EV, photoelectric]
+        ),
+    }
+    return MaterialTables(header, tables)
+
+
+def testplan_material():
+    planner = SimulationPlanner(accuracy=0.05)
+    parameters = planner.plan_material(_create_tables(), 0.1)
+
+    assert parameters.eabs1 == pytest.approx(5000.0, rel=1e-6)
+    assert parameters.eabs2 == pytest.approx(np.sqrt(5e6), rel=1e-6)
+    assert parameters.eabs3 == pytest.approx(5000.0, rel=1e-6)
+    assert parameters.c1 == pytest.approx(0.05)
+    assert parameters.c2 == pytest.approx(0.05)
+    assert parameters.wcc == parameters.eabs1
+    assert parameters.wcr == parameters.eabs2
+
+
+def testplan_material_limits():
+    planner = SimulationPlanner(
+        accuracy=0.5, min_energy_eV=1000.0, energy_resolution_eV=150.0
+    )
+    parameters = planner.plan_material(_create_tables(), 1.0)
+
+    assert parameters.eabs1 == pytest.approx(1000.0)
+    assert parameters.eabs2 == pytest.approx(1000.0)
+    assert parameters.c1 == pytest.approx(0.2)
+    assert parameters.wcc == pytest.approx(150.0)
+    assert parameters.wcr == pytest.approx(150.0)
+
+    # Very thin body
+    parameters = SimulationPlanner().plan_material(_create_tables(), 1e-9)
+    assert parameters.eabs1 == pytest.approx(MIN_ABSORPTION_ENERGY_eV)
+    assert parameters.eabs2 == pytest.approx(MIN_ABSORPTION_ENERGY_eV)
+
+
+def testget_module_size_cm():
+    module = Module()
+    module.add_surface(zplane(0.0), SidePointer.NEGATIVE)
+    module.add_surface(zplane(-0.01), SidePointer.POSITIVE)
+    module.add_surface(cylinder(1.0, "z"), SidePointer.NEGATIVE)
+    assert get_module_size_cm(module) == pytest.approx(0.01)
+
+    module = Module()
+    module.add_surface(xplane(-1.0), SidePointer.POSITIVE)
+    module.add_surface(xplane(2.0), SidePointer.NEGATIVE)
+    module.add_surface(sphere(4.0), SidePointer.NEGATIVE)
+    assert get_module_size_cm(module) == pytest.approx(3.0)
+
+    module = Module()
+    module.add_surface(zplane(0.0), SidePointer.NEGATIVE)
+    assert get_module_size_cm(module) is None
+
+
+def testplan_pengeom():
+    material = Material("Cu", {29: 1.0}, 8.9)
+
+    surface_top = zplane(0.0)
+    surface_bottom = zplane(-0.1)
+    surface_cylinder = cylinder(1.0, "z")
+
+    module = Module(material, "Substrate")
+    module.add_surface(surface_top, SidePointer.NEGATIVE)
+    module.add_surface(surface_bottom, SidePointer.POSITIVE)
+    module.add_surface(surface_cylinder, SidePointer.NEGATIVE)
+
+    geometry = Geometry()
+    geometry.add_module(module)
+
+    planner = SimulationPlanner(accuracy=0.05)
+    plan = planner.plan_pengeom(geometry, {material: _create_tables()})
+
+    assert list(plan.materials) == [1]
+    assert plan.materials[1].eabs1 == pytest.approx(5000.0, rel=1e-6)
+    assert plan.filenames == {1: material.filename}
+    assert plan.dsmax == {(1,): pytest.approx(0.01)}
+
+    input = PenepmaInput()
+    input.materials.add(1, "old.mat", 1e3, 1e3, 1e3, 0.1, 0.1, 1e3, 1e3)
+    plan.apply(input)
+
+    ((material_values,),) = input.materials.get()
+    assert material_values[0] == material.filename
+    assert material_values[1] == pytest.approx(5000.0, rel=1e-6)
+    assert input.DSMAX.get() == (((1, pytest.approx(0.01)),),)
+
+
+def testplan_pencyl():
+    input = PencylInput()
+    input.geometry_definitions.add(0.0, 0.01, cylinders=[(1, 0.0, 1.0)])
+    input.geometry_definitions.add(0.01, 1.0, cylinders=[(2, 0.0, 1.0), (0, 1.0, 2.0)])
+
+    planner = SimulationPlanner(accuracy=0.05)
+    tables = {1: _create_tables(), 2: _create_tables(2.0)}
+    plan = planner.plan_pencyl(input.geometry_definitions, tables)
+
+    assert sorted(plan.materials) == [1, 2]
+    assert plan.materials[1].eabs1 == pytest.approx(500.0, rel=1e-6)
+    assert plan.materials[2].eabs1 == pytest.approx(2.0 * 0.05 * 0.99e6, rel=1e-6)
+    assert plan.dsmax == {(1, 1): pytest.approx(0.001), (2, 1): pytest.approx(0.099)}
+
+    with pytest.raises(ValueError):
+        plan.apply(input)
+
+    plan.filenames.update({1: "mat1.mat", 2: "mat2.mat"})
+    plan.apply(input)
+    assert input.DSMAX.get() == (
+        ((1, 1, pytest.approx(0.001)), (2, 1, pytest.approx(0.099))),
+    )
+
+
+def testplan_unknown_size():
+    planner = SimulationPlanner()
+    with pytest.raises(ValueError):
+        planner.plan({(1,): (1, None)}, {1: _create_tables()})